@@ -0,0 +1,148 @@
+"""
+多帳號模式：帳號池檔案記錄各平台的帳號密碼與付款資訊，批次工作依平台分配帳號，
+各帳號在獨立的 BrowserContext 中同時執行。
+"""
+import csv
+import json
+import logging
+import os
+import stat
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Dict, List
+from batch import BatchJob
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Account:
+    """單一購物帳號，password 與 payment 不會出現在 repr 中"""
+    name: str
+    platform: str
+    username: str
+    password: str = field(repr=False)
+    payment: Dict[str, str] = field(default_factory=dict, repr=False)
+
+def _read_rows(file_path: Path) -> List[Dict]:
+    if file_path.suffix.lower() == '.csv':
+        with file_path.open(newline='', encoding='utf-8') as f:
+            rows = []
+            for row in csv.DictReader(f):
+                # payment.<欄位> 形式的欄位收進 payment
+                payment = {k.split('.', 1)[1]: v for k, v in row.items() if k.startswith('payment.') and v}
+                rows.append({**{k: v for k, v in row.items() if not k.startswith('payment.')}, 'payment': payment})
+            return rows
+    data = json.loads(file_path.read_text(encoding='utf-8'))
+    return data['accounts'] if isinstance(data, dict) else data
+
+def load_accounts(path: str) -> List[Account]:
+    """讀取帳號池檔（.json 或 .csv），欄位為 name、platform、username、password、payment"""
+    from buyer.flows import get_flow
+
+    file_path = Path(path)
+    if os.name == 'posix' and file_path.stat().st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        logger.warning(f"帳號池檔 {file_path} 可被其他使用者讀取，建議執行 chmod 600")
+
+    accounts = []
+    names = set()
+    for index, row in enumerate(_read_rows(file_path), start=1):
+        platform = (row.get('platform') or '').strip().lower()
+        username = (row.get('username') or '').strip()
+        password = row.get('password') or ''
+        if not platform or not username or not password:
+            raise ValueError(f"帳號池第 {index} 筆需要 platform、username 與 password")
+        get_flow(platform)
+
+        name = (row.get('name') or '').strip() or f"{platform}-{index}"
+        if name in names:
+            raise ValueError(f"帳號池第 {index} 筆的名稱重複: {name}")
+        names.add(name)
+
+        payment = row.get('payment') or {}
+        if not isinstance(payment, dict):
+            raise ValueError(f"帳號池第 {index} 筆的 payment 必須是物件")
+        accounts.append(Account(name, platform, username, password, {k: str(v) for k, v in payment.items()}))
+    return accounts
+
+class AccountPool:
+    """依平台分配帳號給工作
+
+    工作指定 account 時使用該帳號，其餘依平台輪流分配目前工作數最少的帳號；
+    同一帳號被分到多筆工作時會共用購物車，因此會提出警告。
+    """
+    def __init__(self, accounts: List[Account]):
+        self.accounts = {account.name: account for account in accounts}
+
+    def get(self, name: str) -> Account:
+        if name not in self.accounts:
+            raise ValueError(f"帳號池中沒有 {name}")
+        return self.accounts[name]
+
+    def for_platform(self, platform: str) -> List[Account]:
+        return [a for a in self.accounts.values() if a.platform == platform]
+
+    def assign(self, jobs: List[BatchJob]) -> List[BatchJob]:
+        """回傳已指定帳號的工作"""
+        load = defaultdict(int)
+        for job in jobs:
+            if job.account:
+                account = self.get(job.account)
+                if account.platform != job.platform:
+                    raise ValueError(f"[{job.name}] 帳號 {account.name} 屬於 {account.platform}，與工作平台 {job.platform} 不符")
+                load[account.name] += 1
+
+        assigned = []
+        for job in jobs:
+            if not job.account:
+                candidates = self.for_platform(job.platform)
+                if not candidates:
+                    raise ValueError(f"[{job.name}] 帳號池中沒有 {job.platform} 的帳號")
+                # 依工作數最少、再依檔案順序挑選
+                account = min(candidates, key=lambda a: load[a.name])
+                load[account.name] += 1
+                job = replace(job, account=account.name)
+            assigned.append(job)
+
+        shared = sorted(name for name, count in load.items() if count > 1)
+        if shared:
+            logger.warning(f"帳號數少於工作數，以下帳號會同時執行多筆工作: {', '.join(shared)}")
+        return assigned
+
+    def fan_out(self, job: BatchJob) -> List[BatchJob]:
+        """把同一筆工作展開到該平台的每個帳號"""
+        accounts = self.for_platform(job.platform)
+        if not accounts:
+            raise ValueError(f"帳號池中沒有 {job.platform} 的帳號")
+        return [replace(job, name=f"{job.name}@{a.name}", account=a.name) for a in accounts]
+
+def account_report(results) -> Dict[str, Dict]:
+    """依帳號彙整成功率與耗時（results 為 batch.JobResult 清單）"""
+    from buyer.instrument import percentile
+
+    grouped = defaultdict(list)
+    for result in results:
+        grouped[result.job.account or '(.env)'].append(result)
+
+    report = {}
+    for name, items in grouped.items():
+        latencies = [r.total_ms for r in items]
+        succeeded = sum(1 for r in items if r.success)
+        report[name] = {
+            'jobs': len(items),
+            'succeeded': succeeded,
+            'success_rate': succeeded / len(items),
+            'latency_p50_ms': percentile(latencies, 50),
+            'latency_p95_ms': percentile(latencies, 95),
+            'throttled_ms': sum(r.timing_stats.get('throttle', {}).get('waited_ms', 0.0) for r in items),
+        }
+    return report
+
+def log_account_report(report: Dict[str, Dict]):
+    """輸出各帳號的成功率與耗時"""
+    for name, stats in report.items():
+        logger.info(
+            f"[帳號 {name}] {stats['succeeded']}/{stats['jobs']} 筆成功，"
+            f"p50 {stats['latency_p50_ms']:.0f} ms，p95 {stats['latency_p95_ms']:.0f} ms，"
+            f"速率限制等待 {stats['throttled_ms']:.0f} ms"
+        )
@@ -0,0 +1,376 @@
+"""
+批次購買模式：一個瀏覽器程序、多個獨立的 BrowserContext 同時執行
+"""
+import asyncio
+import csv
+import json
+import logging
+import socket
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from buyer.factory import PlatformFactory
+from buyer.footprint import MemoryWatchdog, launch_options
+from buyer.instrument import Tracer
+from utils import TimingContext
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BatchJob:
+    """單一購買工作"""
+    url: str
+    time: Optional[str] = None
+    platform: Optional[str] = None
+    name: str = ''
+    # 帳號池中的帳號名稱，未指定時由 AccountPool 分配
+    account: Optional[str] = None
+
+@dataclass
+class JobResult:
+    """單一工作的執行結果與耗時報告"""
+    job: BatchJob
+    success: bool = False
+    error: Optional[str] = None
+    total_ms: float = 0.0
+    timing_stats: Dict = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.job.name,
+            'url': self.job.url,
+            'platform': self.job.platform,
+            'account': self.job.account,
+            'time': self.job.time,
+            'success': self.success,
+            'error': self.error,
+            'total_ms': self.total_ms,
+            'timing_stats': self.timing_stats,
+        }
+
+def load_jobs(path: str) -> List[BatchJob]:
+    """讀取工作檔（.json 或 .csv），欄位為 url、time、platform、name、account"""
+    file_path = Path(path)
+    if file_path.suffix.lower() == '.csv':
+        with file_path.open(newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        data = json.loads(file_path.read_text(encoding='utf-8'))
+        rows = data['jobs'] if isinstance(data, dict) else data
+
+    jobs = []
+    for index, row in enumerate(rows, start=1):
+        url = (row.get('url') or '').strip()
+        if not url:
+            raise ValueError(f"工作檔第 {index} 筆缺少 url")
+
+        platform = PlatformFactory.detect_platform(url)
+        declared = (row.get('platform') or '').strip().lower()
+        if declared and declared != platform:
+            raise ValueError(f"工作檔第 {index} 筆的平台 {declared} 與連結不符（{platform}）")
+
+        jobs.append(BatchJob(
+            url=url,
+            time=(row.get('time') or '').strip() or None,
+            platform=platform,
+            name=(row.get('name') or '').strip() or f"job-{index}",
+            account=(row.get('account') or '').strip() or None,
+        ))
+    return jobs
+
+def record_result(telemetry, result: JobResult, tracer: Tracer, meter=None, mode: str = 'batch'):
+    """把工作結果寫入執行紀錄（telemetry 為 TelemetryStore，None 時略過）"""
+    if telemetry is None:
+        return
+    from buyer.telemetry import RunRecord
+
+    telemetry.record(RunRecord.from_run(
+        tracer,
+        result.job.platform or PlatformFactory.detect_platform(result.job.url),
+        result.success,
+        result.total_ms,
+        error=result.error,
+        timing_stats=result.timing_stats,
+        meter=meter,
+        mode=mode,
+        account=result.job.account,
+    ))
+def check_concurrency(jobs: List[BatchJob], concurrency: int):
+    """同一預定時間的工作數超過 concurrency 時拋出 ValueError
+
+    每個執行名額從登入、預熱一路佔用到開賣結帳結束，超出的工作要等前面的工作結束才開始，會錯過開賣。
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency 必須大於 0")
+    crowded = {t: n for t, n in Counter(job.time for job in jobs if job.time).items() if n > concurrency}
+    if crowded:
+        detail = '、'.join(f"{t} 有 {n} 筆" for t, n in sorted(crowded.items()))
+        raise ValueError(
+            f"同一預定時間的工作數超過同時執行上限 {concurrency}（{detail}），超出的工作會錯過開賣，"
+            f"請將 concurrency 提高到至少 {max(crowded.values())}"
+        )
+
+def _free_port() -> int:
+    """取得本機可用的連接埠"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class SharedBrowser:
+    """啟動單一 Chromium 並開放 CDP 端點
+
+    Playwright 的同步 API 不能跨執行緒共用，因此每個工作執行緒各自以
+    connect_over_cdp 連到同一個瀏覽器程序，再建立自己的 BrowserContext。
+    """
+    def __init__(self, headless: bool = True, low_footprint: bool = False):
+        self.headless = headless
+        self.low_footprint = low_footprint
+        self.endpoint = None
+        self._playwright = None
+        self._browser = None
+
+    def __enter__(self):
+        from playwright.sync_api import sync_playwright
+
+        port = _free_port()
+        self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(
+            **launch_options(self.headless, self.low_footprint, args=[f'--remote-debugging-port={port}'])
+        )
+        self.endpoint = f"http://127.0.0.1:{port}"
+        logger.info(f"共用瀏覽器已啟動: {self.endpoint}")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self._browser.close()
+        finally:
+            self._playwright.stop()
+
+def run_job(endpoint: str, job: BatchJob, **options) -> JobResult:
+    """在共用瀏覽器中以獨立 context 執行一筆工作"""
+    from playwright.sync_api import sync_playwright
+    from buyer.diagnostics import Diagnostics
+    from buyer.telemetry import NetworkMeter
+    from buyer.profile import resolve_profile
+    from buyer.runner import create_context, execute_purchase
+
+    block_resources = options.pop('block_resources', False)
+    low_footprint = options.pop('low_footprint', False)
+    watchdog = options.pop('watchdog', None)
+    trace_dir = options.pop('trace_dir', None)
+    telemetry = options.pop('telemetry', None)
+    diagnostics = options.pop('diagnostics', None)
+    tracer = Tracer(job.name)
+    result = JobResult(job=job)
+    start = time.perf_counter()
+    with sync_playwright() as p:
+        # 建立 context 的過程也可能失敗，清理時只關閉已建立的部分，失敗記錄在這筆工作的結果中
+        browser = context = meter = diag = page = buyer = None
+        try:
+            browser = p.chromium.connect_over_cdp(endpoint)
+            profile = resolve_profile(
+                job.platform or PlatformFactory.detect_platform(job.url),
+                options.get('session_cache'),
+                options.get('buyer_options'),
+            )
+            if watchdog is not None:
+                watchdog.wait_for_headroom()
+            context = create_context(browser, job.url, block_resources, profile=profile, low_footprint=low_footprint)
+            if watchdog is not None:
+                watchdog.context_opened()
+            meter = NetworkMeter().attach(context) if telemetry else None
+            diag = Diagnostics(run_id=tracer.run_id, **(diagnostics or {}))
+            diag.start_tracing(context)
+            options['buyer_options'] = {**(options.get('buyer_options') or {}), 'diagnostics': diag}
+            page = context.new_page()
+            buyer = execute_purchase(page, job.url, job.time, tracer=tracer, **options)
+            result.success = True
+        except Exception as e:
+            result.error = str(e)
+            logger.error(f"[{job.name}] 執行失敗: {str(e)}")
+            if page is not None and not diag.captured:
+                diag.capture(page, 'error')
+        finally:
+            if diag is not None:
+                diag.flush(keep=not result.success)
+            result.total_ms = (time.perf_counter() - start) * 1000
+            result.timing_stats = buyer.timing_stats if buyer is not None else {'trace': tracer.summary()}
+            if trace_dir:
+                tracer.export(trace_dir)
+            record_result(telemetry, result, tracer, meter)
+            if context is not None:
+                try:
+                    context.close()
+                finally:
+                    if watchdog is not None:
+                        watchdog.context_closed()
+            if browser is not None:
+                # 對 CDP 連線呼叫 close 只會中斷連線，不會關閉共用的瀏覽器
+                browser.close()
+    return result
+
+def _job_options(job: BatchJob, options: Dict, accounts=None, rate_limiter=None) -> Dict:
+    """把工作分配到的帳號與共用的速率限制加入購買器選項"""
+    buyer_options = dict(options.get('buyer_options') or {})
+    if accounts is not None and job.account:
+        buyer_options['account'] = accounts.get(job.account)
+    if rate_limiter is not None:
+        buyer_options['rate_limiter'] = rate_limiter
+    return {**options, 'buyer_options': buyer_options}
+
+def log_report(results: List[JobResult]):
+    """輸出每筆工作的耗時報告，多帳號模式另外輸出各帳號的統計"""
+    for result in results:
+        steps = result.timing_stats.get('steps', {})
+        step_text = ', '.join(f"{name} {ms:.0f} ms" for name, ms in steps.items())
+        status = "成功" if result.success else f"失敗（{result.error}）"
+        logger.info(f"[{result.job.name}] {status}，總耗時 {result.total_ms:.0f} ms；{step_text}")
+
+    succeeded = sum(1 for r in results if r.success)
+    logger.info(f"批次完成: {succeeded}/{len(results)} 筆成功")
+    if any(r.job.account for r in results):
+        from accounts import account_report, log_account_report
+        log_account_report(account_report(results))
+
+def run_batch(
+    jobs: List[BatchJob],
+    concurrency: int = 4,
+    headless: bool = True,
+    accounts=None,
+    rate_limiter=None,
+    memory_limit_mb: Optional[float] = None,
+    **options,
+) -> List[JobResult]:
+    """以共用瀏覽器同時執行多筆工作，concurrency 為同時執行的上限（不可少於同一預定時間的工作數）
+
+    options 會傳給 execute_purchase（lead_ms、keep_alive_interval、session_cache），
+    block_resources 與 low_footprint 用於建立 context，trace_dir 為每筆工作計時紀錄的輸出目錄，
+    telemetry（TelemetryStore）會在每筆工作結束後追加執行紀錄，diagnostics 為每筆工作 Diagnostics 的設定。
+    提供 accounts（AccountPool）時每筆工作以分配到的帳號登入；rate_limiter 由所有工作共用。
+    執行期間以 MemoryWatchdog 取樣瀏覽器記憶體，超過 memory_limit_mb 時暫緩建立新的 context。
+    """
+    check_concurrency(jobs, concurrency)
+
+    # 依預定時間排序，避免晚開賣的工作佔住執行名額
+    ordered = sorted(jobs, key=lambda j: j.time or '')
+    if accounts is not None:
+        ordered = accounts.assign(ordered)
+    watchdog = MemoryWatchdog(limit_mb=memory_limit_mb).start()
+    options['watchdog'] = watchdog
+    try:
+        with SharedBrowser(headless=headless, low_footprint=options.get('low_footprint', False)) as shared:
+            with TimingContext(f"批次執行 {len(ordered)} 筆工作"):
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as executor:
+                    futures = [
+                        executor.submit(run_job, shared.endpoint, job, **_job_options(job, options, accounts, rate_limiter))
+                        for job in ordered
+                    ]
+                    results = [future.result() for future in futures]
+    finally:
+        watchdog.stop()
+
+    log_report(results)
+    watchdog.log_summary()
+    return results
+
+async def run_job_async(browser, job: BatchJob, semaphore: asyncio.Semaphore, **options) -> JobResult:
+    """以 asyncio 引擎在共用瀏覽器中執行一筆工作"""
+    from buyer.diagnostics import Diagnostics
+    from buyer.telemetry import NetworkMeter
+    from buyer.profile import resolve_profile
+    from buyer.runner import create_context_async, execute_purchase_async
+
+    block_resources = options.pop('block_resources', False)
+    low_footprint = options.pop('low_footprint', False)
+    watchdog = options.pop('watchdog', None)
+    trace_dir = options.pop('trace_dir', None)
+    telemetry = options.pop('telemetry', None)
+    diagnostics = options.pop('diagnostics', None)
+    async with semaphore:
+        tracer = Tracer(job.name)
+        result = JobResult(job=job)
+        start = time.perf_counter()
+        # 建立 context 的過程也可能失敗，清理時只關閉已建立的部分，失敗記錄在這筆工作的結果中
+        context = meter = diag = page = buyer = None
+        try:
+            profile = resolve_profile(
+                job.platform or PlatformFactory.detect_platform(job.url),
+                options.get('session_cache'),
+                options.get('buyer_options'),
+            )
+            if watchdog is not None:
+                await asyncio.to_thread(watchdog.wait_for_headroom)
+            context = await create_context_async(browser, job.url, block_resources, profile=profile, low_footprint=low_footprint)
+            if watchdog is not None:
+                watchdog.context_opened()
+            meter = NetworkMeter().attach(context) if telemetry else None
+            diag = Diagnostics(run_id=tracer.run_id, **(diagnostics or {}))
+            await diag.start_tracing_async(context)
+            options['buyer_options'] = {**(options.get('buyer_options') or {}), 'diagnostics': diag}
+            page = await context.new_page()
+            buyer = await execute_purchase_async(page, job.url, job.time, tracer=tracer, **options)
+            result.success = True
+        except Exception as e:
+            result.error = str(e)
+            logger.error(f"[{job.name}] 執行失敗: {str(e)}")
+            if page is not None and not diag.captured:
+                await diag.capture_async(page, 'error')
+        finally:
+            if diag is not None:
+                await diag.flush_async(keep=not result.success)
+            result.total_ms = (time.perf_counter() - start) * 1000
+            result.timing_stats = buyer.timing_stats if buyer is not None else {'trace': tracer.summary()}
+            if trace_dir:
+                tracer.export(trace_dir)
+            record_result(telemetry, result, tracer, meter)
+            if context is not None:
+                try:
+                    await context.close()
+                finally:
+                    if watchdog is not None:
+                        watchdog.context_closed()
+        return result
+
+async def run_batch_async(
+    jobs: List[BatchJob],
+    concurrency: int = 4,
+    headless: bool = True,
+    accounts=None,
+    rate_limiter=None,
+    memory_limit_mb: Optional[float] = None,
+    **options,
+) -> List[JobResult]:
+    """run_batch 的 asyncio 版本：單一事件迴圈驅動所有頁面，不需要 CDP 轉接"""
+    from playwright.async_api import async_playwright
+
+    check_concurrency(jobs, concurrency)
+
+    ordered = sorted(jobs, key=lambda j: j.time or '')
+    if accounts is not None:
+        ordered = accounts.assign(ordered)
+    semaphore = asyncio.Semaphore(concurrency)
+    watchdog = MemoryWatchdog(limit_mb=memory_limit_mb).start()
+    options['watchdog'] = watchdog
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(**launch_options(headless, options.get('low_footprint', False)))
+            try:
+                with TimingContext(f"批次執行 {len(ordered)} 筆工作"):
+                    results = await asyncio.gather(
+                        *(
+                            run_job_async(browser, job, semaphore, **_job_options(job, options, accounts, rate_limiter))
+                            for job in ordered
+                        )
+                    )
+            finally:
+                await browser.close()
+    finally:
+        watchdog.stop()
+
+    log_report(list(results))
+    watchdog.log_summary()
+    return list(results)
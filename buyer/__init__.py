@@ -1,9 +1,22 @@
 """
 自動購買模組
+
+平台購買器在第一次存取時才匯入（連同 Playwright），
+讓只需要排程、工作檔或計時工具的程式不必付出匯入成本。
 """
+import importlib
+
+_LAZY = {
+    'BaseBuyer': 'buyer.base',
+    'PChomeBuyer': 'buyer.pchome',
+    'MomoBuyer': 'buyer.momo',
+}
 
-from .base import BaseBuyer
-from .pchome import PChomeBuyer
-from .momo import MomoBuyer
+__all__ = ['BaseBuyer', 'PChomeBuyer', 'MomoBuyer']
 
-__all__ = ['BaseBuyer', 'PChomeBuyer', 'MomoBuyer'] 
\ No newline at end of file
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,22 @@
+"""
+自動購買模組（asyncio 版本）
+
+平台購買器在第一次存取時才匯入。
+"""
+import importlib
+
+_LAZY = {
+    'AsyncBaseBuyer': 'buyer.aio.base',
+    'race': 'buyer.aio.base',
+    'AsyncPChomeBuyer': 'buyer.aio.pchome',
+    'AsyncMomoBuyer': 'buyer.aio.momo',
+}
+
+__all__ = ['AsyncBaseBuyer', 'AsyncPChomeBuyer', 'AsyncMomoBuyer', 'race']
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,77 @@
+"""
+購買器的 asyncio 版本：流程與 BaseBuyer 共用（buyer/base 的 driven 產生器），只換掉驅動器與
+會阻塞的元件呼叫。平台購買器以 ``class AsyncXBuyer(AsyncBaseBuyer, XBuyer)`` 組合。
+"""
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional
+import asyncio
+from buyer.base import BaseBuyer, Plan
+from buyer.steps import AsyncStepEngine
+
+if TYPE_CHECKING:
+    from playwright.async_api import Page
+
+async def race(conditions: Dict[str, Awaitable], timeout: Optional[float] = None) -> str:
+    """同時等待多個條件，回傳最先成立者的名稱並取消其餘等待
+
+    發生例外的條件視為不成立；全部不成立或逾時則拋出 TimeoutError。
+    """
+    tasks = {asyncio.ensure_future(awaitable): name for name, awaitable in conditions.items()}
+    pending = set(tasks)
+    deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+    errors = []
+    try:
+        while pending:
+            remaining = None if deadline is None else max(deadline - asyncio.get_running_loop().time(), 0)
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.cancelled():
+                    continue
+                if task.exception() is None:
+                    return tasks[task]
+                errors.append(f"{tasks[task]}: {task.exception()}")
+    finally:
+        for task in pending:
+            task.cancel()
+    raise TimeoutError(f"等待條件皆未成立: {', '.join(tasks.values())}" + (f"（{'; '.join(errors)}）" if errors else ''))
+
+class AsyncBaseBuyer(BaseBuyer):
+    """自動購買基礎類別（asyncio 版本）
+
+    登入需要 await，因此請以 ``await Buyer.create(url, page)`` 建立實例。
+    """
+    step_engine = AsyncStepEngine
+
+    @classmethod
+    async def create(cls, url: str, page: 'Page', **kwargs) -> 'AsyncBaseBuyer':
+        """建立購買器並完成登入"""
+        buyer = cls(url, page, **kwargs)
+        buyer._load_credentials()
+        await buyer._ensure_login()
+        return buyer
+
+    def _start(self):
+        pass
+
+    async def _drive(self, plan: Plan):
+        """同 BaseBuyer._drive，動作回傳 awaitable 時先 await"""
+        reply, error = None, None
+        while True:
+            try:
+                action = plan.send(reply) if error is None else plan.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                reply = action()
+                if hasattr(reply, '__await__'):
+                    reply = await reply
+                error = None
+            except BaseException as e:
+                reply, error = None, e
+
+    def _api(self, owner, name: str):
+        return getattr(owner, f"{name}_async")
+
+    def _blocking(self, function: Callable, *args):
+        return asyncio.to_thread(function, *args)
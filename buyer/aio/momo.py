@@ -0,0 +1,5 @@
+from buyer.aio.base import AsyncBaseBuyer
+from buyer.momo import MomoBuyer
+
+class AsyncMomoBuyer(AsyncBaseBuyer, MomoBuyer):
+    """MOMO購物平台實作（asyncio 版本），流程由 MomoBuyer 提供"""
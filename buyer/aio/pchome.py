@@ -0,0 +1,5 @@
+from buyer.aio.base import AsyncBaseBuyer
+from buyer.pchome import PChomeBuyer
+
+class AsyncPChomeBuyer(AsyncBaseBuyer, PChomeBuyer):
+    """PChome 平台實作（asyncio 版本），流程由 PChomeBuyer 提供"""
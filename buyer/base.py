@@ -1,20 +1,113 @@
+"""
+購買器的共用流程
+
+每個會碰到瀏覽器的方法都寫成產生器（以 driven 包裝）：流程中的每個 I/O 動作以不帶參數的函式 yield 出去，
+由購買器的驅動器執行後把結果送回。BaseBuyer 的驅動器直接呼叫（Playwright 同步 API），
+AsyncBaseBuyer（buyer/aio）的驅動器遇到 awaitable 時 await，因此兩個版本共用同一份流程。
+"""
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
-from playwright.sync_api import Page
-import datetime
-import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, List, Optional
+import functools
 import logging
+import time
+from buyer.clocksync import ClockSync
+from buyer.diagnostics import Diagnostics
+from buyer.flows import Flow, FlowStep, get_flow
+from buyer.recovery import CheckoutRecovery
+from buyer.scheduler import PrecisionScheduler, parse_scheduled_time
+from buyer.session import SessionCache
+from buyer.steps import StepEngine, count_round_trips
+from buyer.watcher import StockWatcher
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
 
 logger = logging.getLogger(__name__)
 
+# 以 <link rel="preconnect"> 讓瀏覽器預先完成 DNS/TLS 握手
+WARM_CONNECTIONS_JS = '''(origins) => {
+    for (const origin of origins) {
+        for (const rel of ['dns-prefetch', 'preconnect']) {
+            const link = document.createElement('link');
+            link.rel = rel;
+            link.href = origin;
+            link.crossOrigin = 'use-credentials';
+            document.head.appendChild(link);
+        }
+    }
+}'''
+
+# 核心流程：每次 yield 一個 I/O 動作，收到它的結果
+Plan = Generator[Callable[[], Any], Any, Any]
+
+def driven(method: Callable[..., Plan]) -> Callable[..., Any]:
+    """把產生器方法包裝成一般方法，交由購買器的驅動器（_drive）執行
+
+    同步購買器上呼叫時直接回傳結果，asyncio 購買器上回傳 coroutine。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self._drive(method(self, *args, **kwargs))
+    return wrapper
+
 class BaseBuyer(ABC):
-    """自動購買基礎類別"""
-    def __init__(self, url: str, page: Page):
+    """自動購買基礎類別（Playwright 同步 API），建立時即完成登入"""
+    # 購買流程會連到的其他網域，預熱時先建立連線
+    warm_origins: List[str] = []
+    # 平台代號，用於登入快取的檔名
+    platform: str = ''
+    # 登入後才能存取的頁面，用來快速確認登入狀態
+    member_url: Optional[str] = None
+    # 判斷商品是否可購買的輕量 DOM 探測腳本，回傳布林值
+    availability_js: Optional[str] = None
+    # 結帳步驟的引擎，asyncio 版本為 AsyncStepEngine
+    step_engine = StepEngine
+
+    def __init__(self, url: str, page: 'Page', session_cache: Optional[SessionCache] = None, **options):
         self.url = url
         self.page = page
-        self.timing_stats = {}  
+        self.timing_stats = {}
+        self._prepared = False
+        self.session_cache = session_cache
+        # 平台專屬的選項（例如 api_checkout），不認得的選項會被忽略
+        self.options = options
+        # 結帳步驟以事件驅動的方式等待成功、失敗或中途視窗
+        self.steps = self.step_engine(page)
+        # 依流程檔預先解析的元素，於預熱時建立
+        self.locators = {}
+        # 截圖與 HTML 快照延到關鍵路徑之後，由呼叫端 flush 寫出
+        self.diagnostics = options.get('diagnostics') or Diagnostics()
+        self._start()
+
+    def _start(self):
+        """建立後登入（asyncio 版本改在 create 中完成）"""
         self._load_credentials()
-        self.login()
+        self._ensure_login()
+
+    def _drive(self, plan: Plan):
+        """依序呼叫核心流程產出的動作並送回結果，動作拋出的例外在流程的 yield 處拋出"""
+        reply, error = None, None
+        while True:
+            try:
+                action = plan.send(reply) if error is None else plan.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                reply, error = action(), None
+            except BaseException as e:
+                reply, error = None, e
+
+    def _api(self, owner, name: str):
+        """owner 的同步方法；asyncio 版本改用同名的 <name>_async（節流、診斷、快取、排程等元件皆如此命名）"""
+        return getattr(owner, name)
+
+    def _blocking(self, function: Callable, *args):
+        """呼叫會阻塞的函式（例如 input），asyncio 版本改在執行緒中執行"""
+        return function(*args)
+
+    def _capture(self, label: str):
+        """擷取失敗畫面（寫出延到 flush）"""
+        return self._api(self.diagnostics, 'capture')(self.page, label)
 
     @abstractmethod
     def _load_credentials(self):
@@ -36,12 +129,284 @@ class BaseBuyer(ABC):
         """執行購買流程"""
         pass
 
-    def wait_for_scheduled_time(self, scheduled_time: Optional[str]):
-        """等待直到指定時間"""
+    @property
+    def flow(self) -> Optional[Flow]:
+        """平台的宣告式結帳流程（buyer/flows），沒有流程檔時為 None"""
+        try:
+            return get_flow(self.platform)
+        except ValueError:
+            return None
+
+    @driven
+    def _run_flow(self, flow_steps: List[FlowStep]):
+        """依序執行流程步驟，並記錄各步驟結果與瀏覽器往返次數
+
+        開賣當下的結帳步驟不經過速率限制（throttle），帳號的請求配額留給開賣前的預熱、輪詢與登入。
+        """
+        first = len(self.steps.history)
+        try:
+            for flow_step in flow_steps:
+                yield lambda: self.steps.run(flow_step.step, flow_step.action(self))
+        finally:
+            results = self.timing_stats.setdefault('flow', {'round_trips': 0, 'steps': []})
+            finished = self.steps.history[first:]
+            results['round_trips'] += count_round_trips(finished)
+            results['steps'].extend(r.to_dict() for r in finished)
+            for result in finished:
+                self.diagnostics.record(self.page, f"step.{result.step}", outcome=result.outcome)
+
+    @driven
+    def checkout(self, from_cart: Optional[str] = None):
+        """執行購買流程直到送出訂單之前（競速模式只讓最快的一組送出）
+
+        步驟因逾時或導航中斷失敗時，從目前階段重試（recovery 選項為 CheckoutRecovery，
+        或以 max_retries 選項指定次數）；送出訂單不重試，避免重複下單。
+        from_cart 為其他組以 add_to_cart 加入後到達的購物車網址時，略過加入購物車的步驟，
+        前往該頁後從購物車階段繼續（同一帳號共用購物車，不會重複加入）。
+        """
+        if not self.flow:
+            raise NotImplementedError(f"{type(self).__name__} 不支援分段購買")
+        if not self._prepared:
+            yield self.prepare
+        flow_steps = self.flow.checkout
+        if from_cart:
+            flow_steps = self.flow.split_once()[1]
+            if self.page.url != from_cart:
+                yield lambda: self.page.goto(from_cart, wait_until='domcontentloaded')
+        recovery = self._recovery()
+        yield lambda: self._api(recovery, 'run')(self, flow_steps)
+
+    @driven
+    def add_to_cart(self):
+        """只執行流程中到最後一個 once 步驟為止的前段（加入購物車），回傳到達的網址
+
+        流程沒有 once 步驟時不執行任何步驟並回傳 None。
+        """
+        if not self.flow:
+            raise NotImplementedError(f"{type(self).__name__} 不支援分段購買")
+        if not self._prepared:
+            yield self.prepare
+        flow_steps = self.flow.split_once()[0]
+        if not flow_steps:
+            return None
+        recovery = self._recovery()
+        yield lambda: self._api(recovery, 'run')(self, flow_steps)
+        return self.page.url
+
+    def _recovery(self) -> CheckoutRecovery:
+        return self.options.get('recovery') or CheckoutRecovery(max_retries=self.options.get('max_retries', 2))
+
+    @driven
+    def detect_stage(self):
+        """以單次檢查判斷目前頁面在結帳流程的哪個階段，判斷不出時回傳 None"""
+        if not self.flow or not self.flow.stage_step:
+            return None
+        try:
+            matched = yield lambda: self.steps.run(self.flow.stage_step)
+        except Exception as e:
+            logger.info(f"無法判斷目前階段: {str(e)}")
+            return None
+        stage = self.flow.stage_of(matched)
+        self.diagnostics.record(self.page, 'detect_stage', stage=stage)
+        return stage
+
+    @driven
+    def reload_product(self):
+        """重新載入商品頁並解析元素（重試時判斷不出階段才使用）"""
+        yield self.throttle
+        yield lambda: self.page.goto(self.url, wait_until='domcontentloaded')
+        yield self._resolve_locators
+
+    @driven
+    def submit_order(self):
+        """送出訂單，需先完成 checkout"""
+        if not self.flow:
+            raise NotImplementedError(f"{type(self).__name__} 不支援分段購買")
+        yield lambda: self._run_flow(self.flow.submit)
+
+    @driven
+    def _ensure_login(self):
+        """優先沿用快取的登入狀態，失效時才執行完整登入"""
+        account = getattr(self, 'username', None)
+        if self.session_cache and account and (yield lambda: self._restore_session(account)):
+            self.timing_stats['login'] = 'cached'
+            return
+
+        yield self.throttle
+        yield self.login
+        self.timing_stats['login'] = 'full'
+        yield self.save_session
+
+    @driven
+    def _restore_session(self, account: str):
+        """套用快取的登入狀態並確認是否仍有效"""
+        state = self.session_cache.load(self.platform, account)
+        if not state:
+            return False
+
+        yield lambda: self._api(SessionCache, 'restore')(self.page.context, state)
+        try:
+            logged_in = yield self.is_logged_in
+        except Exception as e:
+            logger.warning(f"確認登入狀態失敗: {str(e)}")
+            logged_in = False
+
+        if logged_in:
+            logger.info("沿用快取的登入狀態，略過登入流程")
+            return True
+
+        logger.info("快取的登入狀態已失效，改為重新登入")
+        self.session_cache.invalidate(self.platform, account)
+        yield self.page.context.clear_cookies
+        return False
+
+    @driven
+    def is_logged_in(self):
+        """以不跟隨轉址的 HTTP 請求確認登入狀態，未登入時會被導向登入頁"""
+        if not self.member_url:
+            return False
+
+        yield self.throttle
+        response = yield lambda: self.page.context.request.get(self.member_url, max_redirects=0, timeout=5000)
+        return response.status == 200
+
+    @driven
+    def save_session(self):
+        """將目前的登入狀態寫入快取"""
+        account = getattr(self, 'username', None)
+        if not self.session_cache or not account:
+            return
+
+        try:
+            yield lambda: self._api(self.session_cache, 'save')(self.platform, account, self.page.context)
+        except Exception as e:
+            logger.warning(f"儲存登入快取失敗: {str(e)}")
+
+    @driven
+    def _resolve_locators(self):
+        """依流程檔預先解析購買流程需要的元素，並等待標示 wait 的元素"""
+        if not self.flow:
+            return
+        for name, spec in self.flow.locators.items():
+            locator = self.page.locator(spec.selector, has_text=spec.text).first
+            self.locators[name] = locator
+            if spec.wait:
+                try:
+                    yield lambda: locator.wait_for(state=spec.wait, timeout=10000)
+                except Exception:
+                    # 尚未開賣時按鈕可能不存在，購買時再等待
+                    logger.info(f"元素 {name} 尚未出現")
+
+    @driven
+    def throttle(self):
+        """依帳號與平台的請求速率限制（rate_limiter 選項）等待，並累計等待時間"""
+        limiter = self.options.get('rate_limiter')
+        if limiter is None:
+            return
+        waited = yield lambda: self._api(limiter, 'acquire')(self.platform, getattr(self, 'username', None))
+        stats = self.timing_stats.setdefault('throttle', {'requests': 0, 'waited_ms': 0.0})
+        stats['requests'] += 1
+        stats['waited_ms'] += waited * 1000
+
+    @driven
+    def prepare(self):
+        """在預定時間前預熱：載入商品頁、建立連線並解析元素
+
+        選項 prefill 開啟時，先以 prefill_checkout 走一次結帳並記下結帳表單。
+        """
+        start = time.perf_counter()
+        yield self.steps.install
+        if self.options.get('prefill'):
+            yield self.prefill_checkout
+        yield self.throttle
+        yield lambda: self.page.goto(self.url, wait_until='domcontentloaded')
+        navigated = time.perf_counter()
+
+        if self.warm_origins:
+            yield lambda: self.page.evaluate(WARM_CONNECTIONS_JS, self.warm_origins)
+        yield self._resolve_locators
+        self._prepared = True
+
+        end = time.perf_counter()
+        self.timing_stats['prepare'] = {
+            'navigation_ms': (navigated - start) * 1000,
+            'resolve_ms': (end - navigated) * 1000,
+            'duration_ms': (end - start) * 1000,
+        }
+        logger.info(f"預熱完成，已從關鍵路徑移除 {(end - start) * 1000:.0f} ms")
+
+    @driven
+    def prefill_checkout(self):
+        """開賣前先走一次結帳並記下結帳表單，由平台實作"""
+        logger.warning(f"{type(self).__name__} 不支援預先填寫結帳表單，略過")
+        yield from ()
+
+    @driven
+    def keep_alive(self):
+        """重新整理商品頁，維持登入狀態並讓頁面保持最新"""
+        yield self.throttle
+        yield lambda: self.page.reload(wait_until='domcontentloaded')
+        yield self._resolve_locators
+        logger.info("已重新整理商品頁以維持連線")
+
+    @driven
+    def calibrate_clock(self):
+        """以商品頁主機的 Date 標頭估計伺服器時間差（秒），失敗時視為 0"""
+        try:
+            estimate = yield lambda: self._blocking(ClockSync(self.url).calibrate)
+        except Exception as e:
+            logger.warning(f"伺服器時間校正失敗，改用本機時間: {str(e)}")
+            self.timing_stats['clock'] = {'error': str(e)}
+            return 0.0
+        self.timing_stats['clock'] = estimate.to_dict()
+        return estimate.offset
+
+    @driven
+    def wait_for_scheduled_time(
+        self,
+        scheduled_time: Optional[str],
+        lead_time_ms: float = 0.0,
+        keep_alive_interval: float = 0.0,
+    ):
+        """等待直到指定時間（可設定提前量，單位毫秒）
+
+        若已預熱且 keep_alive_interval 大於 0，等待期間會定期呼叫 keep_alive。
+        選項 clock_sync 開啟時，預定時間視為商店伺服器的時間。
+        """
         if not scheduled_time:
             return
-        
-        target_time = datetime.datetime.strptime(scheduled_time, "%Y-%m-%d %H:%M:%S")
-        while datetime.datetime.now() < target_time:
-            time.sleep(1)
-            logger.info(f"等待中... 目標時間: {scheduled_time}")
\ No newline at end of file
+
+        target_time = parse_scheduled_time(scheduled_time)
+        clock_offset = (yield self.calibrate_clock) if self.options.get('clock_sync') else 0.0
+        scheduler = PrecisionScheduler(lead_time_ms=lead_time_ms, clock_offset=clock_offset)
+        wait_until = self._api(scheduler, 'wait_until')
+        if self._prepared and keep_alive_interval > 0:
+            self.timing_stats['schedule'] = yield lambda: wait_until(
+                target_time, on_idle=self.keep_alive, idle_interval=keep_alive_interval
+            )
+        else:
+            self.timing_stats['schedule'] = yield lambda: wait_until(target_time)
+
+    @driven
+    def probe_availability(self):
+        """重新載入商品頁並以單一 evaluate 判斷是否可購買"""
+        if not self.availability_js:
+            raise NotImplementedError(f"{type(self).__name__} 未提供庫存探測")
+
+        yield lambda: self.page.reload(wait_until='domcontentloaded')
+        return bool((yield lambda: self.page.evaluate(self.availability_js)))
+
+    @driven
+    def _throttled_probe(self):
+        """watch_availability 每次輪詢的探測：先經過速率限制"""
+        yield self.throttle
+        return (yield self.probe_availability)
+
+    @driven
+    def watch_availability(self, timeout: Optional[float] = None, **watcher_options):
+        """輪詢直到商品可購買（用於沒有固定開賣時間的補貨）"""
+        watcher = StockWatcher(**watcher_options)
+        self.timing_stats['watch'] = yield lambda: self._api(watcher, 'watch')(self._throttled_probe, timeout=timeout)
+        # 頁面可能在探測時重新載入過，重新確認購買按鈕
+        if self._prepared:
+            yield self._resolve_locators
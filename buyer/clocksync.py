@@ -0,0 +1,160 @@
+"""
+以 HTTP Date 標頭估計商店伺服器與本機的時間差
+
+Date 只精確到秒，因此每次取樣只能得到「伺服器時間差落在某個一秒寬的區間」；
+對多次取樣的區間取交集，並把請求安排在伺服器預計跨秒的時間點送出，
+每次取樣都能把區間再縮小，數次後即可達到數十毫秒內的精度（受 RTT 限制）。
+"""
+import email.utils
+import http.client
+import logging
+import math
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlparse
+from buyer.scheduler import SystemClock
+
+logger = logging.getLogger(__name__)
+
+class ClockSyncError(Exception):
+    """無法估計伺服器時間差"""
+    pass
+
+@dataclass
+class ClockSample:
+    """單次取樣：本機送出與收到回應的時間（epoch 秒）與伺服器回報的整秒時間"""
+    sent: float
+    received: float
+    server_second: int
+
+    @property
+    def rtt(self) -> float:
+        return self.received - self.sent
+
+@dataclass
+class OffsetEstimate:
+    """伺服器時間減本機時間（秒），uncertainty 為誤差範圍的一半"""
+    offset: float
+    uncertainty: float
+    rtt: float
+    samples: int
+    host: str = ''
+
+    def to_dict(self):
+        return {
+            'host': self.host,
+            'offset_ms': self.offset * 1000,
+            'uncertainty_ms': self.uncertainty * 1000,
+            'rtt_ms': self.rtt * 1000,
+            'samples': self.samples,
+        }
+
+def offset_bounds(samples: List[ClockSample]) -> Tuple[float, float]:
+    """回傳所有取樣共同容許的時間差區間 (下限, 上限)
+
+    伺服器在 [sent, received] 之間的某一刻產生回應，當時的伺服器時間落在
+    [server_second, server_second + 1)，因此時間差介於
+    server_second - received 與 server_second + 1 - sent 之間。
+    """
+    if not samples:
+        raise ClockSyncError("沒有任何取樣")
+    low = max(s.server_second - s.received for s in samples)
+    high = min(s.server_second + 1 - s.sent for s in samples)
+    if low > high:
+        # 伺服器時鐘在取樣期間跳動，或負載平衡後方的主機時間不一致
+        raise ClockSyncError(f"取樣結果互相矛盾（{low:.3f} > {high:.3f}）")
+    return low, high
+
+class ClockSync:
+    """以持續連線對商店主機發出 HEAD 請求，估計伺服器時間差
+
+    fetch 可替換為測試用的取樣函式，簽名為 fetch() -> ClockSample。
+    """
+    def __init__(
+        self,
+        url: str,
+        samples: int = 8,
+        timeout: float = 3.0,
+        clock: Optional[SystemClock] = None,
+        fetch: Optional[Callable[[], ClockSample]] = None,
+    ):
+        if samples < 1:
+            raise ValueError("samples 必須大於 0")
+        parsed = urlparse(url)
+        self.host = parsed.hostname or url
+        self.scheme = parsed.scheme or 'https'
+        self.samples = samples
+        self.timeout = timeout
+        self.clock = clock or SystemClock()
+        self._fetch = fetch or self._fetch_http
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            self._connection = cls(self.host, timeout=self.timeout)
+            # 先完成 TCP/TLS 握手，讓取樣只包含一次往返
+            self._connection.connect()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _fetch_http(self) -> ClockSample:
+        for attempt in range(2):
+            connection = self._connect()
+            try:
+                sent = self.clock.time()
+                connection.request('HEAD', '/', headers={'Cache-Control': 'no-cache'})
+                response = connection.getresponse()
+                response.read()
+                received = self.clock.time()
+                break
+            except (http.client.HTTPException, OSError):
+                # 伺服器關閉了持續連線，重新連線一次
+                self.close()
+                if attempt:
+                    raise
+        date = response.getheader('Date')
+        if not date:
+            raise ClockSyncError(f"{self.host} 的回應沒有 Date 標頭")
+        return ClockSample(sent, received, int(email.utils.parsedate_to_datetime(date).timestamp()))
+
+    def _next_send_time(self, low: float, high: float, rtt: float) -> float:
+        """安排下一次送出時間，讓伺服器處理請求時正好跨過目前估計的整秒"""
+        offset = (low + high) / 2
+        now = self.clock.time()
+        boundary = math.floor(now + offset + rtt / 2) + 1
+        send_at = boundary - offset - rtt / 2
+        return send_at if send_at > now else send_at + 1
+
+    def calibrate(self) -> OffsetEstimate:
+        """取樣並回傳時間差估計"""
+        collected: List[ClockSample] = []
+        try:
+            for index in range(self.samples):
+                if collected:
+                    low, high = offset_bounds(collected)
+                    rtt = min(s.rtt for s in collected)
+                    delay = self._next_send_time(low, high, rtt) - self.clock.time()
+                    if delay > 0:
+                        self.clock.sleep(delay)
+                collected.append(self._fetch())
+        finally:
+            self.close()
+
+        low, high = offset_bounds(collected)
+        estimate = OffsetEstimate(
+            offset=(low + high) / 2,
+            uncertainty=(high - low) / 2,
+            rtt=min(s.rtt for s in collected),
+            samples=len(collected),
+            host=self.host,
+        )
+        logger.info(
+            f"{self.host} 伺服器時間差 {estimate.offset * 1000:+.1f} ms"
+            f"（±{estimate.uncertainty * 1000:.1f} ms，RTT {estimate.rtt * 1000:.0f} ms，{estimate.samples} 次取樣）"
+        )
+        return estimate
@@ -0,0 +1,156 @@
+"""
+診斷資料：截圖、HTML 快照與 Playwright trace 不在購買的關鍵路徑上同步產生。
+
+失敗當下只取 HTML（單次往返）並記錄在環狀緩衝區，截圖延到 flush（執行結束、關閉 context 前）
+才拍；asyncio 版本則以背景 task 擷取。所有檔案寫入每次執行各自的目錄，HTML 與狀態紀錄以 gzip 壓縮。
+"""
+import asyncio
+import gzip
+import json
+import logging
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def _slug(label: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', label).strip('_') or 'capture'
+
+class Diagnostics:
+    """單次執行的診斷資料
+
+    record 只記下目前網址（不需與瀏覽器往返），capture 另外保存 HTML 並排定截圖。
+    環狀緩衝區最多保留 capacity 筆頁面狀態；directory 為 None 時只保留在記憶體中，不寫檔。
+    """
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        run_id: Optional[str] = None,
+        capacity: int = 20,
+        trace: bool = False,
+    ):
+        self.run_id = run_id or time.strftime('run-%Y%m%d-%H%M%S')
+        self.run_dir = Path(directory) / self.run_id if directory else None
+        self.trace = trace
+        self.states = deque(maxlen=capacity)
+        self._pending: List[Dict] = []
+        self._tasks: List[asyncio.Task] = []
+        self._sequence = 0
+        self._tracing = None
+
+    def _state(self, page, label: str, **extra) -> Dict:
+        self._sequence += 1
+        try:
+            url = page.url
+        except Exception:
+            url = None
+        state = {'seq': self._sequence, 'time': time.time(), 'label': label, 'url': url, **extra}
+        self.states.append(state)
+        return state
+
+    def record(self, page, label: str, **extra):
+        """記錄一筆頁面狀態（網址與標籤），不與瀏覽器往返"""
+        self._state(page, label, **extra)
+
+    def capture(self, page, label: str, screenshot: bool = True):
+        """保存目前頁面的 HTML，截圖延到 flush 才拍"""
+        state = self._state(page, label)
+        try:
+            state['html'] = page.content()
+        except Exception as e:
+            state['error'] = str(e)
+        if screenshot:
+            self._pending.append({'state': state, 'page': page})
+
+    async def capture_async(self, page, label: str, screenshot: bool = True):
+        """capture 的 asyncio 版本：HTML 與截圖都在背景 task 擷取，呼叫端不需等待"""
+        state = self._state(page, label)
+
+        async def grab():
+            try:
+                state['html'] = await page.content()
+                if screenshot:
+                    state['png'] = await page.screenshot()
+            except Exception as e:
+                state['error'] = str(e)
+
+        self._tasks.append(asyncio.ensure_future(grab()))
+
+    def start_tracing(self, context):
+        """開始錄製 Playwright trace（trace=True 時），於 flush 時停止並存檔"""
+        if not self.trace:
+            return
+        context.tracing.start(screenshots=True, snapshots=True)
+        self._tracing = context
+
+    async def start_tracing_async(self, context):
+        if not self.trace:
+            return
+        await context.tracing.start(screenshots=True, snapshots=True)
+        self._tracing = context
+
+    @property
+    def captured(self) -> bool:
+        """是否已擷取過頁面（包含尚未完成的截圖）"""
+        if self._pending or self._tasks:
+            return True
+        return any('html' in s or 'png' in s or 'error' in s for s in self.states)
+
+    def _trace_path(self, keep: bool) -> Optional[str]:
+        return str(self.run_dir / 'trace.zip') if keep and self.run_dir else None
+
+    def flush(self, keep: bool = False) -> Optional[Path]:
+        """拍攝延後的截圖並寫出所有資料，keep 為 True 時即使沒有擷取也寫出（例如執行失敗）"""
+        for item in self._pending:
+            try:
+                item['state']['png'] = item['page'].screenshot()
+            except Exception as e:
+                item['state'].setdefault('error', str(e))
+        self._pending.clear()
+        keep = keep or self.captured
+        if self._tracing is not None:
+            try:
+                self._tracing.tracing.stop(path=self._trace_path(keep))
+            except Exception as e:
+                logger.warning(f"停止 trace 失敗: {str(e)}")
+            self._tracing = None
+        return self._write() if keep else None
+
+    async def flush_async(self, keep: bool = False) -> Optional[Path]:
+        """flush 的 asyncio 版本，等待背景擷取完成後在執行緒中寫檔"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks.clear()
+        keep = keep or self.captured
+        if self._tracing is not None:
+            try:
+                await self._tracing.tracing.stop(path=self._trace_path(keep))
+            except Exception as e:
+                logger.warning(f"停止 trace 失敗: {str(e)}")
+            self._tracing = None
+        return await asyncio.to_thread(self._write) if keep else None
+
+    def _write(self) -> Optional[Path]:
+        if self.run_dir is None:
+            return None
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        index = []
+        for state in self.states:
+            entry = {k: v for k, v in state.items() if k not in ('html', 'png')}
+            name = f"{state['seq']:02d}-{_slug(state['label'])}"
+            if state.get('html') is not None:
+                entry['html'] = f"{name}.html.gz"
+                with gzip.open(self.run_dir / entry['html'], 'wt', encoding='utf-8') as f:
+                    f.write(state['html'])
+            if state.get('png') is not None:
+                # PNG 本身已壓縮，不再 gzip
+                entry['screenshot'] = f"{name}.png"
+                (self.run_dir / entry['screenshot']).write_bytes(state['png'])
+            index.append(entry)
+        with gzip.open(self.run_dir / 'states.json.gz', 'wt', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        logger.info(f"已輸出診斷資料: {self.run_dir}")
+        return self.run_dir
@@ -0,0 +1,29 @@
+"""
+平台工廠：依 buyer/flows 的流程檔由商品連結判斷平台並建立購買器
+
+購買器類別在建立時才匯入，匯入本模組不會載入 Playwright。
+"""
+from typing import TYPE_CHECKING
+from buyer.flows import flow_for_url
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
+    from buyer.base import BaseBuyer
+
+class PlatformFactory:
+    """平台工廠類別，依 buyer/flows 的流程檔決定平台與購買器"""
+    @staticmethod
+    def detect_platform(url: str) -> str:
+        """依網域判斷平台代號"""
+        return flow_for_url(url).platform
+
+    @staticmethod
+    def create_buyer(url: str, page: 'Page', **kwargs) -> 'BaseBuyer':
+        buyer_class = flow_for_url(url).buyer_class()
+        return buyer_class(url, page, **kwargs)
+
+    @staticmethod
+    async def create_async_buyer(url: str, page, **kwargs):
+        """建立 asyncio 版本的購買器並完成登入"""
+        buyer_class = flow_for_url(url).buyer_class(is_async=True)
+        return await buyer_class.create(url, page, **kwargs)
@@ -0,0 +1,305 @@
+"""
+宣告式的結帳流程：每個平台的網域、元素與步驟定義在 buyer/flows/<平台>.json
+（安裝 PyYAML 時也可使用 .yaml）。
+
+流程檔載入後會先驗證並編譯成 Flow（步驟條件轉成頁面腳本參數），以 lru_cache
+快取，每次購買只需綁定 buyer 的動作，不再重複解析。
+"""
+import importlib
+import json
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from buyer.steps import Condition, Interstitial, Step
+
+logger = logging.getLogger(__name__)
+
+FLOW_DIR = Path(__file__).parent
+
+_CONDITION_FIELDS = {'selector', 'text', 'url', 'alert'}
+_STEP_FIELDS = {
+    'name', 'click', 'fill', 'value', 'call', 'success', 'failure',
+    'interstitial', 'timeout', 'error', 'in_page', 'stage', 'once',
+}
+
+class FlowError(ValueError):
+    """流程檔格式錯誤"""
+    pass
+
+@dataclass(frozen=True)
+class LocatorSpec:
+    """預先解析的元素：CSS 選擇器，可加上文字篩選；wait 為預熱時等待的狀態"""
+    selector: str
+    text: Optional[str] = None
+    wait: Optional[str] = None
+
+@dataclass(frozen=True)
+class FlowStep:
+    """編譯後的步驟：step 為不含動作的 Step，動作在 bind 時依 buyer 產生
+
+    動作擇一：click（點擊元素）、fill（以 value 填入元素）、call（呼叫 buyer 方法）。
+    value 以 $ 開頭時代表 buyer 的屬性路徑，例如 $payment.CVC。
+    步驟設定 in_page 時，click 已編譯進 step，在頁面腳本內執行，不需綁定動作。
+    stage 為步驟開始時頁面所在的階段，重試時從目前階段的第一個步驟繼續。
+    once 的步驟（例如加入購物車）開始執行後不再重做，避免請求已送出時重複加入。
+    """
+    step: Step
+    click: Optional[str] = None
+    fill: Optional[str] = None
+    value: Optional[Any] = None
+    call: Optional[str] = None
+    stage: Optional[str] = None
+    once: bool = False
+
+    @property
+    def name(self) -> str:
+        return self.step.name
+
+    def action(self, buyer) -> Optional[Callable[[], Any]]:
+        """回傳此步驟在 buyer 上要執行的動作（同步或 asyncio 版本皆可）"""
+        if self.click:
+            return buyer.locators[self.click].click
+        if self.fill:
+            locator = buyer.locators[self.fill]
+            value = _resolve_value(buyer, self.value)
+            return lambda: locator.fill(value)
+        if self.call:
+            return getattr(buyer, self.call)
+        return None
+
+@dataclass(frozen=True)
+class Flow:
+    """平台流程：網域、購買器類別、元素與步驟
+
+    stages 依進度由後往前列出各階段與判斷條件，stage_step 以單次檢查找出目前所在的階段。
+    """
+    platform: str
+    domains: Tuple[str, ...]
+    buyer: str
+    async_buyer: str
+    locators: Dict[str, LocatorSpec]
+    checkout: Tuple[FlowStep, ...]
+    submit: Tuple[FlowStep, ...]
+    stages: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+    stage_step: Optional[Step] = None
+
+    def split_once(self) -> Tuple[Tuple[FlowStep, ...], Tuple[FlowStep, ...]]:
+        """把結帳步驟分成到最後一個 once 步驟為止的前段（加入購物車）與之後的步驟"""
+        last = max((i for i, s in enumerate(self.checkout) if s.once), default=-1)
+        return self.checkout[:last + 1], self.checkout[last + 1:]
+
+    def stage_of(self, condition: Optional[str]) -> Optional[str]:
+        """stage_step 成立的條件所屬的階段"""
+        for stage, names in self.stages:
+            if condition in names:
+                return stage
+        return None
+
+    def matches(self, url: str) -> bool:
+        domain = urlparse(url).netloc
+        return any(d in domain for d in self.domains)
+
+    def buyer_class(self, is_async: bool = False):
+        """匯入購買器類別（格式為 module:Class）"""
+        module, _, name = (self.async_buyer if is_async else self.buyer).partition(':')
+        return getattr(importlib.import_module(module), name)
+
+def _resolve_value(buyer, value):
+    if not isinstance(value, str) or not value.startswith('$'):
+        return value
+    current = buyer
+    for part in value[1:].split('.'):
+        current = current[part] if isinstance(current, dict) else getattr(current, part)
+    return current
+
+def _require(data: Dict, key: str, kind, where: str):
+    if key not in data:
+        raise FlowError(f"{where} 缺少 {key}")
+    if not isinstance(data[key], kind):
+        raise FlowError(f"{where} 的 {key} 格式錯誤")
+    return data[key]
+
+def _compile_condition(name: str, data: Dict, where: str) -> Condition:
+    if not isinstance(data, dict):
+        raise FlowError(f"{where} 的條件 {name} 必須是物件")
+    unknown = set(data) - _CONDITION_FIELDS
+    if unknown:
+        raise FlowError(f"{where} 的條件 {name} 有不認得的欄位: {', '.join(sorted(unknown))}")
+    if not data:
+        raise FlowError(f"{where} 的條件 {name} 至少需要一個欄位")
+    return Condition(name, **data)
+
+def _compile_step(
+    data: Dict,
+    conditions: Dict[str, Condition],
+    locators: Dict[str, LocatorSpec],
+    stages: Dict[str, List[str]],
+    where: str,
+) -> FlowStep:
+    if not isinstance(data, dict):
+        raise FlowError(f"{where} 必須是物件")
+    name = _require(data, 'name', str, where)
+    where = f"{where}（{name}）"
+    unknown = set(data) - _STEP_FIELDS
+    if unknown:
+        raise FlowError(f"{where} 有不認得的欄位: {', '.join(sorted(unknown))}")
+    actions = [key for key in ('click', 'fill', 'call') if key in data]
+    if len(actions) > 1:
+        raise FlowError(f"{where} 只能指定一種動作: {', '.join(actions)}")
+    for key in ('click', 'fill'):
+        if key in data and data[key] not in locators:
+            raise FlowError(f"{where} 使用未定義的元素: {data[key]}")
+    if 'fill' in data and 'value' not in data:
+        raise FlowError(f"{where} 的 fill 需要 value")
+    if 'stage' in data and data['stage'] not in stages:
+        raise FlowError(f"{where} 使用未定義的階段: {data['stage']}")
+
+    def lookup(names, field_name):
+        if not isinstance(names, list):
+            raise FlowError(f"{where} 的 {field_name} 必須是清單")
+        missing = [n for n in names if n not in conditions]
+        if missing:
+            raise FlowError(f"{where} 使用未定義的條件: {', '.join(missing)}")
+        return tuple(conditions[n] for n in names)
+
+    interstitial = []
+    for item in data.get('interstitial', []):
+        if isinstance(item, str):
+            item = {'condition': item}
+        condition, = lookup([item.get('condition')], 'interstitial')
+        click = item.get('click')
+        if click is not None and click not in locators:
+            raise FlowError(f"{where} 使用未定義的元素: {click}")
+        interstitial.append(Interstitial(condition, click=locators[click].selector if click else None))
+
+    in_page = data.get('in_page', False)
+    if not isinstance(in_page, bool):
+        raise FlowError(f"{where} 的 in_page 必須是布林值")
+    once = data.get('once', False)
+    if not isinstance(once, bool):
+        raise FlowError(f"{where} 的 once 必須是布林值")
+    click = data.get('click')
+    in_page_click = None
+    if in_page and click:
+        in_page_click = (locators[click].selector, locators[click].text)
+        click = None
+
+    timeout = data.get('timeout', 10.0)
+    if not isinstance(timeout, (int, float)) or timeout < 0:
+        raise FlowError(f"{where} 的 timeout 必須是非負數")
+
+    step = Step(
+        name,
+        success=lookup(data.get('success', []), 'success'),
+        failure=lookup(data.get('failure', []), 'failure'),
+        interstitial=tuple(interstitial),
+        timeout=float(timeout),
+        error=data.get('error', ''),
+        click=in_page_click,
+        in_page=in_page,
+    )
+    return FlowStep(
+        step, click=click, fill=data.get('fill'), value=data.get('value'), call=data.get('call'),
+        stage=data.get('stage'), once=once,
+    )
+
+def compile_flow(data: Dict, source: str = '') -> Flow:
+    """驗證流程定義並編譯成 Flow"""
+    where = source or '流程'
+    if not isinstance(data, dict):
+        raise FlowError(f"{where} 必須是物件")
+    platform = _require(data, 'platform', str, where)
+    domains = _require(data, 'domains', list, where)
+    if not domains:
+        raise FlowError(f"{where} 的 domains 不可為空")
+
+    locators = {}
+    for name, spec in data.get('locators', {}).items():
+        if isinstance(spec, str):
+            spec = {'selector': spec}
+        if not isinstance(spec, dict) or 'selector' not in spec:
+            raise FlowError(f"{where} 的元素 {name} 缺少 selector")
+        if spec.get('wait') not in (None, 'attached', 'visible'):
+            raise FlowError(f"{where} 的元素 {name} 的 wait 必須是 attached 或 visible")
+        locators[name] = LocatorSpec(spec['selector'], spec.get('text'), spec.get('wait'))
+
+    conditions = {
+        name: _compile_condition(name, spec, where)
+        for name, spec in data.get('conditions', {}).items()
+    }
+
+    stages = data.get('stages', {})
+    if not isinstance(stages, dict):
+        raise FlowError(f"{where} 的 stages 必須是物件")
+    for stage, names in stages.items():
+        if not isinstance(names, list) or not names:
+            raise FlowError(f"{where} 的階段 {stage} 需要條件清單")
+        missing = [n for n in names if n not in conditions]
+        if missing:
+            raise FlowError(f"{where} 的階段 {stage} 使用未定義的條件: {', '.join(missing)}")
+    # 只檢查目前頁面一次，依 stages 的順序回傳第一個成立的條件
+    stage_step = Step(
+        'detect_stage',
+        success=tuple(conditions[n] for names in stages.values() for n in names),
+        timeout=0.0,
+    ) if stages else None
+
+    def steps(key):
+        return tuple(
+            _compile_step(item, conditions, locators, stages, f"{where} 的 {key}[{index}]")
+            for index, item in enumerate(data.get(key, []))
+        )
+
+    return Flow(
+        platform=platform,
+        domains=tuple(domains),
+        buyer=_require(data, 'buyer', str, where),
+        async_buyer=_require(data, 'async_buyer', str, where),
+        locators=locators,
+        checkout=steps('checkout'),
+        submit=steps('submit'),
+        stages=tuple((stage, tuple(names)) for stage, names in stages.items()),
+        stage_step=stage_step,
+    )
+
+def _read(path: Path) -> Dict:
+    if path.suffix in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise FlowError(f"讀取 {path.name} 需要安裝 PyYAML")
+        return yaml.safe_load(path.read_text(encoding='utf-8'))
+    return json.loads(path.read_text(encoding='utf-8'))
+
+def _flow_files(directory: Path) -> List[Path]:
+    return sorted(p for p in directory.iterdir() if p.suffix in ('.json', '.yaml', '.yml'))
+
+@lru_cache(maxsize=None)
+def load_flows(directory: str = str(FLOW_DIR)) -> Tuple[Flow, ...]:
+    """載入並編譯目錄下所有流程檔（結果會被快取）"""
+    flows = []
+    for path in _flow_files(Path(directory)):
+        try:
+            data = _read(path)
+        except ValueError as e:
+            raise FlowError(f"無法解析 {path.name}: {str(e)}")
+        flows.append(compile_flow(data, path.name))
+    logger.debug(f"已載入 {len(flows)} 個平台流程")
+    return tuple(flows)
+
+def get_flow(platform: str) -> Flow:
+    """依平台代號取得流程"""
+    for flow in load_flows():
+        if flow.platform == platform:
+            return flow
+    raise ValueError(f"找不到平台流程: {platform}")
+
+def flow_for_url(url: str) -> Flow:
+    """依網域取得流程"""
+    for flow in load_flows():
+        if flow.matches(url):
+            return flow
+    raise ValueError(f"不支援的平台: {urlparse(url).netloc}")
@@ -0,0 +1,307 @@
+"""
+低資源模式：在小型主機上同時執行多個購買器。
+
+啟動 Chromium 時關閉 GPU、擴充功能與背景服務並限制 renderer 程序數，context 使用較小的視窗，
+並在每個頁面注入停用動畫與轉場的 CSS。MemoryWatchdog 由 /proc 讀取瀏覽器各程序的記憶體，
+估計每個 context 的用量，超過上限時暫緩建立新的 context；benchmark_footprint 比較預設與
+低資源模式下每個 context 的記憶體與每 GB 可同時執行的工作數。
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LOW_FOOTPRINT_ARGS = [
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-component-extensions-with-background-pages',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-dev-shm-usage',
+    '--disable-features=Translate,MediaRouter,OptimizationHints,BackForwardCache',
+    '--renderer-process-limit=2',
+    '--mute-audio',
+    '--no-first-run',
+]
+
+SMALL_VIEWPORT = {'width': 800, 'height': 600}
+
+# 頁面一建立就插入樣式，停用所有動畫、轉場與平滑捲動
+DISABLE_ANIMATIONS_JS = '''(() => {
+    const css = `*, *::before, *::after {
+        animation: none !important;
+        transition: none !important;
+        scroll-behavior: auto !important;
+        caret-color: auto !important;
+    }`;
+    const inject = () => {
+        const style = document.createElement('style');
+        style.textContent = css;
+        (document.head || document.documentElement).appendChild(style);
+    };
+    if (document.documentElement) inject();
+    else document.addEventListener('DOMContentLoaded', inject, {once: true});
+})()'''
+
+def launch_options(headless: bool = True, low_footprint: bool = False, args: Optional[List[str]] = None) -> Dict:
+    """chromium.launch 的參數，低資源模式附加 LOW_FOOTPRINT_ARGS"""
+    args = list(args or [])
+    if low_footprint:
+        args += LOW_FOOTPRINT_ARGS
+    return {'headless': headless, 'args': args}
+
+def context_options(options: Dict, keep_viewport: bool = False) -> Dict:
+    """在 browser.new_context 的參數上套用低資源模式：較小的視窗、偏好減少動態效果
+
+    keep_viewport 為 True 時（帳號的瀏覽器設定檔或指定的視窗大小）保留原本的視窗，
+    避免同一帳號的指紋在低資源模式下改變。
+    """
+    viewport = options['viewport'] if keep_viewport and 'viewport' in options else dict(SMALL_VIEWPORT)
+    return {**options, 'viewport': viewport, 'reduced_motion': 'reduce'}
+
+def _read_memory_kb(proc: Path, pid: int) -> Optional[int]:
+    """程序的 PSS（共用分頁依比例分攤，加總不會重複計算），核心不支援時改用 VmRSS"""
+    try:
+        for line in (proc / str(pid) / 'smaps_rollup').read_text().splitlines():
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        for line in (proc / str(pid) / 'status').read_text().splitlines():
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _parent_pid(proc: Path, pid: int) -> Optional[int]:
+    try:
+        stat = (proc / str(pid) / 'stat').read_text()
+    except OSError:
+        return None
+    # comm 可能含空白與括號，從最後一個右括號之後解析
+    return int(stat[stat.rindex(')') + 2:].split()[1])
+
+def _process_type(proc: Path, pid: int) -> str:
+    """依命令列區分 Chromium 的程序類型（browser、renderer、gpu-process、utility），其他為 driver"""
+    try:
+        cmdline = (proc / str(pid) / 'cmdline').read_bytes().split(b'\0')
+    except OSError:
+        return 'unknown'
+    for arg in cmdline:
+        if arg.startswith(b'--type='):
+            return arg[len(b'--type='):].decode(errors='replace')
+    name = os.path.basename(cmdline[0].decode(errors='replace')) if cmdline and cmdline[0] else ''
+    return 'browser' if 'chrom' in name or 'headless_shell' in name else 'driver'
+
+def process_tree(root: int, proc: Path = Path('/proc')) -> List[int]:
+    """root 的所有子孫程序（Playwright driver 與其啟動的瀏覽器）"""
+    children: Dict[int, List[int]] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        parent = _parent_pid(proc, int(entry.name))
+        if parent is not None:
+            children.setdefault(parent, []).append(int(entry.name))
+    tree, pending = [], list(children.get(root, []))
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(children.get(pid, []))
+    return sorted(tree)
+
+class MemoryWatchdog:
+    """定期取樣瀏覽器程序的記憶體
+
+    每個 context 的用量以 renderer 程序的總和除以目前開啟的 context 數估計
+    （renderer 依網站分配程序，無法精確對應到單一 context）。limit_mb 為瀏覽器程序
+    （不含 Playwright driver）的總量上限，超過時 wait_for_headroom 會等待。
+    """
+    def __init__(
+        self,
+        limit_mb: Optional[float] = None,
+        interval: float = 1.0,
+        root_pid: Optional[int] = None,
+        proc: str = '/proc',
+        capacity: int = 600,
+    ):
+        self.limit_mb = limit_mb
+        self.interval = interval
+        self.root_pid = root_pid or os.getpid()
+        self.proc = Path(proc)
+        self.samples = deque(maxlen=capacity)
+        self.contexts = 0
+        self.peak_contexts = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def available(self) -> bool:
+        """是否能讀取 /proc（非 Linux 時不取樣）"""
+        return (self.proc / str(self.root_pid)).exists()
+
+    def context_opened(self):
+        with self._lock:
+            self.contexts += 1
+            self.peak_contexts = max(self.peak_contexts, self.contexts)
+
+    def context_closed(self):
+        with self._lock:
+            self.contexts = max(0, self.contexts - 1)
+
+    def sample(self) -> Optional[Dict]:
+        """取樣一次，回傳各類程序的記憶體（MB）與每個 context 的估計值"""
+        if not self.available:
+            return None
+        by_type: Dict[str, float] = {}
+        for pid in process_tree(self.root_pid, self.proc):
+            kb = _read_memory_kb(self.proc, pid)
+            if kb is None:
+                continue
+            kind = _process_type(self.proc, pid)
+            by_type[kind] = by_type.get(kind, 0.0) + kb / 1024
+        browser_mb = sum(mb for kind, mb in by_type.items() if kind != 'driver')
+        contexts = self.contexts
+        sample = {
+            'time': time.time(),
+            'browser_mb': browser_mb,
+            'by_type': by_type,
+            'contexts': contexts,
+            'per_context_mb': by_type.get('renderer', 0.0) / contexts if contexts else None,
+        }
+        self.samples.append(sample)
+        if self.limit_mb and browser_mb > self.limit_mb:
+            logger.warning(f"瀏覽器記憶體 {browser_mb:.0f} MB 超過上限 {self.limit_mb:.0f} MB（{contexts} 個 context）")
+        return sample
+
+    @property
+    def over_limit(self) -> bool:
+        if not self.limit_mb or not self.samples:
+            return False
+        return self.samples[-1]['browser_mb'] > self.limit_mb
+
+    def wait_for_headroom(self, timeout: float = 60.0) -> bool:
+        """記憶體超過上限時等待（重新取樣）直到降回上限以下，逾時回傳 False"""
+        if not self.limit_mb:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            self.sample()
+            if not self.over_limit:
+                return True
+            if time.monotonic() >= deadline:
+                logger.warning("等待記憶體釋放逾時，仍繼續建立 context")
+                return False
+            time.sleep(self.interval)
+
+    def start(self) -> 'MemoryWatchdog':
+        """在背景執行緒定期取樣"""
+        if self._thread is None and self.available:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='memory-watchdog', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.debug(f"記憶體取樣失敗: {str(e)}")
+
+    def summary(self) -> Dict:
+        """彙整取樣結果：峰值、每個 context 的平均用量與每 GB 可同時執行的工作數"""
+        samples = list(self.samples)
+        per_context = [s['per_context_mb'] for s in samples if s['per_context_mb']]
+        per_context_mb = sum(per_context) / len(per_context) if per_context else None
+        return {
+            'samples': len(samples),
+            'peak_browser_mb': max((s['browser_mb'] for s in samples), default=None),
+            'peak_contexts': self.peak_contexts,
+            'per_context_mb': per_context_mb,
+            'jobs_per_gb': 1024 / per_context_mb if per_context_mb else None,
+        }
+
+    def log_summary(self):
+        """輸出取樣結果，沒有取樣時不輸出"""
+        summary = self.summary()
+        if not summary['samples']:
+            return
+        per_context = f"{summary['per_context_mb']:.0f} MB" if summary['per_context_mb'] else '未知'
+        jobs = f"{summary['jobs_per_gb']:.1f}" if summary['jobs_per_gb'] else '未知'
+        logger.info(
+            f"瀏覽器記憶體峰值 {summary['peak_browser_mb']:.0f} MB（同時 {summary['peak_contexts']} 個 context），"
+            f"每個 context 約 {per_context}，每 GB 約可同時執行 {jobs} 筆工作"
+        )
+
+def benchmark_footprint(url: str, contexts: int = 4, headless: bool = True, settle: float = 2.0) -> Dict:
+    """比較預設與低資源模式下開啟 contexts 個商品頁的記憶體用量
+
+    兩種模式各啟動一次瀏覽器：先量測沒有 context 時的基準，再開啟所有頁面、等待 settle 秒後量測，
+    以增加的量除以 context 數作為每個 context 的用量，jobs_per_gb 為扣除基準後每 GB 可同時執行的工作數。
+    """
+    from playwright.sync_api import sync_playwright
+
+    if contexts < 1:
+        raise ValueError("contexts 必須大於 0")
+    results = {}
+    with sync_playwright() as p:
+        for low in (False, True):
+            watchdog = MemoryWatchdog()
+            if not watchdog.available:
+                raise RuntimeError("無法讀取 /proc，記憶體量測僅支援 Linux")
+            browser = p.chromium.launch(**launch_options(headless, low))
+            try:
+                baseline = watchdog.sample()['browser_mb']
+                opened = []
+                start = time.perf_counter()
+                for _ in range(contexts):
+                    options = {'viewport': {'width': 1280, 'height': 800}}
+                    context = browser.new_context(**(context_options(options) if low else options))
+                    if low:
+                        context.add_init_script(script=DISABLE_ANIMATIONS_JS)
+                    page = context.new_page()
+                    page.goto(url, wait_until='domcontentloaded')
+                    opened.append(context)
+                    watchdog.context_opened()
+                load_ms = (time.perf_counter() - start) * 1000 / contexts
+                time.sleep(settle)
+                loaded = watchdog.sample()
+                per_context_mb = (loaded['browser_mb'] - baseline) / contexts
+                results['low' if low else 'default'] = {
+                    'baseline_mb': baseline,
+                    'total_mb': loaded['browser_mb'],
+                    'by_type': loaded['by_type'],
+                    'per_context_mb': per_context_mb,
+                    'jobs_per_gb': 1024 / per_context_mb if per_context_mb > 0 else None,
+                    'load_ms': load_ms,
+                }
+                for context in opened:
+                    context.close()
+            finally:
+                browser.close()
+
+    default, low = results['default'], results['low']
+    logger.info(f"記憶體用量比較（{contexts} 個 context）:")
+    for key, label in (
+        ('baseline_mb', '瀏覽器基準 (MB)'),
+        ('per_context_mb', '每個 context (MB)'),
+        ('jobs_per_gb', '每 GB 工作數'),
+        ('load_ms', '平均載入時間 (ms)'),
+    ):
+        logger.info(f"  {label}: 預設 {default[key] or 0:.1f} / 低資源 {low[key] or 0:.1f}")
+    return results
@@ -0,0 +1,362 @@
+"""
+結構化計時：巢狀 span、Playwright 操作自動計時、每次執行的 JSON/CSV 匯出與跨執行統計
+"""
+import contextvars
+import csv
+import json
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 目前作用中的 tracer 與 (tracer, span)；以 ContextVar 保存，執行緒與 asyncio task 各自獨立
+_active_tracer: contextvars.ContextVar = contextvars.ContextVar('active_tracer', default=None)
+_active_span: contextvars.ContextVar = contextvars.ContextVar('active_span', default=None)
+
+# 會與瀏覽器往返一次的 Page / Locator / ElementHandle 方法
+TRACED_ACTIONS = frozenset({
+    'goto', 'reload', 'go_back', 'set_content', 'content',
+    'click', 'dblclick', 'fill', 'type', 'press', 'check', 'uncheck', 'hover', 'select_option',
+    'dispatch_event', 'evaluate', 'evaluate_handle',
+    'wait_for', 'wait_for_selector', 'wait_for_load_state', 'wait_for_url', 'wait_for_function',
+    'wait_for_event', 'wait_for_timeout',
+    'query_selector', 'query_selector_all', 'is_visible', 'is_hidden', 'is_enabled', 'is_checked',
+    'count', 'all', 'text_content', 'inner_text', 'inner_html', 'get_attribute', 'input_value',
+    'screenshot',
+})
+
+# 回傳值需要再包裝的 Playwright 型別，讓串接出來的 locator 也會被計時
+_WRAPPED_TYPES = {'Locator': 'locator', 'FrameLocator': 'locator', 'ElementHandle': 'element'}
+
+CSV_FIELDS = ('run_id', 'span_id', 'parent_id', 'path', 'name', 'start_ms', 'duration_ms', 'kind', 'target', 'error')
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """以線性內插計算百分位數"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+@dataclass
+class Span:
+    """一段計時區間，start_ns 與 end_ns 相對於 tracer 建立的時間點"""
+    span_id: int
+    name: str
+    path: str
+    parent_id: Optional[int] = None
+    start_ns: int = 0
+    end_ns: Optional[int] = None
+    error: Optional[str] = None
+    attrs: Dict = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'path': self.path,
+            'start_ms': self.start_ns / 1e6,
+            'duration_ms': self.duration_ms,
+            'error': self.error,
+            'attrs': self.attrs,
+        }
+
+class Tracer:
+    """記錄單次執行的巢狀 span
+
+    span 的父子關係依呼叫時的 ContextVar 決定，因此同步流程、批次的工作執行緒
+    與 asyncio 的並行 task 都能得到正確的階層。
+    """
+    def __init__(self, name: str = 'run', clock=time.perf_counter_ns):
+        self.run_id = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}"
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self._clock = clock
+        self._origin = clock()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """計時一段區間，例外會記錄在 span 上後再拋出"""
+        active = _active_span.get()
+        parent = active[1] if active is not None and active[0] is self else None
+        span = Span(
+            span_id=len(self.spans) + 1,
+            name=name,
+            path=f"{parent.path}/{name}" if parent else name,
+            parent_id=parent.span_id if parent else None,
+            start_ns=self._clock() - self._origin,
+            attrs=attrs,
+        )
+        self.spans.append(span)
+        token = _active_span.set((self, span))
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"[:200]
+            raise
+        finally:
+            span.end_ns = self._clock() - self._origin
+            _active_span.reset(token)
+
+    @contextmanager
+    def activate(self):
+        """設為目前的 tracer，讓 TimingContext 與 span() 記錄到這裡"""
+        token = _active_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _active_tracer.reset(token)
+
+    @property
+    def action_count(self) -> int:
+        """Playwright 操作次數（約等於與瀏覽器的往返次數）"""
+        return sum(1 for s in self.spans if s.attrs.get('kind') == 'action')
+
+    def summary(self) -> Dict:
+        """依路徑彙總本次執行：次數與總耗時"""
+        steps = {}
+        for span in self.spans:
+            if span.duration_ms is None:
+                continue
+            entry = steps.setdefault(span.path, {'count': 0, 'total_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += span.duration_ms
+        return {'run_id': self.run_id, 'actions': self.action_count, 'steps': steps}
+
+    def to_dict(self) -> Dict:
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'spans': [s.to_dict() for s in self.spans],
+        }
+
+    def export(self, directory: str) -> List[Path]:
+        """輸出 {run_id}.json 與 {run_id}.csv，回傳寫入的路徑"""
+        out_dir = Path(directory)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        json_path = out_dir / f"{self.run_id}.json"
+        json_path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding='utf-8')
+
+        csv_path = out_dir / f"{self.run_id}.csv"
+        with csv_path.open('w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for span in self.spans:
+                row = span.to_dict()
+                writer.writerow({
+                    'run_id': self.run_id,
+                    'span_id': row['span_id'],
+                    'parent_id': row['parent_id'] or '',
+                    'path': row['path'],
+                    'name': row['name'],
+                    'start_ms': f"{row['start_ms']:.3f}",
+                    'duration_ms': '' if row['duration_ms'] is None else f"{row['duration_ms']:.3f}",
+                    'kind': span.attrs.get('kind', ''),
+                    'target': span.attrs.get('target', ''),
+                    'error': row['error'] or '',
+                })
+
+        logger.info(f"已輸出計時紀錄: {json_path}")
+        return [json_path, csv_path]
+
+def current_tracer() -> Optional[Tracer]:
+    """目前作用中的 tracer，沒有則回傳 None"""
+    return _active_tracer.get()
+
+def span(name: str, **attrs):
+    """在目前的 tracer 上開一個 span；沒有作用中的 tracer 時不做任何事"""
+    tracer = _active_tracer.get()
+    if tracer is None:
+        return nullcontext()
+    return tracer.span(name, **attrs)
+
+def _describe(name: str, args, kwargs) -> str:
+    """把建立 locator 的呼叫轉成可讀的描述，例如 get_by_role('button', name='確定')"""
+    parts = [repr(a) for a in args if isinstance(a, (str, int))]
+    parts += [f"{k}={v!r}" for k, v in kwargs.items() if isinstance(v, (str, int))]
+    return f"{name}({', '.join(parts)})"
+
+class _Traced:
+    """包裝 Page / Locator / ElementHandle，對會往返瀏覽器的操作自動建立 span
+
+    其餘屬性直接轉給原物件；回傳的 Locator 會再包裝，串接的呼叫也能被計時。
+    """
+    def __init__(self, target, tracer: Tracer, kind: str, label: str, is_async: bool):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_tracer', tracer)
+        object.__setattr__(self, '_kind', kind)
+        object.__setattr__(self, '_label', label)
+        object.__setattr__(self, '_is_async', is_async)
+
+    def _wrap(self, value, label: str):
+        kind = _WRAPPED_TYPES.get(type(value).__name__)
+        if kind is None:
+            if isinstance(value, list):
+                return [self._wrap(v, f"{label}[{i}]") for i, v in enumerate(value)]
+            return value
+        return _Traced(value, self._tracer, kind, label, self._is_async)
+
+    def _child_label(self, name: str, args=(), kwargs=None) -> str:
+        desc = _describe(name, args, kwargs or {})
+        return f"{self._label} >> {desc}" if self._label else desc
+
+    def __getattr__(self, name: str):
+        value = getattr(self._target, name)
+        if not callable(value):
+            # first、last 等屬性會回傳新的 Locator
+            return self._wrap(value, self._child_label(name))
+
+        if name not in TRACED_ACTIONS:
+            def chained(*args, **kwargs):
+                result = value(*_unwrap_args(args), **_unwrap_kwargs(kwargs))
+                return self._wrap(result, self._child_label(name, args, kwargs))
+            return chained
+
+        span_name = f"{self._kind}.{name}"
+
+        def attrs_for(args) -> Dict:
+            target = self._label or (args[0] if args and isinstance(args[0], str) else '')
+            return {'kind': 'action', 'target': str(target)[:200]}
+
+        if self._is_async:
+            async def traced_async(*args, **kwargs):
+                with self._tracer.span(span_name, **attrs_for(args)):
+                    result = await value(*_unwrap_args(args), **_unwrap_kwargs(kwargs))
+                return self._wrap(result, self._child_label(name, args, kwargs))
+            return traced_async
+
+        def traced(*args, **kwargs):
+            with self._tracer.span(span_name, **attrs_for(args)):
+                result = value(*_unwrap_args(args), **_unwrap_kwargs(kwargs))
+            return self._wrap(result, self._child_label(name, args, kwargs))
+        return traced
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __eq__(self, other):
+        if isinstance(other, _Traced):
+            other = other._target
+        return self._target == other
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"<traced {self._target!r}>"
+
+def unwrap(obj):
+    """取回被包裝的 Playwright 物件（傳給 expect() 等需要原生型別的 API 時使用）"""
+    return obj._target if isinstance(obj, _Traced) else obj
+
+def _unwrap_args(args) -> tuple:
+    return tuple(unwrap(a) for a in args)
+
+def _unwrap_kwargs(kwargs) -> Dict:
+    # 例如 locator.filter(has=另一個 locator) 必須傳入原生物件
+    return {k: unwrap(v) for k, v in kwargs.items()}
+
+def instrument_page(page, tracer: Tracer, is_async: bool = False):
+    """回傳會自動計時每個 Playwright 操作的 page"""
+    return _Traced(page, tracer, 'page', '', is_async)
+
+def load_runs(paths: Iterable[str]) -> List[Dict]:
+    """讀取 Tracer.export 輸出的 JSON；傳入目錄時讀取其中所有 .json"""
+    runs = []
+    for path in paths:
+        path = Path(path)
+        files = sorted(path.glob('*.json')) if path.is_dir() else [path]
+        for file in files:
+            data = json.loads(file.read_text(encoding='utf-8'))
+            if isinstance(data, dict) and 'spans' in data:
+                runs.append(data)
+    return runs
+
+def summarize_runs(runs: List[Dict]) -> Dict[str, Dict]:
+    """彙總多次執行中每個步驟（span 路徑）的耗時分布
+
+    同一次執行中重複出現的步驟先加總，讓 p50/p95 代表「每次執行花在這一步的時間」。
+    """
+    per_run: Dict[str, List[float]] = {}
+    calls: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    for run in runs:
+        totals: Dict[str, float] = {}
+        for span in run['spans']:
+            if span.get('duration_ms') is None:
+                continue
+            path = span['path']
+            totals[path] = totals.get(path, 0.0) + span['duration_ms']
+            calls[path] = calls.get(path, 0) + 1
+            if span.get('error'):
+                errors[path] = errors.get(path, 0) + 1
+        for path, total in totals.items():
+            per_run.setdefault(path, []).append(total)
+
+    return {
+        path: {
+            'runs': len(values),
+            'calls': calls[path],
+            'errors': errors.get(path, 0),
+            'mean_ms': sum(values) / len(values),
+            'p50_ms': percentile(values, 50),
+            'p95_ms': percentile(values, 95),
+            'max_ms': max(values),
+        }
+        for path, values in per_run.items()
+    }
+
+def compare_summaries(baseline: Dict[str, Dict], candidate: Dict[str, Dict]) -> Dict[str, Dict]:
+    """比較兩組 summarize_runs 的結果，saved_ms 為每個步驟 p50 減少的毫秒數（負數代表變慢）
+
+    只出現在其中一組的步驟另一側為 None，例如預先填寫時才有的步驟。
+    """
+    comparison = {}
+    for path in list(baseline) + [p for p in candidate if p not in baseline]:
+        before = baseline.get(path, {}).get('p50_ms')
+        after = candidate.get(path, {}).get('p50_ms')
+        comparison[path] = {
+            'baseline_p50_ms': before,
+            'candidate_p50_ms': after,
+            'saved_ms': before - after if before is not None and after is not None else None,
+        }
+    return comparison
+
+def format_comparison(comparison: Dict[str, Dict]) -> str:
+    """把 compare_summaries 的結果排成表格"""
+    def cell(value):
+        return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+    lines = [f"{'步驟':<60} {'基準 p50':>10} {'比較 p50':>10} {'節省 ms':>10}"]
+    for path, entry in comparison.items():
+        label = '  ' * path.count('/') + path.rsplit('/', 1)[-1]
+        lines.append(
+            f"{label[:60]:<60} {cell(entry['baseline_p50_ms'])} {cell(entry['candidate_p50_ms'])} {cell(entry['saved_ms'])}"
+        )
+    return '\n'.join(lines)
+
+def format_summary(summary: Dict[str, Dict]) -> str:
+    """把 summarize_runs 的結果排成表格，步驟依第一次出現的順序並以縮排表示階層"""
+    lines = [f"{'步驟':<60} {'執行':>5} {'呼叫':>6} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}"]
+    for path, entry in summary.items():
+        depth = path.count('/')
+        label = '  ' * depth + path.rsplit('/', 1)[-1]
+        lines.append(
+            f"{label[:60]:<60} {entry['runs']:>5} {entry['calls']:>6} "
+            f"{entry['p50_ms']:>10.1f} {entry['p95_ms']:>10.1f} {entry['max_ms']:>10.1f}"
+        )
+    return '\n'.join(lines)
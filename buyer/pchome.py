@@ -1,23 +1,150 @@
 from playwright.sync_api import Page
 import logging
 import os
+import re
 from pathlib import Path
-from typing import Dict
-from buyer.base import BaseBuyer
+from typing import Dict, Optional
+from buyer.base import BaseBuyer, driven
+from buyer.instrument import span
+from buyer.recovery import is_transient
+from buyer.pchome_api import (
+    CART_PAGE_URL,
+    AddToCartRejected,
+    AddToCartUncertain,
+    CheckoutApiError,
+    build_add_to_cart_request,
+    build_button_status_url,
+    extract_item_id,
+    parse_add_to_cart_response,
+    parse_button_status,
+)
+from buyer.prefill import (
+    APPLY_FORM_JS,
+    CART_ITEM_GONE_JS,
+    CART_ITEM_JS,
+    SNAPSHOT_FORM_JS,
+    PrefillWalk,
+    cached_stats,
+    cart_item_arg,
+    check_applied,
+    load_prefill,
+    save_prefill,
+    snapshot_arg,
+)
 from dotenv import load_dotenv
 import time
 
 logger = logging.getLogger(__name__)
 
+# 以單一 evaluate 呼叫取得所有商品資訊
+PRODUCT_INFO_JS = '''() => {
+    const result = {
+        name: null,
+        price: null,
+        original_price: null,
+        has_stock: false
+    };
+    
+    // 取得商品名稱
+    const nameElement = document.querySelector('h1.o-prodMainName__grayDarkest') || 
+                      document.querySelector('h1[data-regression="prod_info_name"]') ||
+                      document.querySelector('div.o-prodMainName h1');
+    if (nameElement) {
+        result.name = nameElement.textContent.trim();
+    }
+    
+    // 取得價格資訊
+    const priceBox = document.querySelector('div.o-prodPrice__priceBox');
+    if (priceBox) {
+        // 折扣價
+        const discountElement = priceBox.querySelector('div.o-prodPrice__price--xxxl700Primary');
+        if (discountElement) {
+            result.price = parseInt(discountElement.textContent.replace(/[^0-9]/g, ''));
+        }
+        
+        // 原價
+        const originalElement = priceBox.querySelector('div.o-prodPrice__originalPrice--m500Gray');
+        if (originalElement) {
+            result.original_price = parseInt(originalElement.textContent.replace(/[^0-9]/g, ''));
+        }
+    }
+    
+    // 檢查庫存狀態
+    const buyButton = document.querySelector('button[data-regression="product_button_buyNow"]');
+    const notifyButtons = Array.from(document.querySelectorAll('button span.btn__text')).filter(el => el.textContent.includes('有貨通知我'));
+    result.has_stock = buyButton && notifyButtons.length === 0;
+    
+    return result;
+}'''
+
+# 庫存探測：有立即購買按鈕且沒有「有貨通知我」
+AVAILABILITY_JS = '''() => {
+    const buyButton = document.querySelector('button[data-regression="product_button_buyNow"]');
+    const notify = Array.from(document.querySelectorAll('button span.btn__text')).some(el => el.textContent.includes('有貨通知我'));
+    return !!buyButton && !notify;
+}'''
+
+def normalize_product_info(product_info: Dict) -> Dict:
+    """驗證並補齊商品資訊"""
+    # 驗證結果
+    if not product_info['name']:
+        raise ValueError("無法取得商品名稱")
+    
+    if not product_info['price'] and not product_info['original_price']:
+        raise ValueError("無法取得商品價格")
+    
+    # 如果沒有折扣價，使用原價
+    if not product_info['price']:
+        product_info['price'] = product_info['original_price']
+    
+    logger.info(f"商品名稱: {product_info['name']}")
+    logger.info(f"商品價格: {product_info['price']}")
+    logger.info(f"商品原價: {product_info['original_price']}")
+    logger.info(f"是否有庫存: {product_info['has_stock']}")
+    
+    return product_info
+
+# 請求確定沒有送達伺服器的連線錯誤（連線被拒、DNS 失敗、離線）；連線中斷、逾時等錯誤則可能已被處理
+_NOT_SENT_PATTERN = re.compile(
+    r'ECONNREFUSED|ENOTFOUND|EAI_AGAIN|ERR_CONNECTION_REFUSED|ERR_NAME_NOT_RESOLVED|ERR_INTERNET_DISCONNECTED|ERR_ADDRESS_UNREACHABLE'
+)
+
+def _outcome_unknown(error: BaseException) -> bool:
+    """加入購物車的請求是否可能已被伺服器處理：API 的錯誤回應與無法連線以外的錯誤都視為結果不明"""
+    if isinstance(error, CheckoutApiError):
+        return isinstance(error, AddToCartUncertain)
+    return not _NOT_SENT_PATTERN.search(str(error))
+
 class PChomeBuyer(BaseBuyer):
     # 將 login_url 定義為類別屬性
     login_url = "https://ecvip.pchome.com.tw/login/v3/login.htm"
+    platform = "pchome"
+    member_url = "https://ecvip.pchome.com.tw/web/MemberProduct/Info"
+    warm_origins = [
+        "https://ecssl.pchome.com.tw",
+        "https://ecapi.pchome.com.tw",
+    ]
+    availability_js = AVAILABILITY_JS
     
-    def __init__(self, url: str, page: Page):
-        super().__init__(url, page)
+    def __init__(self, url: str, page: Page, **kwargs):
+        super().__init__(url, page, **kwargs)
+        # 庫存探測優先使用 JSON API，失敗後改用 DOM 探測
+        self._api_probe = True
+        # 預先走結帳時記下的結帳表單（prefill 選項）
+        self.prefill = None
 
     def _load_credentials(self):
-        """載入登入憑證"""
+        """載入登入憑證，多帳號模式下使用分配到的帳號（account 選項）"""
+        account = self.options.get('account')
+        if account is not None:
+            self.username = account.username
+            self.password = account.password
+            self.payment = dict(CVC=account.payment.get('CVC'))
+            if not self.payment['CVC']:
+                raise ValueError(f"請在帳號池中設定 {account.name} 的 payment.CVC")
+            logger.info(f"已載入 PChome 帳號資訊（{account.name}）")
+            return
+
         env_path = Path('.env')
         if not env_path.exists():
             logger.warning("找不到 .env 檔案，請確保已設定登入資訊")
@@ -41,183 +168,266 @@ class PChomeBuyer(BaseBuyer):
 
         logger.info(f"已載入 PChome 帳號資訊")
 
+    @driven
     def login(self):
         """處理 PChome 登入流程"""
         logger.info("開始 PChome 登入流程")
         
         try:
             # 導航到登入頁面
-            self.page.goto(self.login_url)
+            yield lambda: self.page.goto(self.login_url)
             logger.info("已導航到登入頁面")
             
             # 輸入帳號密碼
             account_input = self.page.get_by_placeholder("請輸入手機號碼 或 Email")
-            account_input.wait_for(state="visible")
-            account_input.fill(self.username)
+            yield lambda: account_input.wait_for(state="visible")
+            yield lambda: account_input.fill(self.username)
             
             continue_button = self.page.get_by_role("button", name="繼續")
-            continue_button.wait_for(state="visible")
-            continue_button.click()
+            yield lambda: continue_button.wait_for(state="visible")
+            yield continue_button.click
             
             password_input = self.page.get_by_placeholder("請輸入密碼（英文大小寫有差別）")
-            password_input.wait_for(state="visible")
-            password_input.fill(self.password)
+            yield lambda: password_input.wait_for(state="visible")
+            yield lambda: password_input.fill(self.password)
             
             # 點擊登入按鈕
             login_button = self.page.get_by_role("button", name="登入")
-            login_button.wait_for(state="visible")
-            login_button.click()
+            yield lambda: login_button.wait_for(state="visible")
+            yield login_button.click
 
             # 這邊可能要做認證，點擊送出進行 Email 認證
             submit_button = self.page.get_by_role("button", name="送出")
-            submit_button.wait_for(state="visible")
-            submit_button.click()
+            yield lambda: submit_button.wait_for(state="visible")
+            yield submit_button.click
 
-            # 等待使用者輸入驗證碼
+            # 等待使用者輸入驗證碼（asyncio 版本在執行緒中讀取，避免阻塞其他頁面）
             logger.info("請檢查您的 Email 並輸入驗證碼:")
-            verification_code = input("請輸入驗證碼: ")
+            verification_code = yield lambda: self._blocking(input, "請輸入驗證碼: ")
             
             # 輸入驗證碼
-            self.page.locator(".c-input__captcha > input").first.fill(verification_code[0])
-            self.page.locator("div:nth-child(2) > .c-input__captcha > input").fill(verification_code[1])
-            self.page.locator("div:nth-child(3) > .c-input__captcha > input").fill(verification_code[2])
-            self.page.locator("div:nth-child(4) > .c-input__captcha > input").fill(verification_code[3])
-            self.page.locator("div:nth-child(5) > .c-input__captcha > input").fill(verification_code[4])
-            self.page.locator("div:nth-child(6) > .c-input__captcha > input").fill(verification_code[5])
+            yield lambda: self.page.locator(".c-input__captcha > input").first.fill(verification_code[0])
+            for index in range(1, 6):
+                yield lambda: self.page.locator(f"div:nth-child({index + 1}) > .c-input__captcha > input").fill(verification_code[index])
             
             # 點擊確認按鈕
-            self.page.get_by_role("button", name="確認").click()
-            self.page.get_by_role("button", name="取消").click()
+            yield self.page.get_by_role("button", name="確認").click
+            yield self.page.get_by_role("button", name="取消").click
 
             logger.info("PChome 登入成功")
             
         except Exception as e:
             logger.error(f"PChome 登入失敗: {str(e)}")
             # 保存錯誤截圖
-            self.page.screenshot(path=f"login_error_{int(time.time())}.png")
+            yield lambda: self._capture('login_error')
             raise
 
-    def check_product(self) -> Dict:
+    @driven
+    def check_product(self):
         """檢查商品資訊"""
         logger.info("檢查商品資訊")
         
         try:
             # 等待主要內容載入
-            self.page.wait_for_selector("div.o-prodMainName", timeout=5000)
+            yield lambda: self.page.wait_for_selector("div.o-prodMainName", timeout=5000)
             
             # 使用單一 evaluate 呼叫取得所有商品資訊
-            product_info = self.page.evaluate('''() => {
-                const result = {
-                    name: null,
-                    price: null,
-                    original_price: null,
-                    has_stock: false
-                };
-                
-                // 取得商品名稱
-                const nameElement = document.querySelector('h1.o-prodMainName__grayDarkest') || 
-                                  document.querySelector('h1[data-regression="prod_info_name"]') ||
-                                  document.querySelector('div.o-prodMainName h1');
-                if (nameElement) {
-                    result.name = nameElement.textContent.trim();
-                }
-                
-                // 取得價格資訊
-                const priceBox = document.querySelector('div.o-prodPrice__priceBox');
-                if (priceBox) {
-                    // 折扣價
-                    const discountElement = priceBox.querySelector('div.o-prodPrice__price--xxxl700Primary');
-                    if (discountElement) {
-                        result.price = parseInt(discountElement.textContent.replace(/[^0-9]/g, ''));
-                    }
-                    
-                    // 原價
-                    const originalElement = priceBox.querySelector('div.o-prodPrice__originalPrice--m500Gray');
-                    if (originalElement) {
-                        result.original_price = parseInt(originalElement.textContent.replace(/[^0-9]/g, ''));
-                    }
-                }
-                
-                // 檢查庫存狀態
-                const buyButton = document.querySelector('button[data-regression="product_button_buyNow"]');
-                const notifyButtons = Array.from(document.querySelectorAll('button span.btn__text')).filter(el => el.textContent.includes('有貨通知我'));
-                result.has_stock = buyButton && notifyButtons.length === 0;
-                
-                return result;
-            }''')
-            
-            # 驗證結果
-            if not product_info['name']:
-                raise ValueError("無法取得商品名稱")
-            
-            if not product_info['price'] and not product_info['original_price']:
-                raise ValueError("無法取得商品價格")
-            
-            # 如果沒有折扣價，使用原價
-            if not product_info['price']:
-                product_info['price'] = product_info['original_price']
-            
-            logger.info(f"商品名稱: {product_info['name']}")
-            logger.info(f"商品價格: {product_info['price']}")
-            logger.info(f"商品原價: {product_info['original_price']}")
-            logger.info(f"是否有庫存: {product_info['has_stock']}")
-            
-            return product_info
+            product_info = yield lambda: self.page.evaluate(PRODUCT_INFO_JS)
+            return normalize_product_info(product_info)
             
         except Exception as e:
             logger.error(f"檢查商品資訊時發生錯誤: {str(e)}")
-            self.page.screenshot(path=f"product_check_error_{int(time.time())}.png")
+            yield lambda: self._capture('product_check_error')
             raise
 
-    def purchase(self):
-        """執行購買流程"""
-        logger.info("開始購買流程")
-        self.page.goto(self.url)
-        
+    @driven
+    def probe_availability(self):
+        """優先以按鈕狀態 API 探測庫存，不需重新載入頁面"""
+        if self._api_probe:
+            try:
+                item_id = extract_item_id(self.url)
+                response = yield lambda: self.page.context.request.get(build_button_status_url(item_id), timeout=3000)
+                return parse_button_status(response.status, (yield response.text), item_id)
+            except CheckoutApiError as e:
+                logger.warning(f"按鈕狀態 API 無法使用，改用頁面探測: {str(e)}")
+                self._api_probe = False
+        return (yield super().probe_availability)
+
+    @driven
+    def _post_add_to_cart(self, item_id: str, referer: str):
+        """以 HTTP API 將品項加入購物車（沿用 context 的登入 cookies）"""
+        url, form = build_add_to_cart_request(item_id)
+        response = yield lambda: self.page.context.request.post(url, form=form, headers={'Referer': referer}, timeout=5000)
+        parse_add_to_cart_response(response.status, (yield response.text))
+        logger.info(f"已透過 API 將 {item_id} 加入購物車")
+
+    @driven
+    def _goto_cart(self, attempts: int = 3):
+        """前往購物車頁；加入購物車的請求已被接受，失敗時只重試導航，不再重複加入"""
+        for attempt in range(1, attempts + 1):
+            try:
+                yield lambda: self.page.goto(CART_PAGE_URL, wait_until='domcontentloaded')
+                return
+            except Exception as e:
+                if attempt == attempts or not is_transient(e):
+                    raise
+                logger.warning(f"前往購物車失敗，重試第 {attempt} 次: {str(e)}")
+
+    @driven
+    def _add_to_cart_via_api(self):
+        """以 HTTP API 加入購物車後前往購物車頁，回傳接下來的路徑（api 或 ui）
+
+        只有請求確定沒有送達伺服器（無法連線）或 API 回應可由頁面操作補救（已登出、回應格式改變）時回傳 ui；
+        伺服器明確拒絕（售完、限購）時直接失敗。逾時、5xx 等結果不明時先檢查購物車，
+        商品已在其中就繼續結帳，否則回到商品頁改用頁面操作。
+        """
         try:
+            item_id = extract_item_id(self.url)
+            yield lambda: self._post_add_to_cart(item_id, self.url)
+        except AddToCartRejected:
+            raise
+        except Exception as e:
+            if not _outcome_unknown(e):
+                logger.warning(f"API 加入購物車失敗，改用頁面操作: {str(e)}")
+                return 'ui'
+            logger.warning(f"API 加入購物車的結果不明，先檢查購物車: {str(e)}")
+            yield self._goto_cart
+            if not (yield lambda: self.page.evaluate(CART_ITEM_JS, self._cart_item_arg(item_id)))['found']:
+                logger.info("購物車中沒有此商品，回到商品頁改用頁面操作")
+                yield lambda: self.page.goto(self.url, wait_until='domcontentloaded')
+                return 'ui'
+            logger.info("商品已在購物車中，繼續結帳")
+            return 'api'
+        yield self._goto_cart
+        return 'api'
+
+    @driven
+    def _add_to_cart(self):
+        """優先走 API 加入購物車，API 無法使用時改為點擊立即購買按鈕（流程檔 add_to_cart 步驟的動作）"""
+        start = time.perf_counter()
+        path = 'ui'
+        if self.options.get('api_checkout', True):
+            with span('add_to_cart.api'):
+                path = yield self._add_to_cart_via_api
+
+        if path == 'ui':
             # 點擊立即購買按鈕
-            buy_button = self.page.locator("#ProdBriefing button").filter(has_text="立即購買")
-            if not buy_button:
-                raise Exception("找不到立即購買按鈕")
-            
-            buy_button.click()
+            yield self.locators['buy'].click
             logger.info("已點擊立即購買按鈕")
+        self.timing_stats['add_to_cart'] = {'path': path, 'duration_ms': (time.perf_counter() - start) * 1000}
 
-            # 點擊結帳按鈕
-            checkout_button = self.page.locator("button[data-regression='step1-checkout-btn']")
-            if not checkout_button:
-                raise Exception("找不到結帳按鈕")
-            
-            checkout_button.click()
-            logger.info("已點擊結帳按鈕")
+    @driven
+    def prefill_checkout(self):
+        """開賣前以佔位商品（prefill_item 選項）或購物車中已有的商品走到結帳表單，記下表單欄位
 
-            # 點擊訂單不受24小時到貨時間限制確認按鈕
+        期限內的快照直接沿用；佔位商品在記下表單後從購物車移除，無法移除時中止，避免一併結帳。
+        走結帳失敗時開賣後改為只填 CVC。
+        """
+        account = getattr(self, 'username', None)
+        cached = load_prefill(self.platform, account, self.session_cache)
+        if cached is not None:
+            self.prefill = cached
+            self.timing_stats['prefill'] = cached_stats(cached)
+            return
+
+        placeholder = self.options.get('prefill_item')
+        walk = PrefillWalk(placeholder=extract_item_id(placeholder) if placeholder else None)
+        cvc = self.flow.locators['cvc'].selector
+        try:
+            with span('prefill.walk'):
+                if placeholder:
+                    yield self.throttle
+                    yield lambda: self._post_add_to_cart(walk.placeholder, placeholder)
+                    walk.added = True
+                yield self.throttle
+                yield lambda: self.page.goto(CART_PAGE_URL, wait_until='domcontentloaded')
+                walk.count_cart((yield lambda: self.page.evaluate(CART_ITEM_JS, self._cart_item_arg(walk.product))))
+                for flow_step in self.flow.checkout:
+                    if flow_step.stage == 'cart':
+                        yield self.throttle
+                        yield lambda: self.steps.run(flow_step.step, flow_step.action(self))
+                fields = yield lambda: self.page.evaluate(SNAPSHOT_FORM_JS, snapshot_arg(cvc))
+            self.prefill = walk.finish(fields)
+            save_prefill(self.platform, account, self.session_cache, self.prefill)
+        except Exception as e:
+            logger.warning(f"預先走結帳失敗，開賣時改為只填 CVC: {str(e)}")
+            yield lambda: self._capture('prefill_error')
+        finally:
+            if walk.added:
+                yield lambda: self._remove_placeholder(walk.placeholder)
+        self.timing_stats['prefill'] = walk.stats(self.prefill)
+
+    def _cart_item_arg(self, item_id: Optional[str]) -> Dict:
+        """以流程檔的刪除按鈕建立 CART_ITEM_JS 的參數"""
+        spec = self.flow.locators['cart_remove']
+        return cart_item_arg(spec.selector, spec.text, item_id)
+
+    @driven
+    def _remove_placeholder(self, item_id: str):
+        """從購物車移除佔位商品（網站以 confirm 確認時自動接受），並重新載入購物車確認已不在其中"""
+        arg = self._cart_item_arg(item_id)
+        yield self.throttle
+        yield lambda: self.page.goto(CART_PAGE_URL, wait_until='domcontentloaded')
+        # asyncio 版本的 dialog.accept() 回傳 coroutine，由 Playwright 的事件機制排程執行
+        accept = lambda dialog: dialog.accept()
+        self.page.on('dialog', accept)
+        try:
+            clicked = yield lambda: self.page.evaluate(CART_ITEM_JS, {**arg, 'remove': True})
+            if not clicked['found']:
+                raise CheckoutApiError(f"無法從購物車移除佔位商品 {item_id}，請手動移除後再執行")
             try:
-                # 嘗試點擊結帳按鈕,但不一定每個商品都會出現
-                checkout_confirm = self.page.get_by_role("button", name="確定")
-                if checkout_confirm.is_visible():
-                    checkout_confirm.click()
-                    logger.info("已點擊結帳確認按鈕")
+                # 等刪除請求完成、商品列消失後才離開頁面，否則導航會中斷刪除請求
+                yield lambda: self.page.wait_for_function(CART_ITEM_GONE_JS, arg=arg, timeout=10000)
             except Exception as e:
-                logger.info("沒有出現結帳確認按鈕,繼續下一步")
-            
-            # 等待訂單表單載入
-            self.page.wait_for_selector("input[type='text']", timeout=5000)
-            
-            # 填寫信用卡 CVC
-            self.page.get_by_placeholder("CVC").fill(self.payment['CVC'])
+                logger.info(f"等待佔位商品移除時中斷，重新載入購物車確認: {str(e)}")
+        finally:
+            self.page.remove_listener('dialog', accept)
 
-            logger.info("表單填寫完成")
+        yield self.throttle
+        yield lambda: self.page.goto(CART_PAGE_URL, wait_until='domcontentloaded')
+        if (yield lambda: self.page.evaluate(CART_ITEM_JS, arg))['found']:
+            logger.error(f"佔位商品 {item_id} 仍在購物車中，開賣時會一併結帳")
+            raise CheckoutApiError(f"佔位商品 {item_id} 仍在購物車中，請手動移除後再執行")
+        logger.info(f"已從購物車移除佔位商品 {item_id}")
 
-            # 確認付款
-            # self.page.get_by_role("button", name="確認付款").click()
-            # logger.info("已點擊確認付款按鈕")
-            
-            logger.info("PChome 購買完成")
-            self.page.screenshot(path=f"purchase_success_{int(time.time())}.png")
-            self.page.pause()
+    @driven
+    def _fill_payment(self):
+        """填入付款資訊（流程檔 fill_payment 步驟的動作）
+
+        有結帳表單快照時以單一 evaluate 套用所有欄位與 CVC，否則只填 CVC。
+        """
+        if self.prefill is None:
+            yield lambda: self.locators['cvc'].fill(self.payment['CVC'])
+            return
+        start = time.perf_counter()
+        cvc = self.flow.locators['cvc'].selector
+        result = yield lambda: self.page.evaluate(APPLY_FORM_JS, self.prefill.with_values({cvc: self.payment['CVC']}))
+        stats, missing = check_applied(result, self.platform, getattr(self, 'username', None), self.session_cache)
+        self.timing_stats.setdefault('prefill', {}).update(stats, apply_ms=(time.perf_counter() - start) * 1000)
+        if cvc in missing:
+            yield lambda: self.locators['cvc'].fill(self.payment['CVC'])
+
+    @driven
+    def submit_order(self):
+        """送出訂單（目前保留給使用者手動確認付款）"""
+        # 確認付款
+        # yield self.page.get_by_role("button", name="確認付款").click
+        # logger.info("已點擊確認付款按鈕")
+        
+        logger.info("PChome 購買完成")
+        yield lambda: self._capture('purchase_success')
+        yield self.page.pause
+
+    @driven
+    def purchase(self):
+        """執行購買流程"""
+        logger.info("開始購買流程")
+        
+        try:
+            yield self.checkout
+            yield self.submit_order
             
         except Exception as e:
             logger.error(f"PChome 購買過程發生錯誤: {str(e)}")
-            self.page.screenshot(path=f"purchase_error_{int(time.time())}.png")
-            raise 
\ No newline at end of file
+            yield lambda: self._capture('purchase_error')
+            raise
@@ -0,0 +1,123 @@
+import json
+import logging
+import re
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 加入購物車的 API 與購物車頁面（結帳第一步）
+ADD_TO_CART_URL = "https://ecssl.pchome.com.tw/sys/cflow/fsapi/AddCart"
+CART_PAGE_URL = "https://ecssl.pchome.com.tw/sys/cflow/fsindex/BigCar/BIGCAR/ItemList"
+# 商品按鈕狀態（是否可購買），回應很小且不需要登入
+BUTTON_STATUS_URL = "https://ecapi-cdn.pchome.com.tw/ecshop/prodapi/v2/prod/button&id={product_id}&fields=Id,ButtonType,Qty"
+# 商品狀態與售價，供 HTTP 監看使用（CDN 回應帶有 ETag，可用條件式請求）
+PRODUCT_STATUS_URL = "https://ecapi-cdn.pchome.com.tw/ecshop/prodapi/v2/prod&id={product_id}&fields=Id,Name,ButtonType,Qty,Price"
+
+# 商品頁網址中的商品編號，例如 /prod/DYAJC9-A900GN2IQ
+_PRODUCT_ID_PATTERN = re.compile(r'/prod/([A-Z0-9]{6}-[A-Z0-9]{9})(?:-(\d{3}))?', re.IGNORECASE)
+
+class CheckoutApiError(Exception):
+    """API 結帳路徑失敗，應改走 UI 流程"""
+    pass
+
+class AddToCartRejected(CheckoutApiError):
+    """伺服器明確回覆無法加入購物車（售完、限購等），改走 UI 流程也不會成功"""
+    pass
+
+class AddToCartUncertain(CheckoutApiError):
+    """伺服器錯誤（5xx，例如閘道逾時），請求可能已被處理，應先檢查購物車"""
+    pass
+
+def extract_item_id(url: str) -> str:
+    """從商品頁網址取得購物車使用的品項編號（商品編號加規格序號，預設 000）"""
+    match = _PRODUCT_ID_PATTERN.search(url)
+    if not match:
+        raise CheckoutApiError(f"無法從網址取得商品編號: {url}")
+    return f"{match.group(1).upper()}-{match.group(2) or '000'}"
+
+def build_add_to_cart_request(item_id: str, quantity: int = 1) -> Tuple[str, Dict]:
+    """組出加入購物車的請求，回傳 (網址, 表單欄位)"""
+    payload = {
+        'G': [],
+        'A': [],
+        'B': [],
+        'TB': '24H',
+        'TP': 2,
+        'T': 'ADD',
+        'TI': item_id,
+        'RS': '',
+        'YTQ': quantity,
+    }
+    return ADD_TO_CART_URL, {'data': json.dumps(payload, separators=(',', ':'))}
+
+def parse_add_to_cart_response(status: int, body: str) -> Dict:
+    """檢查加入購物車的回應，失敗時拋出 CheckoutApiError
+
+    明確拒絕時為 AddToCartRejected，5xx 為 AddToCartUncertain。
+    """
+    if status >= 500:
+        raise AddToCartUncertain(f"加入購物車失敗，HTTP {status}")
+    if status >= 400:
+        raise CheckoutApiError(f"加入購物車失敗，HTTP {status}")
+
+    try:
+        data = json.loads(body)
+    except ValueError:
+        # 未登入時會被導向 HTML 登入頁
+        raise CheckoutApiError("加入購物車的回應不是 JSON，可能已登出")
+
+    if not isinstance(data, dict):
+        raise CheckoutApiError(f"無法解析加入購物車的回應: {body[:200]}")
+
+    error = data.get('ERR') or data.get('Err') or data.get('MSG')
+    if error or str(data.get('Status', '')).upper() in ('ERR', 'FAIL'):
+        raise AddToCartRejected(f"加入購物車失敗: {error or data.get('Status')}")
+
+    if int(data.get('PRODCOUNT', 1) or 0) < 1:
+        raise AddToCartRejected("加入購物車後購物車仍為空")
+
+    return data
+
+def build_button_status_url(item_id: str) -> str:
+    """組出查詢商品按鈕狀態的網址"""
+    return BUTTON_STATUS_URL.format(product_id=item_id.rsplit('-', 1)[0])
+
+def _status_items(status: int, body: str, item_id: str) -> List[Dict]:
+    """解析商品 API 的回應，有多個規格時只回傳目標品項，找不到則回傳所有規格"""
+    if status >= 400:
+        raise CheckoutApiError(f"查詢商品狀態失敗，HTTP {status}")
+
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise CheckoutApiError("商品狀態回應不是 JSON")
+
+    if isinstance(data, dict):
+        data = [data]
+    items = [item for item in data if isinstance(item, dict)]
+    if not items:
+        raise CheckoutApiError("商品狀態回應沒有資料")
+
+    return [item for item in items if item.get('Id') == item_id] or items
+
+def parse_button_status(status: int, body: str, item_id: str) -> bool:
+    """解析按鈕狀態，ButtonType 為 ForSale 代表可購買"""
+    return any(item.get('ButtonType') == 'ForSale' for item in _status_items(status, body, item_id))
+
+def build_product_status_url(item_id: str) -> str:
+    """組出查詢商品狀態與售價的網址"""
+    return PRODUCT_STATUS_URL.format(product_id=item_id.rsplit('-', 1)[0])
+
+def parse_product_status(status: int, body: str, item_id: str) -> Dict:
+    """解析商品狀態與售價，回傳 name、price（促銷價，沒有時為定價）與 can_buy"""
+    items = _status_items(status, body, item_id)
+    item = next((i for i in items if i.get('ButtonType') == 'ForSale'), items[0])
+    price = item.get('Price') or {}
+    if not isinstance(price, dict):
+        price = {'P': price}
+    amount = price.get('P') or price.get('M')
+    return {
+        'name': item.get('Name'),
+        'price': int(amount) if amount else None,
+        'can_buy': item.get('ButtonType') == 'ForSale',
+    }
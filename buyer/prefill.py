@@ -0,0 +1,226 @@
+"""
+結帳表單預先填寫：開賣前先以佔位商品（或購物車中已有的商品）走一次結帳，記下結帳表單的付款方式、
+配送選項等欄位，開賣後到達結帳表單時以單一 evaluate 一次套用（含 CVC），不再逐一等待欄位。
+
+走過一次結帳也讓購物車與結帳頁的腳本、樣式進入瀏覽器快取。快照寫入登入快取目錄
+（與 storage_state 同名、副檔名為 .checkout.json），不含 CVC 等敏感欄位，期限內的執行直接沿用。
+"""
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+from buyer.session import SessionCache, write_private_json
+
+logger = logging.getLogger(__name__)
+
+# 快照的有效期限（秒），超過時重新走一次結帳
+PREFILL_MAX_AGE = 6 * 3600
+
+# 記錄 anchor 所在表單中已選取或已填寫的欄位；以 name（radio 加上 value）或 id 作為選擇器，
+# 略過密碼、隱藏欄位、按鈕與 exclude 列出的欄位（例如 CVC）
+SNAPSHOT_FORM_JS = '''({anchor, exclude}) => {
+    const target = anchor && document.querySelector(anchor);
+    const root = (target && target.closest('form')) || document;
+    const skipped = new Set();
+    for (const selector of exclude) {
+        for (const el of document.querySelectorAll(selector)) skipped.add(el);
+    }
+    const fields = [];
+    for (const el of root.querySelectorAll('input, select, textarea')) {
+        const type = (el.type || '').toLowerCase();
+        if (skipped.has(el) || el.disabled || ['password', 'hidden', 'submit', 'button', 'file', 'image', 'reset'].includes(type)) continue;
+        const name = el.getAttribute('name');
+        let key = name ? `${el.tagName.toLowerCase()}[name="${CSS.escape(name)}"]` : (el.id ? `#${CSS.escape(el.id)}` : null);
+        if (!key) continue;
+        if (type === 'radio') {
+            if (!el.checked) continue;
+            if (name) key += `[value="${CSS.escape(el.value)}"]`;
+            fields.push({key, kind: 'radio', checked: true});
+        } else if (type === 'checkbox') {
+            fields.push({key, kind: 'checkbox', checked: el.checked});
+        } else if (el.tagName === 'SELECT') {
+            fields.push({key, kind: 'select', value: el.value});
+        } else if (el.value) {
+            fields.push({key, kind: 'text', value: el.value});
+        }
+    }
+    return fields;
+}'''
+
+# 一次套用所有欄位：以原生 setter 設定值（讓 React 等框架收到變更）並觸發 input 與 change，
+# 回傳已套用的數量與找不到的欄位
+APPLY_FORM_JS = '''(fields) => {
+    const setters = {
+        INPUT: Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set,
+        SELECT: Object.getOwnPropertyDescriptor(HTMLSelectElement.prototype, 'value').set,
+        TEXTAREA: Object.getOwnPropertyDescriptor(HTMLTextAreaElement.prototype, 'value').set,
+    };
+    const result = {applied: 0, missing: []};
+    for (const field of fields) {
+        const el = document.querySelector(field.key);
+        if (!el) {
+            result.missing.push(field.key);
+            continue;
+        }
+        if (field.kind === 'radio' || field.kind === 'checkbox') {
+            if (el.checked !== field.checked) el.click();
+        } else {
+            setters[el.tagName].call(el, field.value);
+        }
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        result.applied += 1;
+    }
+    return result;
+}'''
+
+# 找出購物車中的商品列：由每個刪除按鈕往上找到只包含這一個刪除按鈕的最外層元素作為商品列，
+# 回傳商品列數與是否有包含 product（商品編號）的一列；remove 時點擊該列的刪除按鈕，不會刪到其他商品
+CART_ITEM_JS = '''({selector, text, product, remove}) => {
+    const buttons = Array.from(document.querySelectorAll(selector))
+        .filter(el => !text || el.textContent.includes(text));
+    for (const button of buttons) {
+        let row = button;
+        while (row.parentElement && buttons.filter(b => row.parentElement.contains(b)).length === 1) {
+            row = row.parentElement;
+        }
+        if (product && row.innerHTML.includes(product)) {
+            if (remove) button.click();
+            return {rows: buttons.length, found: true};
+        }
+    }
+    return {rows: buttons.length, found: false};
+}'''
+
+# 等待佔位商品那一列從購物車移除（刪除請求完成、頁面更新之後）
+CART_ITEM_GONE_JS = '(arg) => !(' + CART_ITEM_JS + ')({...arg, remove: false}).found'
+
+@dataclass
+class CheckoutPrefill:
+    """結帳表單的快照，source 為走結帳時使用的佔位商品編號（沿用購物車時為 cart）"""
+    fields: List[Dict] = field(default_factory=list)
+    source: str = 'cart'
+    created_at: float = field(default_factory=time.time)
+
+    def fresh(self, max_age: float = PREFILL_MAX_AGE, now: Optional[float] = None) -> bool:
+        return ((now or time.time()) - self.created_at) < max_age
+
+    def with_values(self, values: Dict[str, str]) -> List[Dict]:
+        """加上開賣時才填入的文字欄位（選擇器 -> 值），同一欄位以 values 為準"""
+        fields = [f for f in self.fields if f['key'] not in values]
+        return fields + [{'key': key, 'kind': 'text', 'value': value} for key, value in values.items()]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CheckoutPrefill':
+        fields = data['fields']
+        if not isinstance(fields, list) or not all(isinstance(f, dict) and 'key' in f and 'kind' in f for f in fields):
+            raise ValueError("結帳表單快照格式錯誤")
+        return cls(fields=fields, source=data.get('source', 'cart'), created_at=float(data['created_at']))
+
+@dataclass
+class PrefillWalk:
+    """一次走結帳的紀錄：placeholder 為佔位商品編號（None 時沿用購物車中已有的商品）
+
+    buyer 只負責頁面操作，購物車商品列的判讀、快照建立與耗時統計都在這裡。
+    """
+    placeholder: Optional[str] = None
+    added: bool = False
+    cart_items: Optional[int] = None
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def source(self) -> str:
+        return self.placeholder or 'cart'
+
+    @property
+    def product(self) -> Optional[str]:
+        """要在購物車中辨識的商品：已加入的佔位商品，未加入時為 None（只計算商品列數）"""
+        return self.placeholder if self.added else None
+
+    def count_cart(self, cart: Dict) -> int:
+        """由 CART_ITEM_JS 的結果算出佔位商品以外的商品數，有其他商品時警告（開賣時會一併結帳）"""
+        self.cart_items = cart['rows'] - (1 if cart['found'] else 0)
+        if self.cart_items:
+            logger.warning(f"購物車中已有 {self.cart_items} 件其他商品，開賣時會一併結帳，請確認後再執行")
+        return self.cart_items
+
+    def finish(self, fields: List[Dict]) -> CheckoutPrefill:
+        logger.info(f"已記下結帳表單（{len(fields)} 個欄位）")
+        return CheckoutPrefill(fields=fields, source=self.source)
+
+    def stats(self, prefill: Optional[CheckoutPrefill]) -> Dict:
+        """timing_stats['prefill'] 的內容"""
+        return {
+            'cached': False,
+            'fields': len(prefill.fields) if prefill else 0,
+            'walk_ms': (time.perf_counter() - self.started) * 1000,
+            'cart_items': self.cart_items,
+        }
+
+def cached_stats(prefill: CheckoutPrefill) -> Dict:
+    """沿用快照時 timing_stats['prefill'] 的內容"""
+    logger.info(f"沿用結帳表單快照（{len(prefill.fields)} 個欄位）")
+    return {'cached': True, 'fields': len(prefill.fields), 'walk_ms': 0.0}
+
+def cart_item_arg(selector: str, text: Optional[str], item_id: Optional[str], remove: bool = False) -> Dict:
+    """CART_ITEM_JS 的參數：刪除按鈕與商品編號（去掉規格，None 時只計算商品列數）"""
+    product = item_id.rsplit('-', 1)[0] if item_id else None
+    return {'selector': selector, 'text': text, 'product': product, 'remove': remove}
+
+def snapshot_arg(sensitive: str) -> Dict:
+    """SNAPSHOT_FORM_JS 的參數：以敏感欄位（CVC）所在的表單為範圍，並略過該欄位"""
+    return {'anchor': sensitive, 'exclude': [sensitive]}
+
+def check_applied(
+    result: Dict,
+    platform: str,
+    account: Optional[str],
+    session_cache: Optional[SessionCache],
+) -> Tuple[Dict, List[str]]:
+    """判讀 APPLY_FORM_JS 的結果，回傳要寫入 timing_stats 的欄位與找不到的欄位
+
+    有欄位不存在代表結帳表單已改版，刪除快照讓下次執行重新走一次結帳。
+    """
+    missing = result['missing']
+    if missing:
+        logger.warning(f"結帳表單有 {len(missing)} 個欄位已不存在: {', '.join(missing)}")
+        discard_prefill(platform, account, session_cache)
+    return {'applied': result['applied'], 'missing': missing}, missing
+
+def load_prefill(
+    platform: str,
+    account: Optional[str],
+    session_cache: Optional[SessionCache],
+    max_age: float = PREFILL_MAX_AGE,
+) -> Optional[CheckoutPrefill]:
+    """讀取期限內的結帳表單快照，不存在、過期或格式錯誤時回傳 None"""
+    if session_cache is None or not account:
+        return None
+    path = session_cache.path_for(platform, account, 'checkout')
+    if not path.exists():
+        return None
+    try:
+        prefill = CheckoutPrefill.from_dict(json.loads(path.read_text(encoding='utf-8')))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"讀取結帳表單快照失敗，重新建立: {str(e)}")
+        return None
+    if not prefill.fresh(max_age):
+        logger.info("結帳表單快照已過期，重新走一次結帳")
+        return None
+    return prefill
+
+def save_prefill(platform: str, account: Optional[str], session_cache: Optional[SessionCache], prefill: CheckoutPrefill):
+    """把快照寫入登入快取目錄（只有自己可讀）"""
+    if session_cache is None or not account:
+        return
+    try:
+        write_private_json(session_cache.path_for(platform, account, 'checkout'), asdict(prefill))
+    except OSError as e:
+        logger.warning(f"儲存結帳表單快照失敗: {str(e)}")
+
+def discard_prefill(platform: str, account: Optional[str], session_cache: Optional[SessionCache]):
+    """刪除快照（結帳表單改版、欄位已不存在時）"""
+    if session_cache is None or not account:
+        return
+    session_cache.path_for(platform, account, 'checkout').unlink(missing_ok=True)
@@ -0,0 +1,105 @@
+"""
+每個帳號固定的瀏覽器設定檔：User-Agent、視窗大小、語系與時區。
+
+設定檔由平台與帳號決定（同一帳號每次都得到相同結果），第一次使用時寫入登入快取目錄
+（與 storage_state 同名、副檔名為 .profile.json），之後的執行與各個 context 都沿用同一份。
+瀏覽器特徵與已儲存的 cookies 一致，商店不會把它當成新裝置而要求重新驗證
+（例如 PChome 的 Email 驗證碼）。登入快取失效時只刪除 storage_state，設定檔保留。
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+from buyer.session import SessionCache, write_private_json
+from utils import UserAgentManager
+
+logger = logging.getLogger(__name__)
+
+# 常見的桌面解析度（扣除瀏覽器工具列後的可視區域）
+_VIEWPORTS = [
+    {'width': 1280, 'height': 800},
+    {'width': 1366, 'height': 768},
+    {'width': 1440, 'height': 900},
+    {'width': 1536, 'height': 864},
+    {'width': 1920, 'height': 1080},
+]
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    """單一帳號的瀏覽器特徵"""
+    user_agent: str
+    viewport: Dict[str, int]
+    locale: str = 'zh-TW'
+    timezone_id: str = 'Asia/Taipei'
+
+    def context_options(self) -> Dict:
+        """browser.new_context 的參數"""
+        return {
+            'user_agent': self.user_agent,
+            'viewport': dict(self.viewport),
+            'locale': self.locale,
+            'timezone_id': self.timezone_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BrowserProfile':
+        return cls(
+            user_agent=data['user_agent'],
+            viewport={'width': int(data['viewport']['width']), 'height': int(data['viewport']['height'])},
+            locale=data.get('locale', 'zh-TW'),
+            timezone_id=data.get('timezone_id', 'Asia/Taipei'),
+        )
+
+def derive_profile(platform: str, account: str) -> BrowserProfile:
+    """由平台與帳號決定設定檔，同一帳號每次結果相同"""
+    seed = hashlib.sha256(f"{platform}:{account}".encode('utf-8')).digest()
+    rng = random.Random(seed)
+    return BrowserProfile(
+        user_agent=UserAgentManager.get_random_user_agent(rng),
+        viewport=dict(rng.choice(_VIEWPORTS)),
+    )
+
+def account_username(platform: str, buyer_options: Optional[Dict] = None) -> Optional[str]:
+    """購買器將使用的帳號：多帳號模式的 account 選項，否則為 .env 的 <平台>_USERNAME"""
+    account = (buyer_options or {}).get('account')
+    if account is not None:
+        return account.username
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return os.getenv(f"{platform.upper()}_USERNAME") or None
+
+def load_profile(platform: str, account: str, session_cache: Optional[SessionCache] = None) -> BrowserProfile:
+    """讀取帳號的設定檔，不存在時建立並寫入登入快取目錄（沒有快取時只依帳號推導）"""
+    if session_cache is None:
+        return derive_profile(platform, account)
+
+    path = session_cache.path_for(platform, account, 'profile')
+    if path.exists():
+        try:
+            return BrowserProfile.from_dict(json.loads(path.read_text(encoding='utf-8'))['profile'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"讀取瀏覽器設定檔失敗，重新建立: {str(e)}")
+
+    profile = derive_profile(platform, account)
+    try:
+        write_private_json(path, {'created_at': time.time(), 'profile': asdict(profile)})
+        logger.info(f"已建立瀏覽器設定檔: {path}")
+    except OSError as e:
+        logger.warning(f"儲存瀏覽器設定檔失敗: {str(e)}")
+    return profile
+
+def resolve_profile(
+    platform: str,
+    session_cache: Optional[SessionCache] = None,
+    buyer_options: Optional[Dict] = None,
+) -> Optional[BrowserProfile]:
+    """取得這次購買要使用的設定檔，無法得知帳號時回傳 None（改用隨機 User-Agent）"""
+    account = account_username(platform, buyer_options)
+    if not account:
+        return None
+    return load_profile(platform, account, session_cache)
@@ -0,0 +1,91 @@
+"""
+請求速率限制：以 token bucket 分別限制每個帳號與每個平台的請求頻率，
+避免多帳號同時執行時觸發商店的流量限制。
+"""
+import logging
+import threading
+from typing import Dict, Hashable, Optional, Tuple
+from buyer.scheduler import SystemClock
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """token bucket：每秒補充 rate 個 token，最多累積 burst 個
+
+    reserve 採預約制：token 可以透支，回傳需要等待的秒數，讓同時搶用的呼叫端
+    依序排隊，而不是同時醒來再競爭。同步執行緒與 asyncio 皆可共用。
+    """
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Optional[SystemClock] = None):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        if self.capacity < 1:
+            raise ValueError("burst 至少為 1")
+        self.clock = clock or SystemClock()
+        self._tokens = self.capacity
+        self._updated_ns = self.clock.monotonic_ns()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """預約 tokens 個 token，回傳需要等待的秒數（0 代表可立即執行）"""
+        with self._lock:
+            now_ns = self.clock.monotonic_ns()
+            elapsed = (now_ns - self._updated_ns) / 1e9
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_ns = now_ns
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+class RateLimiter:
+    """依帳號與平台分別限制請求速率
+
+    每次請求同時向帳號與平台的 bucket 預約，等待兩者中較長的時間。
+    未設定速率的層級不限制；帳號為 None 時只套用平台限制。
+    """
+    def __init__(
+        self,
+        account_rate: Optional[float] = None,
+        platform_rate: Optional[float] = None,
+        account_burst: Optional[float] = None,
+        platform_burst: Optional[float] = None,
+        clock: Optional[SystemClock] = None,
+    ):
+        self.account_limit = (account_rate, account_burst) if account_rate else None
+        self.platform_limit = (platform_rate, platform_burst) if platform_rate else None
+        self.clock = clock or SystemClock()
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: Hashable, limit: Tuple[float, Optional[float]]) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst = limit
+                bucket = self._buckets[key] = TokenBucket(rate, burst, self.clock)
+            return bucket
+
+    def reserve(self, platform: str, account: Optional[str] = None) -> float:
+        """預約一次請求，回傳需要等待的秒數"""
+        delays = []
+        if self.platform_limit:
+            delays.append(self._bucket(platform, self.platform_limit).reserve())
+        if self.account_limit and account:
+            delays.append(self._bucket((platform, account), self.account_limit).reserve())
+        return max(delays, default=0.0)
+
+    def acquire(self, platform: str, account: Optional[str] = None) -> float:
+        """等到可以送出請求為止，回傳等待的秒數"""
+        delay = self.reserve(platform, account)
+        if delay > 0:
+            logger.debug(f"[{platform}/{account}] 速率限制，等待 {delay * 1000:.0f} ms")
+            self.clock.sleep(delay)
+        return delay
+
+    async def acquire_async(self, platform: str, account: Optional[str] = None) -> float:
+        """acquire 的 asyncio 版本"""
+        delay = self.reserve(platform, account)
+        if delay > 0:
+            logger.debug(f"[{platform}/{account}] 速率限制，等待 {delay * 1000:.0f} ms")
+            await self.clock.sleep_async(delay)
+        return delay
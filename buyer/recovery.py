@@ -0,0 +1,188 @@
+"""
+結帳的自動重試：步驟因暫時性錯誤（逾時、導航中斷）失敗時，依目前網址與 DOM 判斷已到達的階段
+（商品頁、購物車、結帳表單），從該階段的步驟繼續，而不是從頭開始。
+
+重試次數有上限，每次重試前以指數退避加上隨機抖動等待；判斷不出階段時才重新載入商品頁。
+標示 once 的步驟（加入購物車）開始執行後不再重做：頁面已前進到之後的階段才繼續，否則直接失敗，
+避免請求已送出但等待逾時時重複加入。
+核心流程為產生器，同步與 asyncio 版本共用。
+"""
+import logging
+import random
+import re
+from typing import Any, Dict, Generator, Optional, Tuple
+from buyer.instrument import span
+from buyer.scheduler import SystemClock
+from buyer.steps import StepFailed, StepTimeout
+
+logger = logging.getLogger(__name__)
+
+# 視為暫時性的錯誤訊息（Playwright 逾時、導航中斷、連線錯誤）
+_TRANSIENT_PATTERN = re.compile(r'Timeout|Execution context was destroyed|navigation|net::ERR_|Target page, context or browser has been closed')
+
+def is_transient(error: BaseException) -> bool:
+    """失敗條件成立（售完、排隊、錯誤訊息）不重試；逾時與導航、連線錯誤可重試"""
+    if isinstance(error, StepFailed):
+        return False
+    if isinstance(error, (StepTimeout, TimeoutError)):
+        return True
+    # Playwright 的 TimeoutError 不是內建 TimeoutError 的子類別，以類別名稱判斷
+    if any(cls.__name__ == 'TimeoutError' for cls in type(error).__mro__):
+        return True
+    return bool(_TRANSIENT_PATTERN.search(str(error)))
+
+class CheckoutRecovery:
+    """可從中斷階段繼續的結帳重試
+
+    max_retries 為最多重試次數（0 代表不重試），第 n 次重試前等待
+    min(base_delay * 2^(n-1), max_delay) 秒，再乘上 1 ± jitter 的隨機比例。
+    """
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        jitter: float = 0.5,
+        clock: Optional[SystemClock] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        if max_retries < 0:
+            raise ValueError("max_retries 不可為負數")
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock or SystemClock()
+        self.rng = rng or random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重試前的等待秒數"""
+        delay = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+        return delay * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def run(self, buyer, flow_steps) -> Dict:
+        """以同步 API 執行 flow_steps，失敗時依階段重試，回傳重試統計"""
+        stats = buyer.timing_stats.setdefault('recovery', {'retries': 0, 'recovery_ms': 0.0, 'attempts': []})
+        plan = self._plan(flow_steps, buyer.flow, stats)
+        try:
+            command, value = next(plan)
+            while True:
+                reply = None
+                if command == 'run':
+                    try:
+                        buyer._run_flow(flow_steps[value:])
+                    except Exception as e:
+                        reply = e
+                elif command == 'sleep':
+                    self.clock.sleep(value)
+                elif command == 'detect':
+                    reply = buyer.detect_stage()
+                elif command == 'reload':
+                    try:
+                        buyer.reload_product()
+                    except Exception as e:
+                        reply = e
+                command, value = plan.send(reply)
+        except StopIteration:
+            return stats
+        finally:
+            plan.close()
+
+    async def run_async(self, buyer, flow_steps) -> Dict:
+        """run 的 asyncio 版本"""
+        stats = buyer.timing_stats.setdefault('recovery', {'retries': 0, 'recovery_ms': 0.0, 'attempts': []})
+        plan = self._plan(flow_steps, buyer.flow, stats)
+        try:
+            command, value = next(plan)
+            while True:
+                reply = None
+                if command == 'run':
+                    try:
+                        await buyer._run_flow(flow_steps[value:])
+                    except Exception as e:
+                        reply = e
+                elif command == 'sleep':
+                    await self.clock.sleep_async(value)
+                elif command == 'detect':
+                    reply = await buyer.detect_stage()
+                elif command == 'reload':
+                    try:
+                        await buyer.reload_product()
+                    except Exception as e:
+                        reply = e
+                command, value = plan.send(reply)
+        except StopIteration:
+            return stats
+        finally:
+            plan.close()
+
+    def _plan(self, flow_steps, flow, stats: Dict) -> Generator[Tuple[str, Any], Any, None]:
+        """產生 ('run', 起始步驟)、('sleep', 秒)、('detect', None)、('reload', None)
+
+        run 與 reload 的回覆為例外（成功時為 None），detect 的回覆為階段名稱或 None。
+        重試的等待、階段判斷與重新載入都記錄在 recovery span 中。
+        """
+        index = 0
+        attempt = 0
+        # 已開始執行過的 once 步驟中最後一個的位置，重試不可從它或更早的步驟開始
+        committed = -1
+        while True:
+            error = yield 'run', index
+            if error is None:
+                return
+            failed_step = getattr(error, 'step', None)
+            committed = max([committed] + [
+                i for i in range(index, _failed_index(flow_steps, index, failed_step) + 1) if flow_steps[i].once
+            ])
+            if attempt >= self.max_retries or not is_transient(error):
+                raise error
+
+            attempt += 1
+            start_ns = self.clock.monotonic_ns()
+            with span('recovery', attempt=attempt):
+                delay = self.backoff(attempt)
+                logger.warning(f"結帳失敗（{str(error)}），{delay * 1000:.0f} ms 後第 {attempt} 次重試")
+                yield 'sleep', delay
+                stage = yield 'detect', None
+                resume = _resume_index(flow_steps, stage)
+                if committed >= 0 and (resume is None or resume <= committed):
+                    logger.error(
+                        f"{flow_steps[committed].name} 已執行過，頁面仍停在 {stage}，"
+                        "請求可能已送出，不再重試以免重複執行"
+                    )
+                    raise error
+                if resume is None:
+                    logger.info(f"無法判斷目前階段（{stage}），重新載入商品頁")
+                    reload_error = yield 'reload', None
+                    if reload_error is not None:
+                        raise reload_error
+                    resume = 0
+            index = resume
+            elapsed_ms = (self.clock.monotonic_ns() - start_ns) / 1e6
+            stats['retries'] = attempt
+            stats['recovery_ms'] += elapsed_ms
+            stats['attempts'].append({
+                'error': str(error)[:200],
+                'failed_step': failed_step,
+                'stage': stage,
+                'resume_step': flow_steps[index].name if index < len(flow_steps) else None,
+                'backoff_ms': delay * 1000,
+                'recovery_ms': elapsed_ms,
+            })
+            logger.info(f"目前階段 {stage}，從 {stats['attempts'][-1]['resume_step']} 繼續（恢復耗時 {elapsed_ms:.0f} ms）")
+
+def _failed_index(flow_steps, start: int, name: Optional[str]) -> int:
+    """失敗步驟的位置；不知道是哪個步驟時，視為從 start 起的步驟都可能已執行"""
+    for index in range(start, len(flow_steps)):
+        if flow_steps[index].name == name:
+            return index
+    return len(flow_steps) - 1
+
+def _resume_index(flow_steps, stage: Optional[str]) -> Optional[int]:
+    """從第一個屬於 stage 的步驟繼續；沒有對應步驟時回傳 None"""
+    if stage is None:
+        return None
+    for index, flow_step in enumerate(flow_steps):
+        if flow_step.stage == stage:
+            return index
+    return None
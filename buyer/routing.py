@@ -0,0 +1,191 @@
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# 點擊購買用不到的資源類型（stylesheet 會影響元素可見性判斷，因此保留）
+DEFAULT_BLOCKED_TYPES = frozenset({'image', 'media', 'font'})
+
+# 廣告與追蹤服務，無論設定為何都封鎖
+TRACKER_DOMAINS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'doubleclick.net',
+    'facebook.net',
+    'facebook.com',
+    'criteo.com',
+    'criteo.net',
+    'scorecardresearch.com',
+    'hotjar.com',
+    'clarity.ms',
+    'appier.net',
+    'tagtoo.co',
+)
+
+# 各平台結帳流程必要的網域（第一方網域、驗證碼、金流）
+PLATFORM_ALLOWLIST = {
+    'pchome': (
+        'pchome.com.tw',
+        'pchome.tw',
+        'google.com',
+        'gstatic.com',
+        'recaptcha.net',
+    ),
+    'momo': (
+        'momoshop.com.tw',
+        'momo.dm',
+        'google.com',
+        'gstatic.com',
+        'recaptcha.net',
+    ),
+}
+
+# 量測頁面載入時間與傳輸量（navigation timing 與 resource timing）
+_PAGE_METRICS_JS = '''() => {
+    const nav = performance.getEntriesByType('navigation')[0];
+    const resources = performance.getEntriesByType('resource');
+    return {
+        dom_interactive_ms: nav ? nav.domInteractive : null,
+        dom_content_loaded_ms: nav ? nav.domContentLoadedEventEnd : null,
+        load_ms: nav ? nav.loadEventEnd : null,
+        bytes: (nav ? nav.transferSize : 0) + resources.reduce((sum, r) => sum + (r.transferSize || 0), 0),
+        requests: resources.length + 1,
+    };
+}'''
+
+def _host_matches(host: str, domains: Iterable[str]) -> bool:
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+class ResourceBlocker:
+    """以 context.route 封鎖不需要的資源
+
+    第三方網域預設封鎖，只有平台白名單內的網域可以載入，
+    確保結帳需要的腳本不受影響。
+    """
+    def __init__(
+        self,
+        platform: str,
+        blocked_types: Iterable[str] = DEFAULT_BLOCKED_TYPES,
+        block_third_party: bool = True,
+        extra_allow: Iterable[str] = (),
+        extra_block: Iterable[str] = (),
+    ):
+        if platform not in PLATFORM_ALLOWLIST:
+            raise ValueError(f"不支援的平台: {platform}")
+
+        self.platform = platform
+        self.blocked_types = frozenset(blocked_types)
+        self.block_third_party = block_third_party
+        self.allow_domains = tuple(PLATFORM_ALLOWLIST[platform]) + tuple(extra_allow)
+        self.block_domains = TRACKER_DOMAINS + tuple(extra_block)
+        self.stats = {'allowed': 0, 'blocked': 0, 'by_reason': {}}
+
+    def should_block(self, url: str, resource_type: str) -> Optional[str]:
+        """判斷是否封鎖請求，回傳封鎖原因；不封鎖則回傳 None"""
+        host = (urlparse(url).hostname or '').lower()
+        if not host:
+            # data:、blob: 等不經網路的請求
+            return None
+
+        if _host_matches(host, self.block_domains):
+            return 'tracker'
+        if resource_type in self.blocked_types:
+            return resource_type
+        if self.block_third_party and not _host_matches(host, self.allow_domains):
+            return 'third_party'
+        return None
+
+    def _record(self, reason: Optional[str]):
+        if reason:
+            self.stats['blocked'] += 1
+            self.stats['by_reason'][reason] = self.stats['by_reason'].get(reason, 0) + 1
+        else:
+            self.stats['allowed'] += 1
+
+    def install(self, context):
+        """安裝到 BrowserContext（同步 API）"""
+        def handle(route):
+            reason = self.should_block(route.request.url, route.request.resource_type)
+            self._record(reason)
+            if reason:
+                route.abort()
+            else:
+                route.continue_()
+
+        context.route('**/*', handle)
+        logger.info(f"已啟用資源封鎖（{self.platform}）")
+
+    async def install_async(self, context):
+        """安裝到 BrowserContext（asyncio API）"""
+        async def handle(route):
+            reason = self.should_block(route.request.url, route.request.resource_type)
+            self._record(reason)
+            if reason:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route('**/*', handle)
+        logger.info(f"已啟用資源封鎖（{self.platform}）")
+
+def _summarize(samples: List[Dict]) -> Dict:
+    """計算多次量測的平均值"""
+    keys = ('dom_interactive_ms', 'dom_content_loaded_ms', 'load_ms', 'bytes', 'requests', 'wall_ms')
+    return {
+        key: sum(s[key] or 0 for s in samples) / len(samples)
+        for key in keys
+    }
+
+def benchmark_blocking(url: str, platform: str, runs: int = 3, headless: bool = True) -> Dict:
+    """比較啟用與停用資源封鎖時的頁面載入時間與傳輸量
+
+    每次量測都使用全新的 context，避免快取影響結果。
+    transferSize 對未提供 Timing-Allow-Origin 的跨網域資源為 0，傳輸量為下限估計。
+    """
+    from playwright.sync_api import sync_playwright
+
+    results = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=headless)
+        try:
+            for enabled in (False, True):
+                samples = []
+                blocked = 0
+                for _ in range(runs):
+                    context = browser.new_context()
+                    blocker = ResourceBlocker(platform) if enabled else None
+                    if blocker:
+                        blocker.install(context)
+                    page = context.new_page()
+                    start = time.perf_counter()
+                    page.goto(url, wait_until='load')
+                    wall_ms = (time.perf_counter() - start) * 1000
+                    metrics = page.evaluate(_PAGE_METRICS_JS)
+                    metrics['wall_ms'] = wall_ms
+                    samples.append(metrics)
+                    if blocker:
+                        blocked += blocker.stats['blocked']
+                    context.close()
+                summary = _summarize(samples)
+                summary['blocked_requests'] = blocked / runs
+                results['on' if enabled else 'off'] = summary
+        finally:
+            browser.close()
+
+    off, on = results['off'], results['on']
+    logger.info("資源封鎖效能比較（平均值）:")
+    for key, label in (
+        ('dom_interactive_ms', '可互動時間 (ms)'),
+        ('load_ms', 'load 事件 (ms)'),
+        ('wall_ms', '導航耗時 (ms)'),
+        ('bytes', '傳輸量 (bytes)'),
+        ('requests', '請求數'),
+    ):
+        saved = off[key] - on[key]
+        ratio = saved / off[key] * 100 if off[key] else 0
+        logger.info(f"  {label}: 停用 {off[key]:.0f} / 啟用 {on[key]:.0f}（減少 {ratio:.1f}%）")
+    return results
@@ -0,0 +1,189 @@
+"""
+購買執行：建立瀏覽器上下文並在頁面上依序執行初始化、預熱、等待與購買
+
+CLI（main.py）、批次、常駐與競速模式共用，匯入本模組不會載入 Playwright。
+"""
+import logging
+from typing import TYPE_CHECKING, Dict, Optional
+from utils import UserAgentManager, TimingContext
+from buyer import footprint
+from buyer.factory import PlatformFactory
+from buyer.instrument import Tracer, instrument_page
+from buyer.routing import ResourceBlocker
+from buyer.session import SessionCache
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
+    from buyer.base import BaseBuyer
+    from buyer.profile import BrowserProfile
+
+logger = logging.getLogger(__name__)
+
+def _context_options(viewport: Optional[dict] = None, profile: Optional['BrowserProfile'] = None) -> dict:
+    """瀏覽器上下文設定：有帳號的設定檔時沿用其 User-Agent、視窗大小、語系與時區，否則使用隨機 User-Agent"""
+    if profile is None:
+        user_agent = UserAgentManager.get_random_user_agent()
+        logger.info(f"使用 User-Agent: {user_agent}")
+        return dict(
+            user_agent=user_agent,
+            viewport=viewport or {'width': 1280, 'height': 800}
+        )
+
+    options = profile.context_options()
+    if viewport:
+        options['viewport'] = viewport
+    logger.info(f"使用帳號的瀏覽器設定檔: {profile.user_agent}")
+    return options
+
+def create_context(
+    browser,
+    url: Optional[str] = None,
+    block_resources: bool = False,
+    viewport: Optional[dict] = None,
+    profile: Optional['BrowserProfile'] = None,
+    low_footprint: bool = False,
+):
+    """建立瀏覽器上下文，套用帳號的設定檔（沒有時使用隨機 User-Agent），並可依平台封鎖不需要的資源
+
+    low_footprint 時停用頁面動畫，沒有設定檔與指定視窗時改用較小的視窗（buyer/footprint）。
+    """
+    options = _context_options(viewport, profile)
+    if low_footprint:
+        options = footprint.context_options(options, keep_viewport=profile is not None or viewport is not None)
+    context = browser.new_context(**options)
+    if low_footprint:
+        context.add_init_script(script=footprint.DISABLE_ANIMATIONS_JS)
+    if block_resources and url:
+        ResourceBlocker(PlatformFactory.detect_platform(url)).install(context)
+    return context
+
+async def create_context_async(
+    browser,
+    url: Optional[str] = None,
+    block_resources: bool = False,
+    viewport: Optional[dict] = None,
+    profile: Optional['BrowserProfile'] = None,
+    low_footprint: bool = False,
+):
+    """create_context 的 asyncio 版本"""
+    options = _context_options(viewport, profile)
+    if low_footprint:
+        options = footprint.context_options(options, keep_viewport=profile is not None or viewport is not None)
+    context = await browser.new_context(**options)
+    if low_footprint:
+        await context.add_init_script(script=footprint.DISABLE_ANIMATIONS_JS)
+    if block_resources and url:
+        await ResourceBlocker(PlatformFactory.detect_platform(url)).install_async(context)
+    return context
+
+def execute_purchase(
+    page: 'Page',
+    url: str,
+    scheduled_time: Optional[str] = None,
+    lead_ms: float = 0.0,
+    keep_alive_interval: float = 120.0,
+    session_cache: Optional[SessionCache] = None,
+    buyer_options: Optional[Dict] = None,
+    watch: Optional[Dict] = None,
+    tracer: Optional[Tracer] = None,
+) -> 'BaseBuyer':
+    """在指定頁面上依序執行初始化、預熱、等待與購買，各階段耗時記錄在 timing_stats['steps']
+
+    buyer_options 會傳給購買器（例如 api_checkout）；提供 watch（StockWatcher 的設定與 timeout）
+    時改為監看庫存，一旦可購買立即下單，不使用預定時間。
+    各階段與其中每個 Playwright 操作都會記錄為 tracer 的 span，由呼叫端決定是否匯出。
+    """
+    tracer = tracer or Tracer(PlatformFactory.detect_platform(url))
+    page = instrument_page(page, tracer)
+    steps = {}
+    
+    with tracer.activate():
+        # 建立對應平台的購買器
+        with TimingContext("初始化購買器") as timer:
+            buyer = PlatformFactory.create_buyer(url, page, session_cache=session_cache, **(buyer_options or {}))
+        steps['init'] = timer.duration_ms
+        buyer.timing_stats['steps'] = steps
+        
+        # 預熱：先載入商品頁並解析元素，讓 T-0 只剩點擊
+        with TimingContext("預熱購買頁面") as timer:
+            buyer.prepare()
+        steps['prepare'] = timer.duration_ms
+        
+        # 監看庫存或等待預定時間
+        if watch is not None:
+            with TimingContext("監看庫存") as timer:
+                buyer.watch_availability(**watch)
+            steps['watch'] = timer.duration_ms
+        elif scheduled_time:
+            logger.info(f"預定時間: {scheduled_time}")
+            with TimingContext("等待預定時間") as timer:
+                buyer.wait_for_scheduled_time(
+                    scheduled_time,
+                    lead_time_ms=lead_ms,
+                    keep_alive_interval=keep_alive_interval,
+                )
+            steps['wait'] = timer.duration_ms
+        
+        # 檢查商品
+        # with TimingContext("檢查商品資訊"):
+        #     product_info = buyer.check_product()
+        #     logger.info(f"商品資訊: {product_info}")
+
+        # 購買商品
+        with TimingContext("購買商品") as timer:
+            buyer.purchase()
+        steps['purchase'] = timer.duration_ms
+    
+    logger.info(f"預熱節省關鍵路徑時間: {buyer.timing_stats['prepare']['duration_ms']:.0f} ms")
+    buyer.timing_stats['trace'] = tracer.summary()
+    buyer.save_session()
+    return buyer
+
+async def execute_purchase_async(
+    page,
+    url: str,
+    scheduled_time: Optional[str] = None,
+    lead_ms: float = 0.0,
+    keep_alive_interval: float = 120.0,
+    session_cache: Optional[SessionCache] = None,
+    buyer_options: Optional[Dict] = None,
+    watch: Optional[Dict] = None,
+    tracer: Optional[Tracer] = None,
+):
+    """execute_purchase 的 asyncio 版本"""
+    tracer = tracer or Tracer(PlatformFactory.detect_platform(url))
+    page = instrument_page(page, tracer, is_async=True)
+    steps = {}
+    
+    with tracer.activate():
+        with TimingContext("初始化購買器") as timer:
+            buyer = await PlatformFactory.create_async_buyer(url, page, session_cache=session_cache, **(buyer_options or {}))
+        steps['init'] = timer.duration_ms
+        buyer.timing_stats['steps'] = steps
+        
+        with TimingContext("預熱購買頁面") as timer:
+            await buyer.prepare()
+        steps['prepare'] = timer.duration_ms
+        
+        if watch is not None:
+            with TimingContext("監看庫存") as timer:
+                await buyer.watch_availability(**watch)
+            steps['watch'] = timer.duration_ms
+        elif scheduled_time:
+            logger.info(f"預定時間: {scheduled_time}")
+            with TimingContext("等待預定時間") as timer:
+                await buyer.wait_for_scheduled_time(
+                    scheduled_time,
+                    lead_time_ms=lead_ms,
+                    keep_alive_interval=keep_alive_interval,
+                )
+            steps['wait'] = timer.duration_ms
+        
+        with TimingContext("購買商品") as timer:
+            await buyer.purchase()
+        steps['purchase'] = timer.duration_ms
+    
+    logger.info(f"預熱節省關鍵路徑時間: {buyer.timing_stats['prepare']['duration_ms']:.0f} ms")
+    buyer.timing_stats['trace'] = tracer.summary()
+    await buyer.save_session()
+    return buyer
@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Generator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SystemClock:
+    """系統時鐘（可在測試中替換）"""
+
+    def time(self) -> float:
+        """目前的牆上時間（epoch 秒）"""
+        return time.time()
+
+    def monotonic_ns(self) -> int:
+        """單調時鐘（奈秒）"""
+        return time.monotonic_ns()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class PrecisionScheduler:
+    """高精度排程器
+
+    先以粗粒度 sleep 接近目標時間，最後幾毫秒改用單調時鐘忙等，
+    讓點擊在目標時間 (T-0) 的毫秒內觸發。
+    clock_offset 為商店伺服器時間減本機時間（秒），目標時間視為伺服器時間。
+    """
+
+    def __init__(
+        self,
+        lead_time_ms: float = 0.0,
+        spin_window_ms: float = 20.0,
+        log_interval: float = 10.0,
+        clock: Optional[SystemClock] = None,
+        clock_offset: float = 0.0,
+    ):
+        self.lead_time_ms = lead_time_ms
+        self.clock_offset = clock_offset
+        self.spin_window_ms = spin_window_ms
+        self.log_interval = log_interval
+        self.clock = clock or SystemClock()
+
+    def wait_until(
+        self,
+        target_time: datetime.datetime,
+        on_idle: Optional[Callable[[], None]] = None,
+        idle_interval: float = 120.0,
+        idle_guard: float = 30.0,
+    ) -> Dict:
+        """等待直到目標時間減去提前量，回傳實際觸發的誤差統計
+
+        on_idle 會在等待期間每隔 idle_interval 秒被呼叫一次（例如保持登入），
+        距離目標時間 idle_guard 秒內不再呼叫，以免影響觸發精度。
+        """
+        plan = self._plan(target_time, on_idle is not None, idle_interval, idle_guard)
+        try:
+            action, value = next(plan)
+            while True:
+                if action == 'sleep':
+                    self.clock.sleep(value)
+                elif action == 'idle':
+                    try:
+                        on_idle()
+                    except Exception as e:
+                        logger.warning(f"等待期間的背景工作失敗: {str(e)}")
+                action, value = plan.send(None)
+        except StopIteration as stop:
+            return stop.value
+
+    async def wait_until_async(
+        self,
+        target_time: datetime.datetime,
+        on_idle: Optional[Callable[[], Awaitable[None]]] = None,
+        idle_interval: float = 120.0,
+        idle_guard: float = 30.0,
+    ) -> Dict:
+        """wait_until 的 asyncio 版本，忙等期間會讓出事件迴圈給其他頁面"""
+        plan = self._plan(target_time, on_idle is not None, idle_interval, idle_guard)
+        try:
+            action, value = next(plan)
+            while True:
+                if action == 'sleep':
+                    await self.clock.sleep_async(value)
+                elif action == 'idle':
+                    try:
+                        await on_idle()
+                    except Exception as e:
+                        logger.warning(f"等待期間的背景工作失敗: {str(e)}")
+                else:
+                    await asyncio.sleep(0)
+                action, value = plan.send(None)
+        except StopIteration as stop:
+            return stop.value
+
+    def _plan(
+        self,
+        target_time: datetime.datetime,
+        has_idle: bool,
+        idle_interval: float,
+        idle_guard: float,
+    ) -> Generator[Tuple[str, Optional[float]], None, Dict]:
+        """等待流程的核心，產生 ('sleep', 秒數)、('idle', None)、('spin', None) 交由呼叫端執行"""
+        # 只在開始時讀一次牆上時間，之後全部以單調時鐘計算，避免系統校時造成跳動
+        remaining_s = target_time.timestamp() - self.clock_offset - self.clock.time()
+        start_ns = self.clock.monotonic_ns()
+        deadline_ns = start_ns + int((remaining_s * 1000 - self.lead_time_ms) * 1_000_000)
+        spin_window_ns = int(self.spin_window_ms * 1_000_000)
+
+        coarse_sleeps = 0
+        spin_iterations = 0
+        idle_calls = 0
+        last_log_ns = start_ns
+        last_idle_ns = start_ns
+
+        while True:
+            now_ns = self.clock.monotonic_ns()
+            remaining_ns = deadline_ns - now_ns
+            if remaining_ns <= spin_window_ns:
+                break
+            if now_ns - last_log_ns >= self.log_interval * 1_000_000_000:
+                logger.info(f"等待中... 目標時間: {target_time}，剩餘 {remaining_ns / 1e9:.1f} 秒")
+                last_log_ns = now_ns
+            if (
+                has_idle
+                and now_ns - last_idle_ns >= idle_interval * 1_000_000_000
+                and remaining_ns > idle_guard * 1_000_000_000
+            ):
+                yield 'idle', None
+                idle_calls += 1
+                last_idle_ns = self.clock.monotonic_ns()
+                continue
+            # 每次最多睡 1 秒，並保留忙等視窗，避免 sleep 的排程誤差跨過目標時間
+            yield 'sleep', min((remaining_ns - spin_window_ns) / 1e9, 1.0)
+            coarse_sleeps += 1
+
+        while True:
+            fired_ns = self.clock.monotonic_ns()
+            if fired_ns >= deadline_ns:
+                break
+            spin_iterations += 1
+            yield 'spin', None
+
+        overshoot_ms = (fired_ns - deadline_ns) / 1_000_000
+        stats = {
+            'target_time': target_time.isoformat(),
+            'lead_time_ms': self.lead_time_ms,
+            'clock_offset_ms': self.clock_offset * 1000,
+            'waited_ms': (fired_ns - start_ns) / 1_000_000,
+            'overshoot_ms': overshoot_ms,
+            'coarse_sleeps': coarse_sleeps,
+            'spin_iterations': spin_iterations,
+            'idle_calls': idle_calls,
+        }
+        logger.info(f"到達目標時間 {target_time}，觸發誤差: {overshoot_ms:.3f} ms")
+        return stats
+
+
+def parse_scheduled_time(scheduled_time: str) -> datetime.datetime:
+    """解析預定時間，支援到微秒 (YYYY-MM-DD HH:MM:SS[.ffffff])"""
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(scheduled_time, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"無法解析預定時間: {scheduled_time}，格式應為 YYYY-MM-DD HH:MM:SS[.ffffff]")
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    from playwright.sync_api import BrowserContext
+
+logger = logging.getLogger(__name__)
+
+# 在頁面載入前寫回 localStorage，只作用於相同 origin。init script 在每次載入文件時都會執行，
+# 因此每個 origin 只寫一次（寫入後留下標記），且只補上不存在的項目，不會以舊快照覆蓋網站之後寫入的值
+_RESTORED_MARKER = '__session_cache_restored__'
+_RESTORE_LOCAL_STORAGE_JS = '''(origins => {
+    const entry = origins.find(o => o.origin === window.location.origin);
+    if (!entry || window.localStorage.getItem('%s') !== null) return;
+    for (const item of entry.localStorage) {
+        if (window.localStorage.getItem(item.name) === null) {
+            window.localStorage.setItem(item.name, item.value);
+        }
+    }
+    window.localStorage.setItem('%s', '1');
+})(%%s)''' % (_RESTORED_MARKER, _RESTORED_MARKER)
+
+# 已加入還原腳本的 context；常駐模式重複使用 context 時不再疊加腳本（context 的 localStorage 已是最新）
+_restored_contexts: 'weakref.WeakSet' = weakref.WeakSet()
+
+def write_private_json(path: Path, data: Dict):
+    """以只有擁有者可讀寫的權限寫入 JSON 檔"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 先寫暫存檔再取代，避免中斷時留下損毀的快取
+    tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, path)
+
+class SessionCache:
+    """登入狀態快取
+
+    以 Playwright 的 storage_state（cookies 與 localStorage）儲存在本機，
+    依平台與帳號分檔，下次執行可略過登入流程。
+    """
+    def __init__(self, cache_dir: str = '.auth', max_age: float = 12 * 3600):
+        self.cache_dir = Path(cache_dir)
+        self.max_age = max_age
+
+    def path_for(self, platform: str, account: str, suffix: str = 'state') -> Path:
+        """取得帳號對應的快取檔路徑（檔名不含帳號明文）"""
+        digest = hashlib.sha256(account.encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"{platform}_{digest}.{suffix}.json"
+
+    def load(self, platform: str, account: str) -> Optional[Dict]:
+        """讀取未過期的 storage_state，不存在或已失效時回傳 None"""
+        path = self.path_for(platform, account)
+        if not path.exists():
+            return None
+
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"讀取登入快取失敗: {str(e)}")
+            return None
+
+        age = time.time() - data.get('saved_at', 0)
+        if age > self.max_age:
+            logger.info(f"登入快取已超過 {self.max_age / 3600:.1f} 小時，視為過期")
+            return None
+
+        state = data.get('state', {})
+        now = time.time()
+        # expires 為 -1 代表 session cookie，其餘依到期時間過濾
+        cookies = [c for c in state.get('cookies', []) if c.get('expires', -1) < 0 or c['expires'] > now]
+        if not cookies:
+            logger.info("登入快取中的 cookies 皆已過期")
+            return None
+
+        state['cookies'] = cookies
+        return state
+
+    def save(self, platform: str, account: str, context: 'BrowserContext'):
+        """將目前 context 的 storage_state 寫入快取"""
+        self._write(platform, account, context.storage_state())
+
+    async def save_async(self, platform: str, account: str, context):
+        """save 的 asyncio 版本"""
+        self._write(platform, account, await context.storage_state())
+
+    def _write(self, platform: str, account: str, state: Dict):
+        path = self.path_for(platform, account)
+        write_private_json(path, {'saved_at': time.time(), 'state': state})
+        logger.info(f"已更新登入快取: {path}")
+
+    def invalidate(self, platform: str, account: str):
+        """刪除帳號的快取"""
+        path = self.path_for(platform, account)
+        if path.exists():
+            path.unlink()
+
+    @staticmethod
+    def _restore_script(context, state: Dict) -> Optional[str]:
+        """還原 localStorage 的 init script，沒有資料或 context 已加入過時回傳 None"""
+        origins = state.get('origins', [])
+        if not origins or context in _restored_contexts:
+            return None
+        _restored_contexts.add(context)
+        return _RESTORE_LOCAL_STORAGE_JS % json.dumps(origins)
+
+    @staticmethod
+    def restore(context: 'BrowserContext', state: Dict):
+        """將 storage_state 套用到已建立的 context"""
+        if state.get('cookies'):
+            context.add_cookies(state['cookies'])
+
+        script = SessionCache._restore_script(context, state)
+        if script:
+            context.add_init_script(script=script)
+
+    @staticmethod
+    async def restore_async(context, state: Dict):
+        """restore 的 asyncio 版本"""
+        if state.get('cookies'):
+            await context.add_cookies(state['cookies'])
+
+        script = SessionCache._restore_script(context, state)
+        if script:
+            await context.add_init_script(script=script)
@@ -0,0 +1,418 @@
+"""
+事件驅動的步驟引擎：每個步驟宣告成功、失敗與中途視窗的條件，在頁面內以單一
+MutationObserver 同時等待，任何條件成立的瞬間就返回，不必等到逾時或輪詢。
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generator, List, Optional, Sequence, Tuple
+from buyer.instrument import span
+
+logger = logging.getLogger(__name__)
+
+# 攔截 window.alert：記錄訊息並通知等待中的步驟（網站常以 alert 回報已售完、超過購買上限等錯誤）。
+# __buyerAlertsId 標示這份文件的紀錄，步驟只看自己開始之後的 alert
+ALERT_HOOK_JS = '''(() => {
+    if (window.__buyerAlerts) return;
+    window.__buyerAlerts = [];
+    window.__buyerAlertsId = `${Date.now()}-${Math.random()}`;
+    window.alert = (message) => {
+        window.__buyerAlerts.push(String(message));
+        window.dispatchEvent(new Event('buyer-alert'));
+    };
+})()'''
+
+# 依序檢查條件（失敗、中途視窗、成功），都不成立時以 MutationObserver 等待 DOM 變化。
+# 指定 click 時在頁面內點擊該元素（元素尚未出現時等到出現），點擊前只檢查失敗條件；
+# 指定 interstitials 時中途視窗也在頁面內點掉，整個步驟只需一次往返。
+# alertMark 為上一個步驟結束時的 alert 位置，同一份文件中更早的 alert 不再列入條件。
+# 點過的中途視窗在 settleMs 內（或元素移除前）不再比對，關閉較慢的視窗不會被重複點擊；
+# settle 為頁面外點擊後各中途視窗剩餘的等待毫秒數。
+WAIT_JS = '''async ({conditions, timeout, failures, click, interstitials, maxInterstitials, alertMark, settle, settleMs}) => {
+    const visible = (el) => {
+        const style = window.getComputedStyle(el);
+        return style.visibility !== 'hidden' && style.display !== 'none' && el.getClientRects().length > 0;
+    };
+    const find = (selector, text) => Array.from(document.querySelectorAll(selector))
+        .find(el => visible(el) && (!text || el.textContent.includes(text)));
+    const alertStart = alertMark && alertMark.id === window.__buyerAlertsId ? alertMark.index : 0;
+    const alerts = () => (window.__buyerAlerts || []).slice(alertStart);
+    const matches = (c) => {
+        if (c.url && !window.location.href.includes(c.url)) return false;
+        if (c.alert !== null && !alerts().some(m => m.includes(c.alert))) return false;
+        if (c.selector) return !!find(c.selector, c.text);
+        if (c.text) return !!document.body && document.body.textContent.includes(c.text);
+        return true;
+    };
+    const failureNames = new Set(failures || []);
+    const handled = [];
+    let pending = click || null;
+    let recheck = null;
+    const started = performance.now();
+    const settling = new Map(Object.entries(settle || {}).map(([name, ms]) => [name, {el: null, until: started + ms}]));
+    const isSettling = (name, el) => {
+        const s = settling.get(name);
+        if (!s || performance.now() >= s.until || (s.el && s.el !== el)) return false;
+        // 等待期間沒有 DOM 變化時，期滿後也要再檢查一次
+        if (!s.timer) s.timer = setTimeout(() => recheck && recheck(), s.until - performance.now() + 1);
+        return true;
+    };
+    const check = () => {
+        for (const c of conditions) {
+            if (!matches(c)) continue;
+            if (failureNames.has(c.name)) return c.name;
+            if (pending) continue;
+            const target = interstitials && interstitials[c.name];
+            const el = target ? find(target[0], target[1]) : null;
+            if (isSettling(c.name, el)) continue;
+            if (!target) return c.name;
+            if (handled.length >= maxInterstitials) return c.name;
+            if (el) {
+                handled.push(c.name);
+                el.click();
+                settling.set(c.name, {el, until: performance.now() + settleMs});
+            }
+            return null;
+        }
+        if (pending) {
+            const el = find(pending[0], pending[1]);
+            if (el) {
+                pending = null;
+                el.click();
+                return check();
+            }
+        }
+        return null;
+    };
+    const result = (name) => ({
+        matched: name,
+        alerts: alerts(),
+        url: window.location.href,
+        clicked: !!click && pending === null,
+        interstitials: handled,
+        alertMark: {id: window.__buyerAlertsId || null, index: (window.__buyerAlerts || []).length},
+    });
+
+    const hit = check();
+    if (hit || timeout <= 0) return result(hit);
+    return await new Promise(resolve => {
+        const onChange = () => {
+            const name = check();
+            if (name) finish(name);
+        };
+        const observer = new MutationObserver(onChange);
+        const timer = setTimeout(() => finish(null), timeout);
+        recheck = onChange;
+        const finish = (name) => {
+            recheck = null;
+            observer.disconnect();
+            clearTimeout(timer);
+            window.removeEventListener('buyer-alert', onChange);
+            resolve(result(name));
+        };
+        observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        window.addEventListener('buyer-alert', onChange);
+    });
+}'''
+
+# 點過的中途視窗在這段時間內（或元素移除前）不再比對（毫秒）
+INTERSTITIAL_SETTLE_MS = 500
+
+# 導航時正在執行的 evaluate 會失敗，這些訊息代表應在新頁面上繼續等待
+_NAVIGATION_ERRORS = ('Execution context was destroyed', 'navigation', 'Cannot find context')
+
+class StepError(Exception):
+    """步驟失敗"""
+    def __init__(self, message: str, step: str, condition: Optional[str] = None):
+        super().__init__(message)
+        self.step = step
+        self.condition = condition
+
+class StepFailed(StepError):
+    """失敗條件成立（例如已售完、排隊頁面、錯誤訊息）"""
+    pass
+
+class StepTimeout(StepError):
+    """逾時前沒有任何條件成立"""
+    pass
+
+@dataclass(frozen=True)
+class Condition:
+    """頁面狀態條件，所有指定的欄位都符合才成立
+
+    selector: 有可見元素符合的 CSS 選擇器（搭配 text 時元素文字需包含 text）
+    text: 未指定 selector 時，頁面文字包含 text
+    url: 目前網址包含 url
+    alert: 曾出現包含此文字的 alert（空字串代表任何 alert）
+    """
+    name: str
+    selector: Optional[str] = None
+    text: Optional[str] = None
+    url: Optional[str] = None
+    alert: Optional[str] = None
+
+    def to_js(self) -> Dict:
+        return {
+            'name': self.name,
+            'selector': self.selector,
+            'text': self.text,
+            'url': self.url,
+            'alert': self.alert,
+        }
+
+@dataclass(frozen=True)
+class Interstitial:
+    """中途出現的視窗：條件成立時點擊 click（預設為條件本身的元素）後繼續等待"""
+    condition: Condition
+    click: Optional[str] = None
+
+    @property
+    def target(self) -> Tuple[str, Optional[str]]:
+        """回傳 (選擇器, 文字)"""
+        if self.click:
+            return self.click, None
+        return self.condition.selector, self.condition.text
+
+@dataclass
+class Step:
+    """一個步驟：執行 action（或點擊 click 指定的 (選擇器, 文字)）後，等待 success 任一條件成立
+
+    failure 任一成立時拋出 StepFailed，interstitial 成立時處理後繼續等待，
+    timeout（秒）內都不成立則拋出 StepTimeout。timeout 為 0 代表只檢查目前狀態。
+    in_page 為 True 時，click 與中途視窗都在頁面腳本內點擊，沒有導航的步驟只需一次往返；
+    頁面內的點擊不是使用者觸發的事件（isTrusted 為 false），只用於不檢查此屬性的元素。
+    """
+    name: str
+    success: Sequence[Condition]
+    action: Optional[Callable[[], Any]] = None
+    click: Optional[Tuple[str, Optional[str]]] = None
+    in_page: bool = False
+    failure: Sequence[Condition] = ()
+    interstitial: Sequence[Interstitial] = ()
+    timeout: float = 10.0
+    error: str = ''
+    max_interstitials: int = 3
+    _conditions_js: List[Dict] = field(default=None, init=False, repr=False, compare=False)
+
+    def conditions_js(self) -> List[Dict]:
+        """頁面腳本的條件參數，第一次使用時編譯並保留"""
+        if self._conditions_js is None:
+            # 失敗條件優先，其次是中途視窗，最後才是成功條件
+            ordered = list(self.failure) + [i.condition for i in self.interstitial] + list(self.success)
+            self._conditions_js = [c.to_js() for c in ordered]
+        return self._conditions_js
+
+@dataclass
+class StepResult:
+    """步驟結果"""
+    step: str
+    outcome: str
+    condition: Optional[str] = None
+    duration_ms: float = 0.0
+    waits: int = 0
+    # 與瀏覽器之間的往返次數（動作、點擊與等待）
+    round_trips: int = 0
+    interstitials: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            'step': self.step,
+            'outcome': self.outcome,
+            'condition': self.condition,
+            'duration_ms': self.duration_ms,
+            'waits': self.waits,
+            'round_trips': self.round_trips,
+            'interstitials': self.interstitials,
+        }
+
+def _is_navigation_error(error: Exception) -> bool:
+    return any(text in str(error) for text in _NAVIGATION_ERRORS)
+
+def count_round_trips(results: Sequence[StepResult]) -> int:
+    """步驟結果的瀏覽器往返總數"""
+    return sum(r.round_trips for r in results)
+
+class StepEngine:
+    """以同步 API 執行步驟，history 保留每個步驟的結果"""
+    def __init__(self, page, clock=time.perf_counter):
+        self.page = page
+        self.history: List[StepResult] = []
+        self._clock = clock
+        self._installed = False
+        # 上一個步驟結束時的 alert 位置，下一個步驟只看之後出現的 alert
+        self._alert_mark: Dict = {}
+
+    def install(self):
+        """在之後載入的每個頁面攔截 alert，需在導航到商品頁前呼叫"""
+        if not self._installed:
+            self.page.add_init_script(script=ALERT_HOOK_JS)
+            self._installed = True
+
+    def run(self, step: Step, action: Optional[Callable[[], Any]] = None) -> Optional[str]:
+        """執行步驟，回傳成立的成功條件名稱；action 會取代步驟本身的動作"""
+        plan = _plan(step, action or step.action, self._clock, self.history, self._alert_mark)
+        with span(f"step.{step.name}"):
+            try:
+                command, value = next(plan)
+                while True:
+                    if command == 'act':
+                        value()
+                        reply = None
+                    elif command == 'click':
+                        selector, text = value
+                        self.page.locator(selector, has_text=text).first.click()
+                        reply = None
+                    else:
+                        try:
+                            reply = self.page.evaluate(WAIT_JS, value)
+                        except Exception as e:
+                            if not _is_navigation_error(e):
+                                raise
+                            reply = 'navigated'
+                    command, value = plan.send(reply)
+            except StopIteration as stop:
+                return stop.value
+
+class AsyncStepEngine:
+    """StepEngine 的 asyncio 版本"""
+    def __init__(self, page, clock=time.perf_counter):
+        self.page = page
+        self.history: List[StepResult] = []
+        self._clock = clock
+        self._installed = False
+        # 上一個步驟結束時的 alert 位置，下一個步驟只看之後出現的 alert
+        self._alert_mark: Dict = {}
+
+    async def install(self):
+        """在之後載入的每個頁面攔截 alert，需在導航到商品頁前呼叫"""
+        if not self._installed:
+            await self.page.add_init_script(script=ALERT_HOOK_JS)
+            self._installed = True
+
+    async def run(self, step: Step, action: Optional[Callable[[], Any]] = None) -> Optional[str]:
+        """執行步驟，回傳成立的成功條件名稱；action 會取代步驟本身的動作"""
+        plan = _plan(step, action or step.action, self._clock, self.history, self._alert_mark)
+        with span(f"step.{step.name}"):
+            try:
+                command, value = next(plan)
+                while True:
+                    if command == 'act':
+                        result = value()
+                        if hasattr(result, '__await__'):
+                            await result
+                        reply = None
+                    elif command == 'click':
+                        selector, text = value
+                        await self.page.locator(selector, has_text=text).first.click()
+                        reply = None
+                    else:
+                        try:
+                            reply = await self.page.evaluate(WAIT_JS, value)
+                        except Exception as e:
+                            if not _is_navigation_error(e):
+                                raise
+                            reply = 'navigated'
+                    command, value = plan.send(reply)
+            except StopIteration as stop:
+                return stop.value
+
+def _plan(
+    step: Step, action, clock, history: List[StepResult], alert_mark: Optional[Dict] = None,
+) -> Generator[Tuple[str, Any], Any, Optional[str]]:
+    """步驟流程的核心，產生 ('act', 函式)、('wait', 參數)、('click', (選擇器, 文字)) 交由引擎執行
+
+    wait 的回覆為頁面回傳的結果，或導航中斷時的 'navigated'。沒有任何條件的步驟只執行動作。
+    alert_mark 為引擎保留的 alert 位置，步驟結束時更新為頁面最新的位置。
+    """
+    start = clock()
+    deadline = start + step.timeout
+    result = StepResult(step=step.name, outcome='timeout')
+    success = {c.name for c in step.success}
+    failure = {c.name for c in step.failure}
+    interstitials = {i.condition.name: i for i in step.interstitial}
+    conditions = step.conditions_js()
+    alert_mark = {} if alert_mark is None else alert_mark
+    start_mark = dict(alert_mark) if alert_mark.get('id') else None
+    latest_mark = None
+
+    def finish(outcome: str, condition: Optional[str] = None):
+        result.outcome = outcome
+        result.condition = condition
+        result.duration_ms = (clock() - start) * 1000
+        history.append(result)
+        if latest_mark:
+            alert_mark.update(latest_mark)
+
+    if action is not None:
+        result.round_trips += 1
+        yield 'act', action
+    elif step.click and not step.in_page:
+        result.round_trips += 1
+        yield 'click', step.click
+    if not conditions and not (step.click and step.in_page):
+        finish('success')
+        return None
+
+    # 頁面內點擊尚未完成時，每次等待都帶著點擊目標
+    pending_click = step.click if step.in_page else None
+    in_page_interstitials = {
+        name: list(i.target) for name, i in interstitials.items()
+    } if step.in_page else None
+    # 頁面外點過的中途視窗 -> 停止比對的期限
+    settle_until: Dict[str, float] = {}
+
+    while True:
+        remaining_ms = max((deadline - clock()) * 1000, 0)
+        reply = yield 'wait', {
+            'conditions': conditions,
+            'timeout': remaining_ms,
+            'failures': list(failure),
+            'click': list(pending_click) if pending_click else None,
+            'interstitials': in_page_interstitials,
+            'maxInterstitials': step.max_interstitials - len(result.interstitials),
+            'alertMark': start_mark,
+            'settle': {name: (until - clock()) * 1000 for name, until in settle_until.items() if until > clock()},
+            'settleMs': INTERSTITIAL_SETTLE_MS,
+        }
+        result.waits += 1
+        result.round_trips += 1
+        if reply == 'navigated':
+            # 頁面內點擊後導航，視為已點擊
+            pending_click = None
+            if remaining_ms > 0:
+                continue
+            reply = {'matched': None, 'alerts': []}
+
+        latest_mark = reply.get('alertMark') or latest_mark
+        if reply.get('clicked'):
+            pending_click = None
+        handled = reply.get('interstitials') or []
+        if handled:
+            logger.info(f"{step.name}：已在頁面內處理中途視窗 {', '.join(handled)}")
+            result.interstitials.extend(handled)
+
+        matched = reply.get('matched')
+        if matched in failure:
+            finish('failure', matched)
+            alerts = reply.get('alerts') or []
+            detail = f"：{alerts[-1]}" if alerts else ''
+            raise StepFailed(f"{step.error or step.name + ' 失敗'}（{matched}）{detail}", step.name, matched)
+        if matched in interstitials:
+            if step.in_page or len(result.interstitials) >= step.max_interstitials:
+                finish('failure', matched)
+                raise StepFailed(f"{step.name} 的中途視窗 {matched} 反覆出現", step.name, matched)
+            result.interstitials.append(matched)
+            logger.info(f"{step.name}：處理中途視窗 {matched}")
+            result.round_trips += 1
+            yield 'click', interstitials[matched].target
+            settle_until[matched] = clock() + INTERSTITIAL_SETTLE_MS / 1000
+            continue
+        if matched in success:
+            finish('success', matched)
+            logger.info(f"{step.name} 完成（{matched}，{result.duration_ms:.0f} ms）")
+            return matched
+
+        finish('timeout')
+        if pending_click:
+            raise StepTimeout(f"{step.error or step.name + ' 逾時'}（{step.timeout:.1f} 秒內找不到 {pending_click[0]}）", step.name)
+        raise StepTimeout(f"{step.error or step.name + ' 逾時'}（{step.timeout:.1f} 秒內沒有任何條件成立）", step.name)
@@ -0,0 +1,273 @@
+"""
+執行紀錄：每次購買結束後在本機 SQLite 追加一筆精簡紀錄（平台、各步驟耗時、結果、重試次數、
+傳輸量），供 stats 子命令計算百分位數、步驟退化與每日成功率。
+"""
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from buyer.instrument import Tracer, percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = 'telemetry.db'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    platform TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    account TEXT,
+    success INTEGER NOT NULL,
+    error TEXT,
+    total_ms REAL NOT NULL,
+    retries INTEGER NOT NULL DEFAULT 0,
+    requests INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    actions INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_platform_started ON runs (platform, started_at);
+CREATE TABLE IF NOT EXISTS steps (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    step TEXT NOT NULL,
+    duration_ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS steps_run ON steps (run);
+'''
+
+class NetworkMeter:
+    """以 context 或 page 的 response 事件累計請求數與傳輸量
+
+    只讀取已在事件中的回應標頭（content-length），不會多一次瀏覽器往返；
+    以 context.request 送出的 API 請求不會觸發此事件，因此不計入。
+    """
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def attach(self, target) -> 'NetworkMeter':
+        """開始計算 target（context 或 page）的回應"""
+        target.on('response', self._on_response)
+        return self
+
+    def detach(self, target):
+        """停止計算（用於會被後續工作沿用的 page）"""
+        target.remove_listener('response', self._on_response)
+
+    def _on_response(self, response):
+        try:
+            size = int(response.headers.get('content-length', 0))
+        except (TypeError, ValueError):
+            size = 0
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+
+@dataclass
+class RunRecord:
+    """單次執行的精簡紀錄"""
+    run_id: str
+    platform: str
+    success: bool
+    total_ms: float
+    started_at: float = field(default_factory=time.time)
+    mode: str = 'single'
+    account: Optional[str] = None
+    error: Optional[str] = None
+    retries: int = 0
+    requests: int = 0
+    bytes: int = 0
+    actions: int = 0
+    steps: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def from_run(
+        cls,
+        tracer: Tracer,
+        platform: str,
+        success: bool,
+        total_ms: float,
+        error: Optional[str] = None,
+        timing_stats: Optional[Dict] = None,
+        meter: Optional[NetworkMeter] = None,
+        **kwargs,
+    ) -> 'RunRecord':
+        """由 tracer 的 span 取各步驟耗時（不含個別 Playwright 操作），同一步驟多次出現時加總
+
+        重試次數優先取 timing_stats 的 retries，沒有時以 recovery span 的數量計算（購買失敗時沒有 timing_stats）。
+        """
+        steps: Dict[str, float] = {}
+        recoveries = 0
+        for span in tracer.spans:
+            if span.name == 'recovery':
+                recoveries += 1
+            if span.duration_ms is None or span.attrs.get('kind') == 'action':
+                continue
+            steps[span.path] = steps.get(span.path, 0.0) + span.duration_ms
+        return cls(
+            run_id=tracer.run_id,
+            platform=platform,
+            success=success,
+            total_ms=total_ms,
+            started_at=tracer.started_at,
+            error=(error or '')[:500] or None,
+            retries=int((timing_stats or {}).get('retries', recoveries)),
+            requests=meter.requests if meter else 0,
+            bytes=meter.bytes if meter else 0,
+            actions=tracer.action_count,
+            steps=steps,
+            **kwargs,
+        )
+
+class TelemetryStore:
+    """SQLite 執行紀錄
+
+    每次寫入都開啟新的連線，批次的工作執行緒與常駐程序可同時寫入同一個檔案；
+    寫入失敗只記錄警告，不影響購買結果。
+    """
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = Path(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def record(self, record: RunRecord) -> Optional[int]:
+        """追加一筆紀錄，回傳 runs 的 id"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                cursor = conn.execute(
+                    'INSERT INTO runs (run_id, started_at, platform, mode, account, success, error, total_ms,'
+                    ' retries, requests, bytes, actions) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        record.run_id, record.started_at, record.platform, record.mode, record.account,
+                        int(record.success), record.error, record.total_ms, record.retries,
+                        record.requests, record.bytes, record.actions,
+                    ),
+                )
+                run = cursor.lastrowid
+                conn.executemany(
+                    'INSERT INTO steps (run, step, duration_ms) VALUES (?, ?, ?)',
+                    [(run, step, ms) for step, ms in record.steps.items()],
+                )
+                return run
+        except sqlite3.Error as e:
+            logger.warning(f"寫入執行紀錄失敗: {str(e)}")
+            return None
+
+    def runs(self, platform: Optional[str] = None, since: Optional[float] = None) -> List[Dict]:
+        """依時間排序讀取執行紀錄，每筆附上 steps"""
+        where, params = [], []
+        if platform:
+            where.append('platform = ?')
+            params.append(platform)
+        if since is not None:
+            where.append('started_at >= ?')
+            params.append(since)
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = [dict(r) for r in conn.execute(f'SELECT * FROM runs {clause} ORDER BY started_at, id', params)]
+            steps: Dict[int, Dict[str, float]] = {}
+            if rows:
+                marks = ','.join('?' * len(rows))
+                for run, step, ms in conn.execute(
+                    f'SELECT run, step, duration_ms FROM steps WHERE run IN ({marks})', [r['id'] for r in rows]
+                ):
+                    steps.setdefault(run, {})[step] = ms
+        for row in rows:
+            row['success'] = bool(row['success'])
+            row['steps'] = steps.get(row['id'], {})
+        return rows
+
+def _distribution(values: List[float]) -> Dict:
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50),
+        'p90_ms': percentile(values, 90),
+        'p99_ms': percentile(values, 99),
+    }
+
+def compute_stats(runs: List[Dict], recent: int = 20, threshold: float = 0.2, min_delta_ms: float = 5.0) -> Dict:
+    """彙整執行紀錄
+
+    overall：總耗時百分位數與成功率；daily：每日成功率與 p50；
+    steps：每個步驟以最近 recent 次與更早的執行比較 p50，
+    變慢超過 threshold 比例且至少 min_delta_ms 時標記為 regression。
+    """
+    if not runs:
+        return {'overall': None, 'daily': [], 'steps': {}}
+
+    succeeded = sum(1 for r in runs if r['success'])
+    overall = _distribution([r['total_ms'] for r in runs])
+    overall.update(
+        success_rate=succeeded / len(runs),
+        retries=sum(r['retries'] for r in runs),
+        mean_bytes=sum(r['bytes'] for r in runs) / len(runs),
+    )
+
+    days: Dict[str, List[Dict]] = {}
+    for run in runs:
+        days.setdefault(time.strftime('%Y-%m-%d', time.localtime(run['started_at'])), []).append(run)
+    daily = [
+        {
+            'date': date,
+            'runs': len(items),
+            'success_rate': sum(1 for r in items if r['success']) / len(items),
+            'p50_ms': percentile([r['total_ms'] for r in items], 50),
+        }
+        for date, items in days.items()
+    ]
+
+    steps = {}
+    for path in dict.fromkeys(p for r in runs for p in r['steps']):
+        values = [r['steps'][path] for r in runs if path in r['steps']]
+        baseline, latest = values[:-recent], values[-recent:]
+        entry = {'runs': len(values), 'recent_p50_ms': percentile(latest, 50), 'recent_p95_ms': percentile(latest, 95)}
+        entry['baseline_p50_ms'] = percentile(baseline, 50)
+        entry['regression'] = bool(
+            baseline
+            and entry['recent_p50_ms'] - entry['baseline_p50_ms'] >= min_delta_ms
+            and entry['recent_p50_ms'] > entry['baseline_p50_ms'] * (1 + threshold)
+        )
+        steps[path] = entry
+    return {'overall': overall, 'daily': daily, 'steps': steps}
+
+def _ms(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value:.1f}"
+
+def format_stats(stats: Dict) -> str:
+    """把 compute_stats 的結果排成文字報告"""
+    overall = stats['overall']
+    if overall is None:
+        return '沒有執行紀錄'
+    lines = [
+        f"共 {overall['count']} 次執行，成功率 {overall['success_rate']:.0%}，重試 {overall['retries']} 次，"
+        f"平均傳輸 {overall['mean_bytes'] / 1024:.0f} KB",
+        f"總耗時 p50 {_ms(overall['p50_ms'])} ms，p90 {_ms(overall['p90_ms'])} ms，p99 {_ms(overall['p99_ms'])} ms",
+        '',
+        f"{'日期':<12} {'執行':>5} {'成功率':>8} {'p50 ms':>10}",
+    ]
+    for day in stats['daily']:
+        lines.append(f"{day['date']:<12} {day['runs']:>5} {day['success_rate']:>8.0%} {_ms(day['p50_ms']):>10}")
+    lines += ['', f"{'步驟':<50} {'執行':>5} {'基準 p50':>10} {'近期 p50':>10} {'近期 p95':>10}"]
+    for path, entry in stats['steps'].items():
+        depth = path.count('/')
+        label = '  ' * depth + path.rsplit('/', 1)[-1]
+        mark = '  ⚠ 變慢' if entry['regression'] else ''
+        lines.append(
+            f"{label[:50]:<50} {entry['runs']:>5} {_ms(entry['baseline_p50_ms']):>10} "
+            f"{_ms(entry['recent_p50_ms']):>10} {_ms(entry['recent_p95_ms']):>10}{mark}"
+        )
+    return '\n'.join(lines)
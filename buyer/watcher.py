@@ -0,0 +1,121 @@
+import logging
+import random
+from typing import Awaitable, Callable, Dict, Generator, Optional, Tuple
+from buyer.instrument import percentile
+from buyer.scheduler import SystemClock
+
+logger = logging.getLogger(__name__)
+
+class StockWatcher:
+    """高頻率輪詢商品是否可購買
+
+    輪詢間隔會依探測耗時自動調整（不低於探測耗時的 latency_factor 倍，避免對網站造成壓力），
+    探測失敗時以指數退避拉長間隔，恢復後回到最短間隔；每次間隔都加上隨機抖動。
+    """
+    def __init__(
+        self,
+        min_interval: float = 0.3,
+        max_interval: float = 5.0,
+        jitter: float = 0.2,
+        backoff: float = 2.0,
+        latency_factor: float = 1.5,
+        clock: Optional[SystemClock] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("輪詢間隔設定不正確")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.clock = clock or SystemClock()
+        self.rng = rng or random.Random()
+
+    def watch(self, probe: Callable[[], bool], timeout: Optional[float] = None) -> Dict:
+        """重複呼叫 probe 直到回傳 True，逾時則拋出 TimeoutError"""
+        plan = self._plan(timeout)
+        try:
+            action, value = next(plan)
+            while True:
+                if action == 'sleep':
+                    self.clock.sleep(value)
+                    result = None
+                else:
+                    try:
+                        result = bool(probe())
+                    except Exception as e:
+                        result = e
+                action, value = plan.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+    async def watch_async(self, probe: Callable[[], Awaitable[bool]], timeout: Optional[float] = None) -> Dict:
+        """watch 的 asyncio 版本"""
+        plan = self._plan(timeout)
+        try:
+            action, value = next(plan)
+            while True:
+                if action == 'sleep':
+                    await self.clock.sleep_async(value)
+                    result = None
+                else:
+                    try:
+                        result = bool(await probe())
+                    except Exception as e:
+                        result = e
+                action, value = plan.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+    def _next_interval(self, interval: float, latency_s: float, failed: bool) -> float:
+        """計算下一次輪詢的基準間隔"""
+        if failed:
+            return min(interval * self.backoff, self.max_interval)
+        return min(max(self.min_interval, latency_s * self.latency_factor), self.max_interval)
+
+    def _plan(self, timeout: Optional[float]) -> Generator[Tuple[str, Optional[float]], object, Dict]:
+        """輪詢流程的核心，產生 ('probe', None) 與 ('sleep', 秒數) 交由呼叫端執行"""
+        start_ns = self.clock.monotonic_ns()
+        deadline_ns = None if timeout is None else start_ns + int(timeout * 1e9)
+        interval = self.min_interval
+        latencies = []
+        errors = 0
+
+        while True:
+            probe_start = self.clock.monotonic_ns()
+            result = yield 'probe', None
+            detected_ns = self.clock.monotonic_ns()
+            latency_s = (detected_ns - probe_start) / 1e9
+            latencies.append(latency_s * 1000)
+
+            failed = isinstance(result, Exception)
+            if failed:
+                errors += 1
+                logger.warning(f"庫存探測失敗: {str(result)}")
+            elif result:
+                break
+
+            interval = self._next_interval(interval, latency_s, failed)
+            delay = interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+            if deadline_ns is not None and detected_ns + delay * 1e9 > deadline_ns:
+                raise TimeoutError(f"監看逾時，共探測 {len(latencies)} 次仍無法購買")
+            if len(latencies) % 50 == 0:
+                logger.info(f"監看中... 已探測 {len(latencies)} 次，目前間隔 {interval * 1000:.0f} ms")
+            yield 'sleep', delay
+
+        stats = {
+            'probes': len(latencies),
+            'errors': errors,
+            'elapsed_ms': (detected_ns - start_ns) / 1e6,
+            'latency_p50_ms': percentile(latencies, 50),
+            'latency_p95_ms': percentile(latencies, 95),
+            'latency_max_ms': max(latencies),
+            # 最後一次探測的耗時，即商品開賣到程式察覺的延遲上限之一
+            'detect_latency_ms': latencies[-1],
+        }
+        logger.info(
+            f"偵測到可購買（探測 {stats['probes']} 次，p50 {stats['latency_p50_ms']:.0f} ms，"
+            f"p95 {stats['latency_p95_ms']:.0f} ms）"
+        )
+        return stats
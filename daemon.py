@@ -0,0 +1,364 @@
+"""
+常駐模式：保持 Chromium 與已登入的 context，CLI 透過本機 socket 送出工作
+
+每次執行 main.py 都要啟動 Playwright、瀏覽器與 context，需要數秒；
+常駐程序在啟動時完成這些工作（可先登入指定平台），之後每筆工作只需取用現成的 context。
+通訊協定為 UNIX domain socket 上的 JSON lines：每行一個請求，回應一行 JSON。
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from batch import BatchJob, JobResult
+from buyer.factory import PlatformFactory
+from buyer.footprint import MemoryWatchdog, launch_options
+from buyer.instrument import Tracer
+from buyer.session import SessionCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '.auth/daemon.sock'
+
+# 單行請求的大小上限，避免異常的用戶端佔用記憶體
+MAX_REQUEST_BYTES = 1 << 20
+
+class BrowserPool:
+    """管理多個已啟動的瀏覽器，以及依平台與帳號保留的閒置 context
+
+    context 用完後若頁面仍可用就放回閒置池，下次同平台、同帳號的工作直接沿用，
+    登入狀態（cookies）與瀏覽器設定檔也跟著保留；其他帳號不會取得這個 context。low_footprint 以低資源模式啟動瀏覽器與 context；
+    瀏覽器記憶體超過 memory_limit_mb 時，建立新 context 前先關閉閒置的 context 並等待記憶體釋放。
+    """
+    def __init__(
+        self,
+        browsers: int = 1,
+        headless: bool = True,
+        block_resources: bool = False,
+        max_idle: int = 4,
+        low_footprint: bool = False,
+        memory_limit_mb: Optional[float] = None,
+    ):
+        if browsers < 1:
+            raise ValueError("browsers 必須大於 0")
+        self.size = browsers
+        self.headless = headless
+        self.block_resources = block_resources
+        self.max_idle = max_idle
+        self.low_footprint = low_footprint
+        self.watchdog = MemoryWatchdog(limit_mb=memory_limit_mb)
+        self._playwright = None
+        self._browsers = []
+        # (平台, 帳號) -> [(context, page)]
+        self._idle: Dict[Tuple[str, Optional[str]], List[Tuple]] = defaultdict(list)
+        self._next = 0
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0}
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        for _ in range(self.size):
+            self._browsers.append(await self._playwright.chromium.launch(**launch_options(self.headless, self.low_footprint)))
+        self.watchdog.start()
+        logger.info(f"已啟動 {self.size} 個瀏覽器")
+
+    async def close(self):
+        self.watchdog.stop()
+        for entries in self._idle.values():
+            for context, _ in entries:
+                await self._discard(context)
+        self._idle.clear()
+        for browser in self._browsers:
+            await _close_quietly(browser)
+        self._browsers.clear()
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _browser(self):
+        """輪流分配瀏覽器，已中斷的瀏覽器會重新啟動"""
+        index = self._next % self.size
+        self._next += 1
+        browser = self._browsers[index]
+        if not browser.is_connected():
+            logger.warning("瀏覽器連線已中斷，重新啟動")
+            browser = await self._playwright.chromium.launch(**launch_options(self.headless, self.low_footprint))
+            self._browsers[index] = browser
+        return browser
+
+    async def acquire(self, url: str, profile=None, account: Optional[str] = None):
+        """取得該平台與帳號的 (context, page)，優先使用同一帳號閒置的 context；新建時套用帳號的瀏覽器設定檔（profile）"""
+        from buyer.runner import create_context_async
+
+        key = (PlatformFactory.detect_platform(url), account)
+        while self._idle[key]:
+            context, page = self._idle[key].pop()
+            if not page.is_closed():
+                self.stats['reused'] += 1
+                return context, page
+            await self._discard(context)
+
+        await self._ensure_headroom()
+        context = await create_context_async(
+            await self._browser(), url, self.block_resources, profile=profile, low_footprint=self.low_footprint,
+        )
+        self.watchdog.context_opened()
+        page = await context.new_page()
+        self.stats['created'] += 1
+        return context, page
+
+    async def _ensure_headroom(self):
+        """記憶體超過上限時先關閉所有閒置的 context，仍不足再等待"""
+        if not self.watchdog.limit_mb:
+            return
+        self.watchdog.sample()
+        if self.watchdog.over_limit and any(self._idle.values()):
+            logger.info("瀏覽器記憶體超過上限，關閉閒置的 context")
+            for entries in self._idle.values():
+                while entries:
+                    context, _ = entries.pop()
+                    self.stats['discarded'] += 1
+                    await self._discard(context)
+        await asyncio.to_thread(self.watchdog.wait_for_headroom)
+
+    async def _discard(self, context):
+        await _close_quietly(context)
+        self.watchdog.context_closed()
+
+    async def release(self, url: str, context, page, healthy: bool = True, account: Optional[str] = None):
+        """歸還 context（account 須與取得時相同）；頁面已關閉、工作異常或閒置池已滿時直接關閉"""
+        key = (PlatformFactory.detect_platform(url), account)
+        if healthy and not page.is_closed() and len(self._idle[key]) < self.max_idle:
+            self._idle[key].append((context, page))
+            return
+        self.stats['discarded'] += 1
+        await self._discard(context)
+
+    def status(self) -> Dict:
+        idle = defaultdict(int)
+        for (platform, _), entries in self._idle.items():
+            idle[platform] += len(entries)
+        return {
+            'browsers': len(self._browsers),
+            'idle': dict(idle),
+            'memory': self.watchdog.summary(),
+            **self.stats,
+        }
+
+async def _close_quietly(target):
+    try:
+        await target.close()
+    except Exception as e:
+        logger.debug(f"關閉時發生錯誤: {str(e)}")
+
+class BuyerDaemon:
+    """接收工作並以 asyncio 引擎在瀏覽器池中執行
+
+    支援的請求（cmd）：
+      ping      確認常駐程序存活
+      status    回傳瀏覽器池與工作統計
+      warm      以指定商品連結先完成登入，將 context 放入閒置池
+      buy       執行一筆購買，回傳 JobResult（同批次報告格式）
+      shutdown  結束常駐程序
+    """
+    def __init__(
+        self,
+        pool: BrowserPool,
+        socket_path: str = DEFAULT_SOCKET,
+        concurrency: int = 4,
+        session_dir: Optional[str] = '.auth',
+        trace_dir: Optional[str] = None,
+        telemetry=None,
+        diagnostics: Optional[Dict] = None,
+    ):
+        self.pool = pool
+        self.socket_path = socket_path
+        self.session_cache = SessionCache(session_dir) if session_dir else None
+        self.trace_dir = trace_dir
+        # TelemetryStore，每筆工作結束後追加執行紀錄
+        self.telemetry = telemetry
+        # Diagnostics 的設定，失敗時的截圖與 HTML 快照寫入每筆工作的目錄
+        self.diagnostics = diagnostics
+        self.jobs = {'running': 0, 'succeeded': 0, 'failed': 0}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stopped = None
+        self._started_at = time.time()
+
+    def _identity(self, url: str, buyer_options: Optional[Dict] = None) -> Dict:
+        """工作使用的帳號（account 選項，否則為 .env 帳號）與其瀏覽器設定檔，作為 acquire 的參數"""
+        from buyer.profile import account_username, load_profile
+
+        platform = PlatformFactory.detect_platform(url)
+        account = account_username(platform, buyer_options)
+        profile = load_profile(platform, account, self.session_cache) if account else None
+        return {'profile': profile, 'account': account}
+
+    async def warm(self, url: str):
+        """登入並預熱一個 context，之後同平台的工作可直接沿用"""
+        identity = self._identity(url)
+        context, page = await self.pool.acquire(url, **identity)
+        try:
+            buyer = await PlatformFactory.create_async_buyer(url, page, session_cache=self.session_cache)
+            await buyer.prepare()
+        except Exception:
+            await self.pool.release(url, context, page, healthy=False, account=identity['account'])
+            raise
+        await self.pool.release(url, context, page, account=identity['account'])
+        logger.info(f"已預熱 {url}（登入: {buyer.timing_stats.get('login')}）")
+        return {'login': buyer.timing_stats.get('login')}
+
+    async def run_job(self, request: Dict) -> JobResult:
+        """取用瀏覽器池的 context 執行一筆購買"""
+        from batch import record_result
+        from buyer.diagnostics import Diagnostics
+        from buyer.telemetry import NetworkMeter
+        from buyer.runner import execute_purchase_async
+
+        job = BatchJob(url=request['url'], time=request.get('time'), name=request.get('name') or 'daemon')
+        async with self._semaphore:
+            self.jobs['running'] += 1
+            tracer = Tracer(job.name)
+            result = JobResult(job=job)
+            start = time.perf_counter()
+            diag = Diagnostics(run_id=tracer.run_id, **(self.diagnostics or {}))
+            context = page = meter = buyer = None
+            identity = {'account': None}
+            try:
+                # 取得 context 失敗（瀏覽器中斷、記憶體不足）也算這筆工作失敗
+                identity = self._identity(job.url, request.get('buyer_options'))
+                context, page = await self.pool.acquire(job.url, **identity)
+                result.timing_stats['acquire_ms'] = (time.perf_counter() - start) * 1000
+                # 頁面會放回閒置池給後續工作沿用，因此只在本次工作期間計算傳輸量
+                meter = NetworkMeter().attach(page) if self.telemetry else None
+                buyer = await execute_purchase_async(
+                    page,
+                    job.url,
+                    job.time,
+                    lead_ms=request.get('lead_ms', 0.0),
+                    keep_alive_interval=request.get('keep_alive_interval', 120.0),
+                    session_cache=self.session_cache,
+                    buyer_options={**(request.get('buyer_options') or {}), 'diagnostics': diag},
+                    watch=request.get('watch'),
+                    tracer=tracer,
+                )
+                result.success = True
+            except Exception as e:
+                result.error = str(e)
+                logger.error(f"[{job.name}] 執行失敗: {str(e)}")
+                if page is not None and not diag.captured:
+                    await diag.capture_async(page, 'error')
+            finally:
+                self.jobs['running'] -= 1
+                self.jobs['succeeded' if result.success else 'failed'] += 1
+                await diag.flush_async(keep=not result.success)
+                result.total_ms = (time.perf_counter() - start) * 1000
+                stats = buyer.timing_stats if buyer is not None else {'trace': tracer.summary()}
+                result.timing_stats.update(stats)
+                if self.trace_dir:
+                    tracer.export(self.trace_dir)
+                if meter is not None:
+                    meter.detach(page)
+                record_result(self.telemetry, result, tracer, meter, mode='daemon')
+                if context is not None:
+                    await self.pool.release(job.url, context, page, healthy=result.success, account=identity['account'])
+        return result
+
+    async def handle(self, request: Dict) -> Dict:
+        """處理單一請求並回傳回應"""
+        cmd = request.get('cmd')
+        try:
+            if cmd == 'ping':
+                return {'ok': True, 'pid': os.getpid()}
+            if cmd == 'status':
+                return {
+                    'ok': True,
+                    'uptime_s': time.time() - self._started_at,
+                    'pool': self.pool.status(),
+                    'jobs': dict(self.jobs),
+                }
+            if cmd == 'warm':
+                return {'ok': True, **(await self.warm(request['url']))}
+            if cmd == 'buy':
+                if not request.get('url'):
+                    raise ValueError("缺少 url")
+                result = await self.run_job(request)
+                return {'ok': result.success, 'result': result.to_dict()}
+            if cmd == 'shutdown':
+                self._stopped.set()
+                return {'ok': True}
+            raise ValueError(f"不支援的指令: {cmd}")
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("請求必須是 JSON 物件")
+                except ValueError as e:
+                    response = {'ok': False, 'error': f"無法解析請求: {str(e)}"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.warning(f"用戶端連線異常: {str(e)}")
+        finally:
+            writer.close()
+
+    async def serve(self, warm_urls: Optional[List[str]] = None):
+        """啟動瀏覽器池並開始接收請求，直到收到 shutdown"""
+        self._stopped = asyncio.Event()
+        path = Path(self.socket_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            if _is_alive(str(path)):
+                raise RuntimeError(f"常駐程序已在執行: {path}")
+            path.unlink()
+
+        await self.pool.start()
+        server = await asyncio.start_unix_server(self._serve_client, path=str(path), limit=MAX_REQUEST_BYTES)
+        os.chmod(path, 0o600)
+        try:
+            for url in warm_urls or []:
+                try:
+                    await self.warm(url)
+                except Exception as e:
+                    logger.error(f"預熱 {url} 失敗: {str(e)}")
+            logger.info(f"常駐程序已就緒: {path}")
+            await self._stopped.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            await self.pool.close()
+            if path.exists():
+                path.unlink()
+            logger.info("常駐程序已結束")
+
+def _is_alive(socket_path: str) -> bool:
+    try:
+        return submit({'cmd': 'ping'}, socket_path, timeout=1).get('ok', False)
+    except OSError:
+        return False
+
+def submit(request: Dict, socket_path: str = DEFAULT_SOCKET, timeout: Optional[float] = None) -> Dict:
+    """送出請求給常駐程序並等待回應（buy 會等到購買流程結束）"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        with client.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("常駐程序未回應")
+    return json.loads(line)
@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 import click
-from playwright.sync_api import sync_playwright, Page
-from urllib.parse import urlparse
 import time
 import logging
-from typing import Optional
-from utils import UserAgentManager, TimingContext
-from buyer.base import BaseBuyer
+from typing import TYPE_CHECKING, Dict, Optional
+from utils import TimingContext
+from buyer import footprint
+from buyer.factory import PlatformFactory
+from buyer.instrument import Tracer
+from buyer.routing import benchmark_blocking
+from buyer.runner import create_context, create_context_async, execute_purchase, execute_purchase_async
+from buyer.session import SessionCache
+
+# Playwright 只在真正啟動瀏覽器時才匯入，讓 --help、參數檢查與工作檔解析維持快速
+if TYPE_CHECKING:
+    from buyer.telemetry import TelemetryStore
 
 # 設定日誌
 logging.basicConfig(
@@ -15,79 +22,357 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class PlatformFactory:
-    """平台工廠類別"""
-    @staticmethod
-    def create_buyer(url: str, page: Page) -> BaseBuyer:
-        domain = urlparse(url).netloc
-        
-        if "24h.pchome.com.tw" in domain:
-            from buyer.pchome import PChomeBuyer
-            return PChomeBuyer(url, page)
-        elif "momoshop" in domain:
-            from buyer.momo import MomoBuyer
-            return MomoBuyer(url, page)
-        else:
-            raise ValueError(f"不支援的平台: {domain}")
+def run_buyer(
+    url: str,
+    scheduled_time: Optional[str] = None,
+    headless: bool = False,
+    lead_ms: float = 0.0,
+    keep_alive_interval: float = 120.0,
+    session_dir: Optional[str] = '.auth',
+    block_resources: bool = False,
+    buyer_options: Optional[Dict] = None,
+    watch: Optional[Dict] = None,
+    trace_dir: Optional[str] = None,
+    telemetry: Optional['TelemetryStore'] = None,
+    diagnostics: Optional[Dict] = None,
+    low_footprint: bool = False,
+):
+    """執行自動購買流程，提供 trace_dir 時輸出本次的計時紀錄，提供 telemetry 時追加執行紀錄
+
+    diagnostics 為 Diagnostics 的設定（directory、trace），截圖與 HTML 快照在結束時才寫出；
+    low_footprint 以低資源模式啟動瀏覽器與 context。
+    """
+    from playwright.sync_api import sync_playwright
+    from buyer.diagnostics import Diagnostics
+    from buyer.profile import resolve_profile
+    from buyer.telemetry import NetworkMeter, RunRecord
 
-def run_buyer(url: str, scheduled_time: Optional[str] = None, headless: bool = False):
-    """執行自動購買流程"""
     total_start_time = time.time()
+    platform = PlatformFactory.detect_platform(url)
+    tracer = Tracer(platform)
+    session_cache = SessionCache(session_dir) if session_dir else None
+    profile = resolve_profile(platform, session_cache, buyer_options)
     
     with sync_playwright() as p:
         with TimingContext("啟動瀏覽器"):
-            browser = p.chromium.launch(headless=headless)
-            
-            # 建立瀏覽器上下文，設定隨機 User-Agent
-            user_agent = UserAgentManager.get_random_user_agent()
-            logger.info(f"使用 User-Agent: {user_agent}")
-            
-            context = browser.new_context(
-                user_agent=user_agent,
-                viewport={'width': 1280, 'height': 800}
-            )
+            browser = p.chromium.launch(**footprint.launch_options(headless, low_footprint))
+            context = create_context(browser, url, block_resources, profile=profile, low_footprint=low_footprint)
+            meter = NetworkMeter().attach(context) if telemetry else None
+            diag = Diagnostics(run_id=tracer.run_id, **(diagnostics or {}))
+            diag.start_tracing(context)
             page = context.new_page()
         
+        buyer = None
+        error = None
         try:
-            # 建立對應平台的購買器
-            with TimingContext("初始化購買器"):
-                buyer = PlatformFactory.create_buyer(url, page)
-            
-            # 等待預定時間
-            if scheduled_time:
-                with TimingContext(f"等待預定時間 {scheduled_time}"):
-                    buyer.wait_for_scheduled_time(scheduled_time)
-            
-            # 檢查商品
-            # with TimingContext("檢查商品資訊"):
-            #     product_info = buyer.check_product()
-            #     logger.info(f"商品資訊: {product_info}")
-
-            # 購買商品
-            with TimingContext("購買商品"):
-                buyer.purchase()
+            buyer = execute_purchase(
+                page, url, scheduled_time, lead_ms, keep_alive_interval, session_cache,
+                {**(buyer_options or {}), 'diagnostics': diag}, watch, tracer,
+            )
             
             total_time = time.time() - total_start_time
             logger.info(f"購買流程完成，總耗時: {total_time:.2f} 秒")
             
         except Exception as e:
+            error = str(e)
             total_time = time.time() - total_start_time
             logger.error(f"發生錯誤: {str(e)}")
             logger.error(f"執行失敗，總耗時: {total_time:.2f} 秒")
             
-            if not headless:
-                timestamp = int(time.time())
-                page.screenshot(path=f"error_{timestamp}.png")
+            # 購買器已擷取過失敗畫面時不再重複
+            if not diag.captured:
+                diag.capture(page, 'error')
         finally:
+            diag.flush(keep=error is not None)
+            if trace_dir:
+                tracer.export(trace_dir)
+            if telemetry:
+                telemetry.record(RunRecord.from_run(
+                    tracer, platform, error is None, (time.time() - total_start_time) * 1000, error,
+                    buyer.timing_stats if buyer is not None else None, meter,
+                ))
             with TimingContext("關閉瀏覽器"):
                 context.close()
                 browser.close()
 
-@click.command()
-@click.argument('url')
-@click.option('--time', '-t', help='預定購買時間 (格式: YYYY-MM-DD HH:MM:SS)')
+async def run_buyer_async(
+    url: str,
+    scheduled_time: Optional[str] = None,
+    headless: bool = False,
+    lead_ms: float = 0.0,
+    keep_alive_interval: float = 120.0,
+    session_dir: Optional[str] = '.auth',
+    block_resources: bool = False,
+    buyer_options: Optional[Dict] = None,
+    watch: Optional[Dict] = None,
+    trace_dir: Optional[str] = None,
+    telemetry: Optional['TelemetryStore'] = None,
+    diagnostics: Optional[Dict] = None,
+    low_footprint: bool = False,
+):
+    """執行自動購買流程（asyncio 版本）"""
+    from playwright.async_api import async_playwright
+    from buyer.diagnostics import Diagnostics
+    from buyer.profile import resolve_profile
+    from buyer.telemetry import NetworkMeter, RunRecord
+    
+    total_start_time = time.time()
+    platform = PlatformFactory.detect_platform(url)
+    tracer = Tracer(platform)
+    session_cache = SessionCache(session_dir) if session_dir else None
+    profile = resolve_profile(platform, session_cache, buyer_options)
+    
+    async with async_playwright() as p:
+        with TimingContext("啟動瀏覽器"):
+            browser = await p.chromium.launch(**footprint.launch_options(headless, low_footprint))
+            context = await create_context_async(browser, url, block_resources, profile=profile, low_footprint=low_footprint)
+            meter = NetworkMeter().attach(context) if telemetry else None
+            diag = Diagnostics(run_id=tracer.run_id, **(diagnostics or {}))
+            await diag.start_tracing_async(context)
+            page = await context.new_page()
+        
+        buyer = None
+        error = None
+        try:
+            buyer = await execute_purchase_async(
+                page, url, scheduled_time, lead_ms, keep_alive_interval, session_cache,
+                {**(buyer_options or {}), 'diagnostics': diag}, watch, tracer,
+            )
+            
+            total_time = time.time() - total_start_time
+            logger.info(f"購買流程完成，總耗時: {total_time:.2f} 秒")
+            
+        except Exception as e:
+            error = str(e)
+            total_time = time.time() - total_start_time
+            logger.error(f"發生錯誤: {str(e)}")
+            logger.error(f"執行失敗，總耗時: {total_time:.2f} 秒")
+            
+            # 購買器已擷取過失敗畫面時不再重複
+            if not diag.captured:
+                await diag.capture_async(page, 'error')
+        finally:
+            await diag.flush_async(keep=error is not None)
+            if trace_dir:
+                tracer.export(trace_dir)
+            if telemetry:
+                telemetry.record(RunRecord.from_run(
+                    tracer, platform, error is None, (time.time() - total_start_time) * 1000, error,
+                    buyer.timing_stats if buyer is not None else None, meter,
+                ))
+            with TimingContext("關閉瀏覽器"):
+                await context.close()
+                await browser.close()
+
+def run_batch_command(
+    jobs_file: str,
+    concurrency: int,
+    headless: bool,
+    lead_ms: float,
+    keep_alive_interval: float,
+    session_dir: Optional[str],
+    report: Optional[str] = None,
+    engine: str = 'sync',
+    block_resources: bool = False,
+    buyer_options: Optional[Dict] = None,
+    watch: Optional[Dict] = None,
+    trace_dir: Optional[str] = None,
+    accounts_file: Optional[str] = None,
+    rate_limits: Optional[Dict] = None,
+    url: Optional[str] = None,
+    scheduled_time: Optional[str] = None,
+    telemetry: Optional['TelemetryStore'] = None,
+    diagnostics: Optional[Dict] = None,
+    low_footprint: bool = False,
+    memory_limit_mb: Optional[float] = None,
+):
+    """執行批次模式並輸出報告
+
+    提供 accounts_file 時以帳號池分配帳號並限制請求速率（rate_limits 為 RateLimiter 的設定）；
+    沒有工作檔時把 url 展開到帳號池中該平台的每個帳號。
+    low_footprint 以低資源模式執行，瀏覽器記憶體超過 memory_limit_mb 時暫緩開始新的工作。
+    """
+    import asyncio
+    import json
+    from batch import BatchJob, load_jobs, run_batch, run_batch_async
+
+    if jobs_file:
+        jobs = load_jobs(jobs_file)
+    else:
+        jobs = [BatchJob(url=url, time=scheduled_time, platform=PlatformFactory.detect_platform(url), name='job')]
+
+    pool = None
+    if accounts_file:
+        from accounts import AccountPool, account_report, load_accounts
+        from buyer.ratelimit import RateLimiter
+
+        pool = AccountPool(load_accounts(accounts_file))
+        if not jobs_file:
+            jobs = pool.fan_out(jobs[0])
+        logger.info(f"已載入 {len(pool.accounts)} 個帳號")
+
+    logger.info(f"已載入 {len(jobs)} 筆工作，同時執行上限 {concurrency}")
+    options = dict(
+        concurrency=concurrency,
+        headless=headless,
+        lead_ms=lead_ms,
+        keep_alive_interval=keep_alive_interval,
+        session_cache=SessionCache(session_dir) if session_dir else None,
+        block_resources=block_resources,
+        buyer_options=buyer_options,
+        watch=watch,
+        trace_dir=trace_dir,
+        telemetry=telemetry,
+        diagnostics=diagnostics,
+        low_footprint=low_footprint,
+        memory_limit_mb=memory_limit_mb,
+    )
+    if pool is not None:
+        options.update(accounts=pool, rate_limiter=RateLimiter(**(rate_limits or {})))
+    if engine == 'async':
+        results = asyncio.run(run_batch_async(jobs, **options))
+    else:
+        results = run_batch(jobs, **options)
+    
+    if report:
+        data = [r.to_dict() for r in results]
+        if pool is not None:
+            data = {'jobs': data, 'accounts': account_report(results)}
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        logger.info(f"已輸出批次報告: {report}")
+
+def run_race_command(
+    url: str,
+    racers: int,
+    race_offsets: Optional[str],
+    scheduled_time: Optional[str],
+    lead_ms: float,
+    keep_alive_interval: float,
+    headless: bool,
+    session_dir: Optional[str],
+    block_resources: bool = False,
+    buyer_options: Optional[Dict] = None,
+    trace_dir: Optional[str] = None,
+    report: Optional[str] = None,
+    low_footprint: bool = False,
+):
+    """執行競速模式並輸出各競速者的時間軸"""
+    import asyncio
+    import json
+    from racing import RaceFailed, parse_offsets, run_race
+
+    results = None
+    try:
+        results = asyncio.run(run_race(
+            url,
+            racers=racers,
+            offsets_ms=parse_offsets(race_offsets, racers),
+            scheduled_time=scheduled_time,
+            lead_ms=lead_ms,
+            keep_alive_interval=keep_alive_interval,
+            headless=headless,
+            session_dir=session_dir,
+            block_resources=block_resources,
+            buyer_options=buyer_options,
+            trace_dir=trace_dir,
+            low_footprint=low_footprint,
+        ))
+    except RaceFailed as e:
+        results = e.results
+        raise
+    finally:
+        if report and results:
+            with open(report, 'w', encoding='utf-8') as f:
+                json.dump([r.to_dict() for r in results], f, ensure_ascii=False, indent=2)
+            logger.info(f"已輸出競速報告: {report}")
+
+class DefaultCommandGroup(click.Group):
+    """未指定子命令時執行 buy，維持 `main.py "商品連結"` 的用法"""
+    default_command = 'buy'
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] != '--help'):
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+@click.group(cls=DefaultCommandGroup)
+def cli():
+    """自動購買程式，預設子命令為 buy"""
+
+@cli.command('buy', short_help='執行自動購買（預設子命令）')
+@click.argument('url', required=False)
+@click.option('--time', '-t', help='預定購買時間 (格式: YYYY-MM-DD HH:MM:SS[.ffffff])')
 @click.option('--headless', '-h', is_flag=True, help='使用無頭模式（不顯示瀏覽器視窗）')
-def main(url: str, time: Optional[str] = None, headless: bool = False):
+@click.option('--lead-ms', type=float, default=0.0, show_default=True, help='提前觸發的毫秒數，用來抵銷點擊的網路延遲')
+@click.option('--keep-alive', type=float, default=120.0, show_default=True, help='等待期間重新整理商品頁的間隔秒數，0 表示停用')
+@click.option('--session-dir', default='.auth', show_default=True, help='登入狀態快取目錄')
+@click.option('--no-session-cache', is_flag=True, help='不使用登入狀態快取，每次都完整登入')
+@click.option('--jobs', '-j', 'jobs_file', type=click.Path(exists=True, dir_okay=False), help='批次工作檔 (.json 或 .csv)，欄位: url, time, platform, name, account')
+@click.option('--accounts', '-a', 'accounts_file', type=click.Path(exists=True, dir_okay=False), help='帳號池檔 (.json 或 .csv)，依平台分配帳號；只給商品連結時每個帳號各買一次')
+@click.option('--account-rate', type=float, default=2.0, show_default=True, help='多帳號模式下每個帳號開賣前每秒的請求上限（結帳步驟不受限），0 表示不限制')
+@click.option('--platform-rate', type=float, default=10.0, show_default=True, help='多帳號模式下每個平台開賣前每秒的請求上限（所有帳號合計，結帳步驟不受限），0 表示不限制')
+@click.option('--concurrency', '-c', type=int, default=4, show_default=True, help='批次模式同時執行的工作數上限')
+@click.option('--report', type=click.Path(dir_okay=False), help='批次或競速模式的結果報告輸出路徑 (JSON)')
+@click.option('--engine', type=click.Choice(['sync', 'async']), default='sync', show_default=True, help='執行引擎：sync 為 Playwright 同步 API，async 以單一事件迴圈驅動所有頁面')
+@click.option('--block-resources', is_flag=True, help='封鎖圖片、字型、廣告追蹤與非白名單的第三方資源')
+@click.option('--bench-blocking', type=int, metavar='RUNS', help='比較啟用/停用資源封鎖的載入時間與傳輸量後結束')
+@click.option('--low-footprint', is_flag=True, help='低資源模式：關閉 GPU 與背景服務、限制 renderer 程序數、縮小視窗並停用頁面動畫')
+@click.option('--memory-limit-mb', type=click.FloatRange(min=0, min_open=True), help='批次模式的瀏覽器記憶體上限（MB），超過時暫緩開始新的工作')
+@click.option('--bench-footprint', type=int, metavar='CONTEXTS', help='比較預設與低資源模式下開啟 N 個商品頁的記憶體用量後結束')
+@click.option('--no-api-checkout', is_flag=True, help='PChome 不使用 API 加入購物車，一律點擊頁面按鈕')
+@click.option('--max-retries', type=click.IntRange(min=0), default=2, show_default=True, help='結帳步驟逾時或導航中斷時，從目前階段重試的次數上限，0 表示不重試')
+@click.option('--prefill', is_flag=True, help='PChome 開賣前先走一次結帳並記下結帳表單，開賣後一次填入（沿用購物車中已有的商品，這些商品開賣時會一併結帳）')
+@click.option('--prefill-item', metavar='URL', help='預先走結帳時使用的佔位商品連結（記下表單後自動從購物車移除並確認），隱含 --prefill')
+@click.option('--watch', '-w', is_flag=True, help='監看庫存（補貨模式），可購買時立即下單，忽略 --time')
+@click.option('--watch-interval', type=float, default=300, show_default=True, help='監看的最短輪詢間隔（毫秒）')
+@click.option('--watch-max-interval', type=float, default=5000, show_default=True, help='監看失敗退避時的最長輪詢間隔（毫秒）')
+@click.option('--watch-timeout', type=float, help='監看的最長時間（秒），預設不限')
+@click.option('--trace-dir', type=click.Path(file_okay=False), help='輸出每次執行的計時紀錄（JSON 與 CSV）的目錄')
+@click.option('--clock-sync', is_flag=True, help='以商店伺服器的 Date 標頭校正時間差，預定時間視為伺服器時間')
+@click.option('--race', 'racers', type=int, help='競速模式：以 N 個已登入的 context 同時結帳，只有最快的一組送出訂單')
+@click.option('--race-offsets', help='各競速者延後開始的毫秒數，以逗號分隔（例如 0,30,60），不足補 0')
+@click.option('--telemetry-db', default='telemetry.db', show_default=True, help='執行紀錄的 SQLite 檔，stats 子命令由此統計')
+@click.option('--no-telemetry', is_flag=True, help='不寫入執行紀錄')
+@click.option('--diagnostics-dir', default='diagnostics', show_default=True, type=click.Path(file_okay=False), help='失敗時的截圖、HTML 快照與頁面狀態紀錄的輸出目錄（每次執行一個子目錄）')
+@click.option('--diagnostics-trace', is_flag=True, help='另外錄製 Playwright trace（trace.zip），會增加執行負擔')
+def main(
+    url: Optional[str],
+    time: Optional[str] = None,
+    headless: bool = False,
+    lead_ms: float = 0.0,
+    keep_alive: float = 120.0,
+    session_dir: str = '.auth',
+    no_session_cache: bool = False,
+    jobs_file: Optional[str] = None,
+    accounts_file: Optional[str] = None,
+    account_rate: float = 2.0,
+    platform_rate: float = 10.0,
+    concurrency: int = 4,
+    report: Optional[str] = None,
+    engine: str = 'sync',
+    block_resources: bool = False,
+    bench_blocking: Optional[int] = None,
+    low_footprint: bool = False,
+    memory_limit_mb: Optional[float] = None,
+    bench_footprint: Optional[int] = None,
+    no_api_checkout: bool = False,
+    max_retries: int = 2,
+    prefill: bool = False,
+    prefill_item: Optional[str] = None,
+    watch: bool = False,
+    watch_interval: float = 300,
+    watch_max_interval: float = 5000,
+    watch_timeout: Optional[float] = None,
+    trace_dir: Optional[str] = None,
+    clock_sync: bool = False,
+    racers: Optional[int] = None,
+    race_offsets: Optional[str] = None,
+    telemetry_db: str = 'telemetry.db',
+    no_telemetry: bool = False,
+    diagnostics_dir: str = 'diagnostics',
+    diagnostics_trace: bool = False,
+):
     """
     自動購買程式
     
@@ -103,13 +388,396 @@ def main(url: str, time: Optional[str] = None, headless: bool = False):
     
     # 指定時間購買
     python auto_buy.py -t "2024-03-20 12:00:00" "商品連結"
+
+    # 提前 50 毫秒觸發
+    python auto_buy.py -t "2024-03-20 12:00:00" --lead-ms 50 "商品連結"
+
+    # 批次模式（共用一個瀏覽器，最多同時 8 筆）
+    python auto_buy.py --jobs jobs.json -c 8 -h
+
+    # 以 asyncio 引擎執行批次
+    python auto_buy.py --jobs jobs.json --engine async -h
+
+    # 多帳號：帳號池中每個 PChome 帳號各買一次，每帳號每秒最多 1 個請求
+    python auto_buy.py -h --accounts accounts.json --account-rate 1 "商品連結"
+
+    # 封鎖不需要的資源，並比較封鎖前後的載入效能
+    python auto_buy.py -h --block-resources "商品連結"
+    python auto_buy.py -h --bench-blocking 5 "商品連結"
+
+    # 低資源模式：同時 8 筆，瀏覽器記憶體超過 1500 MB 時暫緩開始新的工作
+    python auto_buy.py --jobs jobs.json -c 8 -h --low-footprint --memory-limit-mb 1500
+
+    # 比較預設與低資源模式下開啟 4 個商品頁的記憶體用量
+    python auto_buy.py -h --bench-footprint 4 "商品連結"
+
+    # 結帳逾時最多重試 3 次（從目前所在的階段繼續）
+    python auto_buy.py -h --max-retries 3 "商品連結"
+
+    # 開賣前以佔位商品先走一次結帳，開賣後一次填入結帳表單
+    python auto_buy.py -h -t "2024-03-20 12:00:00" --prefill-item "佔位商品連結" "商品連結"
+
+    # 補貨監看：每 200 毫秒探測一次，可購買時立即下單
+    python auto_buy.py -h --watch --watch-interval 200 "商品連結"
+
+    # 輸出計時紀錄，之後以 report 子命令統計
+    python auto_buy.py -h --trace-dir traces "商品連結"
+
+    # 競速模式：3 組同時結帳，第 2、3 組各延後 20、40 毫秒
+    python auto_buy.py -h -t "2024-03-20 12:00:00" --race 3 --race-offsets 0,20,40 "商品連結"
+
+    # 統計歷次執行的耗時與成功率
+    python auto_buy.py stats --platform pchome
     """
+    if not url and not jobs_file:
+        raise click.UsageError("請提供商品連結或 --jobs 工作檔")
+    # 參數檢查放在執行之前，讓 click 顯示用法並以錯誤碼結束
+    for flag, enabled in (('--bench-blocking', bench_blocking), ('--bench-footprint', bench_footprint), ('--race', racers)):
+        if enabled and not url:
+            raise click.UsageError(f"{flag} 需要商品連結")
+    
+    from buyer.telemetry import TelemetryStore
+
+    session_dir = None if no_session_cache else session_dir
+    telemetry = None if no_telemetry else TelemetryStore(telemetry_db)
+    diagnostics = {'directory': diagnostics_dir, 'trace': diagnostics_trace}
+    buyer_options = {'api_checkout': not no_api_checkout, 'clock_sync': clock_sync, 'max_retries': max_retries}
+    if prefill or prefill_item:
+        if prefill_item:
+            from buyer.pchome_api import CheckoutApiError, extract_item_id
+            try:
+                extract_item_id(prefill_item)
+            except CheckoutApiError as e:
+                raise click.BadParameter(str(e), param_hint='--prefill-item')
+        buyer_options.update(prefill=True, prefill_item=prefill_item)
+    watch_options = dict(
+        min_interval=watch_interval / 1000,
+        max_interval=watch_max_interval / 1000,
+        timeout=watch_timeout,
+    ) if watch else None
     try:
         if headless:
             logger.info("使用無頭模式執行")
-        run_buyer(url, time, headless)
+        if bench_blocking:
+            benchmark_blocking(url, PlatformFactory.detect_platform(url), runs=bench_blocking, headless=headless)
+        elif bench_footprint:
+            footprint.benchmark_footprint(url, contexts=bench_footprint, headless=headless)
+        elif racers:
+            run_race_command(
+                url, racers, race_offsets, time, lead_ms, keep_alive, headless, session_dir,
+                block_resources, buyer_options, trace_dir, report, low_footprint,
+            )
+        elif jobs_file or accounts_file:
+            run_batch_command(
+                jobs_file, concurrency, headless, lead_ms, keep_alive, session_dir, report, engine,
+                block_resources, buyer_options, watch_options, trace_dir,
+                accounts_file=accounts_file,
+                rate_limits={'account_rate': account_rate, 'platform_rate': platform_rate},
+                url=url,
+                scheduled_time=time,
+                telemetry=telemetry,
+                diagnostics=diagnostics,
+                low_footprint=low_footprint,
+                memory_limit_mb=memory_limit_mb,
+            )
+        elif engine == 'async':
+            import asyncio
+            asyncio.run(run_buyer_async(
+                url, time, headless, lead_ms, keep_alive, session_dir, block_resources, buyer_options, watch_options,
+                trace_dir, telemetry, diagnostics, low_footprint=low_footprint,
+            ))
+        else:
+            run_buyer(
+                url, time, headless, lead_ms, keep_alive, session_dir, block_resources, buyer_options, watch_options,
+                trace_dir, telemetry, diagnostics, low_footprint=low_footprint,
+            )
+    except click.ClickException:
+        raise
     except Exception as e:
         logger.error(f"程式執行錯誤: {str(e)}")
 
+@cli.command('daemon')
+@click.option('--socket', 'socket_path', default='.auth/daemon.sock', show_default=True, help='常駐程序的 UNIX socket 路徑')
+@click.option('--browsers', type=int, default=1, show_default=True, help='預先啟動的瀏覽器數量')
+@click.option('--concurrency', '-c', type=int, default=4, show_default=True, help='同時執行的工作數上限')
+@click.option('--warm', 'warm_urls', multiple=True, help='啟動時先登入並預熱的商品連結，可重複指定')
+@click.option('--headless', '-h', is_flag=True, help='使用無頭模式（不顯示瀏覽器視窗）')
+@click.option('--session-dir', default='.auth', show_default=True, help='登入狀態快取目錄')
+@click.option('--block-resources', is_flag=True, help='封鎖圖片、字型、廣告追蹤與非白名單的第三方資源')
+@click.option('--low-footprint', is_flag=True, help='低資源模式：關閉 GPU 與背景服務、限制 renderer 程序數、縮小視窗並停用頁面動畫')
+@click.option('--memory-limit-mb', type=click.FloatRange(min=0, min_open=True), help='瀏覽器記憶體上限（MB），超過時先關閉閒置的 context')
+@click.option('--trace-dir', type=click.Path(file_okay=False), help='輸出每筆工作的計時紀錄的目錄')
+@click.option('--telemetry-db', default='telemetry.db', show_default=True, help='執行紀錄的 SQLite 檔')
+@click.option('--no-telemetry', is_flag=True, help='不寫入執行紀錄')
+@click.option('--diagnostics-dir', default='diagnostics', show_default=True, type=click.Path(file_okay=False), help='失敗時的截圖與 HTML 快照的輸出目錄')
+def daemon(
+    socket_path: str,
+    browsers: int = 1,
+    concurrency: int = 4,
+    warm_urls=(),
+    headless: bool = False,
+    session_dir: str = '.auth',
+    block_resources: bool = False,
+    low_footprint: bool = False,
+    memory_limit_mb: Optional[float] = None,
+    trace_dir: Optional[str] = None,
+    telemetry_db: str = 'telemetry.db',
+    no_telemetry: bool = False,
+    diagnostics_dir: str = 'diagnostics',
+):
+    """
+    啟動常駐程序，保持瀏覽器與已登入的 context
+
+    \b
+    python main.py daemon -h --warm "商品連結"
+    python main.py submit -t "2024-03-20 12:00:00" "商品連結"
+    """
+    import asyncio
+    from buyer.telemetry import TelemetryStore
+    from daemon import BrowserPool, BuyerDaemon
+
+    pool = BrowserPool(
+        browsers=browsers, headless=headless, block_resources=block_resources,
+        low_footprint=low_footprint, memory_limit_mb=memory_limit_mb,
+    )
+    server = BuyerDaemon(
+        pool, socket_path, concurrency=concurrency, session_dir=session_dir, trace_dir=trace_dir,
+        telemetry=None if no_telemetry else TelemetryStore(telemetry_db),
+        diagnostics={'directory': diagnostics_dir},
+    )
+    try:
+        asyncio.run(server.serve(list(warm_urls)))
+    except KeyboardInterrupt:
+        logger.info("已中斷常駐程序")
+
+@cli.command('submit')
+@click.argument('url', required=False)
+@click.option('--socket', 'socket_path', default='.auth/daemon.sock', show_default=True, help='常駐程序的 UNIX socket 路徑')
+@click.option('--time', '-t', help='預定購買時間 (格式: YYYY-MM-DD HH:MM:SS[.ffffff])')
+@click.option('--lead-ms', type=float, default=0.0, show_default=True, help='提前觸發的毫秒數，用來抵銷點擊的網路延遲')
+@click.option('--keep-alive', type=float, default=120.0, show_default=True, help='等待期間重新整理商品頁的間隔秒數，0 表示停用')
+@click.option('--no-api-checkout', is_flag=True, help='PChome 不使用 API 加入購物車，一律點擊頁面按鈕')
+@click.option('--max-retries', type=click.IntRange(min=0), default=2, show_default=True, help='結帳步驟逾時或導航中斷時，從目前階段重試的次數上限，0 表示不重試')
+@click.option('--clock-sync', is_flag=True, help='以商店伺服器的 Date 標頭校正時間差，預定時間視為伺服器時間')
+@click.option('--name', default='', help='工作名稱，用於報告與計時紀錄')
+@click.option('--warm', is_flag=True, help='只登入並預熱此商品連結，不購買')
+@click.option('--status', is_flag=True, help='顯示常駐程序狀態')
+@click.option('--shutdown', is_flag=True, help='結束常駐程序')
+def submit_command(
+    url: Optional[str],
+    socket_path: str,
+    time: Optional[str] = None,
+    lead_ms: float = 0.0,
+    keep_alive: float = 120.0,
+    no_api_checkout: bool = False,
+    max_retries: int = 2,
+    clock_sync: bool = False,
+    name: str = '',
+    warm: bool = False,
+    status: bool = False,
+    shutdown: bool = False,
+):
+    """
+    將工作送給常駐程序執行並等待結果
+
+    URL: 商品連結
+    """
+    import json
+    from daemon import submit
+
+    if status:
+        request = {'cmd': 'status'}
+    elif shutdown:
+        request = {'cmd': 'shutdown'}
+    elif not url:
+        raise click.UsageError("請提供商品連結")
+    elif warm:
+        request = {'cmd': 'warm', 'url': url}
+    else:
+        request = {
+            'cmd': 'buy',
+            'url': url,
+            'time': time,
+            'name': name,
+            'lead_ms': lead_ms,
+            'keep_alive_interval': keep_alive,
+            'buyer_options': {'api_checkout': not no_api_checkout, 'clock_sync': clock_sync, 'max_retries': max_retries},
+        }
+
+    try:
+        response = submit(request, socket_path)
+    except OSError as e:
+        raise click.ClickException(f"無法連線到常駐程序（{socket_path}）: {str(e)}")
+    click.echo(json.dumps(response, ensure_ascii=False, indent=2))
+    if not response.get('ok'):
+        raise SystemExit(1)
+
+@cli.command('report')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--csv', 'csv_path', type=click.Path(dir_okay=False), help='將統計結果另存為 CSV')
+@click.option('--baseline', 'baseline_paths', multiple=True, type=click.Path(exists=True), help='作為比較基準的計時紀錄（目錄或 JSON 檔），列出每個步驟 p50 節省的時間，可重複指定')
+def report(paths, csv_path: Optional[str] = None, baseline_paths=()):
+    """
+    統計多次執行的計時紀錄，列出每個步驟的 p50/p95
+
+    PATHS: --trace-dir 輸出的目錄或 JSON 檔
+
+    \b
+    python main.py report traces/prefill --baseline traces/default
+    """
+    import csv
+    from buyer.instrument import compare_summaries, format_comparison, format_summary, load_runs, summarize_runs
+
+    runs = load_runs(paths)
+    if not runs:
+        raise click.UsageError("找不到計時紀錄")
+    summary = summarize_runs(runs)
+    click.echo(f"共 {len(runs)} 次執行")
+    click.echo(format_summary(summary))
+
+    if baseline_paths:
+        baseline_runs = load_runs(baseline_paths)
+        if not baseline_runs:
+            raise click.UsageError("找不到基準的計時紀錄")
+        click.echo(f"\n與基準（{len(baseline_runs)} 次執行）比較:")
+        click.echo(format_comparison(compare_summaries(summarize_runs(baseline_runs), summary)))
+
+    if csv_path:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path', 'runs', 'calls', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms'])
+            for path, entry in summary.items():
+                writer.writerow([path] + [entry[key] for key in ('runs', 'calls', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms')])
+        click.echo(f"已輸出 {csv_path}")
+
+@cli.command('monitor')
+@click.argument('watchlist', type=click.Path(exists=True, dir_okay=False))
+@click.option('--interval', type=float, default=30.0, show_default=True, help='每輪查詢的間隔秒數')
+@click.option('--concurrency', '-c', type=int, default=8, show_default=True, help='同時進行的 HTTP 請求數（也是每個主機保留的連線數）')
+@click.option('--timeout', type=float, help='監看的最長時間（秒），預設不限')
+@click.option('--once', is_flag=True, help='只查詢一輪並輸出各商品狀態（JSON），不購買')
+@click.option('--buyers', type=int, default=2, show_default=True, help='同時執行的瀏覽器購買數上限')
+@click.option('--accounts', '-a', 'accounts_file', type=click.Path(exists=True, dir_okay=False), help='帳號池檔，監看清單的 account 欄位指定購買帳號')
+@click.option('--headless', '-h', is_flag=True, help='使用無頭模式（不顯示瀏覽器視窗）')
+@click.option('--session-dir', default='.auth', show_default=True, help='登入狀態快取目錄')
+@click.option('--block-resources', is_flag=True, help='封鎖圖片、字型、廣告追蹤與非白名單的第三方資源')
+@click.option('--no-api-checkout', is_flag=True, help='PChome 不使用 API 加入購物車，一律點擊頁面按鈕')
+@click.option('--max-retries', type=click.IntRange(min=0), default=2, show_default=True, help='結帳步驟逾時或導航中斷時，從目前階段重試的次數上限，0 表示不重試')
+@click.option('--telemetry-db', default='telemetry.db', show_default=True, help='執行紀錄的 SQLite 檔')
+@click.option('--no-telemetry', is_flag=True, help='不寫入執行紀錄')
+@click.option('--diagnostics-dir', default='diagnostics', show_default=True, type=click.Path(file_okay=False), help='失敗時的截圖與 HTML 快照的輸出目錄')
+def monitor_command(
+    watchlist: str,
+    interval: float = 30.0,
+    concurrency: int = 8,
+    timeout: Optional[float] = None,
+    once: bool = False,
+    buyers: int = 2,
+    accounts_file: Optional[str] = None,
+    headless: bool = False,
+    session_dir: str = '.auth',
+    block_resources: bool = False,
+    no_api_checkout: bool = False,
+    max_retries: int = 2,
+    telemetry_db: str = 'telemetry.db',
+    no_telemetry: bool = False,
+    diagnostics_dir: str = 'diagnostics',
+):
+    """
+    以 HTTP 監看大量商品的價格與庫存，符合條件時才啟動瀏覽器購買
+
+    WATCHLIST: 監看清單 (.json 或 .csv)，欄位: url, name, max_price, account
+
+    \b
+    python main.py monitor watchlist.json --interval 10 -h
+    python main.py monitor watchlist.csv --once
+    """
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from dataclasses import asdict
+    from monitor import Monitor, load_watchlist
+
+    items = load_watchlist(watchlist)
+    pool = None
+    if accounts_file:
+        from accounts import AccountPool, load_accounts
+        pool = AccountPool(load_accounts(accounts_file))
+    watcher = Monitor(items, concurrency=concurrency)
+    logger.info(f"監看 {len(items)} 個商品")
+
+    if once:
+        watcher.poll()
+        click.echo(json.dumps(
+            {item.name: asdict(watcher.states[item.url]) if item.url in watcher.states else None for item in items},
+            ensure_ascii=False, indent=2,
+        ))
+        return
+
+    from buyer.telemetry import TelemetryStore
+
+    telemetry = None if no_telemetry else TelemetryStore(telemetry_db)
+    buyer_options = {'api_checkout': not no_api_checkout, 'max_retries': max_retries}
+    executor = ThreadPoolExecutor(max_workers=buyers, thread_name_prefix='buyer')
+
+    def buy(item, state):
+        options = dict(buyer_options)
+        if item.account:
+            if pool is None:
+                logger.warning(f"[{item.name}] 指定了帳號 {item.account}，但沒有提供 --accounts，改用 .env 的帳號")
+            else:
+                options['account'] = pool.get(item.account)
+        executor.submit(
+            run_buyer, item.url, None, headless, 0.0, 0.0, session_dir, block_resources, options,
+            None, None, telemetry, {'directory': diagnostics_dir},
+        )
+
+    try:
+        result = watcher.run(buy, interval=interval, timeout=timeout)
+        logger.info(
+            f"監看結束：{result['polls']} 輪，解析 {result['parsed']} 次，未變動 {result['unchanged']} 次"
+            f"（其中 304 {result['http_not_modified']} 次），失敗 {result['errors']} 次"
+        )
+    except KeyboardInterrupt:
+        logger.info("已中斷監看")
+    finally:
+        watcher.fetcher.close()
+        # 等待已啟動的購買完成
+        executor.shutdown(wait=True)
+
+@cli.command('stats')
+@click.option('--db', 'db_path', default='telemetry.db', show_default=True, type=click.Path(dir_okay=False), help='執行紀錄的 SQLite 檔')
+@click.option('--platform', help='只統計指定平台（pchome、momo）')
+@click.option('--days', type=float, help='只統計最近 N 天')
+@click.option('--recent', type=int, default=20, show_default=True, help='與更早的執行比較時，視為「近期」的執行次數')
+@click.option('--threshold', type=float, default=0.2, show_default=True, help='近期 p50 比基準慢超過此比例時標記為變慢')
+@click.option('--json', 'as_json', is_flag=True, help='以 JSON 輸出')
+def stats(
+    db_path: str,
+    platform: Optional[str] = None,
+    days: Optional[float] = None,
+    recent: int = 20,
+    threshold: float = 0.2,
+    as_json: bool = False,
+):
+    """
+    統計執行紀錄：總耗時百分位數、每日成功率與各步驟是否變慢
+
+    \b
+    python main.py stats --platform pchome --days 30
+    """
+    import json
+    from pathlib import Path
+    from buyer.telemetry import TelemetryStore, compute_stats, format_stats
+
+    if not Path(db_path).exists():
+        raise click.UsageError(f"找不到執行紀錄 {db_path}")
+    since = time.time() - days * 86400 if days else None
+    runs = TelemetryStore(db_path).runs(platform=platform, since=since)
+    result = compute_stats(runs, recent=recent, threshold=threshold)
+    if as_json:
+        click.echo(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        click.echo(format_stats(result))
+
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    cli() 
\ No newline at end of file
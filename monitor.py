@@ -0,0 +1,310 @@
+"""
+價格與庫存監看：以共用連線池的 HTTP 客戶端輪詢大量商品，不需要為每個商品開瀏覽器頁面。
+
+PChome 查詢商品 API（JSON），MOMO 以 BeautifulSoup 解析商品頁 HTML。每個主機各自保持連線，
+請求帶上 ETag / Last-Modified 做條件式請求，回應未變動（304 或內容相同）時不再解析；
+只有商品由不可購買變成可購買、且價格不高於門檻時才啟動瀏覽器購買。
+"""
+import csv
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import urllib3
+from bs4 import BeautifulSoup
+from buyer.factory import PlatformFactory
+from buyer.pchome_api import build_product_status_url, extract_item_id, parse_product_status
+from buyer.scheduler import SystemClock
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+
+@dataclass
+class WatchItem:
+    """監看的商品，max_price 為觸發購買的價格上限（None 代表不限）"""
+    url: str
+    platform: str
+    name: str = ''
+    max_price: Optional[float] = None
+    account: Optional[str] = None
+
+@dataclass(frozen=True)
+class ProductState:
+    """商品在某次輪詢時的狀態"""
+    can_buy: bool
+    price: Optional[int] = None
+    name: Optional[str] = None
+
+    def purchasable(self, max_price: Optional[float]) -> bool:
+        """可購買且價格不高於門檻（門檻為 None 時不限價格）"""
+        if not self.can_buy:
+            return False
+        return max_price is None or (self.price is not None and self.price <= max_price)
+
+@dataclass
+class FetchResult:
+    """單次請求的結果，not_modified 時 body 為 None"""
+    status: int
+    body: Optional[bytes]
+    not_modified: bool = False
+    elapsed_ms: float = 0.0
+
+@dataclass
+class Change:
+    """商品狀態的變化，previous 為 None 代表第一次取得狀態"""
+    item: WatchItem
+    previous: Optional[ProductState]
+    current: ProductState
+
+    @property
+    def triggered(self) -> bool:
+        """由不可購買（或超過門檻）變成可購買且不超過門檻"""
+        was = self.previous is not None and self.previous.purchasable(self.item.max_price)
+        return not was and self.current.purchasable(self.item.max_price)
+
+def load_watchlist(path: str) -> List[WatchItem]:
+    """讀取監看清單（.json 或 .csv），欄位為 url、name、max_price、account"""
+    file_path = Path(path)
+    if file_path.suffix.lower() == '.csv':
+        with file_path.open(newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        data = json.loads(file_path.read_text(encoding='utf-8'))
+        rows = data['items'] if isinstance(data, dict) else data
+
+    items = []
+    for index, row in enumerate(rows, start=1):
+        url = (row.get('url') or '').strip()
+        if not url:
+            raise ValueError(f"監看清單第 {index} 筆缺少 url")
+        platform = PlatformFactory.detect_platform(url)
+        if platform not in PARSERS:
+            raise ValueError(f"監看清單第 {index} 筆的平台 {platform} 不支援 HTTP 監看")
+
+        max_price = row.get('max_price')
+        try:
+            max_price = float(max_price) if max_price not in (None, '') else None
+        except ValueError:
+            raise ValueError(f"監看清單第 {index} 筆的 max_price 必須是數字")
+
+        items.append(WatchItem(
+            url=url,
+            platform=platform,
+            name=(row.get('name') or '').strip() or f"item-{index}",
+            max_price=max_price,
+            account=(row.get('account') or '').strip() or None,
+        ))
+    return items
+
+def _momo_price(soup: BeautifulSoup) -> Optional[int]:
+    """折扣後價格優先，其次為促銷價、市售價（與 MomoBuyer 的頁面腳本相同）"""
+    prices = {}
+    for element in soup.select('.prdPrice li'):
+        price_element = element.select_one('.seoPrice')
+        digits = ''.join(c for c in price_element.get_text() if c.isdigit()) if price_element else ''
+        if not digits:
+            continue
+        text = element.get_text()
+        for label in ('折扣後價格', '促銷價', '市售價'):
+            if label in text:
+                prices[label] = int(digits)
+    return next((prices[label] for label in ('折扣後價格', '促銷價', '市售價') if label in prices), None)
+
+def _hidden(element) -> bool:
+    style = (element.get('style') or '').replace(' ', '').lower()
+    return 'display:none' in style
+
+def parse_momo_page(url: str, body: bytes) -> ProductState:
+    """解析 MOMO 商品頁：購買按鈕顯示中，或售完按鈕被隱藏時可購買
+
+    只看 HTML 的 style 屬性，由樣式表或腳本切換的顯示狀態需以瀏覽器確認。
+    """
+    # lxml 不一定有安裝，使用內建的 html.parser
+    soup = BeautifulSoup(body, 'html.parser')
+    buy_yes = soup.select_one('#buy_yes')
+    buy_no = soup.select_one('#buy_no')
+    can_buy = bool(buy_yes is not None and not _hidden(buy_yes)) or bool(buy_no is not None and _hidden(buy_no))
+    name = soup.select_one('#osmGoodsName')
+    return ProductState(can_buy, _momo_price(soup), name.get_text(strip=True) if name else None)
+
+def parse_pchome_status(url: str, body: bytes) -> ProductState:
+    """解析 PChome 商品 API 的狀態與售價"""
+    info = parse_product_status(200, body.decode('utf-8'), extract_item_id(url))
+    return ProductState(info['can_buy'], info['price'], info['name'])
+
+# 平台 -> (由商品頁網址取得要請求的網址, 解析回應)
+PARSERS: Dict[str, Tuple[Callable[[str], str], Callable[[str, bytes], ProductState]]] = {
+    'pchome': (lambda url: build_product_status_url(extract_item_id(url)), parse_pchome_status),
+    'momo': (lambda url: url, parse_momo_page),
+}
+
+class HttpFetcher:
+    """以 urllib3 連線池發送條件式 GET
+
+    每個主機保留最多 maxsize 條連線重複使用；伺服器回傳的 ETag 與 Last-Modified 依 key（預設為網址）保存，
+    下一次請求帶上 If-None-Match / If-Modified-Since，內容未變時伺服器只回 304。
+    可同時由多個執行緒使用。
+    """
+    def __init__(
+        self,
+        maxsize: int = 4,
+        num_pools: int = 16,
+        timeout: float = 5.0,
+        headers: Optional[Dict[str, str]] = None,
+        pool: Optional[urllib3.PoolManager] = None,
+    ):
+        self.pool = pool or urllib3.PoolManager(
+            num_pools=num_pools,
+            maxsize=maxsize,
+            timeout=urllib3.Timeout(total=timeout),
+            retries=False,
+            headers={'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip, deflate', **(headers or {})},
+        )
+        self.validators: Dict[Hashable, Dict[str, str]] = {}
+        self.stats = {'requests': 0, 'not_modified': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def fetch(self, url: str, key: Optional[Hashable] = None) -> FetchResult:
+        """送出請求，4xx/5xx 時拋出 urllib3.exceptions.HTTPError
+
+        多個使用者共用同一個網址、但各自判讀回應時（例如同商品不同規格共用狀態 API），
+        應以 key 分開保存 ETag，否則先查詢的一方收下 200 後，另一方只會拿到 304。
+        """
+        key = url if key is None else key
+        # 指定 headers 時 urllib3 不會合併連線池的預設標頭
+        headers = dict(self.pool.headers)
+        validators = self.validators.get(key, {})
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last-modified' in validators:
+            headers['If-Modified-Since'] = validators['last-modified']
+
+        start = time.perf_counter()
+        response = self.pool.request('GET', url, headers=headers, redirect=True)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if response.status == 304:
+            self._count(requests=1, not_modified=1)
+            return FetchResult(304, None, not_modified=True, elapsed_ms=elapsed_ms)
+        if response.status >= 400:
+            self._count(requests=1)
+            raise urllib3.exceptions.HTTPError(f"HTTP {response.status}: {url}")
+
+        self._count(requests=1, bytes=len(response.data))
+        fresh = {k: response.headers[k] for k in ('etag', 'last-modified') if k in response.headers}
+        if fresh:
+            self.validators[key] = fresh
+        return FetchResult(response.status, response.data, elapsed_ms=elapsed_ms)
+
+    def close(self):
+        self.pool.clear()
+
+class Monitor:
+    """輪詢監看清單，回報狀態變化
+
+    每個商品保存上一次回應的摘要，條件式請求回傳 304 或內容摘要相同時不重新解析，
+    狀態不變時也不回報，數千個商品中通常只有少數需要處理。
+    """
+    def __init__(
+        self,
+        items: List[WatchItem],
+        fetcher: Optional[HttpFetcher] = None,
+        concurrency: int = 8,
+        clock: Optional[SystemClock] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.items = list(items)
+        self.fetcher = fetcher or HttpFetcher(maxsize=concurrency)
+        self.concurrency = concurrency
+        self.clock = clock or SystemClock()
+        self.rng = rng or random.Random()
+        self.states: Dict[str, ProductState] = {}
+        self._digests: Dict[str, bytes] = {}
+        self.stats = {'polls': 0, 'parsed': 0, 'unchanged': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _check(self, item: WatchItem) -> Optional[Change]:
+        source_url, parse = PARSERS[item.platform]
+        try:
+            # PChome 狀態 API 的網址不含規格，ETag 依清單項目保存
+            url = source_url(item.url)
+            result = self.fetcher.fetch(url, key=(item.url, url))
+            if result.not_modified:
+                self._count('unchanged')
+                return None
+            digest = hashlib.blake2b(result.body, digest_size=16).digest()
+            if self._digests.get(item.url) == digest:
+                self._count('unchanged')
+                return None
+            current = parse(item.url, result.body)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"[{item.name}] 查詢失敗: {str(e)}")
+            return None
+
+        self._count('parsed')
+        self._digests[item.url] = digest
+        previous = self.states.get(item.url)
+        self.states[item.url] = current
+        if current == previous:
+            return None
+        return Change(item, previous, current)
+
+    def poll(self) -> List[Change]:
+        """查詢所有商品一次，回傳狀態有變化的商品"""
+        self.stats['polls'] += 1
+        if self.concurrency <= 1 or len(self.items) <= 1:
+            results = [self._check(item) for item in self.items]
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                results = list(executor.map(self._check, self.items))
+        changes = [change for change in results if change is not None]
+        for change in changes:
+            state = change.current
+            logger.info(
+                f"[{change.item.name}] {'可購買' if state.can_buy else '不可購買'}，"
+                f"價格 {state.price if state.price is not None else '未知'}"
+            )
+        return changes
+
+    def run(
+        self,
+        on_trigger: Callable[[WatchItem, ProductState], None],
+        interval: float = 30.0,
+        jitter: float = 0.1,
+        timeout: Optional[float] = None,
+    ) -> Dict:
+        """重複輪詢，商品符合購買條件時呼叫 on_trigger 並停止監看該商品
+
+        所有商品都觸發過或超過 timeout 秒時結束，回傳輪詢統計。
+        """
+        start = self.clock.monotonic_ns()
+        while self.items:
+            for change in self.poll():
+                if change.triggered:
+                    logger.info(f"[{change.item.name}] 符合購買條件（價格 {change.current.price}），開始購買")
+                    self.items.remove(change.item)
+                    on_trigger(change.item, change.current)
+            if not self.items:
+                break
+            elapsed = (self.clock.monotonic_ns() - start) / 1e9
+            if timeout is not None and elapsed >= timeout:
+                logger.info("監看時間已到")
+                break
+            self.clock.sleep(interval * (1 + self.rng.uniform(-jitter, jitter)))
+        return {**self.stats, **{f"http_{k}": v for k, v in self.fetcher.stats.items()}}
@@ -0,0 +1,256 @@
+"""
+競速模式：多個已登入並停在商品頁的 context 同時（或依偏移錯開）開始結帳
+
+所有競速者使用同一帳號、共用同一個購物車，因此加入購物車（流程中標示 once 的步驟）只由第一組執行一次，
+其餘各組前往同一個購物車頁，再一起競速之後的步驟。最先完成 checkout（抵達送出訂單前一步）的一組
+勝出並送出訂單，其餘立即取消，不會進入送出訂單的步驟，避免重複下單。每一組的時間軸都記錄在報告中。
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+from buyer.aio.base import race
+from buyer.factory import PlatformFactory
+from buyer.footprint import launch_options
+from buyer.instrument import Tracer, instrument_page
+from buyer.scheduler import PrecisionScheduler, parse_scheduled_time
+from buyer.session import SessionCache
+
+logger = logging.getLogger(__name__)
+
+class RaceFailed(Exception):
+    """所有競速者都未能完成結帳，results 保留各組的時間軸"""
+    def __init__(self, message: str, results: List['RacerResult']):
+        super().__init__(message)
+        self.results = results
+
+@dataclass
+class RacerResult:
+    """單一競速者的結果與時間軸（毫秒，相對於開始競速的時間點）"""
+    index: int
+    offset_ms: float = 0.0
+    status: str = 'pending'
+    error: Optional[str] = None
+    started_ms: Optional[float] = None
+    checkout_ms: Optional[float] = None
+    finished_ms: Optional[float] = None
+    timeline: List[Dict] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            'index': self.index,
+            'offset_ms': self.offset_ms,
+            'status': self.status,
+            'error': self.error,
+            'started_ms': self.started_ms,
+            'checkout_ms': self.checkout_ms,
+            'finished_ms': self.finished_ms,
+            'timeline': self.timeline,
+        }
+
+def parse_offsets(text: Optional[str], racers: int) -> List[float]:
+    """解析以逗號分隔的偏移毫秒數，不足的部分補 0"""
+    offsets = [float(value) for value in text.split(',') if value.strip()] if text else []
+    if len(offsets) > racers:
+        raise ValueError(f"偏移數量（{len(offsets)}）多於競速數（{racers}）")
+    if any(offset < 0 for offset in offsets):
+        raise ValueError("偏移不可為負數")
+    return offsets + [0.0] * (racers - len(offsets))
+
+async def race_checkout(
+    buyers: Sequence,
+    offsets_ms: Sequence[float],
+    tracers: Optional[Sequence[Tracer]] = None,
+    timeout: Optional[float] = None,
+    clock=time.perf_counter,
+) -> List[RacerResult]:
+    """由第一組加入購物車後，讓所有 buyer 依偏移從購物車開始 checkout，最先完成者送出訂單，其餘取消
+
+    回傳每一組的結果，勝出者的 status 為 won；加入購物車失敗或全部失敗時拋出 RaceFailed。
+    """
+    results = [RacerResult(index=i, offset_ms=offset) for i, offset in enumerate(offsets_ms)]
+    origin = clock()
+
+    def elapsed_ms() -> float:
+        return (clock() - origin) * 1000
+
+    def collect_timelines():
+        if tracers:
+            for result, racer_tracer in zip(results, tracers):
+                result.timeline = [span.to_dict() for span in racer_tracer.spans]
+
+    # 共用的購物車只加入一次，否則每一組各加一件，勝出者會連同其他組加入的數量一起結帳
+    try:
+        if tracers:
+            with tracers[0].activate():
+                with tracers[0].span('add_to_cart'):
+                    cart_url = await buyers[0].add_to_cart()
+        else:
+            cart_url = await buyers[0].add_to_cart()
+    except Exception as e:
+        results[0].status = 'failed'
+        results[0].error = f"加入購物車失敗: {str(e)}"
+        results[0].finished_ms = elapsed_ms()
+        collect_timelines()
+        raise RaceFailed(results[0].error, results)
+
+    async def run(index: int):
+        result = results[index]
+        if result.offset_ms:
+            await asyncio.sleep(result.offset_ms / 1000)
+        result.started_ms = elapsed_ms()
+        tracer = tracers[index] if tracers else None
+        try:
+            if tracer:
+                with tracer.activate():
+                    with tracer.span('checkout'):
+                        await buyers[index].checkout(from_cart=cart_url)
+            else:
+                await buyers[index].checkout(from_cart=cart_url)
+            result.checkout_ms = elapsed_ms()
+        except asyncio.CancelledError:
+            result.status = 'cancelled'
+            result.finished_ms = elapsed_ms()
+            raise
+        except Exception as e:
+            result.status = 'failed'
+            result.error = str(e)
+            result.finished_ms = elapsed_ms()
+            logger.warning(f"競速者 #{index} 失敗: {str(e)}")
+            raise
+
+    try:
+        winner = int(await race({str(i): run(i) for i in range(len(buyers))}, timeout=timeout))
+    except TimeoutError as e:
+        # 逾時時仍在執行的競速者已被取消
+        await asyncio.sleep(0)
+        collect_timelines()
+        raise RaceFailed(str(e), results)
+    # race 取消的 task 要到下一輪事件迴圈才會執行完清理
+    await asyncio.sleep(0)
+    for result in results:
+        if result.status == 'pending' and result.index != winner:
+            result.status = 'cancelled'
+            result.finished_ms = result.finished_ms or elapsed_ms()
+
+    champion = results[winner]
+    logger.info(f"競速者 #{winner} 勝出（偏移 {champion.offset_ms:.0f} ms，結帳 {champion.checkout_ms:.0f} ms）")
+    tracer = tracers[winner] if tracers else None
+    try:
+        if tracer:
+            with tracer.activate():
+                with tracer.span('submit_order'):
+                    await buyers[winner].submit_order()
+        else:
+            await buyers[winner].submit_order()
+        champion.status = 'won'
+    except Exception as e:
+        champion.status = 'failed'
+        champion.error = f"送出訂單失敗: {str(e)}"
+        raise
+    finally:
+        champion.finished_ms = elapsed_ms()
+        collect_timelines()
+    return results
+
+def log_race(results: List[RacerResult]):
+    """輸出每一組的時間軸摘要"""
+    for result in results:
+        checkout = f"{result.checkout_ms:.0f} ms" if result.checkout_ms is not None else '-'
+        finished = f"{result.finished_ms:.0f} ms" if result.finished_ms is not None else '-'
+        error = f"（{result.error}）" if result.error else ''
+        logger.info(
+            f"  #{result.index} 偏移 {result.offset_ms:.0f} ms：{result.status}{error}，"
+            f"開始 {result.started_ms or 0:.0f} ms，完成結帳 {checkout}，結束 {finished}"
+        )
+
+async def run_race(
+    url: str,
+    racers: int = 3,
+    offsets_ms: Optional[Sequence[float]] = None,
+    scheduled_time: Optional[str] = None,
+    lead_ms: float = 0.0,
+    keep_alive_interval: float = 120.0,
+    headless: bool = False,
+    session_dir: Optional[str] = '.auth',
+    block_resources: bool = False,
+    buyer_options: Optional[Dict] = None,
+    trace_dir: Optional[str] = None,
+    low_footprint: bool = False,
+) -> List[RacerResult]:
+    """以 racers 個 context 競速購買同一商品，low_footprint 以低資源模式啟動瀏覽器與 context"""
+    from playwright.async_api import async_playwright
+    from buyer.profile import resolve_profile
+    from buyer.runner import create_context_async
+
+    if racers < 1:
+        raise ValueError("racers 必須大於 0")
+    offsets_ms = list(offsets_ms) if offsets_ms else [0.0] * racers
+    if len(offsets_ms) != racers:
+        raise ValueError("偏移數量必須等於競速數")
+
+    platform = PlatformFactory.detect_platform(url)
+    session_cache = SessionCache(session_dir) if session_dir else None
+    # 所有競速者使用同一帳號，共用同一份瀏覽器設定檔，沿用的登入狀態才不會被視為新裝置
+    profile = resolve_profile(platform, session_cache, buyer_options)
+    tracers = [Tracer(f"{platform}-racer{i}") for i in range(racers)]
+    results = []
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(**launch_options(headless, low_footprint))
+        try:
+            buyers = []
+            # 依序登入：第一組完成登入並寫入快取後，其餘各組直接沿用
+            for tracer in tracers:
+                context = await create_context_async(browser, url, block_resources, profile=profile, low_footprint=low_footprint)
+                page = instrument_page(await context.new_page(), tracer, is_async=True)
+                with tracer.activate():
+                    buyers.append(await PlatformFactory.create_async_buyer(
+                        url, page, session_cache=session_cache, **(buyer_options or {})
+                    ))
+
+            async def prepare(buyer, tracer):
+                with tracer.activate():
+                    await buyer.prepare()
+
+            if (buyer_options or {}).get('prefill'):
+                # 所有競速者共用同一個購物車：由第一組走結帳並記下結帳表單，其餘各組直接沿用
+                await prepare(buyers[0], tracers[0])
+                for buyer in buyers[1:]:
+                    buyer.options['prefill'] = False
+                    buyer.prefill = getattr(buyers[0], 'prefill', None)
+                await asyncio.gather(*(prepare(b, t) for b, t in zip(buyers[1:], tracers[1:])))
+            else:
+                await asyncio.gather(*(prepare(b, t) for b, t in zip(buyers, tracers)))
+            logger.info(f"{racers} 組競速者已停在商品頁")
+
+            if scheduled_time:
+                async def keep_alive():
+                    await asyncio.gather(*(b.keep_alive() for b in buyers))
+
+                clock_offset = await buyers[0].calibrate_clock() if (buyer_options or {}).get('clock_sync') else 0.0
+                scheduler = PrecisionScheduler(lead_time_ms=lead_ms, clock_offset=clock_offset)
+                await scheduler.wait_until_async(
+                    parse_scheduled_time(scheduled_time),
+                    on_idle=keep_alive if keep_alive_interval > 0 else None,
+                    idle_interval=keep_alive_interval or 120,
+                )
+
+            try:
+                results = await race_checkout(buyers, offsets_ms, tracers)
+            except RaceFailed as e:
+                logger.error("所有競速者皆未完成結帳:")
+                log_race(e.results)
+                raise
+            finally:
+                await buyers[0].save_session()
+        finally:
+            if trace_dir:
+                for tracer in tracers:
+                    tracer.export(trace_dir)
+            await browser.close()
+
+    logger.info("競速結果:")
+    log_race(results)
+    return results
@@ -0,0 +1,272 @@
+"""
+本機模擬的 PChome / MOMO 商店，用於離線量測完整購買流程的耗時
+
+頁面只保留購買器實際使用的選擇器，請求依網域分派：瀏覽器端以 context.route
+把真實網址改寫為 http://127.0.0.1:{port}/{網域}{路徑}，購買器的程式碼不需要任何修改。
+每個請求可注入固定延遲與隨機抖動，模擬開賣時的網站負載。
+"""
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+PCHOME_PRODUCT_URL = "https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ"
+MOMO_PRODUCT_URL = "https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=10001234"
+
+_PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+{body}
+</body></html>'''
+
+_PCHOME_LOGIN = '''
+<input type="text" placeholder="請輸入手機號碼 或 Email">
+<button type="button">繼續</button>
+<input type="password" placeholder="請輸入密碼（英文大小寫有差別）">
+<button type="button">登入</button>
+<button type="button">送出</button>
+<div class="captcha">
+  <div><div class="c-input__captcha"><input maxlength="1"></div></div>
+  <div><div class="c-input__captcha"><input maxlength="1"></div></div>
+  <div><div class="c-input__captcha"><input maxlength="1"></div></div>
+  <div><div class="c-input__captcha"><input maxlength="1"></div></div>
+  <div><div class="c-input__captcha"><input maxlength="1"></div></div>
+  <div><div class="c-input__captcha"><input maxlength="1"></div></div>
+</div>
+<button type="button" id="confirm">確認</button>
+<button type="button" id="cancel">取消</button>
+<script>
+document.getElementById('confirm').onclick = () => { document.cookie = 'mock_login=pchome; path=/'; };
+</script>
+'''
+
+_PCHOME_PRODUCT = '''
+<div class="o-prodMainName"><h1 class="o-prodMainName__grayDarkest">模擬商品</h1></div>
+<div class="o-prodPrice__priceBox">
+  <div class="o-prodPrice__price--xxxl700Primary">$1,990</div>
+  <div class="o-prodPrice__originalPrice--m500Gray">$2,490</div>
+</div>
+<div id="ProdBriefing">{button}</div>
+<script>
+const buy = document.querySelector('button[data-regression="product_button_buyNow"]');
+if (buy) buy.onclick = () => {{ location.href = 'https://ecssl.pchome.com.tw/sys/cflow/fsindex/BigCar/BIGCAR/ItemList'; }};
+</script>
+'''
+
+_PCHOME_BUY_BUTTON = '<button data-regression="product_button_buyNow"><span class="btn__text">立即購買</span></button>'
+_PCHOME_NOTIFY_BUTTON = '<button><span class="btn__text">有貨通知我</span></button>'
+
+_PCHOME_CART = '''
+<div class="cart-item"><a href="https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ">模擬商品</a> x 1 <button type="button" class="remove">刪除</button></div>
+<button data-regression="step1-checkout-btn">去結帳</button>
+<div id="dialog" style="display:none"><button id="ok">確定</button></div>
+<script>
+const toCheckout = () => { location.href = '/sys/cflow/fsindex/BigCar/BIGCAR/Checkout'; };
+document.querySelector('button[data-regression="step1-checkout-btn"]').onclick = () => {
+  if ({confirm_dialog}) document.getElementById('dialog').style.display = 'block';
+  else toCheckout();
+};
+document.getElementById('ok').onclick = toCheckout;
+for (const button of document.querySelectorAll('button.remove')) {
+  button.onclick = () => { if (confirm('確定刪除？')) button.closest('.cart-item').remove(); };
+}
+</script>
+'''
+
+_PCHOME_CHECKOUT = '''
+<form id="order">
+  <input type="text" name="name" value="王小明">
+  <label><input type="radio" name="payment" value="card" checked>信用卡</label>
+  <label><input type="radio" name="payment" value="atm">ATM 轉帳</label>
+  <select name="delivery"><option value="home" selected>宅配</option><option value="store">超商取貨</option></select>
+  <input type="checkbox" name="invoice_donate">
+  <input type="text" name="cvc" placeholder="CVC">
+  <button type="submit">確認付款</button>
+</form>
+'''
+
+_MOMO_PRODUCT = '''
+<a class="loginBtn" href="/login/Login.jsp">登入</a>
+<h3 id="osmGoodsName">模擬商品</h3>
+<ul class="prdPrice">
+  <li>市售價 <span class="seoPrice">2,490</span></li>
+  <li>促銷價 <span class="seoPrice">1,990</span></li>
+</ul>
+<div id="buy_yes" style="display:{buy_yes}"><a class="buynow" href="/order/Cart.jsp">立即購買</a></div>
+<div id="buy_no" style="display:{buy_no}">售完補貨中</div>
+<script>
+// 登入後以會員名稱取代登入連結
+if (document.cookie.includes('mock_login=momo')) {{
+  const link = document.querySelector('a.loginBtn');
+  link.className = 'userName';
+  link.textContent = '模擬會員';
+}}
+</script>
+'''
+
+_MOMO_LOGIN = '''
+<input id="memId">
+<input id="passwd" type="password">
+<button class="login" type="button">登入</button>
+<script>
+document.querySelector('button.login').onclick = () => {
+  document.cookie = 'mock_login=momo; path=/';
+  location.href = '/goods/GoodsDetail.jsp?i_code=10001234';
+};
+</script>
+'''
+
+_MOMO_CART = '<div class="cart-item">模擬商品 x 1</div><a class="checkoutBtn" href="/order/Checkout.jsp">結帳</a>'
+_MOMO_CHECKOUT = '<div>訂購資訊</div><a id="orderSendBtn" href="/order/Done.jsp">送出訂單</a>'
+_MOMO_DONE = '<div id="orderDone">訂單已成立</div>'
+
+class MockShop:
+    """以 ThreadingHTTPServer 提供模擬商店頁面
+
+    latency_ms 與 jitter_ms 為每個請求的注入延遲；in_stock 控制商品頁是否可購買，
+    confirm_dialog 控制 PChome 結帳時是否出現「確定」確認視窗。
+    """
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        in_stock: bool = True,
+        confirm_dialog: bool = False,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.in_stock = in_stock
+        self.confirm_dialog = confirm_dialog
+        self.requests = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        shop = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                shop._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mockshop', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def local_url(self, url: str) -> str:
+        """把真實網址改寫為模擬伺服器的網址"""
+        parsed = urlparse(url)
+        query = f"?{parsed.query}" if parsed.query else ''
+        return f"{self.base_url}/{parsed.hostname}{parsed.path or '/'}{query}"
+
+    def _delay(self) -> float:
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        parsed = urlparse(handler.path)
+        host, _, path = parsed.path.lstrip('/').partition('/')
+        path = '/' + path
+        with self._lock:
+            self.requests.append((host, path))
+
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+
+        page = self.render(host, path, parse_qs(parsed.query))
+        if page is None:
+            handler.send_error(404)
+            return
+
+        title, body = page
+        content = _PAGE.format(title=title, body=body).encode('utf-8')
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/html; charset=utf-8')
+        handler.send_header('Content-Length', str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    def render(self, host: str, path: str, query: Dict) -> Optional[tuple]:
+        """依網域與路徑產生 (標題, 內容)，找不到頁面時回傳 None"""
+        if host == '24h.pchome.com.tw' and path.startswith('/prod/'):
+            button = _PCHOME_BUY_BUTTON if self.in_stock else _PCHOME_NOTIFY_BUTTON
+            return 'PChome 商品', _PCHOME_PRODUCT.format(button=button)
+        if host == 'ecvip.pchome.com.tw' and path.startswith('/login/'):
+            return 'PChome 登入', _PCHOME_LOGIN
+        if host == 'ecssl.pchome.com.tw' and path.endswith('/ItemList'):
+            return 'PChome 購物車', _PCHOME_CART.replace('{confirm_dialog}', 'true' if self.confirm_dialog else 'false')
+        if host == 'ecssl.pchome.com.tw' and path.endswith('/Checkout'):
+            return 'PChome 結帳', _PCHOME_CHECKOUT
+
+        if host == 'www.momoshop.com.tw':
+            if path == '/goods/GoodsDetail.jsp':
+                return 'MOMO 商品', _MOMO_PRODUCT.format(
+                    buy_yes='block' if self.in_stock else 'none',
+                    buy_no='none' if self.in_stock else 'block',
+                )
+            if path == '/login/Login.jsp':
+                return 'MOMO 登入', _MOMO_LOGIN
+            if path == '/order/Cart.jsp':
+                return 'MOMO 購物車', _MOMO_CART
+            if path == '/order/Checkout.jsp':
+                return 'MOMO 結帳', _MOMO_CHECKOUT
+            if path == '/order/Done.jsp':
+                return 'MOMO 訂單完成', _MOMO_DONE
+        return None
+
+    def install(self, context):
+        """將 context 的所有請求導向模擬伺服器（同步 API），其他網域一律封鎖"""
+        def handle(route):
+            url = route.request.url
+            if not url.startswith(('http://', 'https://')) or url.startswith(self.base_url):
+                route.continue_()
+                return
+            if self.is_shop_url(url):
+                route.fulfill(response=route.fetch(url=self.local_url(url)))
+            else:
+                route.abort()
+
+        context.route('**/*', handle)
+
+    async def install_async(self, context):
+        """install 的 asyncio 版本"""
+        async def handle(route):
+            url = route.request.url
+            if not url.startswith(('http://', 'https://')) or url.startswith(self.base_url):
+                await route.continue_()
+                return
+            if self.is_shop_url(url):
+                await route.fulfill(response=await route.fetch(url=self.local_url(url)))
+            else:
+                await route.abort()
+
+        await context.route('**/*', handle)
+
+    @staticmethod
+    def is_shop_url(url: str) -> bool:
+        """是否為模擬商店負責的網域"""
+        host = urlparse(url).hostname or ''
+        return host.endswith(('pchome.com.tw', 'momoshop.com.tw'))
@@ -0,0 +1,78 @@
+import json
+import pytest
+from accounts import Account, AccountPool, account_report, load_accounts
+from batch import BatchJob, JobResult, _job_options
+
+PCHOME_URL = "https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ"
+MOMO_URL = "https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=12345678"
+
+def _account(name, platform='pchome'):
+    return Account(name, platform, f"{name}@example.com", 'secret', {'CVC': '123'})
+
+def test_load_accounts_from_json_and_csv(tmp_path):
+    """測試讀取 JSON 與 CSV 帳號池，CSV 以 payment.<欄位> 表示付款資訊"""
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps({"accounts": [
+        {"name": "main", "platform": "pchome", "username": "a@example.com", "password": "hunter2", "payment": {"CVC": 123}},
+        {"platform": "MOMO", "username": "b@example.com", "password": "y"},
+    ]}), encoding='utf-8')
+    main, second = load_accounts(str(path))
+    assert main.payment == {'CVC': '123'}
+    assert (second.name, second.platform) == ('momo-2', 'momo')
+    assert "hunter2" not in repr(main)
+
+    path = tmp_path / "accounts.csv"
+    path.write_text("name,platform,username,password,payment.CVC\nmain,pchome,a@example.com,x,456\n", encoding='utf-8')
+    account, = load_accounts(str(path))
+    assert account.payment == {'CVC': '456'}
+
+@pytest.mark.parametrize('rows, message', [
+    ([{"platform": "pchome", "username": "a"}], 'password'),
+    ([{"platform": "shopee", "username": "a", "password": "x"}], 'shopee'),
+    ([{"name": "a", "platform": "pchome", "username": "a", "password": "x"}] * 2, '名稱重複'),
+])
+def test_load_accounts_rejects_invalid_rows(tmp_path, rows, message):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(rows), encoding='utf-8')
+    with pytest.raises(ValueError, match=message):
+        load_accounts(str(path))
+
+def test_pool_assigns_least_loaded_account_per_platform():
+    """測試指定帳號的工作優先保留，其餘依平台分配工作最少的帳號"""
+    pool = AccountPool([_account('p1'), _account('p2'), _account('m1', 'momo')])
+    jobs = [
+        BatchJob(PCHOME_URL, platform='pchome', name='a'),
+        BatchJob(PCHOME_URL, platform='pchome', name='b', account='p1'),
+        BatchJob(MOMO_URL, platform='momo', name='c'),
+        BatchJob(PCHOME_URL, platform='pchome', name='d'),
+    ]
+    assert [j.account for j in pool.assign(jobs)] == ['p2', 'p1', 'm1', 'p1']
+
+    with pytest.raises(ValueError, match='不符'):
+        pool.assign([BatchJob(MOMO_URL, platform='momo', name='x', account='p1')])
+    with pytest.raises(ValueError, match='沒有 momo'):
+        AccountPool([_account('p1')]).assign([BatchJob(MOMO_URL, platform='momo', name='x')])
+
+def test_fan_out_and_job_options():
+    """測試單一工作展開到每個帳號，並把帳號與速率限制傳給購買器"""
+    pool = AccountPool([_account('p1'), _account('p2'), _account('m1', 'momo')])
+    jobs = pool.fan_out(BatchJob(PCHOME_URL, platform='pchome', name='job'))
+    assert [(j.name, j.account) for j in jobs] == [('job@p1', 'p1'), ('job@p2', 'p2')]
+
+    limiter = object()
+    options = _job_options(jobs[0], {'buyer_options': {'api_checkout': False}}, pool, limiter)
+    assert options['buyer_options'] == {'api_checkout': False, 'account': pool.get('p1'), 'rate_limiter': limiter}
+
+def test_account_report():
+    """測試依帳號彙整成功率、延遲與速率限制等待時間"""
+    results = [
+        JobResult(BatchJob(PCHOME_URL, account='p1'), success=True, total_ms=100,
+                  timing_stats={'throttle': {'requests': 3, 'waited_ms': 40.0}}),
+        JobResult(BatchJob(PCHOME_URL, account='p1'), success=False, total_ms=300),
+        JobResult(BatchJob(PCHOME_URL), success=True, total_ms=50),
+    ]
+    report = account_report(results)
+    assert report['p1']['success_rate'] == 0.5
+    assert report['p1']['latency_p50_ms'] == 200
+    assert report['p1']['throttled_ms'] == 40.0
+    assert report['(.env)']['jobs'] == 1
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from buyer.aio.base import race
+
+async def _after(delay: float, value=None, error: Exception = None):
+    await asyncio.sleep(delay)
+    if error:
+        raise error
+    return value
+
+def test_race_returns_first_completed_and_cancels_others():
+    """測試 race 回傳最先成立的條件並取消其餘等待"""
+    async def scenario():
+        slow = asyncio.ensure_future(_after(1))
+        winner = await race({'fast': _after(0.01), 'slow': slow})
+        await asyncio.sleep(0)
+        return winner, slow.cancelled()
+
+    winner, slow_cancelled = asyncio.run(scenario())
+    assert winner == 'fast'
+    assert slow_cancelled
+
+def test_race_ignores_failed_conditions():
+    """測試發生例外的條件不會勝出"""
+    winner = asyncio.run(race({
+        'error': _after(0, error=RuntimeError("boom")),
+        'ok': _after(0.01),
+    }))
+    assert winner == 'ok'
+
+def test_race_timeout():
+    """測試全部條件未在時限內成立時拋出 TimeoutError"""
+    with pytest.raises(TimeoutError):
+        asyncio.run(race({'never': _after(1)}, timeout=0.01))
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import pytest
+from batch import BatchJob, check_concurrency, load_jobs, run_batch, run_job_async
+
+PCHOME_URL = "https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ"
+MOMO_URL = "https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=12345678"
+
+def test_load_jobs_from_json(tmp_path):
+    """測試讀取 JSON 工作檔並自動判斷平台"""
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps([
+        {"url": PCHOME_URL, "time": "2024-03-20 12:00:00", "name": "switch"},
+        {"url": MOMO_URL},
+    ]), encoding='utf-8')
+
+    jobs = load_jobs(str(path))
+    assert [j.platform for j in jobs] == ["pchome", "momo"]
+    assert jobs[0].name == "switch"
+    assert jobs[0].time == "2024-03-20 12:00:00"
+    assert jobs[1].name == "job-2"
+    assert jobs[1].time is None
+
+def test_load_jobs_from_csv(tmp_path):
+    """測試讀取 CSV 工作檔"""
+    path = tmp_path / "jobs.csv"
+    path.write_text(f"url,time,platform\n{MOMO_URL},2024-03-20 12:00:00,momo\n", encoding='utf-8')
+
+    jobs = load_jobs(str(path))
+    assert len(jobs) == 1
+    assert jobs[0].platform == "momo"
+
+def test_load_jobs_rejects_mismatched_platform(tmp_path):
+    """測試宣告的平台與連結不符時報錯"""
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps({"jobs": [{"url": MOMO_URL, "platform": "pchome"}]}), encoding='utf-8')
+
+    with pytest.raises(ValueError):
+        load_jobs(str(path))
+
+def test_jobs_sharing_a_drop_must_fit_concurrency():
+    """測試同一預定時間的工作數超過同時執行上限時，在啟動瀏覽器前拒絕執行"""
+    drop = '2024-03-20 12:00:00'
+    jobs = [BatchJob(url=PCHOME_URL, time=drop, name=f'job-{i}') for i in range(3)]
+    jobs += [BatchJob(url=MOMO_URL, name='now'), BatchJob(url=MOMO_URL, time='2024-03-20 13:00:00', name='later')]
+    check_concurrency(jobs, 3)
+    with pytest.raises(ValueError, match='至少 3'):
+        check_concurrency(jobs, 2)
+    with pytest.raises(ValueError, match='至少 3'):
+        run_batch(jobs, concurrency=2)
+    with pytest.raises(ValueError, match='大於 0'):
+        check_concurrency([], 0)
+
+class CountingWatchdog:
+    """記錄目前開啟中的 context 數"""
+    def __init__(self):
+        self.open = 0
+
+    def wait_for_headroom(self):
+        pass
+
+    def context_opened(self):
+        self.open += 1
+
+    def context_closed(self):
+        self.open -= 1
+
+class FailingContext:
+    """建立頁面時失敗的 context"""
+    def __init__(self):
+        self.closed = False
+
+    async def new_page(self):
+        raise RuntimeError("Target closed")
+
+    async def close(self):
+        self.closed = True
+
+class FakeBrowser:
+    def __init__(self, fail_context: bool):
+        self.fail_context = fail_context
+        self.contexts = []
+
+    async def new_context(self, **options):
+        if self.fail_context:
+            raise RuntimeError("browser has been closed")
+        context = FailingContext()
+        self.contexts.append(context)
+        return context
+
+@pytest.mark.parametrize('fail_context', [True, False])
+def test_setup_failure_is_reported_as_job_result(tmp_path, fail_context):
+    """測試建立 context 或頁面失敗時記錄在該筆工作的結果，已建立的 context 會關閉且 watchdog 計數歸零"""
+    browser = FakeBrowser(fail_context)
+    watchdog = CountingWatchdog()
+    job = BatchJob(url=PCHOME_URL, name='switch', platform='pchome')
+    result = asyncio.run(run_job_async(
+        browser, job, asyncio.Semaphore(1), watchdog=watchdog, diagnostics={'directory': str(tmp_path)},
+    ))
+
+    assert not result.success and result.error
+    assert 'trace' in result.timing_stats
+    assert watchdog.open == 0
+    assert all(context.closed for context in browser.contexts)
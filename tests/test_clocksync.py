@@ -0,0 +1,54 @@
+import math
+import pytest
+from buyer.clocksync import ClockSample, ClockSync, ClockSyncError, offset_bounds
+
+class SimulatedServer:
+    """模擬伺服器：時間比本機快 offset 秒，請求單程耗時 rtt/2"""
+    def __init__(self, offset: float, rtt: float, start: float = 1_700_000_000.25):
+        self.offset = offset
+        self.rtt = rtt
+        self.now = start
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def fetch(self) -> ClockSample:
+        sent = self.now
+        server_time = sent + self.rtt / 2 + self.offset
+        self.now = sent + self.rtt
+        return ClockSample(sent, self.now, math.floor(server_time))
+
+@pytest.mark.parametrize('offset', [0.3456, -1.2, 0.0])
+def test_calibrate_converges_to_server_offset(offset):
+    """測試多次取樣後估計值收斂，誤差範圍包含真實時間差"""
+    server = SimulatedServer(offset=offset, rtt=0.04)
+    estimate = ClockSync('https://24h.pchome.com.tw/prod/x', samples=10, clock=server, fetch=server.fetch).calibrate()
+
+    assert estimate.host == '24h.pchome.com.tw'
+    assert abs(estimate.offset - offset) <= estimate.uncertainty + 1e-9
+    # 精度受 RTT 限制
+    assert estimate.uncertainty <= 0.03
+    assert estimate.rtt == pytest.approx(0.04)
+    assert estimate.to_dict()['samples'] == 10
+
+def test_single_sample_bounds_span_one_second_plus_rtt():
+    """測試單次取樣的區間寬度為 1 秒加上 RTT"""
+    low, high = offset_bounds([ClockSample(sent=100.0, received=100.1, server_second=105)])
+    assert low == pytest.approx(4.9)
+    assert high == pytest.approx(6.0)
+
+def test_inconsistent_samples_raise():
+    """測試互相矛盾的取樣（伺服器時鐘跳動）會拋出例外"""
+    samples = [
+        ClockSample(sent=100.0, received=100.1, server_second=105),
+        ClockSample(sent=101.0, received=101.1, server_second=110),
+    ]
+    with pytest.raises(ClockSyncError):
+        offset_bounds(samples)
+    with pytest.raises(ClockSyncError):
+        offset_bounds([])
@@ -0,0 +1,150 @@
+import asyncio
+from buyer import runner
+from buyer.diagnostics import Diagnostics
+from daemon import BrowserPool, BuyerDaemon, submit
+
+PCHOME_URL = "https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ"
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+class FakePool:
+    """不啟動瀏覽器的瀏覽器池，記錄取用與歸還"""
+    def __init__(self):
+        self.started = False
+        self.closed = False
+        self.idle = []
+        self.released = []
+
+    async def start(self):
+        self.started = True
+
+    async def close(self):
+        self.closed = True
+
+    async def acquire(self, url, profile=None, account=None):
+        if self.idle:
+            return self.idle.pop()
+        return object(), FakePage()
+
+    async def release(self, url, context, page, healthy=True, account=None):
+        self.released.append(healthy)
+        if healthy:
+            self.idle.append((context, page))
+
+    def status(self):
+        return {'idle': {'pchome': len(self.idle)}}
+
+class FakeBuyer:
+    def __init__(self):
+        self.timing_stats = {'login': 'cached', 'steps': {'purchase': 1.0}}
+
+def _serve(tmp_path, requests):
+    """啟動常駐程序，於背景執行緒送出 requests 後關閉，回傳回應與瀏覽器池"""
+    pool = FakePool()
+    socket_path = str(tmp_path / 'daemon.sock')
+    server = BuyerDaemon(pool, socket_path, session_dir=None)
+
+    async def scenario():
+        serving = asyncio.ensure_future(server.serve())
+        while not (tmp_path / 'daemon.sock').exists():
+            await asyncio.sleep(0.01)
+        loop = asyncio.get_running_loop()
+        responses = []
+        for request in requests + [{'cmd': 'shutdown'}]:
+            responses.append(await loop.run_in_executor(None, submit, request, socket_path, 5))
+        await serving
+        return responses
+
+    return asyncio.run(scenario()), pool
+
+def test_buy_reuses_pooled_context(tmp_path, monkeypatch):
+    """測試工作透過 socket 執行，context 用完歸還並被下一筆沿用"""
+    pages = []
+
+    async def execute(page, url, scheduled_time=None, **kwargs):
+        pages.append(page)
+        options = dict(kwargs['buyer_options'])
+        # 每筆工作各自的 Diagnostics 會加進購買器選項
+        assert isinstance(options.pop('diagnostics'), Diagnostics)
+        assert options == {'api_checkout': False}
+        return FakeBuyer()
+
+    monkeypatch.setattr(runner, 'execute_purchase_async', execute)
+    request = {'cmd': 'buy', 'url': PCHOME_URL, 'name': 'job', 'buyer_options': {'api_checkout': False}}
+    responses, pool = _serve(tmp_path, [{'cmd': 'ping'}, request, request, {'cmd': 'status'}])
+
+    ping, first, second, status, shutdown = responses
+    assert ping['ok'] and shutdown['ok']
+    assert first['ok'] and first['result']['name'] == 'job'
+    assert first['result']['timing_stats']['login'] == 'cached'
+    assert 'acquire_ms' in first['result']['timing_stats']
+    assert pages[0] is pages[1]
+    assert status['jobs'] == {'running': 0, 'succeeded': 2, 'failed': 0}
+    assert pool.started and pool.closed
+    assert not (tmp_path / 'daemon.sock').exists()
+
+def test_failed_job_discards_context(tmp_path, monkeypatch):
+    """測試失敗的工作回報錯誤，context 不放回閒置池"""
+    async def execute(page, url, scheduled_time=None, **kwargs):
+        raise RuntimeError("sold out")
+
+    monkeypatch.setattr(runner, 'execute_purchase_async', execute)
+    responses, pool = _serve(tmp_path, [{'cmd': 'buy', 'url': PCHOME_URL}])
+    assert responses[0]['ok'] is False
+    assert responses[0]['result']['error'] == 'sold out'
+    assert pool.released == [False]
+
+def test_failed_acquire_counts_as_failed_job(tmp_path, monkeypatch):
+    """測試取得 context 失敗時工作回報錯誤、計入失敗，且不歸還不存在的 context"""
+    async def acquire(url, profile=None, account=None):
+        raise RuntimeError("browser closed")
+
+    monkeypatch.setattr(FakePool, 'acquire', staticmethod(acquire))
+    responses, pool = _serve(tmp_path, [{'cmd': 'buy', 'url': PCHOME_URL}, {'cmd': 'status'}])
+    assert responses[0]['ok'] is False
+    assert responses[0]['result']['error'] == 'browser closed'
+    assert responses[1]['jobs'] == {'running': 0, 'succeeded': 0, 'failed': 1}
+    assert pool.released == []
+
+def test_pool_keeps_idle_contexts_per_account(monkeypatch):
+    """測試閒置的 context 只交給同平台、同帳號的工作，不會把已登入的 context 交給其他帳號"""
+    class FakeContext:
+        async def new_page(self):
+            return FakePage()
+
+        async def close(self):
+            pass
+
+    async def create_context(browser, url, block_resources=False, profile=None, low_footprint=False):
+        return FakeContext()
+
+    async def browser():
+        return object()
+
+    monkeypatch.setattr(runner, 'create_context_async', create_context)
+    pool = BrowserPool()
+    monkeypatch.setattr(pool, '_browser', browser)
+
+    async def scenario():
+        first = await pool.acquire(PCHOME_URL, account='a')
+        await pool.release(PCHOME_URL, *first, account='a')
+        other = await pool.acquire(PCHOME_URL, account='b')
+        again = await pool.acquire(PCHOME_URL, account='a')
+        await pool.release(PCHOME_URL, *other, account='b')
+        return first, other, again
+
+    first, other, again = asyncio.run(scenario())
+    assert other[0] is not first[0] and again[0] is first[0]
+    assert pool.stats['created'] == 2 and pool.stats['reused'] == 1
+    assert pool.status()['idle'] == {'pchome': 1}
+
+def test_invalid_requests(tmp_path):
+    """測試不支援的指令與缺少參數"""
+    responses, _ = _serve(tmp_path, [{'cmd': 'nope'}, {'cmd': 'buy'}])
+    assert responses[0] == {'ok': False, 'error': '不支援的指令: nope'}
+    assert responses[1]['ok'] is False
@@ -0,0 +1,110 @@
+import asyncio
+import gzip
+import json
+from buyer.diagnostics import Diagnostics
+
+class FakePage:
+    """記錄 content 與 screenshot 的呼叫順序"""
+    def __init__(self, url='https://shop.example/cart'):
+        self.url = url
+        self.calls = []
+
+    def content(self):
+        self.calls.append('content')
+        return '<html>售完</html>'
+
+    def screenshot(self):
+        self.calls.append('screenshot')
+        return b'\x89PNG'
+
+class AsyncFakePage(FakePage):
+    async def content(self):
+        return super().content()
+
+    async def screenshot(self):
+        await asyncio.sleep(0)
+        return super().screenshot()
+
+class FakeTracing:
+    def __init__(self):
+        self.calls = []
+
+    def start(self, **kwargs):
+        self.calls.append(('start', kwargs))
+
+    def stop(self, path=None):
+        self.calls.append(('stop', path))
+
+class FakeContext:
+    def __init__(self):
+        self.tracing = FakeTracing()
+
+def _read_gzip(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+def test_capture_defers_screenshot_until_flush(tmp_path):
+    """測試失敗當下只取 HTML，截圖延到 flush，並寫出壓縮過的資料"""
+    page = FakePage()
+    diag = Diagnostics(str(tmp_path), run_id='run-1')
+    diag.record(page, 'step.add_to_cart', outcome='success')
+    diag.capture(page, 'purchase_error')
+    assert page.calls == ['content']
+
+    run_dir = diag.flush()
+    assert page.calls == ['content', 'screenshot']
+    assert run_dir == tmp_path / 'run-1'
+    states = json.loads(_read_gzip(run_dir / 'states.json.gz'))
+    assert [s['label'] for s in states] == ['step.add_to_cart', 'purchase_error']
+    assert states[0]['outcome'] == 'success' and states[0]['url'] == page.url
+    assert _read_gzip(run_dir / states[1]['html']) == '<html>售完</html>'
+    assert (run_dir / states[1]['screenshot']).read_bytes() == b'\x89PNG'
+
+def test_ring_buffer_and_nothing_written_without_captures(tmp_path):
+    """測試環狀緩衝區只保留最近的狀態，沒有擷取且成功時不寫檔"""
+    page = FakePage()
+    diag = Diagnostics(str(tmp_path), run_id='run-2', capacity=3)
+    for i in range(5):
+        diag.record(page, f"step.{i}")
+    assert [s['label'] for s in diag.states] == ['step.2', 'step.3', 'step.4']
+    assert diag.flush() is None
+    assert not (tmp_path / 'run-2').exists()
+
+    # 執行失敗時即使沒有擷取也保留狀態紀錄
+    assert diag.flush(keep=True) == tmp_path / 'run-2'
+
+def test_trace_saved_only_when_kept(tmp_path):
+    """測試 Playwright trace 只在需要保留時寫檔"""
+    context = FakeContext()
+    diag = Diagnostics(str(tmp_path), run_id='ok', trace=True)
+    diag.start_tracing(context)
+    diag.flush()
+    assert context.tracing.calls[-1] == ('stop', None)
+
+    context = FakeContext()
+    diag = Diagnostics(str(tmp_path), run_id='failed', trace=True)
+    diag.start_tracing(context)
+    diag.flush(keep=True)
+    assert context.tracing.calls[-1] == ('stop', str(tmp_path / 'failed' / 'trace.zip'))
+
+def test_capture_async_runs_in_background(tmp_path):
+    """測試 asyncio 版本在背景擷取，呼叫端立即返回"""
+    page = AsyncFakePage()
+    diag = Diagnostics(str(tmp_path), run_id='run-3')
+
+    async def scenario():
+        await diag.capture_async(page, 'login_error')
+        returned = list(page.calls)
+        assert diag.captured
+        await diag.flush_async()
+        return returned
+
+    assert asyncio.run(scenario()) == []
+    assert page.calls == ['content', 'screenshot']
+    assert (tmp_path / 'run-3' / '01-login_error.png').exists()
+
+def test_without_directory_keeps_data_in_memory():
+    diag = Diagnostics()
+    diag.capture(FakePage(), 'error')
+    assert diag.flush(keep=True) is None
+    assert diag.states[0]['png'] == b'\x89PNG'
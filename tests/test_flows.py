@@ -0,0 +1,128 @@
+import json
+import pytest
+from buyer.flows import FlowError, compile_flow, flow_for_url, get_flow, load_flows
+from buyer.steps import StepEngine
+
+PCHOME_URL = "https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ"
+MOMO_URL = "https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=12345"
+
+def _flow(**overrides):
+    data = {
+        'platform': 'demo',
+        'domains': ['shop.example'],
+        'buyer': 'buyer.pchome:PChomeBuyer',
+        'async_buyer': 'buyer.aio.pchome:AsyncPChomeBuyer',
+        'locators': {'buy': {'selector': '#buy', 'wait': 'visible'}, 'cvc': 'input.cvc'},
+        'conditions': {'cart': {'selector': '.cart'}, 'alert': {'alert': ''}},
+        'checkout': [
+            {'name': 'add', 'click': 'buy', 'success': ['cart'], 'failure': ['alert']},
+            {'name': 'pay', 'fill': 'cvc', 'value': '$payment.CVC'},
+        ],
+    }
+    data.update(overrides)
+    return data
+
+def test_bundled_flows_are_compiled_once():
+    """測試內建流程可載入、依網域選取，且只編譯一次"""
+    assert load_flows() is load_flows()
+    assert flow_for_url(PCHOME_URL).platform == 'pchome'
+    assert flow_for_url(MOMO_URL).platform == 'momo'
+    add_to_cart, checkout = get_flow('momo').checkout
+    assert add_to_cart.step.in_page and add_to_cart.step.click == ('#buy_yes a.buynow', None)
+    # 頁面內點擊的步驟不需綁定動作
+    assert add_to_cart.click is None and checkout.step.in_page
+    assert get_flow('pchome').buyer_class().__name__ == 'PChomeBuyer'
+    assert get_flow('momo').buyer_class(is_async=True).__name__ == 'AsyncMomoBuyer'
+    with pytest.raises(ValueError, match='不支援的平台'):
+        flow_for_url("https://example.com/item")
+
+def test_compile_flow_builds_steps():
+    """測試條件與元素被編譯進步驟"""
+    flow = compile_flow(_flow())
+    add, pay = flow.checkout
+    assert [c['name'] for c in add.step.conditions_js()] == ['alert', 'cart']
+    assert flow.locators['buy'].wait == 'visible'
+    assert pay.step.success == ()
+
+def test_compile_flow_builds_stage_detection():
+    """測試 stages 編譯成單次檢查的步驟，條件依階段順序排列"""
+    flow = compile_flow(_flow(
+        stages={'cart': ['cart'], 'product': ['alert']},
+        checkout=[{'name': 'add', 'stage': 'product', 'click': 'buy', 'success': ['cart']}],
+    ))
+    assert flow.stage_step.timeout == 0
+    assert [c['name'] for c in flow.stage_step.conditions_js()] == ['cart', 'alert']
+    assert flow.stage_of('cart') == 'cart' and flow.stage_of(None) is None
+    assert flow.checkout[0].stage == 'product'
+    assert get_flow('pchome').stage_of('order_form') == 'checkout'
+    assert [s.stage for s in get_flow('momo').checkout] == ['product', 'cart']
+    assert [s.once for s in get_flow('pchome').checkout] == [True, False, False]
+    head, tail = get_flow('pchome').split_once()
+    assert [s.name for s in head] == ['add_to_cart'] and [s.name for s in tail] == ['checkout', 'fill_payment']
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'domains': []}, 'domains'),
+    ({'checkout': [{'name': 'x', 'success': ['missing']}]}, '未定義的條件'),
+    ({'checkout': [{'name': 'x', 'click': 'nope'}]}, '未定義的元素'),
+    ({'checkout': [{'name': 'x', 'click': 'buy', 'call': 'go'}]}, '只能指定一種動作'),
+    ({'checkout': [{'name': 'x', 'fill': 'cvc'}]}, 'value'),
+    ({'checkout': [{'name': 'x', 'wait': 3}]}, '不認得的欄位'),
+    ({'conditions': {'bad': {'css': '#x'}}}, '不認得的欄位'),
+    ({'stages': {'cart': ['missing']}}, '未定義的條件'),
+    ({'checkout': [{'name': 'x', 'stage': 'nowhere'}]}, '未定義的階段'),
+    ({'checkout': [{'name': 'x', 'once': 'yes'}]}, 'once'),
+])
+def test_invalid_flows_are_rejected(overrides, message):
+    """測試流程檔格式錯誤時拋出 FlowError"""
+    with pytest.raises(FlowError, match=message):
+        compile_flow(_flow(**overrides))
+
+class FakeLocator:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    def click(self):
+        self.log.append(('click', self.name))
+
+    def fill(self, value):
+        self.log.append(('fill', self.name, value))
+
+class FakeBuyer:
+    def __init__(self, log):
+        self.payment = {'CVC': '123'}
+        self.locators = {'buy': FakeLocator(log, 'buy'), 'cvc': FakeLocator(log, 'cvc')}
+
+class FakePage:
+    def __init__(self):
+        self.evaluations = 0
+
+    def evaluate(self, script, arg=None):
+        self.evaluations += 1
+        return {'matched': 'cart', 'alerts': []}
+
+def test_flow_steps_bind_buyer_actions():
+    """測試步驟動作綁定到 buyer 的元素與屬性，沒有條件的步驟不需等待"""
+    log = []
+    buyer = FakeBuyer(log)
+    page = FakePage()
+    engine = StepEngine(page)
+    for flow_step in compile_flow(_flow()).checkout:
+        engine.run(flow_step.step, flow_step.action(buyer))
+
+    assert log == [('click', 'buy'), ('fill', 'cvc', '123')]
+    assert page.evaluations == 1
+    assert [r.outcome for r in engine.history] == ['success', 'success']
+
+def test_load_flows_from_directory(tmp_path):
+    """測試從自訂目錄載入流程檔，JSON 錯誤以 FlowError 回報"""
+    (tmp_path / 'demo.json').write_text(json.dumps(_flow()), encoding='utf-8')
+    flows = load_flows(str(tmp_path))
+    assert [f.platform for f in flows] == ['demo']
+    assert flows[0].matches("https://shop.example/item/1")
+
+    broken = tmp_path / 'broken'
+    broken.mkdir()
+    (broken / 'bad.json').write_text('{', encoding='utf-8')
+    with pytest.raises(FlowError, match='bad.json'):
+        load_flows(str(broken))
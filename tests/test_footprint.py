@@ -0,0 +1,103 @@
+from buyer import runner
+from buyer.footprint import (
+    LOW_FOOTPRINT_ARGS, SMALL_VIEWPORT, MemoryWatchdog, context_options, launch_options, process_tree,
+)
+
+def _process(proc, pid, ppid, cmdline, pss_kb=None, rss_kb=None):
+    """在假的 /proc 建立程序：stat、cmdline，以及 smaps_rollup（PSS）或 status（VmRSS）"""
+    entry = proc / str(pid)
+    entry.mkdir()
+    (entry / 'stat').write_text(f"{pid} (some (odd) name) S {ppid} 1 1 0")
+    (entry / 'cmdline').write_bytes(b'\0'.join(arg.encode() for arg in cmdline) + b'\0')
+    if pss_kb is not None:
+        (entry / 'smaps_rollup').write_text(f"Rss:  {pss_kb * 2} kB\nPss:  {pss_kb} kB\n")
+    if rss_kb is not None:
+        (entry / 'status').write_text(f"Name:\tx\nVmRSS:\t{rss_kb} kB\n")
+
+def _fake_proc(tmp_path):
+    """python(100) -> driver(200) -> chrome(300) -> gpu(301)、renderer(302, 303)；另有無關的程序 900"""
+    proc = tmp_path / 'proc'
+    proc.mkdir()
+    _process(proc, 100, 1, ['python', 'main.py'], pss_kb=50 * 1024)
+    _process(proc, 200, 100, ['/ms-playwright/node', 'cli.js', 'run-driver'], pss_kb=40 * 1024)
+    _process(proc, 300, 200, ['/ms-playwright/chromium/chrome', '--headless'], pss_kb=100 * 1024)
+    _process(proc, 301, 300, ['/ms-playwright/chromium/chrome', '--type=gpu-process'], rss_kb=30 * 1024)
+    _process(proc, 302, 300, ['/ms-playwright/chromium/chrome', '--type=renderer'], pss_kb=120 * 1024)
+    _process(proc, 303, 300, ['/ms-playwright/chromium/chrome', '--type=renderer'], pss_kb=80 * 1024)
+    _process(proc, 900, 1, ['/usr/bin/chrome', '--type=renderer'], pss_kb=999 * 1024)
+    (proc / 'self').mkdir()
+    return proc
+
+def test_launch_and_context_options():
+    """測試低資源模式附加啟動參數、縮小視窗並減少動態效果，預設模式不變"""
+    assert launch_options(True) == {'headless': True, 'args': []}
+    low = launch_options(False, True, args=['--remote-debugging-port=9222'])
+    assert low['headless'] is False
+    assert low['args'] == ['--remote-debugging-port=9222'] + LOW_FOOTPRINT_ARGS
+    options = context_options({'user_agent': 'ua', 'viewport': {'width': 1920, 'height': 1080}})
+    assert options == {'user_agent': 'ua', 'viewport': SMALL_VIEWPORT, 'reduced_motion': 'reduce'}
+    # 帳號的設定檔帶有固定的視窗大小，低資源模式不覆寫
+    options = context_options({'user_agent': 'ua', 'viewport': {'width': 1920, 'height': 1080}}, keep_viewport=True)
+    assert options['viewport'] == {'width': 1920, 'height': 1080} and options['reduced_motion'] == 'reduce'
+
+def test_process_tree_and_sample(tmp_path):
+    """測試只加總目前程序的子孫，依程序類型分類，每個 context 以 renderer 總和估計"""
+    proc = _fake_proc(tmp_path)
+    assert process_tree(100, proc) == [200, 300, 301, 302, 303]
+
+    watchdog = MemoryWatchdog(root_pid=100, proc=str(proc))
+    watchdog.context_opened()
+    watchdog.context_opened()
+    sample = watchdog.sample()
+    assert sample['by_type'] == {'driver': 40.0, 'browser': 100.0, 'gpu-process': 30.0, 'renderer': 200.0}
+    assert sample['browser_mb'] == 330.0
+    assert sample['per_context_mb'] == 100.0
+
+    watchdog.context_closed()
+    watchdog.context_closed()
+    assert watchdog.sample()['per_context_mb'] is None
+    summary = watchdog.summary()
+    assert summary['samples'] == 2
+    assert summary['peak_browser_mb'] == 330.0 and summary['peak_contexts'] == 2
+    assert summary['per_context_mb'] == 100.0 and summary['jobs_per_gb'] == 10.24
+
+def test_wait_for_headroom(tmp_path):
+    """測試低於上限時立即繼續，超過上限時重新取樣直到逾時"""
+    proc = _fake_proc(tmp_path)
+    assert MemoryWatchdog(limit_mb=500, root_pid=100, proc=str(proc)).wait_for_headroom()
+
+    watchdog = MemoryWatchdog(limit_mb=300, interval=0.01, root_pid=100, proc=str(proc))
+    assert not watchdog.wait_for_headroom(timeout=0.05)
+    assert watchdog.over_limit and len(watchdog.samples) > 1
+
+def test_unavailable_proc_disables_sampling(tmp_path):
+    """測試無法讀取 /proc 時不取樣、不等待，批次照常執行"""
+    watchdog = MemoryWatchdog(limit_mb=1, root_pid=100, proc=str(tmp_path / 'missing')).start()
+    assert not watchdog.available and watchdog._thread is None
+    assert watchdog.sample() is None
+    assert watchdog.wait_for_headroom(timeout=0)
+    assert watchdog.summary()['samples'] == 0
+    watchdog.stop()
+
+def test_low_footprint_context_disables_animations():
+    """測試低資源模式的 context 套用小視窗並注入停用動畫的腳本"""
+    class FakeContext:
+        def __init__(self):
+            self.scripts = []
+
+        def add_init_script(self, script):
+            self.scripts.append(script)
+
+        def route(self, *args, **kwargs):
+            pass
+
+    class FakeBrowser:
+        def new_context(self, **options):
+            self.options = options
+            self.context = FakeContext()
+            return self.context
+
+    browser = FakeBrowser()
+    runner.create_context(browser, 'https://24h.pchome.com.tw/prod/X', low_footprint=True)
+    assert browser.options['viewport'] == SMALL_VIEWPORT and browser.options['reduced_motion'] == 'reduce'
+    assert any('animation: none' in script for script in browser.context.scripts)
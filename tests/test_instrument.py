@@ -0,0 +1,180 @@
+import asyncio
+import csv
+import json
+import threading
+import pytest
+from buyer.instrument import (
+    Tracer, compare_summaries, format_comparison, format_summary, instrument_page, load_runs, span, summarize_runs, unwrap,
+)
+from utils import TimingContext
+
+class FakeClock:
+    """每次讀取時間推進 1 毫秒"""
+    def __init__(self):
+        self.ns = 0
+
+    def __call__(self) -> int:
+        self.ns += 1_000_000
+        return self.ns
+
+class Locator:
+    """模擬 Playwright Locator（以類別名稱辨識）"""
+    def __init__(self, calls, selector):
+        self.calls = calls
+        self.selector = selector
+
+    def click(self):
+        self.calls.append(('click', self.selector))
+
+    def filter(self, has_text=None, has=None):
+        self.calls.append(('filter', has))
+        return Locator(self.calls, f"{self.selector}|{has_text}")
+
+    @property
+    def first(self):
+        return Locator(self.calls, f"{self.selector}:first")
+
+class FakePage:
+    def __init__(self):
+        self.calls = []
+        self.url = 'https://example.com'
+
+    def goto(self, url):
+        self.calls.append(('goto', url))
+
+    def locator(self, selector):
+        return Locator(self.calls, selector)
+
+    def evaluate(self, script):
+        raise RuntimeError("boom")
+
+class AsyncFakePage:
+    def __init__(self):
+        self.calls = []
+
+    async def click(self, selector):
+        await asyncio.sleep(0)
+        self.calls.append(('click', selector))
+
+def test_spans_nest_and_record_errors():
+    """測試巢狀 span 的階層、路徑與例外紀錄"""
+    tracer = Tracer('t', clock=FakeClock())
+    with tracer.span('outer'):
+        with tracer.span('inner', kind='action'):
+            pass
+        with pytest.raises(ValueError):
+            with tracer.span('failing'):
+                raise ValueError("bad")
+
+    outer, inner, failing = tracer.spans
+    assert inner.parent_id == outer.span_id and failing.parent_id == outer.span_id
+    assert inner.path == 'outer/inner'
+    assert failing.error == 'ValueError: bad'
+    assert inner.duration_ms == pytest.approx(1)
+    assert tracer.action_count == 1
+
+def test_timing_context_records_span_only_when_active():
+    """測試 TimingContext 在有作用中的 tracer 時記錄 span"""
+    tracer = Tracer('t')
+    with TimingContext("未啟用"):
+        pass
+    with tracer.activate():
+        with TimingContext("購買商品") as timer:
+            with span('子步驟'):
+                pass
+
+    assert [s.path for s in tracer.spans] == ['購買商品', '購買商品/子步驟']
+    assert timer.duration_ms >= 0
+
+def test_tracer_is_isolated_per_thread():
+    """測試不同執行緒的 tracer 互不干擾"""
+    tracers = [Tracer(f"t{i}") for i in range(4)]
+
+    def work(tracer):
+        with tracer.activate():
+            with span('job'):
+                with span('step'):
+                    pass
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in tracers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for tracer in tracers:
+        assert [s.path for s in tracer.spans] == ['job', 'job/step']
+
+def test_instrument_page_traces_actions_and_chained_locators():
+    """測試包裝後的 page 對操作建立 span，串接的 locator 也會被計時"""
+    raw = FakePage()
+    tracer = Tracer('t')
+    page = instrument_page(raw, tracer)
+    with tracer.span('purchase'):
+        page.goto('https://example.com/prod')
+        button = page.locator('#buy').filter(has_text='立即購買', has=page.locator('span'))
+        button.first.click()
+        with pytest.raises(RuntimeError):
+            page.evaluate('() => 1')
+
+    names = [s.name for s in tracer.spans]
+    assert names == ['purchase', 'page.goto', 'locator.click', 'page.evaluate']
+    click = tracer.spans[2]
+    assert click.path == 'purchase/locator.click'
+    assert "locator('#buy') >> filter(has_text='立即購買') >> first()" == click.attrs['target']
+    assert tracer.spans[3].error == 'RuntimeError: boom'
+    # 傳給 Playwright 的參數必須是原生物件
+    assert isinstance(raw.calls[1][1], Locator)
+    assert page.url == 'https://example.com'
+    assert unwrap(page) is raw and page == raw
+
+def test_instrument_page_async():
+    """測試 asyncio 版本的包裝"""
+    async def scenario():
+        tracer = Tracer('t')
+        page = instrument_page(AsyncFakePage(), tracer, is_async=True)
+        with tracer.activate():
+            with span('step'):
+                await asyncio.gather(page.click('#a'), page.click('#b'))
+        return tracer
+
+    tracer = asyncio.run(scenario())
+    assert [s.path for s in tracer.spans] == ['step', 'step/page.click', 'step/page.click']
+    assert {s.attrs['target'] for s in tracer.spans[1:]} == {'#a', '#b'}
+
+def test_export_and_summarize_runs(tmp_path):
+    """測試匯出 JSON/CSV 並跨執行統計 p50/p95"""
+    for durations in ([10, 1], [20, 2], [30, 3]):
+        clock_values = iter([0, 0, durations[0] * 1_000_000, durations[0] * 1_000_000,
+                             (durations[0] + durations[1]) * 1_000_000, (durations[0] + durations[1]) * 1_000_000])
+        tracer = Tracer(f"run{durations[0]}", clock=lambda: next(clock_values))
+        with tracer.span('purchase'):
+            pass
+        with tracer.span('purchase'):
+            pass
+        # 同一次執行重複的步驟會加總：10+1、20+2、30+3
+        tracer.export(str(tmp_path))
+
+    data = json.loads(next(tmp_path.glob('run10-*.json')).read_text(encoding='utf-8'))
+    assert [s['duration_ms'] for s in data['spans']] == [10, 1]
+    with next(tmp_path.glob('run10-*.csv')).open(encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['path'] == 'purchase' and float(rows[0]['duration_ms']) == 10
+
+    summary = summarize_runs(load_runs([str(tmp_path)]))
+    entry = summary['purchase']
+    assert entry['runs'] == 3 and entry['calls'] == 6
+    assert entry['p50_ms'] == pytest.approx(22)
+    assert entry['p95_ms'] == pytest.approx(31.9)
+    assert 'purchase' in format_summary(summary)
+
+def test_compare_summaries():
+    """測試以基準比較各步驟 p50 節省的時間，只出現在一側的步驟不計算差值"""
+    baseline = {'purchase': {'p50_ms': 120.0}, 'purchase/step.fill_payment': {'p50_ms': 40.0}}
+    candidate = {'purchase': {'p50_ms': 90.0}, 'purchase/step.fill_payment': {'p50_ms': 45.0}, 'prepare/prefill.walk': {'p50_ms': 300.0}}
+    comparison = compare_summaries(baseline, candidate)
+    assert list(comparison) == ['purchase', 'purchase/step.fill_payment', 'prepare/prefill.walk']
+    assert comparison['purchase']['saved_ms'] == 30.0
+    assert comparison['purchase/step.fill_payment']['saved_ms'] == -5.0
+    assert comparison['prepare/prefill.walk'] == {'baseline_p50_ms': None, 'candidate_p50_ms': 300.0, 'saved_ms': None}
+    assert 'step.fill_payment' in format_comparison(comparison)
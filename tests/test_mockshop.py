@@ -0,0 +1,56 @@
+import time
+import urllib.error
+import urllib.request
+import pytest
+from tests.mockshop import MOMO_PRODUCT_URL, PCHOME_PRODUCT_URL, MockShop
+
+def _get(shop: MockShop, url: str) -> str:
+    with urllib.request.urlopen(shop.local_url(url), timeout=5) as response:
+        return response.read().decode('utf-8')
+
+def test_pages_contain_buyer_selectors():
+    """測試模擬頁面包含購買器使用的選擇器"""
+    with MockShop() as shop:
+        product = _get(shop, PCHOME_PRODUCT_URL)
+        assert 'data-regression="product_button_buyNow"' in product
+        assert 'id="ProdBriefing"' in product
+        cart = _get(shop, 'https://ecssl.pchome.com.tw/sys/cflow/fsindex/BigCar/BIGCAR/ItemList')
+        assert 'step1-checkout-btn' in cart and '刪除' in cart
+        checkout = _get(shop, 'https://ecssl.pchome.com.tw/sys/cflow/fsindex/BigCar/BIGCAR/Checkout')
+        assert 'placeholder="CVC"' in checkout and 'name="payment"' in checkout
+        assert 'placeholder="請輸入手機號碼 或 Email"' in _get(shop, 'https://ecvip.pchome.com.tw/login/v3/login.htm')
+
+        momo = _get(shop, MOMO_PRODUCT_URL)
+        assert 'id="buy_yes" style="display:block"' in momo
+        assert 'class="buynow"' in momo
+        assert 'id="orderSendBtn"' in _get(shop, 'https://www.momoshop.com.tw/order/Checkout.jsp')
+
+    assert ('24h.pchome.com.tw', '/prod/DYAJC9-A900GN2IQ') in shop.requests
+
+def test_out_of_stock_pages():
+    """測試缺貨狀態的頁面"""
+    with MockShop(in_stock=False) as shop:
+        assert '有貨通知我' in _get(shop, PCHOME_PRODUCT_URL)
+        assert 'id="buy_yes" style="display:none"' in _get(shop, MOMO_PRODUCT_URL)
+
+def test_unknown_page_returns_404():
+    """測試未知路徑回傳 404"""
+    with MockShop() as shop:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            _get(shop, 'https://24h.pchome.com.tw/unknown')
+    assert error.value.code == 404
+
+def test_injected_latency():
+    """測試每個請求都會加上注入的延遲"""
+    with MockShop(latency_ms=80) as shop:
+        start = time.perf_counter()
+        _get(shop, PCHOME_PRODUCT_URL)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    assert elapsed_ms >= 80
+
+def test_local_url_and_shop_domains():
+    """測試網址改寫與網域判斷"""
+    with MockShop() as shop:
+        assert shop.local_url(MOMO_PRODUCT_URL) == f"{shop.base_url}/www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=10001234"
+    assert MockShop.is_shop_url(PCHOME_PRODUCT_URL)
+    assert not MockShop.is_shop_url('https://www.google-analytics.com/collect')
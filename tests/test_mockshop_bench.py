@@ -0,0 +1,109 @@
+"""
+以模擬商店量測完整的登入→購買流程
+
+每個情境執行 MOCKSHOP_RUNS 次（預設 3），輸出各步驟的 p50/p95，
+並檢查購買步驟的 p95 不超過 MOCKSHOP_BUDGET_MS 加上注入延遲的預算。
+設定 MOCKSHOP_TRACE_DIR 可保留每次執行的計時紀錄，之後以 `main.py report` 比較。
+無法啟動 Chromium 時整個模組略過。
+"""
+import os
+import pytest
+from playwright.sync_api import sync_playwright
+from buyer.instrument import Tracer, compare_summaries, format_comparison, format_summary, summarize_runs
+from buyer.runner import execute_purchase
+from tests.mockshop import MOMO_PRODUCT_URL, PCHOME_PRODUCT_URL, MockShop
+
+RUNS = int(os.getenv('MOCKSHOP_RUNS', '3'))
+BUDGET_MS = float(os.getenv('MOCKSHOP_BUDGET_MS', '3000'))
+TRACE_DIR = os.getenv('MOCKSHOP_TRACE_DIR')
+
+# 購買步驟中需要等待伺服器回應的頁面數（每頁都會加上注入延遲）
+PURCHASE_PAGES = {'pchome': 2, 'momo': 3}
+
+@pytest.fixture(scope='module')
+def browser():
+    with sync_playwright() as p:
+        try:
+            browser = p.chromium.launch(headless=True)
+        except Exception as e:
+            pytest.skip(f"無法啟動 Chromium: {str(e).splitlines()[0]}")
+        yield browser
+        browser.close()
+
+@pytest.fixture
+def credentials(tmp_path, monkeypatch):
+    """在暫存目錄提供帳號設定，截圖也會寫在這裡"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / '.env').write_text('', encoding='utf-8')
+    for key, value in {
+        'PCHOME_USERNAME': 'bench@example.com',
+        'PCHOME_PASSWORD': 'secret',
+        'PAYMENT_INFO_CVC': '123',
+        'MOMO_USERNAME': 'bench@example.com',
+        'MOMO_PASSWORD': 'secret',
+    }.items():
+        monkeypatch.setenv(key, value)
+    # PChome 登入時的 Email 驗證碼
+    monkeypatch.setattr('builtins.input', lambda *args: '123456')
+
+def _run_once(browser, shop: MockShop, url: str, tracer: Tracer, **buyer_options):
+    context = browser.new_context()
+    shop.install(context)
+    page = context.new_page()
+    # 無頭模式下不停在 Inspector
+    page.pause = lambda: None
+    try:
+        if 'momoshop' in url:
+            # MOMO 的登入從商品頁上的登入連結開始
+            page.goto(url)
+        return execute_purchase(page, url, buyer_options={'api_checkout': False, **buyer_options}, tracer=tracer)
+    finally:
+        context.close()
+
+@pytest.mark.parametrize('latency_ms', [0, 50])
+@pytest.mark.parametrize('platform, url', [('pchome', PCHOME_PRODUCT_URL), ('momo', MOMO_PRODUCT_URL)])
+def test_purchase_flow_latency(browser, credentials, platform, url, latency_ms):
+    """完整流程在預算內完成，並輸出各步驟的耗時分布"""
+    runs = []
+    round_trips = []
+    actions = []
+    with MockShop(latency_ms=latency_ms, seed=0) as shop:
+        for index in range(RUNS):
+            tracer = Tracer(f"{platform}-{latency_ms}ms-{index}")
+            buyer = _run_once(browser, shop, url, tracer)
+            assert buyer.timing_stats['login'] == 'full'
+            if TRACE_DIR:
+                tracer.export(TRACE_DIR)
+            runs.append(tracer.to_dict())
+            round_trips.append(buyer.timing_stats['flow']['round_trips'])
+            actions.append(tracer.action_count)
+
+    summary = summarize_runs(runs)
+    print(f"\n{platform}，注入延遲 {latency_ms} ms，{RUNS} 次")
+    print(format_summary(summary))
+    print(f"結帳流程的瀏覽器往返次數: {max(round_trips)}（整次執行平均 {sum(actions) / len(actions):.0f} 次 Playwright 操作）")
+
+    budget = BUDGET_MS + PURCHASE_PAGES[platform] * latency_ms
+    assert summary['購買商品']['errors'] == 0
+    assert summary['購買商品']['p95_ms'] < budget
+
+def test_pchome_prefill_saves_checkout_time(browser, credentials):
+    """預先走結帳後，開賣時一次套用結帳表單，並與目前流程比較各步驟的 p50"""
+    summaries = {}
+    with MockShop(latency_ms=50, seed=0) as shop:
+        for prefill in (False, True):
+            runs = []
+            for index in range(RUNS):
+                tracer = Tracer(f"pchome-prefill-{prefill}-{index}")
+                buyer = _run_once(browser, shop, PCHOME_PRODUCT_URL, tracer, prefill=prefill)
+                if prefill:
+                    # 姓名、付款方式、配送方式、捐贈發票勾選框，加上開賣時填入的 CVC
+                    assert buyer.timing_stats['prefill']['fields'] == 4
+                    assert buyer.timing_stats['prefill']['applied'] == 5
+                    assert not buyer.timing_stats['prefill']['missing']
+                runs.append(tracer.to_dict())
+            summaries[prefill] = summarize_runs(runs)
+
+    print(f"\nPChome 預先填寫結帳表單，注入延遲 50 ms，{RUNS} 次")
+    print(format_comparison(compare_summaries(summaries[False], summaries[True])))
+    assert summaries[True]['購買商品']['errors'] == 0
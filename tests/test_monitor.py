@@ -0,0 +1,122 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from buyer.pchome_api import parse_product_status
+import monitor
+from monitor import HttpFetcher, Monitor, ProductState, WatchItem, load_watchlist, parse_momo_page
+
+def _momo_html(can_buy: bool, price: int) -> str:
+    return f'''<html><body>
+<h3 id="osmGoodsName">測試商品</h3>
+<ul class="prdPrice"><li>市售價<span class="seoPrice">$2,990</span></li><li>促銷價<span class="seoPrice">{price:,}</span></li></ul>
+<div id="buy_yes" style="display: {'block' if can_buy else 'none'}"><a class="buynow">購買</a></div>
+<div id="buy_no" style="display: {'none' if can_buy else 'block'}">售完</div>
+</body></html>'''
+
+class Shop:
+    """本機商品頁：body 可隨時更換，記錄連線數與 304 次數"""
+    def __init__(self):
+        self.body = _momo_html(False, 1990).encode()
+        self.connections = set()
+        self.not_modified = 0
+
+    def handler(self):
+        shop = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                shop.connections.add(self.client_address)
+                etag = f'"{hash(shop.body)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    shop.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(shop.body)))
+                self.end_headers()
+                self.wfile.write(shop.body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+@pytest.fixture
+def shop():
+    shop = Shop()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), shop.handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    shop.url = f"http://127.0.0.1:{server.server_port}/goods/GoodsDetail.jsp?i_code=1"
+    yield shop
+    server.shutdown()
+    server.server_close()
+
+def test_parse_momo_page():
+    """測試以 HTML 解析 MOMO 的價格與購買按鈕狀態"""
+    assert parse_momo_page('', _momo_html(True, 1490).encode()) == ProductState(True, 1490, '測試商品')
+    assert not parse_momo_page('', _momo_html(False, 1490).encode()).can_buy
+
+def test_parse_product_status_price():
+    body = json.dumps([{'Id': 'DYAJC9-A900GN2IQ-000', 'Name': '耳機', 'ButtonType': 'ForSale', 'Price': {'M': 1990, 'P': 1490}}])
+    assert parse_product_status(200, body, 'DYAJC9-A900GN2IQ-000') == {'name': '耳機', 'price': 1490, 'can_buy': True}
+
+def test_fetcher_reuses_connection_and_sends_conditional_requests(shop):
+    """測試同一主機沿用連線，內容未變時伺服器回 304"""
+    fetcher = HttpFetcher()
+    first = fetcher.fetch(shop.url)
+    second = fetcher.fetch(shop.url)
+    assert first.status == 200 and first.body == shop.body
+    assert second.not_modified and second.body is None
+    assert len(shop.connections) == 1 and shop.not_modified == 1
+    assert fetcher.stats == {'requests': 2, 'not_modified': 1, 'bytes': len(shop.body)}
+
+def test_entries_sharing_a_source_url_keep_their_own_validators(shop, monkeypatch):
+    """測試同商品不同規格共用查詢網址時，各項目各自保存 ETag，後查詢的一方不會因 304 拿不到狀態"""
+    monkeypatch.setitem(monitor.PARSERS, 'momo', (lambda url: url.split('&')[0], parse_momo_page))
+    items = [WatchItem(shop.url + '&spec=A', 'momo', 'A'), WatchItem(shop.url + '&spec=B', 'momo', 'B')]
+    watcher = Monitor(items, concurrency=1)
+    assert [change.item.name for change in watcher.poll()] == ['A', 'B']
+    assert set(watcher.states) == {item.url for item in items}
+    assert watcher.poll() == [] and shop.not_modified == 2
+
+def test_monitor_triggers_once_when_purchasable_under_threshold(shop):
+    """測試只有變成可購買且價格不超過門檻時觸發，未變動的回應不重新解析"""
+    watcher = Monitor([WatchItem(shop.url, 'momo', 'item', max_price=1500)])
+    first, = watcher.poll()
+    assert first.previous is None and not first.triggered
+    assert watcher.poll() == [] and watcher.stats['unchanged'] == 1
+
+    shop.body = _momo_html(True, 1990).encode()
+    change, = watcher.poll()
+    assert change.current.can_buy and not change.triggered
+
+    shop.body = _momo_html(True, 1490).encode()
+    triggered = []
+    watcher.run(lambda item, state: triggered.append((item.name, state.price)), interval=0)
+    assert triggered == [('item', 1490)] and watcher.items == []
+    assert watcher.stats['parsed'] == 3
+
+def test_load_watchlist(tmp_path):
+    path = tmp_path / 'watch.csv'
+    path.write_text(
+        'url,name,max_price\n'
+        'https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ,耳機,1500\n'
+        'https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code=1,,\n',
+        encoding='utf-8',
+    )
+    pchome, momo = load_watchlist(str(path))
+    assert (pchome.platform, pchome.name, pchome.max_price) == ('pchome', '耳機', 1500.0)
+    assert (momo.platform, momo.name, momo.max_price) == ('momo', 'item-2', None)
+
+    path.write_text('url,max_price\nhttps://www.momoshop.com.tw/x,abc\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='max_price'):
+        load_watchlist(str(path))
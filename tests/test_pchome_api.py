@@ -0,0 +1,59 @@
+import json
+import pytest
+from buyer.pchome_api import (
+    ADD_TO_CART_URL,
+    AddToCartRejected,
+    AddToCartUncertain,
+    CheckoutApiError,
+    build_add_to_cart_request,
+    build_button_status_url,
+    extract_item_id,
+    parse_add_to_cart_response,
+    parse_button_status,
+)
+
+def test_extract_item_id():
+    """測試從商品網址取得品項編號"""
+    assert extract_item_id("https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ") == "DYAJC9-A900GN2IQ-000"
+    assert extract_item_id("https://24h.pchome.com.tw/prod/dyajc9-a900gn2iq-001?fq=/S/DYAJC9") == "DYAJC9-A900GN2IQ-001"
+    with pytest.raises(CheckoutApiError):
+        extract_item_id("https://24h.pchome.com.tw/store/DYAJC9")
+
+def test_build_add_to_cart_request():
+    """測試加入購物車的請求內容"""
+    url, form = build_add_to_cart_request("DYAJC9-A900GN2IQ-000", quantity=2)
+    payload = json.loads(form['data'])
+    assert url == ADD_TO_CART_URL
+    assert payload['TI'] == "DYAJC9-A900GN2IQ-000"
+    assert payload['YTQ'] == 2
+    assert payload['T'] == 'ADD'
+
+def test_parse_add_to_cart_response_success():
+    """測試成功回應"""
+    assert parse_add_to_cart_response(200, '{"PRODCOUNT": 1, "PRODTOTAL": 990}')['PRODTOTAL'] == 990
+
+@pytest.mark.parametrize("status, body, error", [
+    (500, '{}', AddToCartUncertain),
+    (403, '{}', CheckoutApiError),
+    (200, '<html>login</html>', CheckoutApiError),
+    (200, '{"ERR": "已售完"}', AddToCartRejected),
+    (200, '{"Status": "ERR"}', AddToCartRejected),
+    (200, '{"PRODCOUNT": 0}', AddToCartRejected),
+    (200, '[]', CheckoutApiError),
+])
+def test_parse_add_to_cart_response_failures(status: int, body: str, error):
+    """測試失敗回應的分類：明確拒絕、結果不明（5xx）與可改走 UI 流程的錯誤"""
+    with pytest.raises(error) as raised:
+        parse_add_to_cart_response(status, body)
+    assert type(raised.value) is error
+
+def test_button_status():
+    """測試按鈕狀態 API 的網址與解析"""
+    assert "id=DYAJC9-A900GN2IQ&" in build_button_status_url("DYAJC9-A900GN2IQ-000")
+
+    body = '[{"Id": "DYAJC9-A900GN2IQ-000", "ButtonType": "ForSale"}, {"Id": "DYAJC9-A900GN2IQ-001", "ButtonType": "NotReady"}]'
+    assert parse_button_status(200, body, "DYAJC9-A900GN2IQ-000") is True
+    assert parse_button_status(200, body, "DYAJC9-A900GN2IQ-001") is False
+    assert parse_button_status(200, '{"Id": "X", "ButtonType": "SoldOut"}', "DYAJC9-A900GN2IQ-000") is False
+    with pytest.raises(CheckoutApiError):
+        parse_button_status(200, '[]', "DYAJC9-A900GN2IQ-000")
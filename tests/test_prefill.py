@@ -0,0 +1,326 @@
+import asyncio
+import json
+import time
+import pytest
+from accounts import Account
+from buyer.aio.pchome import AsyncPChomeBuyer
+from buyer.pchome import PChomeBuyer
+from buyer.pchome_api import AddToCartRejected, CheckoutApiError
+from buyer.prefill import (
+    APPLY_FORM_JS, CART_ITEM_GONE_JS, CART_ITEM_JS, SNAPSHOT_FORM_JS, CheckoutPrefill, PrefillWalk, cart_item_arg,
+    check_applied, discard_prefill, load_prefill, save_prefill,
+)
+from buyer.session import SessionCache
+
+CVC = "input[placeholder='CVC']"
+FIELDS = [
+    {'key': 'input[name="payment"][value="card"]', 'kind': 'radio', 'checked': True},
+    {'key': 'select[name="delivery"]', 'kind': 'select', 'value': 'store'},
+]
+
+class FakeResponse:
+    status = 200
+    body = json.dumps({'PRODCOUNT': 2})
+
+    def text(self):
+        return self.body
+
+class FakeRequest:
+    """errors 中的例外依序在 post 時拋出（請求已記錄），body 為回應內容"""
+    def __init__(self, log):
+        self.log = log
+        self.errors = []
+        self.body = FakeResponse.body
+
+    def post(self, url, form=None, headers=None, timeout=None):
+        self.log.append(('post', json.loads(form['data'])['TI']))
+        if self.errors:
+            raise self.errors.pop(0)
+        response = FakeResponse()
+        response.body = self.body
+        return response
+
+class FakeContext:
+    def __init__(self, log):
+        self.request = FakeRequest(log)
+
+class FakeLocator:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    def fill(self, value):
+        self.log.append(('fill', self.name, value))
+
+    def click(self):
+        self.log.append(('click', self.name))
+
+class FakePage:
+    """記錄導航與 evaluate，結帳表單快照回傳 FIELDS
+
+    購物車有 rows 列（含佔位商品）；removed 為刪除按鈕是否找得到佔位商品，remains 為刪除後是否仍在購物車中，
+    in_cart 為商品是否已在購物車中；goto_errors 中的例外依序在導航時拋出。
+    """
+    def __init__(self, removed=True, remains=False, rows=1, missing=(), in_cart=True, goto_errors=()):
+        self.log = []
+        self.in_cart = in_cart
+        self.goto_errors = list(goto_errors)
+        self.context = FakeContext(self.log)
+        self.removed = removed
+        self.remains = remains
+        self.rows = rows
+        self.missing = list(missing)
+        self.listeners = []
+        self.deleted = False
+
+    def goto(self, url, wait_until=None):
+        self.log.append(('goto', url.rsplit('/', 1)[-1]))
+        if self.goto_errors:
+            raise self.goto_errors.pop(0)
+
+    def evaluate(self, script, arg=None):
+        if script == SNAPSHOT_FORM_JS:
+            self.log.append(('snapshot', arg['exclude']))
+            return list(FIELDS)
+        if script == CART_ITEM_JS:
+            if arg['remove']:
+                self.log.append(('remove', arg['product']))
+                self.deleted = self.removed
+                return {'rows': self.rows, 'found': self.removed}
+            self.log.append(('cart', arg['product']))
+            found = bool(arg['product']) and self.in_cart and (self.remains or not self.deleted)
+            return {'rows': self.rows, 'found': found}
+        if script == APPLY_FORM_JS:
+            self.log.append(('apply', arg))
+            return {'applied': len(arg) - len(self.missing), 'missing': self.missing}
+        # 步驟引擎的等待：購物車頁點擊去結帳後到達結帳表單
+        self.log.append(('wait', arg['click']))
+        return {'matched': 'order_form', 'alerts': [], 'clicked': True}
+
+    def on(self, event, handler):
+        self.listeners.append(handler)
+
+    def remove_listener(self, event, handler):
+        self.listeners.remove(handler)
+
+    def wait_for_function(self, script, arg=None, timeout=None):
+        assert script == CART_ITEM_GONE_JS
+        self.log.append(('wait_gone', arg['product']))
+
+class AsyncFakeResponse(FakeResponse):
+    async def text(self):
+        return super().text()
+
+class AsyncFakeRequest(FakeRequest):
+    async def post(self, *args, **kwargs):
+        response = AsyncFakeResponse()
+        response.body = super().post(*args, **kwargs).body
+        return response
+
+class AsyncFakePage(FakePage):
+    """FakePage 的 asyncio 版本，購買器的流程與同步版本共用，記錄應完全相同"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.context.request = AsyncFakeRequest(self.log)
+
+    async def goto(self, url, wait_until=None):
+        super().goto(url, wait_until)
+
+    async def evaluate(self, script, arg=None):
+        return super().evaluate(script, arg)
+
+    async def wait_for_function(self, script, arg=None, timeout=None):
+        super().wait_for_function(script, arg, timeout)
+
+class QuietBuyer(PChomeBuyer):
+    """不登入的 PChomeBuyer"""
+    def login(self):
+        pass
+
+class AsyncQuietBuyer(AsyncPChomeBuyer):
+    def login(self):
+        pass
+
+def _buyer(page, **options):
+    account = Account('main', 'pchome', 'a@example.com', 'secret', {'CVC': '123'})
+    url = 'https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ'
+    if isinstance(page, AsyncFakePage):
+        buyer = asyncio.run(AsyncQuietBuyer.create(url, page, account=account, prefill=True, **options))
+    else:
+        buyer = QuietBuyer(url, page, account=account, prefill=True, **options)
+    buyer.locators['cvc'] = FakeLocator(page.log, 'cvc')
+    return buyer
+
+def _call(result):
+    """asyncio 購買器的方法回傳 coroutine，在新的事件迴圈中執行"""
+    return asyncio.run(result) if asyncio.iscoroutine(result) else result
+
+ENGINES = [FakePage, AsyncFakePage]
+
+def test_prefill_round_trip_and_expiry(tmp_path):
+    """測試快照寫入登入快取目錄（只有自己可讀）、過期與格式錯誤時不沿用，開賣時的值覆蓋同一欄位"""
+    cache = SessionCache(str(tmp_path))
+    prefill = CheckoutPrefill(fields=FIELDS, source='DYAJC9-A900GN2IQ-000')
+    save_prefill('pchome', 'a@example.com', cache, prefill)
+    path = cache.path_for('pchome', 'a@example.com', 'checkout')
+    assert (path.stat().st_mode & 0o777) == 0o600
+    assert load_prefill('pchome', 'a@example.com', cache) == prefill
+    assert load_prefill('pchome', 'a@example.com', None) is None
+
+    assert load_prefill('pchome', 'a@example.com', cache, max_age=0) is None
+    path.write_text(json.dumps({'fields': [{'value': 'x'}], 'created_at': time.time()}), encoding='utf-8')
+    assert load_prefill('pchome', 'a@example.com', cache) is None
+    discard_prefill('pchome', 'a@example.com', cache)
+    assert not path.exists()
+
+    fields = prefill.with_values({'select[name="delivery"]': 'home', CVC: '123'})
+    assert fields[0] == FIELDS[0]
+    assert fields[1:] == [
+        {'key': 'select[name="delivery"]', 'kind': 'text', 'value': 'home'},
+        {'key': CVC, 'kind': 'text', 'value': '123'},
+    ]
+
+def test_walk_bookkeeping_without_a_page(tmp_path):
+    """測試走結帳的判讀（購物車商品數、快照、統計）與套用結果不需要頁面即可驗證"""
+    walk = PrefillWalk(placeholder='DGBJA1-A900ABCDE-000')
+    assert walk.source == 'DGBJA1-A900ABCDE-000' and walk.product is None
+    walk.added = True
+    assert cart_item_arg('.del', '刪除', walk.product) == {
+        'selector': '.del', 'text': '刪除', 'product': 'DGBJA1-A900ABCDE', 'remove': False,
+    }
+    assert walk.count_cart({'rows': 3, 'found': True}) == 2
+    prefill = walk.finish(FIELDS)
+    assert prefill.source == 'DGBJA1-A900ABCDE-000'
+    stats = walk.stats(prefill)
+    assert stats['fields'] == len(FIELDS) and stats['cart_items'] == 2 and not stats['cached']
+    assert PrefillWalk().source == 'cart'
+
+    cache = SessionCache(str(tmp_path))
+    save_prefill('pchome', 'a@example.com', cache, prefill)
+    stats, missing = check_applied({'applied': 2, 'missing': []}, 'pchome', 'a@example.com', cache)
+    assert stats == {'applied': 2, 'missing': []} and load_prefill('pchome', 'a@example.com', cache) == prefill
+    stats, missing = check_applied({'applied': 1, 'missing': [CVC]}, 'pchome', 'a@example.com', cache)
+    assert missing == [CVC] and load_prefill('pchome', 'a@example.com', cache) is None
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_walk_with_placeholder_then_remove(tmp_path, engine):
+    """測試以佔位商品走到結帳表單、記下欄位（不含 CVC）後從購物車移除，並寫入快照（同步與 asyncio 版本相同）"""
+    page = engine()
+    buyer = _buyer(page, prefill_item='https://24h.pchome.com.tw/prod/DGBJA1-A900ABCDE')
+    buyer.session_cache = SessionCache(str(tmp_path))
+    _call(buyer.prefill_checkout())
+
+    assert page.log == [
+        ('post', 'DGBJA1-A900ABCDE-000'),
+        ('goto', 'ItemList'),
+        ('cart', 'DGBJA1-A900ABCDE'),
+        ('wait', ["button[data-regression='step1-checkout-btn']", None]),
+        ('snapshot', [CVC]),
+        ('goto', 'ItemList'),
+        ('remove', 'DGBJA1-A900ABCDE'),
+        ('wait_gone', 'DGBJA1-A900ABCDE'),
+        # 重新載入購物車確認佔位商品已不在其中
+        ('goto', 'ItemList'),
+        ('cart', 'DGBJA1-A900ABCDE'),
+    ]
+    assert page.listeners == []
+    assert buyer.prefill.fields == FIELDS and buyer.prefill.source == 'DGBJA1-A900ABCDE-000'
+    stats = buyer.timing_stats['prefill']
+    assert stats['fields'] == 2 and not stats['cached'] and stats['cart_items'] == 0
+    assert load_prefill('pchome', 'a@example.com', buyer.session_cache).fields == FIELDS
+
+    # 期限內的快照直接沿用，不再走結帳
+    again = engine()
+    cached = _buyer(again)
+    cached.session_cache = buyer.session_cache
+    _call(cached.prefill_checkout())
+    assert again.log == [] and cached.timing_stats['prefill']['cached']
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('state', [{'removed': False}, {'remains': True}])
+def test_placeholder_that_cannot_be_removed_aborts(engine, state):
+    """測試找不到刪除按鈕、或刪除後重新載入仍在購物車中時中止，避免開賣時一併結帳"""
+    page = engine(**state)
+    buyer = _buyer(page, prefill_item='https://24h.pchome.com.tw/prod/DGBJA1-A900ABCDE')
+    with pytest.raises(CheckoutApiError, match='佔位商品'):
+        _call(buyer.prefill_checkout())
+    assert page.listeners == []
+
+def test_walk_counts_other_cart_items(caplog):
+    """測試沿用購物車時提醒其中的商品開賣時會一併結帳"""
+    page = FakePage(rows=2)
+    buyer = _buyer(page)
+    buyer.prefill_checkout()
+    assert ('cart', None) in page.log
+    assert buyer.timing_stats['prefill']['cart_items'] == 2
+    assert '購物車中已有 2 件其他商品' in caplog.text
+
+def test_fill_payment_applies_snapshot_in_one_evaluate(tmp_path):
+    """測試開賣時以單一 evaluate 套用快照與 CVC；沒有快照時只填 CVC；CVC 欄位不存在時改回逐一填寫"""
+    page = FakePage()
+    buyer = _buyer(page)
+    buyer._fill_payment()
+    assert page.log == [('fill', 'cvc', '123')]
+
+    page = FakePage()
+    buyer = _buyer(page)
+    buyer.prefill = CheckoutPrefill(fields=FIELDS)
+    buyer._fill_payment()
+    assert page.log == [('apply', FIELDS + [{'key': CVC, 'kind': 'text', 'value': '123'}])]
+    assert buyer.timing_stats['prefill']['applied'] == 3
+
+    cache = SessionCache(str(tmp_path))
+    save_prefill('pchome', 'a@example.com', cache, CheckoutPrefill(fields=FIELDS))
+    page = FakePage(missing=[CVC])
+    buyer = _buyer(page)
+    buyer.session_cache = cache
+    buyer.prefill = CheckoutPrefill(fields=FIELDS)
+    buyer._fill_payment()
+    assert page.log[-1] == ('fill', 'cvc', '123')
+    assert load_prefill('pchome', 'a@example.com', cache) is None
+
+def _cart_buyer(page):
+    buyer = _buyer(page)
+    buyer.locators['buy'] = FakeLocator(page.log, 'buy')
+    return buyer
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_add_to_cart_retries_only_navigation_after_post(engine):
+    """測試加入購物車的請求成功後前往購物車頁失敗時只重試導航，不重複加入也不點擊立即購買"""
+    page = engine(goto_errors=[TimeoutError('Timeout 30000ms exceeded')])
+    buyer = _cart_buyer(page)
+    _call(buyer._add_to_cart())
+    assert page.log == [('post', 'DYAJC9-A900GN2IQ-000'), ('goto', 'ItemList'), ('goto', 'ItemList')]
+    assert buyer.timing_stats['add_to_cart']['path'] == 'api'
+
+@pytest.mark.parametrize('in_cart', [True, False])
+def test_add_to_cart_timeout_checks_cart_first(in_cart):
+    """測試加入購物車逾時（請求可能已被處理）時先檢查購物車，不在其中才回到商品頁點擊立即購買"""
+    page = FakePage(in_cart=in_cart)
+    page.context.request.errors.append(TimeoutError('Request timed out after 5000ms'))
+    buyer = _cart_buyer(page)
+    buyer._add_to_cart()
+    expected = [('post', 'DYAJC9-A900GN2IQ-000'), ('goto', 'ItemList'), ('cart', 'DYAJC9-A900GN2IQ')]
+    if in_cart:
+        assert page.log == expected
+    else:
+        assert page.log == expected + [('goto', 'DYAJC9-A900GN2IQ'), ('click', 'buy')]
+    assert buyer.timing_stats['add_to_cart']['path'] == ('api' if in_cart else 'ui')
+
+def test_add_to_cart_falls_back_only_when_not_sent_or_recoverable():
+    """測試無法連線與已登出（回應不是 JSON）時直接改用頁面操作，伺服器明確拒絕時不點擊立即購買"""
+    page = FakePage()
+    page.context.request.errors.append(Exception('connect ECONNREFUSED 203.0.113.1:443'))
+    _cart_buyer(page)._add_to_cart()
+    assert page.log == [('post', 'DYAJC9-A900GN2IQ-000'), ('click', 'buy')]
+
+    page = FakePage()
+    page.context.request.body = '<html>login</html>'
+    _cart_buyer(page)._add_to_cart()
+    assert page.log == [('post', 'DYAJC9-A900GN2IQ-000'), ('click', 'buy')]
+
+    page = FakePage()
+    page.context.request.body = json.dumps({'ERR': '已售完'})
+    with pytest.raises(AddToCartRejected, match='已售完'):
+        _cart_buyer(page)._add_to_cart()
+    assert page.log == [('post', 'DYAJC9-A900GN2IQ-000')]
@@ -0,0 +1,68 @@
+import json
+from accounts import Account
+from buyer import profile as profile_module
+from buyer import runner
+from buyer.profile import BrowserProfile, account_username, derive_profile, load_profile, resolve_profile
+from buyer.session import SessionCache
+
+def test_derive_profile_is_stable_per_account():
+    """測試同一帳號每次得到相同的設定檔，不同帳號各自推導"""
+    first = derive_profile('pchome', 'a@example.com')
+    assert first == derive_profile('pchome', 'a@example.com')
+    assert first.locale == 'zh-TW' and first.timezone_id == 'Asia/Taipei'
+    others = {derive_profile('pchome', f"user{i}@example.com").user_agent for i in range(20)}
+    assert len(others) > 1
+
+def test_profile_is_cached_next_to_session_state(tmp_path, monkeypatch):
+    """測試設定檔寫入登入快取目錄後沿用，不受推導方式改變影響，登入快取失效時保留"""
+    cache = SessionCache(str(tmp_path))
+    created = load_profile('momo', 'a@example.com', cache)
+    path = cache.path_for('momo', 'a@example.com', 'profile')
+    assert path.exists() and (path.stat().st_mode & 0o777) == 0o600
+    assert json.loads(path.read_text(encoding='utf-8'))['profile']['user_agent'] == created.user_agent
+
+    monkeypatch.setattr(profile_module, 'derive_profile', lambda platform, account: BrowserProfile('other', {'width': 1, 'height': 1}))
+    cache.invalidate('momo', 'a@example.com')
+    assert load_profile('momo', 'a@example.com', cache) == created
+
+    path.write_text('not json', encoding='utf-8')
+    assert load_profile('momo', 'a@example.com', cache).user_agent == 'other'
+
+def test_resolve_profile_uses_assigned_account(monkeypatch):
+    """測試多帳號模式使用分配到的帳號，沒有帳號時回傳 None"""
+    monkeypatch.delenv('MOMO_USERNAME', raising=False)
+    monkeypatch.setattr('dotenv.load_dotenv', lambda *args, **kwargs: False)
+    account = Account('m1', 'momo', 'm1@example.com', 'secret')
+    assert account_username('momo', {'account': account}) == 'm1@example.com'
+    assert resolve_profile('momo', buyer_options={'account': account}) == derive_profile('momo', 'm1@example.com')
+    assert resolve_profile('momo') is None
+
+    monkeypatch.setenv('MOMO_USERNAME', 'env@example.com')
+    assert resolve_profile('momo') == derive_profile('momo', 'env@example.com')
+
+def test_context_options_apply_profile():
+    profile = derive_profile('pchome', 'a@example.com')
+    options = runner._context_options(profile=profile)
+    assert options == profile.context_options()
+    assert runner._context_options({'width': 800, 'height': 600}, profile)['viewport'] == {'width': 800, 'height': 600}
+    assert 'locale' not in runner._context_options()
+
+def test_low_footprint_keeps_profile_viewport():
+    """測試低資源模式保留帳號設定檔的視窗大小，沒有設定檔時才縮小"""
+    class Browser:
+        def new_context(self, **options):
+            self.options = options
+
+            class Context:
+                def add_init_script(self, script=None):
+                    pass
+
+            return Context()
+
+    profile = derive_profile('pchome', 'a@example.com')
+    browser = Browser()
+    runner.create_context(browser, profile=profile, low_footprint=True)
+    assert browser.options['viewport'] == profile.context_options()['viewport']
+    assert browser.options['reduced_motion'] == 'reduce'
+    runner.create_context(browser, low_footprint=True)
+    assert browser.options['viewport'] == runner.footprint.SMALL_VIEWPORT
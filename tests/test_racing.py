@@ -0,0 +1,153 @@
+import asyncio
+import pytest
+from buyer.instrument import Tracer, span
+from racing import RaceFailed, parse_offsets, race_checkout
+
+class FakeBuyer:
+    """checkout 耗時 delay 秒，error 不為 None 時失敗；cart 為同一帳號共用的購物車"""
+    def __init__(self, delay: float, error: Exception = None, cart: dict = None):
+        self.delay = delay
+        self.error = error
+        self.cart = cart if cart is not None else {'count': 0}
+        self.checkout_done = False
+        self.submitted = False
+        self.from_cart = None
+
+    async def add_to_cart(self):
+        self.cart['count'] += 1
+        return 'https://shop.example/cart'
+
+    async def checkout(self, from_cart=None):
+        self.from_cart = from_cart
+        if from_cart is None:
+            # 完整流程從加入購物車開始
+            await self.add_to_cart()
+        with span('step'):
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.checkout_done = True
+
+    async def submit_order(self):
+        self.submitted = True
+
+def test_fastest_racer_submits_and_others_are_cancelled():
+    """測試最先完成結帳者送出訂單，其餘取消且不會送出"""
+    buyers = [FakeBuyer(0.2), FakeBuyer(0.01), FakeBuyer(0.3)]
+    tracers = [Tracer(f"r{i}") for i in range(3)]
+    results = asyncio.run(race_checkout(buyers, [0, 0, 0], tracers))
+
+    assert [r.status for r in results] == ['cancelled', 'won', 'cancelled']
+    assert buyers[1].submitted
+    assert not any(b.submitted or b.checkout_done for b in (buyers[0], buyers[2]))
+    assert results[1].checkout_ms <= results[1].finished_ms
+    # 每一組都有自己的時間軸
+    assert [s['path'] for s in results[1].timeline] == ['checkout', 'checkout/step', 'submit_order']
+    # 第一組先加入購物車，之後的結帳被取消
+    assert [s['path'] for s in results[0].timeline] == ['add_to_cart', 'checkout', 'checkout/step']
+    assert results[0].timeline[1]['error'].startswith('CancelledError')
+
+def test_shared_cart_is_added_to_once():
+    """測試共用購物車只由第一組加入一次，所有競速者都從同一個購物車頁開始結帳"""
+    cart = {'count': 0}
+    buyers = [FakeBuyer(delay, cart=cart) for delay in (0.05, 0.01, 0.03)]
+    results = asyncio.run(race_checkout(buyers, [0, 0, 0]))
+
+    assert cart['count'] == 1
+    assert [b.from_cart for b in buyers] == ['https://shop.example/cart'] * 3
+    assert results[1].status == 'won' and buyers[1].submitted
+
+def test_failed_add_to_cart_stops_the_race():
+    """測試加入購物車失敗時不開始競速"""
+    class EmptyCart(FakeBuyer):
+        async def add_to_cart(self):
+            raise RuntimeError("sold out")
+
+    buyers = [EmptyCart(0), FakeBuyer(0)]
+    with pytest.raises(RaceFailed, match='加入購物車失敗'):
+        asyncio.run(race_checkout(buyers, [0, 0]))
+    assert not any(b.checkout_done or b.submitted for b in buyers)
+
+def test_offsets_delay_start_and_failures_do_not_win():
+    """測試偏移延後開始，失敗的競速者不會勝出"""
+    buyers = [FakeBuyer(0, error=RuntimeError("sold out")), FakeBuyer(0.01)]
+    results = asyncio.run(race_checkout(buyers, [0, 50]))
+
+    assert results[0].status == 'failed' and results[0].error == 'sold out'
+    assert results[1].status == 'won'
+    assert results[1].started_ms >= 45
+
+def test_all_racers_failing_raises_with_results():
+    """測試全部失敗時拋出 RaceFailed 並保留各組結果"""
+    buyers = [FakeBuyer(0, error=RuntimeError("a")), FakeBuyer(0, error=RuntimeError("b"))]
+    with pytest.raises(RaceFailed) as error:
+        asyncio.run(race_checkout(buyers, [0, 0]))
+    assert [r.status for r in error.value.results] == ['failed', 'failed']
+    assert not any(b.submitted for b in buyers)
+
+def test_parse_offsets():
+    """測試偏移解析"""
+    assert parse_offsets(None, 3) == [0, 0, 0]
+    assert parse_offsets('0, 25', 3) == [0, 25, 0]
+    with pytest.raises(ValueError):
+        parse_offsets('0,1,2', 2)
+    with pytest.raises(ValueError):
+        parse_offsets('-5', 1)
+
+def test_run_race_launches_like_other_modes(monkeypatch):
+    """測試競速模式以 launch_options 啟動瀏覽器，低資源模式同樣套用到各組 context"""
+    import playwright.async_api
+    from buyer.factory import PlatformFactory
+    from buyer.footprint import LOW_FOOTPRINT_ARGS, SMALL_VIEWPORT
+    from racing import run_race
+
+    launched, contexts = [], []
+
+    class Context:
+        async def add_init_script(self, script=None):
+            pass
+
+        async def new_page(self):
+            return object()
+
+    class Browser:
+        async def new_context(self, **options):
+            contexts.append(options)
+            return Context()
+
+        async def close(self):
+            pass
+
+    class Chromium:
+        async def launch(self, **options):
+            launched.append(options)
+            return Browser()
+
+    class Playwright:
+        chromium = Chromium()
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+    class Buyer(FakeBuyer):
+        async def prepare(self):
+            pass
+
+        async def save_session(self):
+            pass
+
+    async def create_async_buyer(url, page, **kwargs):
+        return Buyer(0)
+
+    monkeypatch.setattr(playwright.async_api, 'async_playwright', Playwright)
+    monkeypatch.setattr(PlatformFactory, 'create_async_buyer', staticmethod(create_async_buyer))
+    results = asyncio.run(run_race(
+        'https://24h.pchome.com.tw/prod/X', racers=2, headless=True, session_dir=None, low_footprint=True,
+    ))
+
+    assert launched == [{'headless': True, 'args': LOW_FOOTPRINT_ARGS}]
+    assert [c['viewport'] for c in contexts] == [SMALL_VIEWPORT] * 2
+    assert [r.status for r in results].count('won') == 1
@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from buyer.ratelimit import RateLimiter, TokenBucket
+
+class FakeClock:
+    """假時鐘：sleep 直接推進時間"""
+    def __init__(self):
+        self.mono_ns = 0
+        self.sleeps = []
+
+    def monotonic_ns(self) -> int:
+        return self.mono_ns
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.mono_ns += int(seconds * 1e9)
+
+    async def sleep_async(self, seconds: float):
+        self.sleep(seconds)
+
+def test_token_bucket_allows_burst_then_queues():
+    """測試可連續使用 burst 個 token，之後的預約依序排隊"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+
+    # 經過 1.5 秒補回 3 個 token，扣掉透支的 2 個後可立即使用
+    clock.mono_ns += int(1.5e9)
+    assert bucket.reserve() == 0.0
+
+def test_token_bucket_rejects_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+def test_rate_limiter_applies_account_and_platform_limits():
+    """測試帳號限制各自計算，平台限制由所有帳號共用"""
+    clock = FakeClock()
+    limiter = RateLimiter(account_rate=1, platform_rate=10, platform_burst=2, clock=clock)
+
+    assert limiter.acquire('pchome', 'a') == 0.0
+    # 同一帳號的第二個請求受帳號限制
+    assert limiter.reserve('pchome', 'a') == pytest.approx(1.0)
+    # 其他帳號不受帳號 a 影響，但平台 burst 已用完
+    assert limiter.reserve('pchome', 'b') == pytest.approx(0.1)
+    # 不同平台各自計算
+    assert limiter.reserve('momo', 'a') == 0.0
+
+def test_rate_limiter_without_limits_never_waits():
+    limiter = RateLimiter(account_rate=0, clock=FakeClock())
+    assert all(limiter.reserve('pchome', 'a') == 0.0 for _ in range(100))
+
+def test_async_acquire_sleeps_on_clock():
+    clock = FakeClock()
+    limiter = RateLimiter(account_rate=4, account_burst=1, clock=clock)
+
+    async def scenario():
+        return [await limiter.acquire_async('momo', 'a') for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [0.0, 0.25, 0.25]
+    assert clock.sleeps == [0.25, 0.25]
+
+def test_checkout_steps_are_not_throttled():
+    """測試開賣當下的結帳步驟不經過速率限制，開賣前的請求（throttle）仍會排隊"""
+    from buyer.base import BaseBuyer
+    from buyer.flows import FlowStep
+    from buyer.steps import Condition, Step
+
+    class Limiter:
+        def __init__(self):
+            self.acquired = []
+
+        def acquire(self, platform, account=None):
+            self.acquired.append((platform, account))
+            return 1.0
+
+    class Steps:
+        def __init__(self):
+            self.history = []
+
+        def run(self, step, action=None):
+            action()
+
+    class Buyer(BaseBuyer):
+        platform = 'pchome'
+        login = check_product = purchase = _ensure_login = lambda self: None
+
+        def _load_credentials(self):
+            self.username = 'a'
+
+        def click(self):
+            self.clicked.append(len(limiter.acquired))
+
+    limiter = Limiter()
+    buyer = Buyer('https://24h.pchome.com.tw/prod/X', None, rate_limiter=limiter)
+    buyer.steps, buyer.clicked = Steps(), []
+    step = FlowStep(Step('checkout', success=[Condition('form', selector='#form')]), call='click', stage='cart')
+    buyer._run_flow([step, step])
+    assert buyer.clicked == [0, 0] and 'throttle' not in buyer.timing_stats
+
+    buyer.throttle()
+    assert limiter.acquired == [('pchome', 'a')] and buyer.timing_stats['throttle']['waited_ms'] == 1000.0
+
+def test_fan_out_login_consumes_tokens():
+    """測試多帳號同時登入時，登入與確認登入狀態的請求都經過速率限制（共用平台配額）"""
+    from buyer.base import BaseBuyer
+
+    class Response:
+        status = 200
+
+    class Request:
+        def get(self, url, max_redirects=None, timeout=None):
+            return Response()
+
+    class Context:
+        request = Request()
+
+    class Page:
+        context = Context()
+
+    class Buyer(BaseBuyer):
+        platform = 'pchome'
+        member_url = 'https://ecvip.pchome.com.tw/web/MemberProduct/Info'
+        check_product = purchase = lambda self: None
+
+        def _load_credentials(self):
+            self.username = self.options['username']
+
+        def login(self):
+            logins.append((self.username, clock.mono_ns / 1e9))
+
+    clock, logins = FakeClock(), []
+    limiter = RateLimiter(account_rate=1, platform_rate=10, platform_burst=2, clock=clock)
+    buyers = [Buyer('https://24h.pchome.com.tw/prod/X', Page(), rate_limiter=limiter, username=u) for u in 'abc']
+    # 平台 burst 只有 2，第三個帳號的登入等待平台補回 token
+    assert [u for u, _ in logins] == ['a', 'b', 'c'] and logins[2][1] == pytest.approx(0.1)
+    assert [b.timing_stats['throttle']['requests'] for b in buyers] == [1, 1, 1]
+
+    assert buyers[0].is_logged_in()
+    assert buyers[0].timing_stats['throttle'] == {'requests': 2, 'waited_ms': pytest.approx(1000.0 - 100.0)}
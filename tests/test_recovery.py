@@ -0,0 +1,134 @@
+import asyncio
+import random
+import pytest
+from buyer.flows import FlowStep
+from buyer.recovery import CheckoutRecovery, is_transient
+from buyer.steps import Step, StepFailed, StepTimeout
+
+class FakeClock:
+    """假時鐘：sleep 直接推進時間"""
+    def __init__(self):
+        self.mono_ns = 0
+        self.sleeps = []
+
+    def monotonic_ns(self) -> int:
+        return self.mono_ns
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.mono_ns += int(seconds * 1e9)
+
+    async def sleep_async(self, seconds: float):
+        self.sleep(seconds)
+
+STEPS = tuple(
+    FlowStep(Step(name, success=()), stage=stage)
+    for name, stage in (('add_to_cart', 'product'), ('checkout', 'cart'), ('fill_payment', 'checkout'))
+)
+
+class FakeBuyer:
+    """依腳本讓步驟失敗（每個步驟依序拋出清單中的例外），記錄每次從哪個步驟開始執行"""
+    def __init__(self, failures, stages):
+        self.failures = {name: list(errors) for name, errors in failures.items()}
+        self.stages = list(stages)
+        self.timing_stats = {}
+        self.flow = None
+        self.runs = []
+        self.reloads = 0
+
+    def _run_flow(self, flow_steps):
+        self.runs.append(flow_steps[0].name)
+        for flow_step in flow_steps:
+            errors = self.failures.get(flow_step.name)
+            if errors:
+                raise errors.pop(0)
+
+    def detect_stage(self):
+        return self.stages.pop(0)
+
+    def reload_product(self):
+        self.reloads += 1
+
+class AsyncFakeBuyer(FakeBuyer):
+    async def _run_flow(self, flow_steps):
+        super()._run_flow(flow_steps)
+
+    async def detect_stage(self):
+        return super().detect_stage()
+
+    async def reload_product(self):
+        super().reload_product()
+
+def _recovery(clock, **kwargs):
+    return CheckoutRecovery(clock=clock, rng=random.Random(1), **kwargs)
+
+def test_resumes_from_detected_stage():
+    """測試逾時後依目前階段從對應步驟繼續，並記錄恢復耗時"""
+    clock = FakeClock()
+    buyer = FakeBuyer({'fill_payment': [StepTimeout('逾時', 'fill_payment')]}, ['checkout'])
+    stats = _recovery(clock).run(buyer, STEPS)
+
+    assert buyer.runs == ['add_to_cart', 'fill_payment']
+    assert stats['retries'] == 1 and buyer.reloads == 0
+    attempt, = stats['attempts']
+    assert attempt['failed_step'] == 'fill_payment' and attempt['resume_step'] == 'fill_payment'
+    assert stats['recovery_ms'] == pytest.approx(clock.sleeps[0] * 1000)
+    assert buyer.timing_stats['recovery'] is stats
+
+def test_unknown_stage_reloads_product_page():
+    """測試判斷不出階段時重新載入商品頁並從頭開始"""
+    buyer = FakeBuyer({'checkout': [StepTimeout('逾時', 'checkout')]}, [None])
+    _recovery(FakeClock()).run(buyer, STEPS)
+    assert buyer.runs == ['add_to_cart', 'add_to_cart'] and buyer.reloads == 1
+
+def test_add_to_cart_is_not_repeated():
+    """測試加入購物車（once）送出後等待逾時：頁面仍在商品頁時不重做，已到購物車時從下一步繼續"""
+    steps = (FlowStep(STEPS[0].step, stage='product', once=True),) + STEPS[1:]
+    buyer = FakeBuyer({'add_to_cart': [StepTimeout('逾時', 'add_to_cart')]}, ['product'])
+    with pytest.raises(StepTimeout):
+        _recovery(FakeClock()).run(buyer, steps)
+    assert buyer.runs == ['add_to_cart'] and buyer.reloads == 0
+
+    buyer = FakeBuyer({'add_to_cart': [StepTimeout('逾時', 'add_to_cart')]}, ['cart'])
+    _recovery(FakeClock()).run(buyer, steps)
+    assert buyer.runs == ['add_to_cart', 'checkout']
+
+    # 之後的步驟失敗、判斷不出階段時，不重新載入商品頁從頭加入
+    buyer = FakeBuyer({'checkout': [StepTimeout('逾時', 'checkout')]}, [None])
+    with pytest.raises(StepTimeout):
+        _recovery(FakeClock()).run(buyer, steps)
+    assert buyer.runs == ['add_to_cart'] and buyer.reloads == 0
+
+def test_backoff_is_bounded_and_jittered():
+    """測試退避時間以指數成長、不超過上限，抖動在 ± jitter 之內"""
+    recovery = _recovery(FakeClock(), base_delay=0.1, max_delay=0.3, jitter=0.5)
+    for attempt, base in ((1, 0.1), (2, 0.2), (3, 0.3), (6, 0.3)):
+        assert base * 0.5 <= recovery.backoff(attempt) <= base * 1.5
+
+def test_gives_up_after_max_retries_and_on_failures():
+    """測試超過重試次數或失敗條件成立時直接拋出"""
+    buyer = FakeBuyer({'checkout': [StepTimeout('逾時', 'checkout')] * 3}, ['cart', 'cart'])
+    with pytest.raises(StepTimeout):
+        _recovery(FakeClock(), max_retries=2).run(buyer, STEPS)
+    assert buyer.runs == ['add_to_cart', 'checkout', 'checkout']
+    assert buyer.timing_stats['recovery']['retries'] == 2
+
+    buyer = FakeBuyer({'add_to_cart': [StepFailed('售完', 'add_to_cart', 'sold_out')]}, [])
+    with pytest.raises(StepFailed):
+        _recovery(FakeClock()).run(buyer, STEPS)
+    assert buyer.runs == ['add_to_cart']
+
+def test_is_transient():
+    class TimeoutError(Exception):
+        """模擬 Playwright 的 TimeoutError"""
+
+    assert is_transient(TimeoutError('Timeout 5000ms exceeded'))
+    assert is_transient(RuntimeError('page.goto: net::ERR_CONNECTION_RESET'))
+    assert not is_transient(ValueError('找不到付款資訊'))
+
+def test_async_recovery():
+    clock = FakeClock()
+    buyer = AsyncFakeBuyer({'checkout': [StepTimeout('逾時', 'checkout')]}, ['cart'])
+    stats = asyncio.run(_recovery(clock).run_async(buyer, STEPS))
+    assert buyer.runs == ['add_to_cart', 'checkout'] and stats['retries'] == 1
+    assert len(clock.sleeps) == 1
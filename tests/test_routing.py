@@ -0,0 +1,37 @@
+import pytest
+from buyer.routing import ResourceBlocker
+
+@pytest.fixture
+def blocker() -> ResourceBlocker:
+    return ResourceBlocker('pchome')
+
+def test_first_party_scripts_are_allowed(blocker: ResourceBlocker):
+    """測試第一方腳本與頁面不會被封鎖"""
+    assert blocker.should_block("https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ", "document") is None
+    assert blocker.should_block("https://ecssl.pchome.com.tw/sys/cflow/js/checkout.js", "script") is None
+    assert blocker.should_block("https://www.gstatic.com/recaptcha/api.js", "script") is None
+
+def test_heavy_resource_types_are_blocked(blocker: ResourceBlocker):
+    """測試圖片與字型即使來自第一方也會被封鎖"""
+    assert blocker.should_block("https://img.pchome.com.tw/cs/items/a.jpg", "image") == "image"
+    assert blocker.should_block("https://24h.pchome.com.tw/fonts/a.woff2", "font") == "font"
+
+def test_trackers_and_third_party_are_blocked(blocker: ResourceBlocker):
+    """測試追蹤服務與非白名單第三方網域會被封鎖"""
+    assert blocker.should_block("https://www.googletagmanager.com/gtm.js", "script") == "tracker"
+    assert blocker.should_block("https://cdn.example-ads.com/x.js", "script") == "third_party"
+    # 相似但不同的網域不應被視為白名單
+    assert blocker.should_block("https://evilpchome.com.tw/x.js", "script") == "third_party"
+
+def test_third_party_blocking_can_be_disabled():
+    """測試可關閉第三方封鎖並加入額外白名單"""
+    blocker = ResourceBlocker('momo', block_third_party=False)
+    assert blocker.should_block("https://cdn.example.com/x.js", "script") is None
+
+    blocker = ResourceBlocker('momo', extra_allow=['payment.example.com'])
+    assert blocker.should_block("https://payment.example.com/pay.js", "script") is None
+
+def test_unknown_platform():
+    """測試不支援的平台"""
+    with pytest.raises(ValueError):
+        ResourceBlocker('shopee')
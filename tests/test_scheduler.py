@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from buyer.scheduler import PrecisionScheduler, parse_scheduled_time
+
+class FakeClock:
+    """可控制的假時鐘，sleep 會直接推進時間"""
+    def __init__(self, start: datetime, tick_ns: int = 1000):
+        self.wall = start.timestamp()
+        self.mono_ns = 0
+        self.tick_ns = tick_ns
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self.wall + self.mono_ns / 1e9
+
+    def monotonic_ns(self) -> int:
+        # 每次讀取時鐘都前進一點，模擬忙等的耗時
+        self.mono_ns += self.tick_ns
+        return self.mono_ns
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.mono_ns += int(seconds * 1e9)
+
+    async def sleep_async(self, seconds: float):
+        self.sleep(seconds)
+
+@pytest.fixture
+def start() -> datetime:
+    return datetime(2024, 3, 20, 11, 59, 55)
+
+def test_wait_until_fires_within_spin_resolution(start: datetime):
+    """測試排程器在目標時間的微秒內觸發"""
+    clock = FakeClock(start)
+    scheduler = PrecisionScheduler(clock=clock)
+    stats = scheduler.wait_until(start + timedelta(seconds=5))
+
+    assert 0 <= stats['overshoot_ms'] < 0.01
+    assert stats['spin_iterations'] > 0
+    # 粗粒度 sleep 每次不超過 1 秒
+    assert all(s <= 1.0 for s in clock.sleeps)
+    assert stats['coarse_sleeps'] == len(clock.sleeps)
+
+def test_wait_until_applies_lead_time(start: datetime):
+    """測試提前量會讓觸發時間提早"""
+    clock = FakeClock(start)
+    scheduler = PrecisionScheduler(lead_time_ms=50, clock=clock)
+    stats = scheduler.wait_until(start + timedelta(seconds=1))
+
+    assert stats['waited_ms'] == pytest.approx(950, abs=0.01)
+    assert stats['lead_time_ms'] == 50
+
+def test_wait_until_applies_clock_offset(start: datetime):
+    """測試伺服器時間較本機快 300 毫秒時，本機提早 300 毫秒觸發"""
+    clock = FakeClock(start)
+    scheduler = PrecisionScheduler(clock=clock, clock_offset=0.3)
+    stats = scheduler.wait_until(start + timedelta(seconds=2))
+
+    assert stats['waited_ms'] == pytest.approx(1700, abs=0.01)
+    assert stats['clock_offset_ms'] == pytest.approx(300)
+
+def test_wait_until_past_target_returns_immediately(start: datetime):
+    """測試目標時間已過時立即返回並記錄延遲"""
+    clock = FakeClock(start)
+    scheduler = PrecisionScheduler(clock=clock)
+    stats = scheduler.wait_until(start - timedelta(seconds=1))
+
+    assert clock.sleeps == []
+    assert stats['overshoot_ms'] >= 1000
+
+def test_wait_until_calls_on_idle_outside_guard(start: datetime):
+    """測試等待期間定期呼叫背景工作，且接近目標時間時停止"""
+    clock = FakeClock(start)
+    calls = []
+    scheduler = PrecisionScheduler(clock=clock)
+    stats = scheduler.wait_until(
+        start + timedelta(seconds=100),
+        on_idle=lambda: calls.append(clock.time()),
+        idle_interval=20,
+        idle_guard=30,
+    )
+
+    # 第 20、40、60 秒會呼叫，80 秒時已進入保護區間
+    assert stats['idle_calls'] == len(calls) == 3
+    assert all(start.timestamp() + 100 - t > 30 for t in calls)
+
+def test_wait_until_async_matches_sync(start: datetime):
+    """測試 asyncio 版本的等待結果與同步版本一致"""
+    clock = FakeClock(start)
+    idle_calls = []
+
+    async def on_idle():
+        idle_calls.append(clock.time())
+
+    scheduler = PrecisionScheduler(lead_time_ms=10, clock=clock)
+    stats = asyncio.run(scheduler.wait_until_async(
+        start + timedelta(seconds=60), on_idle=on_idle, idle_interval=20, idle_guard=5,
+    ))
+
+    assert 0 <= stats['overshoot_ms'] < 0.01
+    assert stats['waited_ms'] == pytest.approx(59990, abs=0.01)
+    assert stats['idle_calls'] == len(idle_calls) == 2
+
+def test_parse_scheduled_time():
+    """測試預定時間格式解析"""
+    assert parse_scheduled_time("2024-03-20 12:00:00") == datetime(2024, 3, 20, 12, 0, 0)
+    assert parse_scheduled_time("2024-03-20 12:00:00.250") == datetime(2024, 3, 20, 12, 0, 0, 250000)
+    with pytest.raises(ValueError):
+        parse_scheduled_time("2024/03/20 12:00")
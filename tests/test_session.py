@@ -0,0 +1,82 @@
+import json
+import time
+import pytest
+from buyer.session import SessionCache
+
+class FakeContext:
+    """模擬 BrowserContext 的 storage_state 相關介面"""
+    def __init__(self, state=None):
+        self.state = state or {'cookies': [], 'origins': []}
+        self.added_cookies = []
+        self.init_scripts = []
+
+    def storage_state(self):
+        return self.state
+
+    def add_cookies(self, cookies):
+        self.added_cookies.extend(cookies)
+
+    def add_init_script(self, script=None):
+        self.init_scripts.append(script)
+
+@pytest.fixture
+def cache(tmp_path) -> SessionCache:
+    return SessionCache(cache_dir=str(tmp_path), max_age=3600)
+
+def _state(expires: float):
+    return {
+        'cookies': [{'name': 'sid', 'value': 'abc', 'domain': '.pchome.com.tw', 'path': '/', 'expires': expires}],
+        'origins': [{'origin': 'https://24h.pchome.com.tw', 'localStorage': [{'name': 'k', 'value': 'v'}]}],
+    }
+
+def test_save_and_load_round_trip(cache: SessionCache):
+    """測試儲存後可讀回 storage_state，且檔名不含帳號明文"""
+    cache.save('pchome', 'user@example.com', FakeContext(_state(time.time() + 600)))
+
+    path = cache.path_for('pchome', 'user@example.com')
+    assert 'user@example.com' not in path.name
+    state = cache.load('pchome', 'user@example.com')
+    assert state['cookies'][0]['name'] == 'sid'
+    assert cache.load('momo', 'user@example.com') is None
+
+def test_load_rejects_expired_cache(cache: SessionCache):
+    """測試超過有效期限或 cookies 皆過期時視為失效"""
+    cache.save('pchome', 'a', FakeContext(_state(time.time() - 1)))
+    assert cache.load('pchome', 'a') is None
+
+    cache.save('pchome', 'b', FakeContext(_state(-1)))
+    path = cache.path_for('pchome', 'b')
+    data = json.loads(path.read_text(encoding='utf-8'))
+    data['saved_at'] -= 7200
+    path.write_text(json.dumps(data), encoding='utf-8')
+    assert cache.load('pchome', 'b') is None
+
+def test_invalidate(cache: SessionCache):
+    """測試刪除快取"""
+    cache.save('momo', 'a', FakeContext(_state(-1)))
+    cache.invalidate('momo', 'a')
+    assert cache.load('momo', 'a') is None
+
+def test_restore_applies_cookies_and_local_storage():
+    """測試將快取套用到 context"""
+    context = FakeContext()
+    SessionCache.restore(context, _state(-1))
+
+    assert context.added_cookies[0]['value'] == 'abc'
+    assert len(context.init_scripts) == 1
+    assert 'https://24h.pchome.com.tw' in context.init_scripts[0]
+
+def test_restore_adds_local_storage_script_once():
+    """測試 localStorage 只補上不存在的項目、每個 origin 只寫一次，重複使用的 context 不疊加腳本"""
+    context = FakeContext()
+    SessionCache.restore(context, _state(-1))
+    SessionCache.restore(context, _state(-1))
+
+    assert len(context.added_cookies) == 2
+    assert len(context.init_scripts) == 1
+    script = context.init_scripts[0]
+    assert 'getItem(item.name) === null' in script and '__session_cache_restored__' in script
+
+    other = FakeContext()
+    SessionCache.restore(other, {'cookies': _state(-1)['cookies'], 'origins': []})
+    assert other.init_scripts == []
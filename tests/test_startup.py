@@ -0,0 +1,85 @@
+"""
+CLI 啟動成本：以 `python -X importtime` 量測匯入 main 的時間，並確認
+--help、工作檔解析與排程不會載入 Playwright。
+
+IMPORT_BUDGET_MS 可調整匯入時間的預算（預設 250 ms）。
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '250'))
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=60,
+    )
+
+def parse_importtime(stderr: str) -> dict:
+    """解析 -X importtime 的輸出，回傳 模組 -> 累計微秒"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+def test_import_main_is_within_budget_and_skips_playwright():
+    """測試匯入 main 不會載入 Playwright，且耗時在預算內"""
+    result = _python('-X', 'importtime', '-c', 'import main')
+    assert result.returncode == 0, result.stderr
+    modules = parse_importtime(result.stderr)
+    assert not [name for name in modules if name.startswith('playwright')]
+    assert modules['main'] / 1000 < BUDGET_MS
+
+def test_cli_paths_do_not_load_playwright(tmp_path):
+    """測試 --help、參數檢查、工作檔解析與時間解析都不需要 Playwright"""
+    jobs = tmp_path / 'jobs.json'
+    jobs.write_text('[{"url": "https://24h.pchome.com.tw/prod/DYAJC9-A900GN2IQ", "time": "2030-01-01 12:00:00"}]', encoding='utf-8')
+    script = f'''
+import sys
+from click.testing import CliRunner
+import main
+from batch import load_jobs
+from buyer.scheduler import parse_scheduled_time
+assert CliRunner().invoke(main.cli, ['--help']).exit_code == 0
+assert CliRunner().invoke(main.cli, ['buy', '--help']).exit_code == 0
+# 缺少商品連結時顯示用法並以錯誤碼 2 結束
+for flag in (['--race', '3'], ['--bench-blocking', '2'], ['--bench-footprint', '2']):
+    result = CliRunner().invoke(main.cli, ['buy', '--jobs', {str(jobs)!r}, *flag])
+    assert result.exit_code == 2 and '需要商品連結' in result.output, result.output
+jobs = load_jobs({str(jobs)!r})
+parse_scheduled_time(jobs[0].time)
+print(sorted(m for m in sys.modules if m.startswith('playwright')))
+'''
+    result = _python('-c', script)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '[]'
+
+def test_buyer_package_exports_are_lazy():
+    """測試 buyer 套件的購買器在存取時才匯入"""
+    script = '''
+import sys
+import buyer
+assert 'buyer.pchome' not in sys.modules
+assert buyer.PChomeBuyer.platform == 'pchome'
+print('buyer.pchome' in sys.modules)
+'''
+    result = _python('-c', script)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'True'
+
+def test_library_modules_do_not_import_the_cli():
+    """測試批次、常駐、競速與監看模組不匯入 main（避免 CLI 的 logging 設定等副作用）"""
+    script = '''
+import sys
+import batch, daemon, racing, monitor
+from buyer import runner
+print('main' in sys.modules, sorted(m for m in sys.modules if m.startswith('playwright')))
+'''
+    result = _python('-c', script)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'False []'
@@ -0,0 +1,213 @@
+import asyncio
+import pytest
+from buyer.steps import (
+    AsyncStepEngine,
+    Condition,
+    Interstitial,
+    Step,
+    StepEngine,
+    StepFailed,
+    StepTimeout,
+    count_round_trips,
+)
+
+SUCCESS = Condition('form', selector='#form')
+FAILURE = Condition('alert', alert='')
+CONFIRM = Interstitial(Condition('confirm', selector='button', text='確定'))
+
+class FakePage:
+    """依序回傳預先安排的頁面狀態，記錄 evaluate 參數與點擊"""
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.waits = []
+        self.clicks = []
+        self.init_scripts = []
+
+    def add_init_script(self, script=None):
+        self.init_scripts.append(script)
+
+    def evaluate(self, script, arg=None):
+        self.waits.append(arg)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def locator(self, selector, has_text=None):
+        page = self
+
+        class Locator:
+            @property
+            def first(self):
+                return self
+
+            def click(self):
+                page.clicks.append((selector, has_text))
+
+        return Locator()
+
+class AsyncFakePage(FakePage):
+    async def add_init_script(self, script=None):
+        super().add_init_script(script)
+
+    async def evaluate(self, script, arg=None):
+        return super().evaluate(script, arg)
+
+    def locator(self, selector, has_text=None):
+        page = self
+
+        class Locator:
+            @property
+            def first(self):
+                return self
+
+            async def click(self):
+                page.clicks.append((selector, has_text))
+
+        return Locator()
+
+def _matched(name, alerts=()):
+    return {'matched': name, 'alerts': list(alerts)}
+
+def test_action_then_success():
+    """測試執行動作後以單次等待取得成功條件，並記錄結果"""
+    actions = []
+    page = FakePage([_matched('form')])
+    engine = StepEngine(page)
+    step = Step('checkout', success=[SUCCESS], action=lambda: actions.append('click'), failure=[FAILURE])
+
+    assert engine.run(step) == 'form'
+    assert actions == ['click']
+    assert len(page.waits) == 1
+    # 失敗條件排在成功條件之前，兩者同時成立時以失敗為準
+    assert [c['name'] for c in page.waits[0]['conditions']] == ['alert', 'form']
+    assert engine.history[0].outcome == 'success' and engine.history[0].waits == 1
+
+def test_failure_raises_with_alert_message():
+    """測試失敗條件成立時立即拋出 StepFailed 並附上 alert 訊息"""
+    engine = StepEngine(FakePage([_matched('alert', ['商品已售完'])]))
+    step = Step('add_to_cart', success=[SUCCESS], failure=[FAILURE], error="加入購物車失敗")
+
+    with pytest.raises(StepFailed) as error:
+        engine.run(step)
+    assert error.value.condition == 'alert'
+    assert '商品已售完' in str(error.value) and '加入購物車失敗' in str(error.value)
+    assert engine.history[0].outcome == 'failure'
+
+def test_earlier_alerts_do_not_fail_later_steps():
+    """測試步驟只看自己開始之後的 alert：上一個步驟結束時的位置會帶到下一個步驟"""
+    mark = {'id': 'doc-1', 'index': 1}
+    page = FakePage([
+        {'matched': 'form', 'alerts': ['數量不足'], 'alertMark': mark},
+        {'matched': 'form', 'alerts': [], 'alertMark': mark},
+    ])
+    engine = StepEngine(page)
+    step = Step('checkout', success=[SUCCESS], failure=[FAILURE])
+    engine.run(step)
+    engine.run(step)
+    assert page.waits[0]['alertMark'] is None
+    assert page.waits[1]['alertMark'] == mark
+
+def test_interstitial_is_clicked_and_wait_continues():
+    """測試中途視窗出現時點擊後繼續等待"""
+    page = FakePage([_matched('confirm'), _matched('form')])
+    engine = StepEngine(page)
+    step = Step('checkout', success=[SUCCESS], interstitial=[CONFIRM])
+
+    assert engine.run(step) == 'form'
+    assert page.clicks == [('button', '確定')]
+    assert engine.history[0].interstitials == ['confirm']
+    # 點擊後的等待暫不比對同一個中途視窗，關閉較慢時不會再點一次
+    assert page.waits[0]['settle'] == {}
+    assert 0 < page.waits[1]['settle']['confirm'] <= 500
+
+def test_repeated_interstitial_fails():
+    """測試中途視窗反覆出現時不會無限點擊"""
+    page = FakePage([_matched('confirm')] * 3)
+    step = Step('checkout', success=[SUCCESS], interstitial=[CONFIRM], max_interstitials=2)
+    with pytest.raises(StepFailed):
+        StepEngine(page).run(step)
+    assert len(page.clicks) == 2
+
+def test_navigation_restarts_wait_on_new_page():
+    """測試導航中斷等待後，在新頁面上繼續等待"""
+    page = FakePage([RuntimeError("Execution context was destroyed, most likely because of a navigation"), _matched('form')])
+    assert StepEngine(page).run(Step('checkout', success=[SUCCESS])) == 'form'
+    assert len(page.waits) == 2
+
+def test_other_errors_propagate():
+    """測試非導航造成的錯誤直接拋出"""
+    page = FakePage([RuntimeError("Target closed")])
+    with pytest.raises(RuntimeError):
+        StepEngine(page).run(Step('checkout', success=[SUCCESS]))
+
+def test_timeout_and_immediate_check():
+    """測試沒有條件成立時拋出 StepTimeout，timeout 為 0 時只檢查一次"""
+    page = FakePage([_matched(None)])
+    with pytest.raises(StepTimeout) as error:
+        StepEngine(page).run(Step('stock', success=[SUCCESS], timeout=0, error="商品目前無法購買"))
+    assert '商品目前無法購買' in str(error.value)
+    assert page.waits[0]['timeout'] == 0
+
+def test_async_engine():
+    """測試 asyncio 版本支援 coroutine 動作、中途視窗與安裝 alert 攔截"""
+    page = AsyncFakePage([_matched('confirm'), _matched('form')])
+    engine = AsyncStepEngine(page)
+    actions = []
+
+    async def click():
+        actions.append('click')
+
+    async def scenario():
+        await engine.install()
+        await engine.install()
+        return await engine.run(Step('checkout', success=[SUCCESS], action=click, interstitial=[CONFIRM]))
+
+    assert asyncio.run(scenario()) == 'form'
+    assert actions == ['click']
+    assert page.clicks == [('button', '確定')]
+    assert len(page.init_scripts) == 1
+
+def test_in_page_step_clicks_and_handles_interstitials_in_one_round_trip():
+    """測試頁面內模式把點擊、中途視窗與等待合併為一次往返"""
+    page = FakePage([{'matched': 'form', 'alerts': [], 'clicked': True, 'interstitials': ['confirm']}])
+    engine = StepEngine(page)
+    step = Step('checkout', success=[SUCCESS], click=('#checkout', None), in_page=True, interstitial=[CONFIRM], failure=[FAILURE])
+
+    assert engine.run(step) == 'form'
+    wait = page.waits[0]
+    assert wait['click'] == ['#checkout', None]
+    assert wait['failures'] == ['alert']
+    assert wait['interstitials'] == {'confirm': ['button', '確定']}
+    assert page.clicks == []
+    assert engine.history[0].interstitials == ['confirm']
+    assert count_round_trips(engine.history) == 1
+
+def test_round_trips_before_and_after_in_page_mode():
+    """比較同一步驟以 Playwright 操作與頁面內模式執行的往返次數"""
+    # 逐一操作：點擊、等待、點掉確認視窗、再等待
+    page = FakePage([_matched('confirm'), _matched('form')])
+    engine = StepEngine(page)
+    engine.run(Step('checkout', success=[SUCCESS], click=('#checkout', None), interstitial=[CONFIRM]))
+    assert page.clicks == [('#checkout', None), ('button', '確定')]
+    assert count_round_trips(engine.history) == 4
+
+    page = FakePage([{'matched': 'form', 'alerts': [], 'clicked': True, 'interstitials': ['confirm']}])
+    engine = StepEngine(page)
+    engine.run(Step('checkout', success=[SUCCESS], click=('#checkout', None), in_page=True, interstitial=[CONFIRM]))
+    assert count_round_trips(engine.history) == 1
+
+def test_in_page_click_survives_navigation():
+    """測試頁面內點擊造成導航後，在新頁面等待時不再重複點擊"""
+    page = FakePage([RuntimeError("Execution context was destroyed"), _matched('form')])
+    step = Step('add_to_cart', success=[SUCCESS], click=('#buy', None), in_page=True)
+    assert StepEngine(page).run(step) == 'form'
+    assert page.waits[0]['click'] == ['#buy', None]
+    assert page.waits[1]['click'] is None
+
+def test_in_page_click_target_missing_times_out():
+    """測試頁面內點擊的元素一直沒出現時，逾時訊息指出元素"""
+    page = FakePage([{'matched': None, 'alerts': [], 'clicked': False}])
+    step = Step('add_to_cart', success=[SUCCESS], click=('#buy', None), in_page=True, timeout=0)
+    with pytest.raises(StepTimeout, match='#buy'):
+        StepEngine(page).run(step)
@@ -0,0 +1,87 @@
+import pytest
+from buyer.instrument import Tracer
+from buyer.telemetry import NetworkMeter, RunRecord, TelemetryStore, compute_stats, format_stats
+
+DAY = 86400
+# 取 UTC 正午，避免時區讓同一批執行跨日
+NOON = 100 * DAY + DAY / 2
+
+class FakeResponse:
+    def __init__(self, length):
+        self.headers = {'content-length': length} if length is not None else {}
+
+class FakeTarget:
+    def __init__(self):
+        self.listeners = []
+
+    def on(self, event, handler):
+        self.listeners.append(handler)
+
+    def remove_listener(self, event, handler):
+        self.listeners.remove(handler)
+
+    def emit(self, response):
+        for handler in list(self.listeners):
+            handler(response)
+
+def _tracer():
+    ticks = iter(range(0, 10_000_000_000, 5_000_000))
+    tracer = Tracer('pchome', clock=lambda: next(ticks))
+    with tracer.span('purchase'):
+        with tracer.span('step.checkout'):
+            with tracer.span('click', kind='action'):
+                pass
+    return tracer
+
+def test_network_meter_counts_until_detached():
+    """測試依回應標頭累計傳輸量，detach 後不再計算"""
+    target = FakeTarget()
+    meter = NetworkMeter().attach(target)
+    target.emit(FakeResponse('1000'))
+    target.emit(FakeResponse(None))
+    target.emit(FakeResponse('bad'))
+    meter.detach(target)
+    target.emit(FakeResponse('5000'))
+    assert (meter.requests, meter.bytes) == (3, 1000)
+
+def test_record_from_run_skips_actions_and_roundtrips(tmp_path):
+    """測試紀錄只保留步驟層級的 span，並可從 SQLite 讀回"""
+    meter = NetworkMeter()
+    meter.requests, meter.bytes = 12, 34567
+    record = RunRecord.from_run(
+        _tracer(), 'pchome', False, 250.0, error='逾時', timing_stats={'retries': 2}, meter=meter, account='main',
+    )
+    assert set(record.steps) == {'purchase', 'purchase/step.checkout'}
+    assert record.actions == 1
+
+    store = TelemetryStore(str(tmp_path / 'sub' / 'telemetry.db'))
+    assert store.record(record) is not None
+    run, = store.runs()
+    assert run['success'] is False and run['error'] == '逾時'
+    assert (run['retries'], run['requests'], run['bytes'], run['account']) == (2, 12, 34567, 'main')
+    assert run['steps'] == record.steps
+    assert store.runs(platform='momo') == []
+
+def _run(started_at, success=True, checkout=100.0):
+    return {
+        'started_at': started_at, 'success': success, 'total_ms': checkout + 50, 'retries': 0, 'bytes': 2048,
+        'steps': {'purchase': checkout + 40, 'purchase/step.checkout': checkout},
+    }
+
+def test_compute_stats_flags_step_regression():
+    """測試近期執行與基準比較，步驟變慢時標記並依日期計算成功率"""
+    runs = [_run(NOON + i * 60) for i in range(10)] + [_run(NOON + DAY + i * 60, success=i % 2 == 0, checkout=180.0) for i in range(4)]
+    stats = compute_stats(runs, recent=4)
+
+    assert stats['overall']['count'] == 14
+    assert stats['overall']['success_rate'] == pytest.approx(12 / 14)
+    assert [d['runs'] for d in stats['daily']] == [10, 4]
+    checkout = stats['steps']['purchase/step.checkout']
+    assert checkout['baseline_p50_ms'] == 100 and checkout['recent_p50_ms'] == 180
+    assert checkout['regression']
+    assert '變慢' in format_stats(stats)
+
+def test_compute_stats_without_baseline_or_runs():
+    stats = compute_stats([_run(0), _run(60)], recent=20)
+    assert not any(entry['regression'] for entry in stats['steps'].values())
+    assert format_stats(compute_stats([])) == '沒有執行紀錄'
@@ -0,0 +1,95 @@
+import asyncio
+import random
+import pytest
+from buyer.watcher import StockWatcher, percentile
+
+class FakeClock:
+    """假時鐘：sleep 直接推進時間，每次探測耗時固定"""
+    def __init__(self):
+        self.mono_ns = 0
+        self.sleeps = []
+
+    def monotonic_ns(self) -> int:
+        return self.mono_ns
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.mono_ns += int(seconds * 1e9)
+
+    async def sleep_async(self, seconds: float):
+        self.sleep(seconds)
+
+def _probe(clock: FakeClock, results, latency_ms: float = 50):
+    """依序回傳 results 的探測函式，元素為 Exception 時拋出"""
+    results = iter(results)
+
+    def probe():
+        clock.mono_ns += int(latency_ms * 1e6)
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return probe
+
+def test_watch_returns_when_available():
+    """測試可購買時立即返回並統計探測延遲"""
+    clock = FakeClock()
+    watcher = StockWatcher(min_interval=0.2, jitter=0, clock=clock)
+    stats = watcher.watch(_probe(clock, [False, False, True]))
+
+    assert stats['probes'] == 3
+    assert stats['errors'] == 0
+    assert stats['latency_p50_ms'] == pytest.approx(50)
+    assert clock.sleeps == [pytest.approx(0.2), pytest.approx(0.2)]
+
+def test_watch_backs_off_on_errors_and_recovers():
+    """測試探測失敗時指數退避，成功後回到最短間隔"""
+    clock = FakeClock()
+    watcher = StockWatcher(min_interval=0.2, max_interval=1.0, backoff=2, jitter=0, clock=clock)
+    error = RuntimeError("503")
+    stats = watcher.watch(_probe(clock, [error, error, error, False, True]))
+
+    assert stats['errors'] == 3
+    assert clock.sleeps == [pytest.approx(s) for s in (0.4, 0.8, 1.0, 0.2)]
+
+def test_interval_adapts_to_probe_latency():
+    """測試探測很慢時拉長間隔，避免對網站造成壓力"""
+    clock = FakeClock()
+    watcher = StockWatcher(min_interval=0.1, latency_factor=2, jitter=0, clock=clock)
+    watcher.watch(_probe(clock, [False, True], latency_ms=300))
+
+    assert clock.sleeps == [pytest.approx(0.6)]
+
+def test_jitter_stays_within_bounds():
+    """測試抖動範圍"""
+    clock = FakeClock()
+    watcher = StockWatcher(min_interval=1.0, jitter=0.2, clock=clock, rng=random.Random(1))
+    watcher.watch(_probe(clock, [False] * 20 + [True], latency_ms=0))
+
+    assert all(0.8 <= s <= 1.2 for s in clock.sleeps)
+    assert len(set(clock.sleeps)) > 1
+
+def test_watch_timeout():
+    """測試超過監看時間時拋出 TimeoutError"""
+    clock = FakeClock()
+    watcher = StockWatcher(min_interval=0.5, jitter=0, clock=clock)
+    with pytest.raises(TimeoutError):
+        watcher.watch(_probe(clock, [False] * 10), timeout=1.2)
+
+def test_watch_async():
+    """測試 asyncio 版本"""
+    clock = FakeClock()
+    watcher = StockWatcher(min_interval=0.2, jitter=0, clock=clock)
+    probe = _probe(clock, [False, True])
+
+    async def async_probe():
+        return probe()
+
+    stats = asyncio.run(watcher.watch_async(async_probe))
+    assert stats['probes'] == 2
+
+def test_percentile():
+    """測試百分位數計算"""
+    assert percentile([], 50) is None
+    assert percentile([10, 20, 30, 40], 50) == pytest.approx(25)
+    assert percentile([10, 20, 30, 40], 100) == 40
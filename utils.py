@@ -1,6 +1,8 @@
 import random
 import time
 import logging
+from typing import Optional
+from buyer.instrument import span
 
 logger = logging.getLogger(__name__)
 
@@ -26,10 +28,11 @@ class UserAgentManager:
     ]
     
     @classmethod
-    def get_random_user_agent(cls) -> str:
-        """取得隨機的 User-Agent"""
-        os_info = random.choice(cls._OS_LIST)
-        chrome_version = random.choice(cls._CHROME_VERSIONS)
+    def get_random_user_agent(cls, rng: Optional[random.Random] = None) -> str:
+        """取得隨機的 User-Agent，提供 rng 時結果由其種子決定"""
+        rng = rng or random
+        os_info = rng.choice(cls._OS_LIST)
+        chrome_version = rng.choice(cls._CHROME_VERSIONS)
         
         user_agent = f'Mozilla/5.0 ({os_info}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome_version} Safari/537.36'
         return user_agent
@@ -55,18 +58,29 @@ class UserAgentManager:
             return f'Mozilla/5.0 ({device}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{chrome_version} Mobile Safari/537.36' 
         
 class TimingContext:
-    """計時器上下文管理器"""
+    """計時器上下文管理器
+
+    使用 perf_counter_ns 計時；若有作用中的 Tracer，同時記錄為一個巢狀 span。
+    """
     def __init__(self, description: str):
         self.description = description
-        self.start_time = None
-        self.end_time = None
+        self.start_ns = None
+        self.end_ns = None
+        self._span = None
 
     def __enter__(self):
-        self.start_time = time.time()
         logger.info(f"開始{self.description}")
+        self._span = span(self.description)
+        self._span.__enter__()
+        self.start_ns = time.perf_counter_ns()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.end_time = time.time()
-        duration = self.end_time - self.start_time
-        logger.info(f"完成{self.description}，耗時: {duration:.2f} 秒") 
\ No newline at end of file
+        self.end_ns = time.perf_counter_ns()
+        self._span.__exit__(exc_type, exc_val, exc_tb)
+        logger.info(f"完成{self.description}，耗時: {self.duration_ms:.1f} ms")
+
+    @property
+    def duration_ms(self) -> float:
+        """耗時（毫秒）"""
+        return (self.end_ns - self.start_ns) / 1e6